@@ -0,0 +1,279 @@
+"""
+Time-series analytics for the admin panel
+Activity is rolled up into analytics_rollups at hour, day and week granularity so that
+GET /api/admin/analytics answers any range with an index range scan instead of
+aggregating the base tables.
+
+Hourly buckets are computed from the rows' own timestamps (completed_at, created_at,
+applied_at, ...); day and week buckets are summed from the hours. The scheduler
+refreshes incrementally: every run recomputes the buckets from shortly before the
+previous watermark up to now, so rows committed late or changed since are picked up.
+Existing data is loaded with the backfill CLI:
+
+    python3 analytics.py --backfill [--from 2024-01-01] [--to 2025-01-01]
+    python3 analytics.py --refresh
+"""
+import argparse
+import os
+from datetime import datetime, timedelta
+
+GRANULARITIES = ('hour', 'day', 'week')
+_STEP = {'hour': timedelta(hours=1), 'day': timedelta(days=1), 'week': timedelta(weeks=1)}
+
+# How far before the last watermark each incremental refresh starts again (seconds)
+LATE_WINDOW = float(os.environ.get('ANALYTICS_LATE_WINDOW', 3600))
+# Longest series (number of buckets) one request may ask for
+MAX_POINTS = int(os.environ.get('ANALYTICS_MAX_POINTS', 2000))
+BACKFILL_CHUNK = timedelta(days=31)
+# Advisory lock serializing refreshes (scheduler job and CLI)
+LOCK_KEY = 573_002
+
+# metric: query yielding (at, dimension, value) rows with `at` in [%(start)s, %(end)s).
+# Dimension '' is the metric's total; others ('type:offer', 'tag:Cooking') break it down.
+SOURCES = {
+    'completions': """
+        SELECT completed_at AS at, '' AS dimension, 1 AS value
+        FROM service_progress
+        WHERE status = 'completed' AND completed_at >= %(start)s AND completed_at < %(end)s
+    """,
+    # From the completions themselves (not the ledger), so services completed before the
+    # ledger existed are counted by the backfill the same way as new ones
+    'hours_transferred': """
+        SELECT completed_at AS at, '' AS dimension, hours AS value
+        FROM service_progress
+        WHERE status = 'completed' AND completed_at >= %(start)s AND completed_at < %(end)s
+    """,
+    'services_created': """
+        SELECT s.created_at AS at, d.dimension, 1 AS value
+        FROM services s
+        CROSS JOIN LATERAL (VALUES (''), ('type:' || s.service_type)) AS d(dimension)
+        WHERE s.created_at >= %(start)s AND s.created_at < %(end)s
+        UNION ALL
+        SELECT s.created_at, 'tag:' || t.name, 1
+        FROM services s
+        JOIN service_tags st ON st.service_id = s.id
+        JOIN tags t ON t.id = st.tag_id
+        WHERE s.created_at >= %(start)s AND s.created_at < %(end)s
+    """,
+    'applications': """
+        SELECT applied_at AS at, '' AS dimension, 1 AS value
+        FROM service_applications
+        WHERE applied_at >= %(start)s AND applied_at < %(end)s
+    """,
+    'forum_threads': """
+        SELECT created_at AS at, '' AS dimension, 1 AS value
+        FROM forum_threads
+        WHERE created_at >= %(start)s AND created_at < %(end)s
+    """,
+    'forum_comments': """
+        SELECT created_at AS at, '' AS dimension, 1 AS value
+        FROM forum_comments
+        WHERE created_at >= %(start)s AND created_at < %(end)s
+    """,
+}
+
+# Earliest timestamp per source, where a full backfill starts
+_EARLIEST = """
+    SELECT LEAST(
+        (SELECT MIN(completed_at) FROM service_progress WHERE status = 'completed'),
+        (SELECT MIN(created_at) FROM services),
+        (SELECT MIN(applied_at) FROM service_applications),
+        (SELECT MIN(created_at) FROM forum_threads),
+        (SELECT MIN(created_at) FROM forum_comments)
+    ) AS earliest
+"""
+
+
+class AnalyticsQueryError(ValueError):
+    """Raised for analytics requests that cannot be answered (bad metric, range too long)"""
+
+
+def refresh(cursor, start, end):
+    """
+    Recompute all buckets touching [start, end) inside the caller's transaction.
+    `start` and `end` are rounded out to whole hours. Returns the hourly rows written.
+    """
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (LOCK_KEY,))
+    cursor.execute("""
+        SELECT date_trunc('hour', %(start)s::timestamp) AS start,
+               date_trunc('hour', %(end)s::timestamp - INTERVAL '1 microsecond') + INTERVAL '1 hour' AS end
+    """, {"start": start, "end": end})
+    window = cursor.fetchone()
+
+    written = 0
+    for metric, source in SOURCES.items():
+        params = {"metric": metric, "start": window['start'], "end": window['end']}
+        cursor.execute("""
+            DELETE FROM analytics_rollups
+            WHERE metric = %(metric)s AND granularity = 'hour'
+            AND bucket >= %(start)s AND bucket < %(end)s
+        """, params)
+        cursor.execute(f"""
+            INSERT INTO analytics_rollups (metric, granularity, dimension, bucket, value)
+            SELECT %(metric)s, 'hour', dimension, date_trunc('hour', at), SUM(value)
+            FROM ({source}) AS source
+            GROUP BY dimension, date_trunc('hour', at)
+        """, params)
+        written += cursor.rowcount
+
+        # Coarser buckets are re-summed from the hours they contain
+        for granularity in ('day', 'week'):
+            params["granularity"] = granularity
+            cursor.execute("""
+                SELECT date_trunc(%(granularity)s, %(start)s::timestamp) AS start,
+                       date_trunc(%(granularity)s, %(end)s::timestamp - INTERVAL '1 microsecond')
+                           + ('1 ' || %(granularity)s)::interval AS end
+            """, params)
+            span = cursor.fetchone()
+            span_params = dict(params, start=span['start'], end=span['end'])
+            cursor.execute("""
+                DELETE FROM analytics_rollups
+                WHERE metric = %(metric)s AND granularity = %(granularity)s
+                AND bucket >= %(start)s AND bucket < %(end)s
+            """, span_params)
+            cursor.execute("""
+                INSERT INTO analytics_rollups (metric, granularity, dimension, bucket, value)
+                SELECT metric, %(granularity)s, dimension, date_trunc(%(granularity)s, bucket), SUM(value)
+                FROM analytics_rollups
+                WHERE metric = %(metric)s AND granularity = 'hour'
+                AND bucket >= %(start)s AND bucket < %(end)s
+                GROUP BY metric, dimension, date_trunc(%(granularity)s, bucket)
+            """, span_params)
+    return written
+
+
+def _set_watermark(cursor, watermark):
+    cursor.execute("""
+        INSERT INTO analytics_state (name, watermark) VALUES ('rollups', %s)
+        ON CONFLICT (name) DO UPDATE SET watermark = EXCLUDED.watermark
+    """, (watermark,))
+
+
+def backfill(conn, start=None, end=None, chunk=BACKFILL_CHUNK):
+    """
+    Build the rollups for [start, end) in committed chunks (default: from the earliest
+    activity until now, after which incremental refreshes take over). Returns rows written.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT LOCALTIMESTAMP AS now")
+    now = cursor.fetchone()['now']
+    set_watermark = end is None
+    end = end or now
+    if start is None:
+        cursor.execute(_EARLIEST)
+        start = cursor.fetchone()['earliest'] or end
+
+    written = 0
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(chunk_start + chunk, end)
+        written += refresh(cursor, chunk_start, chunk_end)
+        conn.commit()
+        print(f"Analytics rolled up {chunk_start:%Y-%m-%d %H:%M} .. {chunk_end:%Y-%m-%d %H:%M}")
+        chunk_start = chunk_end
+
+    if set_watermark:
+        _set_watermark(cursor, now)
+        conn.commit()
+    cursor.close()
+    return written
+
+
+def refresh_recent(conn):
+    """Incremental refresh from just before the last watermark until now (scheduler job)"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT watermark FROM analytics_state WHERE name = 'rollups'")
+    row = cursor.fetchone()
+    if row is None:
+        cursor.close()
+        return {"backfilled": backfill(conn)}
+
+    cursor.execute("SELECT LOCALTIMESTAMP AS now")
+    now = cursor.fetchone()['now']
+    written = refresh(cursor, row['watermark'] - timedelta(seconds=LATE_WINDOW), now)
+    _set_watermark(cursor, now)
+    conn.commit()
+    cursor.close()
+    return {"rows": written, "from": row['watermark'] - timedelta(seconds=LATE_WINDOW), "to": now}
+
+
+def _bucket_start(moment, granularity):
+    if granularity == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == 'week':
+        day -= timedelta(days=day.weekday())
+    return day
+
+
+def series(cursor, metrics, granularity, start, end, breakdown=None, limit=10):
+    """
+    Values per bucket for [start, end): {"buckets": [...], "series": {metric: {label: [values]}}}.
+    Label "total" is the metric itself; with `breakdown` ('type' or 'tag') the `limit`
+    largest dimensions of that kind over the range are added.
+    """
+    unknown = [metric for metric in metrics if metric not in SOURCES]
+    if unknown:
+        raise AnalyticsQueryError(f"Unknown metric(s): {', '.join(unknown)}")
+    if granularity not in GRANULARITIES:
+        raise AnalyticsQueryError(f"granularity must be one of: {', '.join(GRANULARITIES)}")
+    if breakdown not in (None, 'type', 'tag'):
+        raise AnalyticsQueryError("breakdown must be 'type' or 'tag'")
+    if end <= start:
+        raise AnalyticsQueryError("end must be after start")
+
+    first = _bucket_start(start, granularity)
+    if (end - first) / _STEP[granularity] > MAX_POINTS:
+        raise AnalyticsQueryError(f"Range too long for {granularity} buckets (max {MAX_POINTS} points)")
+
+    buckets = []
+    bucket = first
+    while bucket < end:
+        buckets.append(bucket)
+        bucket = _bucket_start(bucket + _STEP[granularity], granularity)
+    position = {bucket: index for index, bucket in enumerate(buckets)}
+
+    cursor.execute("""
+        SELECT metric, dimension, bucket, value
+        FROM analytics_rollups
+        WHERE metric = ANY(%(metrics)s) AND granularity = %(granularity)s
+        AND bucket >= %(start)s AND bucket < %(end)s
+        AND (dimension = '' OR dimension LIKE %(prefix)s)
+    """, {"metrics": list(metrics), "granularity": granularity, "start": first, "end": end,
+          "prefix": f"{breakdown}:%" if breakdown else ''})
+
+    values = {metric: {} for metric in metrics}
+    for row in cursor.fetchall():
+        label = row['dimension'] or 'total'
+        points = values[row['metric']].setdefault(label, [0.0] * len(buckets))
+        points[position[row['bucket']]] = float(row['value'])
+
+    result = {}
+    for metric in metrics:
+        lines = values[metric]
+        total = lines.pop('total', [0.0] * len(buckets))
+        top = sorted(lines.items(), key=lambda item: sum(item[1]), reverse=True)[:limit]
+        result[metric] = {"total": total, **{label.split(':', 1)[1]: points for label, points in top}}
+
+    return {"buckets": [bucket.isoformat() for bucket in buckets], "series": result}
+
+
+if __name__ == "__main__":
+    import db_pool
+
+    parser = argparse.ArgumentParser(description="Build the admin analytics rollups")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument('--backfill', action='store_true', help="rebuild a range (default: all history)")
+    action.add_argument('--refresh', action='store_true', help="incremental refresh since the last run")
+    parser.add_argument('--from', dest='start', type=datetime.fromisoformat, help="backfill start (ISO date)")
+    parser.add_argument('--to', dest='end', type=datetime.fromisoformat, help="backfill end (ISO date)")
+    args = parser.parse_args()
+
+    conn = db_pool.connect()
+    try:
+        if args.backfill:
+            print(f"Wrote {backfill(conn, args.start, args.end)} hourly rollup rows")
+        else:
+            print(refresh_recent(conn))
+    finally:
+        conn.close()
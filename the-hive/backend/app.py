@@ -1,17 +1,42 @@
-from flask import Flask, jsonify, request, render_template, send_from_directory
-from flask_bcrypt import Bcrypt
+from flask import Flask, Response, jsonify, request, render_template, send_from_directory, has_request_context, url_for
 import os
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import Json
 import jwt
 from datetime import datetime, timedelta, timezone
 from email_validator import validate_email, EmailNotValidError
 import re
+import time
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.utils import secure_filename
 import uuid
 
+import db_pool
+import query_stats
+from pagination import encode_cursor, decode_cursor, parse_limit, InvalidCursorError
+from search import (
+    SEARCH_CONFIG, SNIPPET_OPTIONS, TITLE_OPTIONS,
+    refresh_service_search_vector, build_tsquery, render_highlight
+)
+import tag_search
+import suggestion_cache
+import taxonomy
+import conversations
+import events
+import ledger
+import scheduler
+import stats
+import analytics
+import auth
+import passwords
+import sessions
+import response_cache
+import reputation
+import migrate
+
 # Import wikibase search functionality
 try:
+    import wikibase_search
     from wikibase_search import get_entity_id, get_related_tags
     WIKIBASE_AVAILABLE = True
 except ImportError as e:
@@ -25,12 +50,43 @@ static_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../fronte
 
 app = Flask(__name__, template_folder=template_dir, static_folder=static_dir)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
-bcrypt = Bcrypt(app)
+
+# Behind a load balancer request.remote_addr is the balancer. Trust the X-Forwarded-For
+# (and -Proto) entries added by that many proxies, so per-client login limits and sessions
+# see the client's address. Leave at 0 when clients connect directly: they could forge it.
+TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', 0))
+if TRUSTED_PROXY_COUNT:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_COUNT, x_proto=TRUSTED_PROXY_COUNT)
+db_pool.init_app(app)
+query_stats.init_app(app)
 
 UPLOAD_FOLDER = os.path.join(static_dir, 'uploads')
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
+# Page sizes for GET /api/services (keyset pagination)
+SERVICES_PAGE_SIZE = int(os.environ.get('SERVICES_PAGE_SIZE', 50))
+SERVICES_MAX_PAGE_SIZE = int(os.environ.get('SERVICES_MAX_PAGE_SIZE', 100))
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 50
+TAG_SEARCH_LIMIT = 10
+TAG_SEARCH_MAX_LIMIT = 50
+CONVERSATIONS_PAGE_SIZE = 50
+CONVERSATIONS_MAX_PAGE_SIZE = 100
+MESSAGES_PAGE_SIZE = 50
+MESSAGES_MAX_PAGE_SIZE = 200
+
+# Incremental message sync: changes returned per request before the client is told to
+# reload, and how far back each sync cursor reaches to cover transactions committing late
+MESSAGES_SYNC_MAX = 500
+MESSAGES_SYNC_OVERLAP = timedelta(seconds=10)
+
+# Longest range of the admin dashboard's daily history
+STATS_HISTORY_MAX_DAYS = 366
+
+# Most statements listed per endpoint by /api/admin/query-stats
+QUERY_STATS_MAX_TOP = 100
+
 # Ensure upload directory exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
@@ -40,400 +96,19 @@ def allowed_file(filename):
 
 # Function to connect to the database
 def get_db_connection():
-    # Check if DATABASE_URL is set (DigitalOcean/Production)
-    database_url = os.environ.get('DATABASE_URL')
-    
-    if database_url:
-        # Parse DATABASE_URL for production (DigitalOcean format)
-        conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
-    else:
-        # Use individual environment variables for local/docker-compose/DigitalOcean
-        conn = psycopg2.connect(
-            host=os.environ.get("POSTGRES_HOST"),
-            port=os.environ.get("POSTGRES_PORT"),
-            database=os.environ.get("POSTGRES_DB"),
-            user=os.environ.get("POSTGRES_USER"),
-            password=os.environ.get("POSTGRES_PASSWORD"),
-            sslmode=os.environ.get("POSTGRES_SSLMODE"),
-            cursor_factory=RealDictCursor
-        )
-    return conn
+    """
+    Borrow a pooled connection (see db_pool.py).
+    Inside a request the same connection is reused until teardown, so the existing
+    conn.close() calls in handlers are safe; outside a request close() returns it to the pool.
+    """
+    if has_request_context():
+        return db_pool.get_request_connection()
+    return db_pool.connect()
 
 # Initialize database tables
 def init_db():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Create users table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id SERIAL PRIMARY KEY,
-            email VARCHAR(255) UNIQUE NOT NULL,
-            password_hash VARCHAR(255) NOT NULL,
-            first_name VARCHAR(100),
-            last_name VARCHAR(100),
-            phone_number VARCHAR(20),
-            biography TEXT,
-            profile_photo VARCHAR(255),
-            role VARCHAR(20) DEFAULT 'user',
-            time_balance DECIMAL(10,2) DEFAULT 1.0,
-            is_verified BOOLEAN DEFAULT FALSE,
-            is_active BOOLEAN DEFAULT TRUE,
-            user_status VARCHAR(20) DEFAULT 'active' CHECK (user_status IN ('active', 'banned', 'warning')),
-            date_joined TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            last_login TIMESTAMP
-        );
-    """)
-    
-    # Create email verification tokens table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS email_verifications (
-            id SERIAL PRIMARY KEY,
-            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-            token VARCHAR(255) UNIQUE NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            expires_at TIMESTAMP NOT NULL,
-            is_used BOOLEAN DEFAULT FALSE
-        );
-    """)
-    
-    # Create tags table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS tags (
-            id SERIAL PRIMARY KEY,
-            name VARCHAR(100) UNIQUE NOT NULL,
-            created_by INTEGER REFERENCES users(id),
-            is_approved BOOLEAN DEFAULT TRUE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-    
-    # Create services table (for both offers and needs)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS services (
-            id SERIAL PRIMARY KEY,
-            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-            service_type VARCHAR(10) NOT NULL CHECK (service_type IN ('offer', 'need')),
-            title VARCHAR(255) NOT NULL,
-            description TEXT NOT NULL,
-            hours_required DECIMAL(10,2) NOT NULL CHECK (hours_required >= 1.0 AND hours_required <= 3.0),
-            location_type VARCHAR(20) NOT NULL CHECK (location_type IN ('online', 'in-person', 'both')),
-            location_address TEXT,
-            latitude DECIMAL(10,8),
-            longitude DECIMAL(11,8),
-            status VARCHAR(20) DEFAULT 'open' CHECK (status IN ('open', 'in_progress', 'completed', 'cancelled', 'expired')),
-            service_date TIMESTAMP,
-            start_time TIME,
-            end_time TIME,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-    
-    # Create service_tags junction table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS service_tags (
-            service_id INTEGER REFERENCES services(id) ON DELETE CASCADE,
-            tag_id INTEGER REFERENCES tags(id) ON DELETE CASCADE,
-            PRIMARY KEY (service_id, tag_id)
-        );
-    """)
-    
-    # Create service_availability table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS service_availability (
-            id SERIAL PRIMARY KEY,
-            service_id INTEGER REFERENCES services(id) ON DELETE CASCADE,
-            day_of_week INTEGER NOT NULL CHECK (day_of_week BETWEEN 0 AND 6),
-            start_time TIME NOT NULL,
-            end_time TIME NOT NULL
-        );
-    """)
-    
-    # Create password_reset_tokens table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS password_reset_tokens (
-            id SERIAL PRIMARY KEY,
-            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-            token VARCHAR(255) UNIQUE NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            expires_at TIMESTAMP NOT NULL,
-            is_used BOOLEAN DEFAULT FALSE
-        );
-    """)
-    
-    # Create service_applications table (for tracking applications to services)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS service_applications (
-            id SERIAL PRIMARY KEY,
-            service_id INTEGER REFERENCES services(id) ON DELETE CASCADE,
-            applicant_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-            status VARCHAR(20) DEFAULT 'pending' CHECK (status IN ('pending', 'accepted', 'rejected', 'cancelled', 'withdrawn')),
-            message TEXT,
-            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(service_id, applicant_id)
-        );
-    """)
-    
-    # Add 'withdrawn' to existing status check constraint if table already exists
-    cursor.execute("""
-        DO $$
-        BEGIN
-            -- Drop the old constraint if it exists
-            ALTER TABLE service_applications DROP CONSTRAINT IF EXISTS service_applications_status_check;
-            
-            -- Add the new constraint with 'withdrawn' included
-            ALTER TABLE service_applications ADD CONSTRAINT service_applications_status_check 
-                CHECK (status IN ('pending', 'accepted', 'rejected', 'cancelled', 'withdrawn'));
-        EXCEPTION
-            WHEN OTHERS THEN
-                -- Ignore errors if constraint doesn't exist
-                NULL;
-        END $$;
-    """)
-    
-    # Create service_progress table (for tracking service completion workflow)
-    # Progress flow: selected -> scheduled -> in_progress -> awaiting_confirmation -> completed
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS service_progress (
-            id SERIAL PRIMARY KEY,
-            service_id INTEGER REFERENCES services(id),
-            application_id INTEGER REFERENCES service_applications(id),
-            provider_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-            consumer_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-            hours DECIMAL(10,2) NOT NULL,
-            status VARCHAR(30) DEFAULT 'selected' CHECK (status IN ('selected', 'scheduled', 'in_progress', 'awaiting_confirmation', 'completed', 'disputed', 'cancelled')),
-            scheduled_date DATE,
-            scheduled_time TIME,
-            agreed_location TEXT,
-            special_instructions TEXT,
-            provider_confirmed BOOLEAN DEFAULT FALSE,
-            consumer_confirmed BOOLEAN DEFAULT FALSE,
-            provider_start_confirmed BOOLEAN DEFAULT FALSE,
-            consumer_start_confirmed BOOLEAN DEFAULT FALSE,
-            provider_start_confirmed_at TIMESTAMP,
-            consumer_start_confirmed_at TIMESTAMP,
-            proposed_date DATE,
-            proposed_time TIME,
-            proposed_location TEXT,
-            proposed_by INTEGER REFERENCES users(id),
-            proposed_at TIMESTAMP,
-            schedule_accepted_by_consumer BOOLEAN DEFAULT FALSE,
-            schedule_accepted_by_provider BOOLEAN DEFAULT FALSE,
-            service_end_date DATE,
-            service_start_date DATE,
-            provider_survey_submitted BOOLEAN DEFAULT FALSE,
-            consumer_survey_submitted BOOLEAN DEFAULT FALSE,
-            provider_survey_submitted_at TIMESTAMP,
-            consumer_survey_submitted_at TIMESTAMP,
-            provider_survey_data JSONB,
-            consumer_survey_data JSONB,
-            survey_deadline TIMESTAMP,
-            selected_at TIMESTAMP,
-            scheduled_at TIMESTAMP,
-            started_at TIMESTAMP,
-            completed_at TIMESTAMP,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-    
-    # Create messages table (for communication between users)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS messages (
-            id SERIAL PRIMARY KEY,
-            service_id INTEGER REFERENCES services(id) ON DELETE CASCADE,
-            application_id INTEGER REFERENCES service_applications(id) ON DELETE CASCADE,
-            sender_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-            receiver_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-            message TEXT NOT NULL,
-            is_read BOOLEAN DEFAULT FALSE,
-            message_type VARCHAR(50) DEFAULT 'text',
-            proposal_date DATE,
-            proposal_start_time TIME,
-            proposal_end_time TIME,
-            proposal_status VARCHAR(20) DEFAULT 'pending',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-    
-    # Add migration columns to existing tables (safe to run multiple times)
-    print("Applying database migrations...")
-    
-    # Add new columns to services table
-    cursor.execute("""
-        ALTER TABLE services 
-        ADD COLUMN IF NOT EXISTS start_time TIME,
-        ADD COLUMN IF NOT EXISTS end_time TIME;
-    """)
-    
-    # Add new columns to service_progress table
-    cursor.execute("""
-        ALTER TABLE service_progress 
-        ADD COLUMN IF NOT EXISTS provider_start_confirmed BOOLEAN DEFAULT FALSE,
-        ADD COLUMN IF NOT EXISTS consumer_start_confirmed BOOLEAN DEFAULT FALSE,
-        ADD COLUMN IF NOT EXISTS provider_start_confirmed_at TIMESTAMP,
-        ADD COLUMN IF NOT EXISTS consumer_start_confirmed_at TIMESTAMP,
-        ADD COLUMN IF NOT EXISTS proposed_date DATE,
-        ADD COLUMN IF NOT EXISTS proposed_time TIME,
-        ADD COLUMN IF NOT EXISTS proposed_location TEXT,
-        ADD COLUMN IF NOT EXISTS proposed_by INTEGER REFERENCES users(id),
-        ADD COLUMN IF NOT EXISTS proposed_at TIMESTAMP,
-        ADD COLUMN IF NOT EXISTS schedule_accepted_by_consumer BOOLEAN DEFAULT FALSE,
-        ADD COLUMN IF NOT EXISTS schedule_accepted_by_provider BOOLEAN DEFAULT FALSE,
-        ADD COLUMN IF NOT EXISTS service_end_date DATE,
-        ADD COLUMN IF NOT EXISTS service_start_date DATE,
-        ADD COLUMN IF NOT EXISTS provider_survey_submitted BOOLEAN DEFAULT FALSE,
-        ADD COLUMN IF NOT EXISTS consumer_survey_submitted BOOLEAN DEFAULT FALSE,
-        ADD COLUMN IF NOT EXISTS provider_survey_submitted_at TIMESTAMP,
-        ADD COLUMN IF NOT EXISTS consumer_survey_submitted_at TIMESTAMP,
-        ADD COLUMN IF NOT EXISTS provider_survey_data JSONB,
-        ADD COLUMN IF NOT EXISTS consumer_survey_data JSONB,
-        ADD COLUMN IF NOT EXISTS survey_deadline TIMESTAMP;
-    """)
-    
-    # Add new columns to messages table
-    cursor.execute("""
-        ALTER TABLE messages 
-        ADD COLUMN IF NOT EXISTS message_type VARCHAR(50) DEFAULT 'text',
-        ADD COLUMN IF NOT EXISTS proposal_date DATE,
-        ADD COLUMN IF NOT EXISTS proposal_start_time TIME,
-        ADD COLUMN IF NOT EXISTS proposal_end_time TIME,
-        ADD COLUMN IF NOT EXISTS proposal_location TEXT,
-        ADD COLUMN IF NOT EXISTS proposal_status VARCHAR(20) DEFAULT 'pending';
-    """)
-
-    # Create index for survey deadlines on service_progress
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_service_progress_survey_deadline 
-        ON service_progress(survey_deadline) 
-        WHERE survey_deadline IS NOT NULL;
-    """)
-    
-    # Create forum_categories table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS forum_categories (
-            id SERIAL PRIMARY KEY,
-            name VARCHAR(100) UNIQUE NOT NULL,
-            description TEXT,
-            is_active BOOLEAN DEFAULT TRUE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-    
-    # Create forum_threads table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS forum_threads (
-            id SERIAL PRIMARY KEY,
-            category_id INTEGER REFERENCES forum_categories(id) ON DELETE CASCADE,
-            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-            title VARCHAR(255) NOT NULL,
-            content TEXT NOT NULL,
-            is_pinned BOOLEAN DEFAULT FALSE,
-            is_locked BOOLEAN DEFAULT FALSE,
-            view_count INTEGER DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-    
-    # Create forum_comments table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS forum_comments (
-            id SERIAL PRIMARY KEY,
-            thread_id INTEGER REFERENCES forum_threads(id) ON DELETE CASCADE,
-            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-            content TEXT NOT NULL,
-            parent_comment_id INTEGER REFERENCES forum_comments(id) ON DELETE CASCADE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-    
-    # Create admin_logs table for audit trail
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS admin_logs (
-            id SERIAL PRIMARY KEY,
-            admin_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
-            action VARCHAR(100) NOT NULL,
-            target_type VARCHAR(50) NOT NULL,
-            target_id INTEGER,
-            details JSONB,
-            ip_address VARCHAR(45),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-    
-    # Create reports table for content flagging
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS reports (
-            id SERIAL PRIMARY KEY,
-            reporter_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-            reported_user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-            content_type VARCHAR(50) NOT NULL CHECK (content_type IN ('service', 'thread', 'comment', 'user', 'message')),
-            content_id INTEGER,
-            reason VARCHAR(255) NOT NULL,
-            description TEXT,
-            status VARCHAR(20) DEFAULT 'open' CHECK (status IN ('open', 'resolved', 'dismissed')),
-            resolved_by INTEGER REFERENCES users(id) ON DELETE SET NULL,
-            resolved_at TIMESTAMP,
-            resolution_notes TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-    
-    # Create indexes for better performance
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_forum_threads_category 
-        ON forum_threads(category_id);
-    """)
-    
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_forum_threads_user 
-        ON forum_threads(user_id);
-    """)
-    
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_forum_comments_thread 
-        ON forum_comments(thread_id);
-    """)
-    
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_forum_comments_user 
-        ON forum_comments(user_id);
-    """)
-    
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_reports_status 
-        ON reports(status);
-    """)
-    
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_admin_logs_admin 
-        ON admin_logs(admin_id);
-    """)
-    
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_admin_logs_created 
-        ON admin_logs(created_at);
-    """)
-    
-    # Add user_status column to existing users table
-    cursor.execute("""
-        ALTER TABLE users 
-        ADD COLUMN IF NOT EXISTS user_status VARCHAR(20) DEFAULT 'active' 
-        CHECK (user_status IN ('active', 'banned', 'warning'));
-    """)
-    
-    
-    print("Migrations applied successfully!")
-    
-    conn.commit()
-    cursor.close()
-    conn.close()
-    print("Database initialized successfully!")
+    """Bring the database schema up to date (see migrate.py)"""
+    migrate.migrate()
 
 # Validation functions
 def validate_password(password):
@@ -457,54 +132,84 @@ def validate_phone(phone):
         return True
     return False
 
-def get_user_from_token(auth_header):
-    """Extract and validate user from JWT token"""
+def load_user_status(user_id):
+    """Current status, role and active flag of a user (None if deleted); cached by auth.py"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT user_status, role, is_active FROM users WHERE id = %s", (user_id,))
+    user = cursor.fetchone()
+    cursor.close()
+    conn.close()
+    return dict(user) if user else None
+
+def authenticate(auth_header):
+    """
+    Validate the JWT and check the account is still allowed in.
+    Returns (user_id, user status row, error, status code).
+    """
     if not auth_header:
-        return None, {"error": "Authorization header is required"}, 401
+        return None, None, {"error": "Authorization header is required"}, 401
     
     try:
         token = auth_header.split(' ')[1]  # Bearer <token>
     except IndexError:
-        return None, {"error": "Invalid authorization header format"}, 401
+        return None, None, {"error": "Invalid authorization header format"}, 401
     
     try:
-        payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-        return payload['user_id'], None, None
+        payload = auth.decode_token(token, app.config['SECRET_KEY'])
     except jwt.ExpiredSignatureError:
-        return None, {"error": "Token has expired"}, 401
+        return None, None, {"error": "Token has expired"}, 401
     except jwt.InvalidTokenError:
-        return None, {"error": "Invalid token"}, 401
+        return None, None, {"error": "Invalid token"}, 401
+    
+    # Bans and deactivations apply to tokens issued before them
+    user = auth.user_status(payload['user_id'], load_user_status)
+    error, status = account_error(user)
+    if error:
+        return None, None, error, status
+    
+    return payload['user_id'], user, None, None
+
+def account_error(user):
+    """(error, status code) if an account with this status row may no longer sign in, else (None, None)"""
+    if not user or not user['is_active']:
+        return {"error": "Account is deactivated"}, 401
+    if user['user_status'] == 'banned':
+        return {"error": "Your account is banned"}, 403
+    return None, None
+
+def create_access_token(user):
+    """Short-lived JWT for API calls; clients renew it with their refresh token"""
+    return jwt.encode({
+        'user_id': user['id'],
+        'email': user['email'],
+        'role': user['role'],
+        'exp': datetime.now(timezone.utc) + timedelta(seconds=sessions.ACCESS_TOKEN_TTL)
+    }, app.config['SECRET_KEY'], algorithm='HS256')
+
+def get_user_from_token(auth_header):
+    """Extract and validate user from JWT token"""
+    user_id, user, error, status = authenticate(auth_header)
+    return user_id, error, status
 
 def get_admin_from_token(auth_header):
     """Extract and validate admin user from JWT token"""
-    if not auth_header:
-        return None, {"error": "Authorization header is required"}, 401
+    user_id, user, error, status = authenticate(auth_header)
+    if error:
+        return None, error, status
     
-    try:
-        token = auth_header.split(' ')[1]  # Bearer <token>
-    except IndexError:
-        return None, {"error": "Invalid authorization header format"}, 401
+    # The current role, not the one in the token
+    if user['role'] != 'admin':
+        return None, {"error": "Admin access required"}, 403
     
-    try:
-        payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-        user_id = payload['user_id']
-        role = payload.get('role', 'user')
-        
-        if role != 'admin':
-            return None, {"error": "Admin access required"}, 403
-            
-        return user_id, None, None
-    except jwt.ExpiredSignatureError:
-        return None, {"error": "Token has expired"}, 401
-    except jwt.InvalidTokenError:
-        return None, {"error": "Invalid token"}, 401
+    return user_id, None, None
 
 def log_admin_action(cursor, admin_id, action, target_type, target_id, details=None, ip_address=None):
     """Log admin actions for audit trail"""
     cursor.execute("""
         INSERT INTO admin_logs (admin_id, action, target_type, target_id, details, ip_address)
         VALUES (%s, %s, %s, %s, %s, %s)
-    """, (admin_id, action, target_type, target_id, details, ip_address))
+    """, (admin_id, action, target_type, target_id, Json(details) if details is not None else None, ip_address))
 
 def validate_time_balance(cursor, consumer_id, provider_id, hours_required):
     """
@@ -708,6 +413,8 @@ def api_info():
             "health": "GET /api/health",
             "register": "POST /api/auth/register",
             "login": "POST /api/auth/login",
+            "refresh": "POST /api/auth/refresh",
+            "logout": "POST /api/auth/logout",
             "verify_email": "GET /api/auth/verify-email?token=<token>",
             "profile": "GET /api/auth/profile (requires token)"
         }
@@ -718,17 +425,103 @@ def health_check():
     """Health check endpoint"""
     try:
         conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.close()
         conn.close()
         return jsonify({
             "status": "success", 
-            "message": "API is running and database is connected!"
+            "message": "API is running and database is connected!",
+            "pool": db_pool.pool_stats(),
+            "suggestion_cache": suggestion_cache.cache_stats(),
+            "wikidata": wikibase_search.client_stats() if WIKIBASE_AVAILABLE else None,
+            "taxonomy": taxonomy.graph_stats(),
+            "events": events.hub_stats(),
+            "listener": events.listener_stats(),
+            "auth": auth.auth_stats(),
+            "passwords": passwords.password_stats(),
+            "response_cache": response_cache.cache_stats()
         })
     except Exception as e:
         return jsonify({
             "status": "error", 
-            "message": str(e)
+            "message": str(e),
+            "pool": db_pool.pool_stats()
         }), 500
 
+@app.route("/api/events/ticket", methods=['POST'])
+def event_stream_ticket():
+    """
+    Single-use ticket for GET /api/events?ticket= (EventSource cannot send the
+    Authorization header, and the access token must not end up in a URL)
+    """
+    try:
+        user_id, error, status = get_user_from_token(request.headers.get('Authorization'))
+        if error:
+            return jsonify(error), status
+        
+        # The stream ends when the access token does
+        claims = auth.decode_token(request.headers['Authorization'].split(' ')[1], app.config['SECRET_KEY'])
+        
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        ticket = events.create_ticket(cursor, user_id, max(claims['exp'] - time.time(), 0))
+        conn.commit()
+        cursor.close()
+        conn.close()
+        
+        return jsonify({"ticket": ticket, "expires_in": events.TICKET_TTL}), 200
+        
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+@app.route("/api/events", methods=['GET'])
+def event_stream():
+    """
+    Server-Sent Events stream of the current user's events (message, application,
+    progress, survey, balance, plus resync when events may have been missed).
+    Opened with a ticket from POST /api/events/ticket (?ticket=) or an Authorization
+    header. It ends when the access token expires or the account is banned or deactivated.
+    """
+    ticket = request.args.get('ticket')
+    if ticket:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        redeemed = events.redeem_ticket(cursor, ticket)
+        conn.commit()
+        cursor.close()
+        conn.close()
+        if redeemed is None:
+            return jsonify({"error": "Invalid or expired stream ticket"}), 401
+        user_id, lifetime = redeemed
+        error, status = account_error(auth.user_status(user_id, load_user_status))
+        if error:
+            return jsonify(error), status
+    else:
+        auth_header = request.headers.get('Authorization')
+        user_id, error, status = get_user_from_token(auth_header)
+        if error:
+            return jsonify(error), status
+        claims = auth.decode_token(auth_header.split(' ')[1], app.config['SECRET_KEY'])
+        lifetime = max(claims['exp'] - time.time(), 0)
+    
+    def check_account():
+        return account_error(auth.user_status(user_id, load_user_status))[0]
+    
+    hub = events.get_hub()
+    try:
+        subscriber = hub.subscribe(user_id)
+    except events.HubFullError as e:
+        return jsonify({"error": str(e)}), 503
+    
+    # Not wrapped in stream_with_context: the request (and its pooled DB connection)
+    # is released as soon as the stream starts
+    return Response(hub.stream(subscriber, lifetime=lifetime, check=check_account),
+                    mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route("/api/auth/register", methods=['POST'])
 def register():
     """User registration endpoint"""
@@ -767,7 +560,10 @@ def register():
             return jsonify({"error": "Invalid phone number format"}), 400
         
         # Hash password
-        password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        try:
+            password_hash = passwords.hash_password(password)
+        except passwords.PasswordServiceBusy as e:
+            return jsonify({"error": str(e)}), 503
         
         # Insert user into database
         conn = get_db_connection()
@@ -843,68 +639,84 @@ def login():
         
         cursor.execute("""
             SELECT id, email, password_hash, first_name, last_name, 
-                   is_verified, is_active, role, time_balance
+                   is_verified, is_active, role, time_balance, user_status
             FROM users 
             WHERE email = %s
         """, (email,))
         
         user = cursor.fetchone()
         
+        # The password check can wait up to PASSWORD_HASH_TIMEOUT for a hashing process;
+        # hand the connection back to the pool instead of holding it idle meanwhile
+        cursor.close()
+        conn.close()
+        db_pool.release_request_connection()
+        
         if not user:
-            cursor.close()
-            conn.close()
             return jsonify({"error": "Invalid email or password"}), 401
         
         # Check password
-        if not bcrypt.check_password_hash(user['password_hash'], password):
-            cursor.close()
-            conn.close()
+        try:
+            with passwords.login_slot(request.remote_addr or 'unknown', email):
+                password_ok = passwords.check_password(password, user['password_hash'])
+        except passwords.LoginThrottled as e:
+            return jsonify({"error": str(e)}), 429
+        except passwords.PasswordServiceBusy as e:
+            return jsonify({"error": str(e)}), 503
+        
+        if not password_ok:
             return jsonify({"error": "Invalid email or password"}), 401
         
         # Check if user is banned
-        cursor.execute("SELECT user_status FROM users WHERE id = %s", (user['id'],))
-        status_result = cursor.fetchone()
-        if status_result and status_result['user_status'] == 'banned':
-            cursor.close()
-            conn.close()
+        if user['user_status'] == 'banned':
             return jsonify({"error": "Your account is banned"}), 403
         
         # Check if user is active
         if not user['is_active']:
-            cursor.close()
-            conn.close()
             return jsonify({"error": "Account is deactivated"}), 403
         
         # Check if email is verified
         if not user['is_verified']:
-            cursor.close()
-            conn.close()
             return jsonify({
                 "error": "Please verify your email before logging in",
                 "is_verified": False
             }), 403
         
+        # Hashes from before a BCRYPT_ROUNDS change are upgraded now that we know the password
+        # (hashed before taking a connection again, for the same reason)
+        new_hash = None
+        if passwords.needs_rehash(user['password_hash']):
+            try:
+                new_hash = passwords.hash_password(password)
+            except passwords.PasswordServiceBusy:
+                pass  # retried on the next login
+        
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
         # Update last login
         cursor.execute("""
             UPDATE users SET last_login = CURRENT_TIMESTAMP 
             WHERE id = %s
         """, (user['id'],))
+        
+        if new_hash:
+            cursor.execute("""
+                UPDATE users SET password_hash = %s
+                WHERE id = %s AND password_hash = %s
+            """, (new_hash, user['id'], user['password_hash']))
+        
+        refresh_token = sessions.create(cursor, user['id'], request.headers.get('User-Agent'), request.remote_addr)
         conn.commit()
         
         cursor.close()
         conn.close()
         
-        # Generate access token
-        access_token = jwt.encode({
-            'user_id': user['id'],
-            'email': user['email'],
-            'role': user['role'],
-            'exp': datetime.now(timezone.utc) + timedelta(hours=24)
-        }, app.config['SECRET_KEY'], algorithm='HS256')
-        
         return jsonify({
             "message": "Login successful",
-            "access_token": access_token,
+            "access_token": create_access_token(user),
+            "refresh_token": refresh_token,
+            "expires_in": sessions.ACCESS_TOKEN_TTL,
             "user": {
                 "id": user['id'],
                 "email": user['email'],
@@ -918,6 +730,81 @@ def login():
     except Exception as e:
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
+@app.route("/api/auth/refresh", methods=['POST'])
+def refresh_session():
+    """Trade a refresh token for a new access token and the next refresh token (no password needed)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        refresh_token = data.get('refresh_token', '')
+        
+        if not refresh_token:
+            return jsonify({"error": "Refresh token is required"}), 400
+        
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        new_token, session, error, status = sessions.rotate(cursor, refresh_token)
+        if error:
+            # A detected reuse has revoked the session
+            conn.commit()
+            cursor.close()
+            conn.close()
+            return jsonify({"error": error}), status
+        
+        cursor.execute("""
+            SELECT id, email, role, user_status, is_active
+            FROM users
+            WHERE id = %s
+        """, (session['user_id'],))
+        user = cursor.fetchone()
+        
+        if not user or not user['is_active']:
+            conn.rollback()
+            cursor.close()
+            conn.close()
+            return jsonify({"error": "Account is deactivated"}), 401
+        
+        if user['user_status'] == 'banned':
+            conn.rollback()
+            cursor.close()
+            conn.close()
+            return jsonify({"error": "Your account is banned"}), 403
+        
+        conn.commit()
+        cursor.close()
+        conn.close()
+        
+        return jsonify({
+            "access_token": create_access_token(user),
+            "refresh_token": new_token,
+            "expires_in": sessions.ACCESS_TOKEN_TTL
+        }), 200
+        
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+@app.route("/api/auth/logout", methods=['POST'])
+def logout():
+    """End the session of a refresh token (the access token simply expires)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        refresh_token = data.get('refresh_token', '')
+        
+        if not refresh_token:
+            return jsonify({"error": "Refresh token is required"}), 400
+        
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        sessions.revoke(cursor, refresh_token)
+        conn.commit()
+        cursor.close()
+        conn.close()
+        
+        return jsonify({"message": "Signed out"}), 200
+        
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
 @app.route("/api/auth/verify-email", methods=['GET'])
 def verify_email():
     """Email verification endpoint"""
@@ -1044,6 +931,7 @@ def get_profile():
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
 @app.route("/api/users/<int:user_id>", methods=['GET'])
+@response_cache.cached(ttl=60, tags=lambda args, data: [f"user:{args['user_id']}"])
 def get_public_profile(user_id):
     """Get public user profile (no auth required)"""
     try:
@@ -1093,16 +981,8 @@ def get_public_profile(user_id):
         
         services_stats = cursor.fetchone()
         
-        # Get completed services count
-        cursor.execute("""
-            SELECT 
-                COUNT(DISTINCT CASE WHEN provider_id = %s THEN id END) as completed_as_provider,
-                COUNT(DISTINCT CASE WHEN consumer_id = %s THEN id END) as completed_as_consumer
-            FROM service_progress
-            WHERE status = 'completed'
-        """, (user_id, user_id))
-        
-        completed_stats = cursor.fetchone()
+        # Completion counts and survey aggregates (one row, see reputation.py)
+        user_reputation = reputation.get(cursor, user_id)
         
         cursor.close()
         conn.close()
@@ -1121,9 +1001,10 @@ def get_public_profile(user_id):
             "stats": {
                 "total_offers": services_stats['total_offers'] if services_stats else 0,
                 "total_needs": services_stats['total_needs'] if services_stats else 0,
-                "completed_as_provider": completed_stats['completed_as_provider'] if completed_stats else 0,
-                "completed_as_consumer": completed_stats['completed_as_consumer'] if completed_stats else 0
+                "completed_as_provider": user_reputation['as_provider']['completed'],
+                "completed_as_consumer": user_reputation['as_consumer']['completed']
             },
+            "reputation": user_reputation,
             "services": [
                 {
                     "id": service['id'],
@@ -1147,6 +1028,9 @@ def get_public_profile(user_id):
 
 
 @app.route("/api/users/<int:user_id>/reviews", methods=['GET'])
+@response_cache.cached(ttl=300, tags=lambda args, data: [f"user:{args['user_id']}"] + [
+    f"user:{review['reviewer']['id']}" for review in data['reviews_as_provider'] + data['reviews_as_consumer']
+])
 def get_user_reviews(user_id):
     """Get reviews for a user from completed services"""
     try:
@@ -1203,6 +1087,8 @@ def get_user_reviews(user_id):
         
         consumer_reviews = cursor.fetchall()
         
+        user_reputation = reputation.get(cursor, user_id)
+        
         cursor.close()
         conn.close()
         
@@ -1251,7 +1137,8 @@ def get_user_reviews(user_id):
         return jsonify({
             "reviews_as_provider": formatted_provider_reviews,
             "reviews_as_consumer": formatted_consumer_reviews,
-            "total_reviews": len(formatted_provider_reviews) + len(formatted_consumer_reviews)
+            "total_reviews": user_reputation['as_provider']['reviews'] + user_reputation['as_consumer']['reviews'],
+            "reputation": user_reputation
         }), 200
         
     except Exception as e:
@@ -1370,6 +1257,7 @@ def update_profile():
         conn.commit()
         cursor.close()
         conn.close()
+        response_cache.invalidate(f"user:{user_id}")
         
         return jsonify({
             "message": "Profile updated successfully",
@@ -1541,7 +1429,12 @@ def reset_password():
             return jsonify({"error": "Reset token has expired"}), 400
         
         # Hash new password
-        password_hash = bcrypt.generate_password_hash(new_password).decode('utf-8')
+        try:
+            password_hash = passwords.hash_password(new_password)
+        except passwords.PasswordServiceBusy as e:
+            cursor.close()
+            conn.close()
+            return jsonify({"error": str(e)}), 503
         
         # Update user password
         cursor.execute("""
@@ -1557,6 +1450,9 @@ def reset_password():
             WHERE id = %s
         """, (reset_record['id'],))
         
+        # Whoever knew the old password is signed out everywhere
+        sessions.revoke_user(cursor, user_id)
+        
         conn.commit()
         cursor.close()
         conn.close()
@@ -1571,6 +1467,7 @@ def reset_password():
 # Service Management Endpoints
 
 @app.route("/api/tags", methods=['GET'])
+@response_cache.cached(ttl=600, tags=lambda args, data: ["tags"])
 def get_tags():
     """Get all approved tags"""
     try:
@@ -1638,6 +1535,7 @@ def create_tag():
         conn.commit()
         cursor.close()
         conn.close()
+        response_cache.invalidate("tags")
         
         return jsonify({
             "message": "Tag created successfully",
@@ -1649,41 +1547,28 @@ def create_tag():
 
 @app.route("/api/tags/search", methods=['GET'])
 def search_tags():
-    """Search tags by query string"""
+    """
+    Typeahead search for tags: exact, prefix, substring and then fuzzy matches,
+    most used tags first within each group. An empty query returns the most used tags.
+    """
     try:
         # Get search query from URL parameter
-        query = request.args.get('q', '').strip().lower()
+        query = request.args.get('q', '').strip()
+        
+        try:
+            limit = parse_limit(request.args.get('limit'), TAG_SEARCH_LIMIT, TAG_SEARCH_MAX_LIMIT)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        if query:
-            # Search tags that contain the query string
-            cursor.execute("""
-                SELECT id, name FROM tags 
-                WHERE is_approved = TRUE 
-                AND LOWER(name) LIKE %s
-                ORDER BY 
-                    CASE WHEN LOWER(name) = %s THEN 0 ELSE 1 END,
-                    name
-                LIMIT 10
-            """, (f'%{query}%', query))
-        else:
-            # Return all tags if no query
-            cursor.execute("""
-                SELECT id, name FROM tags 
-                WHERE is_approved = TRUE 
-                ORDER BY name
-                LIMIT 10
-            """)
+        tags = tag_search.search_tags(cursor, query, limit)
         
-        tags = cursor.fetchall()
         cursor.close()
         conn.close()
         
-        return jsonify({
-            "tags": [{"id": tag['id'], "name": tag['name']} for tag in tags]
-        }), 200
+        return jsonify({"tags": tags}), 200
         
     except Exception as e:
         return jsonify({"error": f"Server error: {str(e)}"}), 500
@@ -1705,27 +1590,44 @@ def get_wikibase_tag_suggestions():
         if not tag_name:
             return jsonify({"error": "tag parameter is required"}), 400
         
-        # Get the entity ID for this tag
-        entity_id = get_entity_id(tag_name)
+        # Answer from the local taxonomy snapshot when it knows the tag; otherwise fall back
+        # to the suggestion cache, which only queries Wikidata on a cold miss
+        # (stale entries are refreshed in the background)
+        graph = taxonomy.get_graph()
+        result = graph.lookup(tag_name) if graph is not None else None
+        if result is not None:
+            result['cache'] = 'snapshot'
+        else:
+            try:
+                result = suggestion_cache.get_cache().lookup(tag_name)
+            except Exception as e:
+                print(f"Wikidata lookup failed for '{tag_name}': {e}")
+                return jsonify({
+                    "tag": tag_name,
+                    "suggestions": [],
+                    "message": "Wikidata is currently unavailable"
+                }), 200
         
+        entity_id = result['entity_id']
         if not entity_id:
             return jsonify({
                 "tag": tag_name,
                 "suggestions": [],
-                "message": "No entity found in Wikidata"
+                "message": "No entity found in Wikidata",
+                "cache": result['cache']
             }), 200
         
-        # Get related tags from Wikidata
-        related_tags = get_related_tags(entity_id)
+        related_tags = result['suggestions']
         
         # Limit to 5 suggestions as requested
-        suggestions = related_tags[:5] if related_tags else []
+        suggestions = related_tags[:5]
         
         return jsonify({
             "tag": tag_name,
             "entity_id": entity_id,
             "suggestions": suggestions,
-            "total_available": len(related_tags) if related_tags else 0
+            "total_available": len(related_tags),
+            "cache": result['cache']
         }), 200
         
     except Exception as e:
@@ -1820,6 +1722,9 @@ def create_service():
                 VALUES (%s, %s, %s, %s)
             """, (service_id, avail['day_of_week'], avail['start_time'], avail['end_time']))
         
+        # Index title, description and tags for /api/services/search
+        refresh_service_search_vector(cursor, service_id)
+        
         conn.commit()
         cursor.close()
         conn.close()
@@ -1836,12 +1741,31 @@ def create_service():
 
 @app.route("/api/services", methods=['GET'])
 def get_services():
-    """Get all services with optional filters"""
+    """
+    Get services with optional filters, newest first, one page at a time.
+    The body stays a JSON array; pagination metadata is returned in headers:
+    X-Next-Cursor / Link (rel="next") when more rows exist, and X-Total-Count
+    when the client asks for it with include_total=true.
+    """
     try:
         service_type = request.args.get('type')  # 'offer' or 'need'
         tag_ids = request.args.getlist('tag_ids')  # List of tag IDs
         status = request.args.get('status', 'open')
         include_own_in_progress = request.args.get('include_own_in_progress') == 'true'
+        include_total = request.args.get('include_total') == 'true'
+        cursor_token = request.args.get('cursor')
+        
+        try:
+            limit = parse_limit(request.args.get('limit'), SERVICES_PAGE_SIZE, SERVICES_MAX_PAGE_SIZE)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        after = None
+        if cursor_token:
+            try:
+                after = decode_cursor(cursor_token, datetime, int)
+            except InvalidCursorError:
+                return jsonify({"error": "Invalid cursor"}), 400
         
         # Get user ID if authenticated (for filtering own services)
         user_id = None
@@ -1849,72 +1773,93 @@ def get_services():
         if auth_header and include_own_in_progress:
             user_id, error, status_code = get_user_from_token(auth_header)
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        query = """
-            SELECT s.*, 
-                   u.first_name, u.last_name, u.profile_photo,
-                   ARRAY_AGG(DISTINCT t.name) as tags,
-                   sp.id as progress_id,
-                   sp.status as progress_status,
-                   sp.consumer_id,
-                   sp.provider_id as progress_provider_id
-            FROM services s
-            JOIN users u ON s.user_id = u.id
-            LEFT JOIN service_tags st ON s.id = st.service_id
-            LEFT JOIN tags t ON st.tag_id = t.id
-            LEFT JOIN LATERAL (
-                SELECT id, status, consumer_id, provider_id
-                FROM service_progress
-                WHERE service_id = s.id
-                ORDER BY updated_at DESC NULLS LAST, created_at DESC
-                LIMIT 1
-            ) sp ON true
-        """
-        
+        conditions = []
         params = []
-        where_added = False
         
         # Handle status filter
         if status != 'all':
             if user_id and include_own_in_progress:
                 # Show open services AND in_progress/completed services owned by the user
                 # Also show in_progress offers (they remain public unless disabled)
-                query += " WHERE (s.status = %s OR ((s.status = 'in_progress' OR s.status = 'completed') AND s.user_id = %s) OR (s.status = 'in_progress' AND s.service_type = 'offer'))"
-                params.append(status)
-                params.append(user_id)
-                where_added = True
+                conditions.append("(s.status = %s OR ((s.status = 'in_progress' OR s.status = 'completed') AND s.user_id = %s) OR (s.status = 'in_progress' AND s.service_type = 'offer'))")
+                params.extend([status, user_id])
             else:
                 # Show open services + in_progress offers (offers remain public)
-                query += " WHERE (s.status = %s OR (s.status = 'in_progress' AND s.service_type = 'offer'))"
+                conditions.append("(s.status = %s OR (s.status = 'in_progress' AND s.service_type = 'offer'))")
                 params.append(status)
-                where_added = True
-        else:
-            where_added = False
         
         if service_type:
-            if where_added:
-                query += " AND s.service_type = %s"
-            else:
-                query += " WHERE s.service_type = %s"
-                where_added = True
+            conditions.append("s.service_type = %s")
             params.append(service_type)
         
         if tag_ids:
             placeholders = ','.join(['%s'] * len(tag_ids))
-            if where_added:
-                query += f" AND s.id IN (SELECT service_id FROM service_tags WHERE tag_id IN ({placeholders}))"
-            else:
-                query += f" WHERE s.id IN (SELECT service_id FROM service_tags WHERE tag_id IN ({placeholders}))"
-                where_added = True
+            conditions.append(f"s.id IN (SELECT service_id FROM service_tags WHERE tag_id IN ({placeholders}))")
             params.extend(tag_ids)
         
-        query += " GROUP BY s.id, u.first_name, u.last_name, u.profile_photo, sp.id, sp.status, sp.consumer_id, sp.provider_id ORDER BY s.created_at DESC"
+        filter_conditions = list(conditions)
+        filter_params = list(params)
+        
+        # Keyset: continue strictly after the last (created_at, id) of the previous page
+        if after:
+            conditions.append("(s.created_at, s.id) < (%s, %s)")
+            params.extend(after)
+        
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        # Pick the page of services first, then decorate only those rows with
+        # owner, tags and latest progress (instead of aggregating every match)
+        query = f"""
+            WITH page AS (
+                SELECT s.*
+                FROM services s
+                {where_clause}
+                ORDER BY s.created_at DESC, s.id DESC
+                LIMIT %s
+            )
+            SELECT page.*, 
+                   u.first_name, u.last_name, u.profile_photo,
+                   to_jsonb(r) as owner_reputation,
+                   tg.tags,
+                   sp.id as progress_id,
+                   sp.status as progress_status,
+                   sp.consumer_id,
+                   sp.provider_id as progress_provider_id
+            FROM page
+            JOIN users u ON page.user_id = u.id
+            LEFT JOIN user_reputation r ON r.user_id = page.user_id
+            LEFT JOIN LATERAL (
+                SELECT ARRAY_AGG(DISTINCT t.name) as tags
+                FROM service_tags st
+                JOIN tags t ON st.tag_id = t.id
+                WHERE st.service_id = page.id
+            ) tg ON true
+            LEFT JOIN LATERAL (
+                SELECT id, status, consumer_id, provider_id
+                FROM service_progress
+                WHERE service_id = page.id
+                ORDER BY updated_at DESC NULLS LAST, created_at DESC
+                LIMIT 1
+            ) sp ON true
+            ORDER BY page.created_at DESC, page.id DESC
+        """
         
-        cursor.execute(query, tuple(params))
+        # Fetch one extra row to know whether another page exists
+        cursor.execute(query, tuple(params) + (limit + 1,))
         services = cursor.fetchall()
         
+        has_more = len(services) > limit
+        services = services[:limit]
+        
+        total = None
+        if include_total:
+            filter_where = f"WHERE {' AND '.join(filter_conditions)}" if filter_conditions else ""
+            cursor.execute(f"SELECT COUNT(*) as count FROM services s {filter_where}", tuple(filter_params))
+            total = cursor.fetchone()['count']
+        
         result = []
         for service in services:
             result.append({
@@ -1936,7 +1881,8 @@ def get_services():
                 "created_at": service['created_at'].isoformat(),
                 "provider_name": f"{service['first_name']} {service['last_name']}",
                 "provider_photo": service['profile_photo'],
-                "tags": service['tags'] if service['tags'][0] else [],
+                "provider_reputation": reputation.listing_summary(service['owner_reputation'], service['service_type']),
+                "tags": service['tags'] or [],
                 "progress_id": service.get('progress_id'),
                 "progress_status": service.get('progress_status'),
                 "progress_consumer_id": service.get('consumer_id'),
@@ -1946,12 +1892,159 @@ def get_services():
         cursor.close()
         conn.close()
         
-        return jsonify(result), 200
+        response = jsonify(result)
+        if has_more:
+            last = services[-1]
+            next_cursor = encode_cursor(last['created_at'], last['id'])
+            next_args = request.args.to_dict(flat=False)
+            next_args['cursor'] = [next_cursor]
+            response.headers['X-Next-Cursor'] = next_cursor
+            response.headers['Link'] = f'<{url_for("get_services", **next_args)}>; rel="next"'
+        if total is not None:
+            response.headers['X-Total-Count'] = str(total)
+        return response, 200
+        
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+@app.route("/api/services/search", methods=['GET'])
+def search_services():
+    """
+    Full-text search over service titles, descriptions and tags, best match first.
+    The last word is prefix-matched so the endpoint can back an as-you-type search box.
+    Like GET /api/services the body is a JSON array and X-Next-Cursor points at the next page.
+    """
+    try:
+        text = request.args.get('q', '').strip()
+        if not text:
+            return jsonify({"error": "q is required"}), 400
+        
+        service_type = request.args.get('type')  # 'offer' or 'need'
+        status = request.args.get('status', 'open')
+        cursor_token = request.args.get('cursor')
+        
+        try:
+            limit = parse_limit(request.args.get('limit'), SEARCH_PAGE_SIZE, SEARCH_MAX_PAGE_SIZE)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        after = None
+        if cursor_token:
+            try:
+                after = decode_cursor(cursor_token, float, int)
+            except InvalidCursorError:
+                return jsonify({"error": "Invalid cursor"}), 400
+        
+        tsquery = build_tsquery(text)
+        if not tsquery:
+            return jsonify([]), 200
+        
+        conditions = ["s.search_vector @@ q.query"]
+        params = [tsquery]
+        
+        if status != 'all':
+            # Same visibility rule as the listing: open services + in_progress offers
+            conditions.append("(s.status = %s OR (s.status = 'in_progress' AND s.service_type = 'offer'))")
+            params.append(status)
+        
+        if service_type:
+            conditions.append("s.service_type = %s")
+            params.append(service_type)
+        
+        page_filter = ""
+        if after:
+            page_filter = "WHERE (rank, id) < (%s::real, %s)"
+            params.extend(after)
+        
+        params.append(limit + 1)
+        
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        # Rank every match from the GIN index, but only build headlines for the returned page
+        cursor.execute(f"""
+            WITH q AS (
+                SELECT to_tsquery('{SEARCH_CONFIG}', %s) AS query
+            ),
+            matches AS (
+                SELECT s.id, ts_rank_cd(s.search_vector, q.query) AS rank
+                FROM services s, q
+                WHERE {' AND '.join(conditions)}
+            ),
+            page AS (
+                SELECT id, rank
+                FROM matches
+                {page_filter}
+                ORDER BY rank DESC, id DESC
+                LIMIT %s
+            )
+            SELECT s.id, s.user_id, s.service_type, s.title, s.description, s.hours_required,
+                   s.location_type, s.location_address, s.latitude, s.longitude, s.status,
+                   s.created_at, page.rank,
+                   ts_headline('{SEARCH_CONFIG}', s.title, q.query, %s) AS title_highlight,
+                   ts_headline('{SEARCH_CONFIG}', s.description, q.query, %s) AS snippet,
+                   u.first_name, u.last_name, u.profile_photo,
+                   to_jsonb(r) AS owner_reputation,
+                   tg.tags
+            FROM page
+            JOIN services s ON s.id = page.id
+            JOIN users u ON s.user_id = u.id
+            LEFT JOIN user_reputation r ON r.user_id = s.user_id
+            CROSS JOIN q
+            LEFT JOIN LATERAL (
+                SELECT ARRAY_AGG(DISTINCT t.name) as tags
+                FROM service_tags st
+                JOIN tags t ON st.tag_id = t.id
+                WHERE st.service_id = s.id
+            ) tg ON true
+            ORDER BY page.rank DESC, page.id DESC
+        """, tuple(params) + (TITLE_OPTIONS, SNIPPET_OPTIONS))
+        
+        rows = cursor.fetchall()
+        cursor.close()
+        conn.close()
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        result = []
+        for row in rows:
+            result.append({
+                "id": row['id'],
+                "provider_id": row['user_id'],
+                "service_type": row['service_type'],
+                "title": row['title'],
+                "description": row['description'],
+                "duration_hours": float(row['hours_required']),
+                "hours_cost": float(row['hours_required']),
+                "location_type": row['location_type'],
+                "location": row['location_address'],
+                "latitude": float(row['latitude']) if row['latitude'] else None,
+                "longitude": float(row['longitude']) if row['longitude'] else None,
+                "status": row['status'],
+                "created_at": row['created_at'].isoformat(),
+                "provider_name": f"{row['first_name']} {row['last_name']}",
+                "provider_photo": row['profile_photo'],
+                "provider_reputation": reputation.listing_summary(row['owner_reputation'], row['service_type']),
+                "tags": row['tags'] or [],
+                "rank": float(row['rank']),
+                "title_highlight": render_highlight(row['title_highlight']),
+                "snippet": render_highlight(row['snippet'])
+            })
+        
+        response = jsonify(result)
+        if has_more:
+            last = rows[-1]
+            response.headers['X-Next-Cursor'] = encode_cursor(float(last['rank']), last['id'])
+        return response, 200
         
     except Exception as e:
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
 @app.route("/api/services/<int:service_id>", methods=['GET'])
+@response_cache.cached(ttl=120, tags=lambda args, data: [
+    f"service:{args['service_id']}", f"user:{data['service']['provider']['id']}"
+])
 def get_service(service_id):
     """Get a specific service by ID"""
     try:
@@ -1962,6 +2055,7 @@ def get_service(service_id):
             SELECT s.*, 
                    u.first_name, u.last_name, u.email, u.phone_number, 
                    u.biography, u.profile_photo, u.date_joined,
+                   (SELECT to_jsonb(r) FROM user_reputation r WHERE r.user_id = s.user_id) as owner_reputation,
                    ARRAY_AGG(DISTINCT t.name) as tags,
                    ARRAY_AGG(DISTINCT jsonb_build_object(
                        'day_of_week', sa.day_of_week,
@@ -2008,7 +2102,8 @@ def get_service(service_id):
                     "phone_number": service['phone_number'],
                     "biography": service['biography'],
                     "profile_photo": service['profile_photo'],
-                    "date_joined": service['date_joined'].isoformat() if service.get('date_joined') else None
+                    "date_joined": service['date_joined'].isoformat() if service.get('date_joined') else None,
+                    "reputation": reputation.listing_summary(service['owner_reputation'], service['service_type'])
                 },
                 "tags": service['tags'] if service['tags'][0] else [],
                 "availability": service['availability'] if service['availability'][0] else []
@@ -2233,6 +2328,10 @@ def update_service(service_id):
                     (service_id, tag_id)
                 )
         
+        # Re-index only when searchable text changed
+        if 'title' in data or 'description' in data or 'tag_ids' in data:
+            refresh_service_search_vector(cursor, service_id)
+        
         # Update availability if provided (for offers)
         if 'availability' in data:
             # Delete existing availability
@@ -2248,6 +2347,7 @@ def update_service(service_id):
         conn.commit()
         cursor.close()
         conn.close()
+        response_cache.invalidate(f"service:{service_id}", f"user:{user_id}")
         
         return jsonify({"message": "Service updated successfully"}), 200
         
@@ -2286,6 +2386,7 @@ def delete_service(service_id):
         conn.commit()
         cursor.close()
         conn.close()
+        response_cache.invalidate(f"service:{service_id}", f"user:{user_id}")
         
         return jsonify({"message": "Service deleted successfully"}), 200
         
@@ -2368,8 +2469,16 @@ def apply_to_service(service_id):
         cursor.execute("""
             INSERT INTO messages (sender_id, receiver_id, message, application_id, service_id)
             VALUES (%s, %s, %s, %s, %s)
+            RETURNING id
         """, (user_id, service['user_id'], message, application_id, service_id))
         
+        initial_message_id = cursor.fetchone()['id']
+        conversations.record_message(cursor, application_id, initial_message_id)
+        events.publish(cursor, (user_id, service['user_id']), 'message',
+                       application_id=application_id, service_id=service_id, message_id=initial_message_id)
+        events.publish(cursor, (service['user_id'],), 'application',
+                       application_id=application_id, service_id=service_id, status='pending')
+        
         conn.commit()
         cursor.close()
         conn.close()
@@ -2530,6 +2639,8 @@ def accept_application(application_id):
         
         progress = cursor.fetchone()
         
+        events.publish_application(cursor, application_id, 'application', status='accepted')
+        events.publish_progress(cursor, progress['id'])
         conn.commit()
         cursor.close()
         conn.close()
@@ -2592,6 +2703,7 @@ def withdraw_application(application_id):
             WHERE id = %s
         """, (application_id,))
         
+        events.publish_application(cursor, application_id, 'application', status='withdrawn')
         conn.commit()
         cursor.close()
         conn.close()
@@ -2647,10 +2759,13 @@ def send_message():
         cursor.execute("""
             INSERT INTO messages (sender_id, receiver_id, message, application_id, service_id)
             VALUES (%s, %s, %s, %s, %s)
-            RETURNING id, created_at
+            RETURNING id, receiver_id, created_at
         """, (user_id, receiver_id, message, application_id, service_id))
         
         new_message = cursor.fetchone()
+        conversations.record_message(cursor, application_id, new_message['id'])
+        events.publish(cursor, (user_id, new_message['receiver_id']), 'message',
+                       application_id=application_id, service_id=service_id, message_id=new_message['id'])
         
         conn.commit()
         cursor.close()
@@ -2667,74 +2782,54 @@ def send_message():
 
 @app.route("/api/messages", methods=['GET'], strict_slashes=False)
 def get_user_conversations():
-    """Get all conversations for the current user"""
+    """
+    Conversations of the current user, most recent activity first.
+    Served from conversation_summaries; pass ?cursor=<next_cursor> for the next page.
+    """
     try:
         # Get user from token
         user_id, error, status = get_user_from_token(request.headers.get('Authorization'))
         if error:
             return jsonify(error), status
         
+        try:
+            limit = parse_limit(request.args.get('limit'), CONVERSATIONS_PAGE_SIZE, CONVERSATIONS_MAX_PAGE_SIZE)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        after = None
+        cursor_token = request.args.get('cursor')
+        if cursor_token:
+            try:
+                after = decode_cursor(cursor_token, datetime, int)
+            except InvalidCursorError:
+                return jsonify({"error": "Invalid cursor"}), 400
+        
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Get all applications where user is either applicant or service owner
-        cursor.execute("""
-            SELECT
-                sa.id as application_id,
-                s.id as service_id,
-                s.title as service_title,
-                s.service_type,
-                s.hours_required,
-                sa.status as application_status,
-                sa.applied_at as application_date,
-                sp.status as progress_status,
-                sp.hours as transaction_hours,
-                CASE 
-                    WHEN sa.applicant_id = %s THEN provider.id
-                    ELSE applicant.id
-                END as other_user_id,
-                CASE 
-                    WHEN sa.applicant_id = %s THEN provider.first_name || ' ' || provider.last_name
-                    ELSE applicant.first_name || ' ' || applicant.last_name
-                END as other_user_name,
-                CASE 
-                    WHEN sa.applicant_id = %s THEN provider.profile_photo
-                    ELSE applicant.profile_photo
-                END as other_user_photo,
-                (SELECT COUNT(*) 
-                 FROM messages 
-                 WHERE application_id = sa.id 
-                 AND receiver_id = %s 
-                 AND is_read = FALSE) as unread_count,
-                (SELECT m.message 
-                 FROM messages m 
-                 WHERE m.application_id = sa.id 
-                 ORDER BY m.created_at DESC 
-                 LIMIT 1) as last_message,
-                (SELECT m.created_at 
-                 FROM messages m 
-                 WHERE m.application_id = sa.id 
-                 ORDER BY m.created_at DESC 
-                 LIMIT 1) as last_message_time,
-                (SELECT COUNT(*) FROM messages WHERE application_id = sa.id) as message_count
-            FROM service_applications sa
-            JOIN services s ON sa.service_id = s.id
-            JOIN users applicant ON sa.applicant_id = applicant.id
-            JOIN users provider ON s.user_id = provider.id
-            LEFT JOIN service_progress sp ON sa.id = sp.application_id
-            WHERE (sa.applicant_id = %s OR s.user_id = %s)
-            ORDER BY 
-                COALESCE(
-                    (SELECT MAX(m.created_at) FROM messages m WHERE m.application_id = sa.id),
-                    sa.applied_at
-                ) DESC
-        """, (user_id, user_id, user_id, user_id, user_id, user_id))
-        
-        conversations = cursor.fetchall()
+        rows = conversations.inbox_page(cursor, user_id, limit, after)
         cursor.close()
         conn.close()
         
-        return jsonify({"conversations": [dict(conv) for conv in conversations]}), 200
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        next_cursor = None
+        if has_more:
+            last = rows[-1]
+            next_cursor = encode_cursor(last['sort_at'], last['application_id'])
+        
+        result = []
+        for row in rows:
+            conv = dict(row)
+            del conv['sort_at']
+            result.append(conv)
+        
+        response = jsonify({"conversations": result, "next_cursor": next_cursor})
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response, 200
         
     except Exception as e:
         print(f"Error in get_user_conversations: {str(e)}")
@@ -2744,19 +2839,41 @@ def get_user_conversations():
 
 @app.route("/api/applications/<int:application_id>/messages", methods=['GET'])
 def get_application_messages(application_id):
-    """Get all messages for an application"""
+    """
+    Messages of an application, oldest first.
+    Without parameters returns the latest page; ?before=<message id> returns the page of
+    older history before it (X-Has-More tells whether there is more). ?since=<X-Sync-Cursor>
+    returns only messages sent or changed (read, proposal answered) after the previous call.
+    Every response carries an X-Sync-Cursor for the next ?since= call.
+    """
     try:
         # Get user from token
         user_id, error, status = get_user_from_token(request.headers.get('Authorization'))
         if error:
             return jsonify(error), status
         
+        try:
+            limit = parse_limit(request.args.get('limit'), MESSAGES_PAGE_SIZE, MESSAGES_MAX_PAGE_SIZE)
+            before = request.args.get('before', type=int)
+            if 'before' in request.args and before is None:
+                raise ValueError("before must be a message id")
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        since = None
+        since_token = request.args.get('since')
+        if since_token:
+            try:
+                (since,) = decode_cursor(since_token, datetime)
+            except InvalidCursorError:
+                return jsonify({"error": "Invalid cursor"}), 400
+        
         conn = get_db_connection()
         cursor = conn.cursor()
         
         # Check if user is part of this application
         cursor.execute("""
-            SELECT sa.applicant_id, s.user_id as service_owner_id
+            SELECT sa.applicant_id, s.user_id as service_owner_id, LOCALTIMESTAMP as synced_at
             FROM service_applications sa
             JOIN services s ON sa.service_id = s.id
             WHERE sa.id = %s
@@ -2774,8 +2891,7 @@ def get_application_messages(application_id):
             conn.close()
             return jsonify({"error": "Unauthorized"}), 403
         
-        # Get messages
-        cursor.execute("""
+        message_columns = """
             SELECT 
                 m.id,
                 m.message,
@@ -2794,11 +2910,32 @@ def get_application_messages(application_id):
                 sender.profile_photo as sender_photo
             FROM messages m
             JOIN users sender ON m.sender_id = sender.id
-            WHERE m.application_id = %s
-            ORDER BY m.created_at ASC
-        """, (application_id,))
+        """
         
-        messages = cursor.fetchall()
+        has_more = None
+        reset = False
+        if since is not None:
+            # Delta: everything sent or changed since the client's last sync
+            cursor.execute(message_columns + """
+                WHERE m.application_id = %s AND m.updated_at > %s
+                ORDER BY m.id ASC
+                LIMIT %s
+            """, (application_id, since, MESSAGES_SYNC_MAX + 1))
+            messages = cursor.fetchall()
+            if len(messages) > MESSAGES_SYNC_MAX:
+                # Too far behind; answer with the latest page and let the client start over
+                since = None
+                reset = True
+        
+        if since is None:
+            cursor.execute(message_columns + f"""
+                WHERE m.application_id = %s {"AND m.id < %s" if before is not None else ""}
+                ORDER BY m.id DESC
+                LIMIT %s
+            """, (application_id, before, limit + 1) if before is not None else (application_id, limit + 1))
+            rows = cursor.fetchall()
+            has_more = len(rows) > limit
+            messages = list(reversed(rows[:limit]))
         
         # Convert datetime objects to strings for JSON serialization
         serialized_messages = []
@@ -2815,18 +2952,22 @@ def get_application_messages(application_id):
                 msg_dict['created_at'] = msg_dict['created_at'].isoformat()
             serialized_messages.append(msg_dict)
         
-        # Mark messages as read
-        cursor.execute("""
-            UPDATE messages 
-            SET is_read = TRUE 
-            WHERE application_id = %s AND receiver_id = %s
-        """, (application_id, user_id))
+        # Mark messages as read (a no-op write-free query when nothing is unread);
+        # paging through older history never has anything new to mark
+        if before is None:
+            conversations.mark_read(cursor, application_id, user_id)
         
         conn.commit()
         cursor.close()
         conn.close()
         
-        return jsonify(serialized_messages), 200
+        response = jsonify(serialized_messages)
+        response.headers['X-Sync-Cursor'] = encode_cursor(application['synced_at'] - MESSAGES_SYNC_OVERLAP)
+        if has_more is not None:
+            response.headers['X-Has-More'] = 'true' if has_more else 'false'
+        if reset:
+            response.headers['X-Sync-Reset'] = 'true'
+        return response, 200
         
     except Exception as e:
         return jsonify({"error": f"Server error: {str(e)}"}), 500
@@ -3110,6 +3251,7 @@ def create_progress(application_id):
         
         progress_id = cursor.fetchone()['id']
         
+        events.publish_progress(cursor, progress_id)
         conn.commit()
         cursor.close()
         conn.close()
@@ -3178,6 +3320,7 @@ def update_progress_status(progress_id):
                 WHERE id = %s
             """, (new_status, progress_id))
         
+        events.publish_progress(cursor, progress_id)
         conn.commit()
         cursor.close()
         conn.close()
@@ -3236,8 +3379,12 @@ def mark_service_finished(progress_id):
                 survey_deadline = NOW() + INTERVAL '24 hours',
                 updated_at = NOW()
             WHERE id = %s
+            RETURNING survey_deadline
         """, (progress_id,))
         
+        # Auto-complete right when the deadline passes
+        scheduler.add_deadline(cursor, 'survey_deadline', progress_id, cursor.fetchone()['survey_deadline'])
+        events.publish_progress(cursor, progress_id)
         conn.commit()
         cursor.close()
         conn.close()
@@ -3268,13 +3415,15 @@ def submit_completion_survey(progress_id):
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Get progress details
+        # Get progress details; the lock makes a concurrent confirmation (or the survey
+        # expiry job) wait for this one and then see its result
         cursor.execute("""
             SELECT service_id, provider_id, consumer_id, status, hours,
                    provider_survey_submitted, consumer_survey_submitted,
                    survey_deadline
             FROM service_progress 
             WHERE id = %s
+            FOR UPDATE
         """, (progress_id,))
         
         progress = cursor.fetchone()
@@ -3335,12 +3484,17 @@ def submit_completion_survey(progress_id):
         
         # If both surveys submitted, complete the service
         if result['provider_survey_submitted'] and result['consumer_survey_submitted']:
-            # Update progress status to completed
+            # Update progress status to completed (only once)
             cursor.execute("""
                 UPDATE service_progress 
                 SET status = 'completed', completed_at = NOW(), updated_at = NOW()
-                WHERE id = %s
+                WHERE id = %s AND status = 'awaiting_confirmation'
             """, (progress_id,))
+            if cursor.rowcount == 0:
+                conn.rollback()
+                cursor.close()
+                conn.close()
+                return jsonify({"error": "Service has already been completed"}), 409
             
             # Update service status to completed
             cursor.execute("""
@@ -3349,28 +3503,24 @@ def submit_completion_survey(progress_id):
                 WHERE id = %s
             """, (progress['service_id'],))
             
-            # Transfer hours: add to provider, deduct from consumer
-            cursor.execute("""
-                UPDATE users 
-                SET time_balance = time_balance + %s 
-                WHERE id = %s
-            """, (progress['hours'], progress['provider_id']))
-            
-            cursor.execute("""
-                UPDATE users 
-                SET time_balance = time_balance - %s 
-                WHERE id = %s
-            """, (progress['hours'], progress['consumer_id']))
+            # Transfer hours from consumer to provider (once per progress, see ledger.py)
+            ledger.transfer_for_progress(cursor, dict(progress, id=progress_id))
+            reputation.apply(cursor, [progress_id])
             
+            events.publish_progress(cursor, progress_id, 'survey', submitted_by=user_id, completed=True)
+            events.publish(cursor, (progress['provider_id'], progress['consumer_id']), 'balance')
             conn.commit()
             cursor.close()
             conn.close()
+            response_cache.invalidate(f"service:{progress['service_id']}",
+                                      f"user:{progress['provider_id']}", f"user:{progress['consumer_id']}")
             
             return jsonify({
                 "message": "Thank you! Service completed and hours transferred.",
                 "completed": True
             }), 200
         else:
+            events.publish_progress(cursor, progress_id, 'survey', submitted_by=user_id, completed=False)
             conn.commit()
             cursor.close()
             conn.close()
@@ -3450,6 +3600,7 @@ def confirm_service_start(progress_id):
                 WHERE id = %s
             """, (progress_id,))
         
+        events.publish_progress(cursor, progress_id)
         conn.commit()
         
         # Re-fetch to check if both confirmed
@@ -3483,6 +3634,7 @@ def confirm_service_start(progress_id):
                         updated_at = NOW()
                     WHERE id = %s
                 """, (progress_id,))
+                events.publish_progress(cursor, progress_id)
                 conn.commit()
                 cursor.close()
                 conn.close()
@@ -3496,6 +3648,7 @@ def confirm_service_start(progress_id):
                 WHERE id = %s
             """, (progress_id,))
             
+            events.publish_progress(cursor, progress_id)
             conn.commit()
             cursor.close()
             conn.close()
@@ -3638,6 +3791,10 @@ def propose_schedule_change(progress_id):
               message_text, proposed_date, proposed_start_time, proposed_end_time, proposed_location))
         
         message_id = cursor.fetchone()['id']
+        conversations.record_message(cursor, progress['application_id'], message_id)
+        events.publish(cursor, (user_id, receiver_id), 'message',
+                       application_id=progress['application_id'], service_id=progress['service_id'],
+                       message_id=message_id, message_type='schedule_proposal')
         
         conn.commit()
         cursor.close()
@@ -3758,9 +3915,11 @@ def respond_to_schedule_proposal_message(message_id):
             cursor.execute("""
                 UPDATE messages 
                 SET proposal_status = 'accepted',
-                    is_read = TRUE
+                    is_read = TRUE,
+                    updated_at = CURRENT_TIMESTAMP
                 WHERE id = %s
             """, (message_id,))
+            conversations.refresh_conversation(cursor, message['application_id'])
             
             # Update service schedule (and location if provided)
             if message.get('proposal_location'):
@@ -3795,6 +3954,8 @@ def respond_to_schedule_proposal_message(message_id):
                 WHERE id = %s
             """, (message['proposal_date'], message['proposal_start_time'], scheduled_hours, message['progress_id']))
             
+            events.publish_application(cursor, message['application_id'], 'message', message_id=message_id)
+            events.publish_progress(cursor, message['progress_id'])
             conn.commit()
             cursor.close()
             conn.close()
@@ -3808,9 +3969,11 @@ def respond_to_schedule_proposal_message(message_id):
             cursor.execute("""
                 UPDATE messages 
                 SET proposal_status = 'rejected',
-                    is_read = TRUE
+                    is_read = TRUE,
+                    updated_at = CURRENT_TIMESTAMP
                 WHERE id = %s
             """, (message_id,))
+            conversations.refresh_conversation(cursor, message['application_id'])
             
             # Change service back to 'open' and stop progress
             cursor.execute("""
@@ -3835,6 +3998,8 @@ def respond_to_schedule_proposal_message(message_id):
                 WHERE id = %s
             """, (message['application_id'],))
             
+            events.publish_application(cursor, message['application_id'], 'message', message_id=message_id)
+            events.publish_progress(cursor, message['progress_id'])
             conn.commit()
             cursor.close()
             conn.close()
@@ -3960,6 +4125,7 @@ def respond_to_schedule_proposal(progress_id):
                     WHERE id = %s
                 """, (progress_id,))
                 
+                events.publish_progress(cursor, progress_id)
                 conn.commit()
                 cursor.close()
                 conn.close()
@@ -3969,6 +4135,7 @@ def respond_to_schedule_proposal(progress_id):
                     "both_accepted": True
                 }), 200
             else:
+                events.publish_progress(cursor, progress_id)
                 conn.commit()
                 cursor.close()
                 conn.close()
@@ -3992,6 +4159,7 @@ def respond_to_schedule_proposal(progress_id):
                 WHERE id = %s
             """, (progress_id,))
             
+            events.publish_progress(cursor, progress_id)
             conn.commit()
             cursor.close()
             conn.close()
@@ -4046,10 +4214,12 @@ def cancel_schedule_proposal(message_id):
         # Update the proposal status to cancelled
         cursor.execute("""
             UPDATE messages
-            SET proposal_status = 'cancelled'
+            SET proposal_status = 'cancelled',
+                updated_at = CURRENT_TIMESTAMP
             WHERE id = %s
         """, (message_id,))
         
+        events.publish_application(cursor, message['application_id'], 'message', message_id=message_id)
         conn.commit()
         cursor.close()
         conn.close()
@@ -4070,10 +4240,11 @@ def trigger_expired_surveys():
     """Manual trigger for processing expired surveys (for testing/admin use)"""
     try:
         from survey_processor import process_expired_surveys
-        count = process_expired_surveys()
+        stats = process_expired_surveys()
         return jsonify({
-            "message": f"Processed {count} expired surveys",
-            "count": count
+            "message": f"Processed {stats['processed']} expired surveys",
+            "count": stats['processed'],
+            **stats
         }), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -4081,9 +4252,9 @@ def trigger_expired_surveys():
 
 # ==================== ADMIN API ENDPOINTS ====================
 
-@app.route("/api/admin/stats", methods=['GET'])
-def get_admin_stats():
-    """Get aggregate statistics for admin dashboard"""
+@app.route("/api/admin/ledger/audit", methods=['GET'])
+def audit_time_ledger():
+    """Check the time ledger: balanced transactions and balances matching the ledger"""
     try:
         admin_id, error, status = get_admin_from_token(request.headers.get('Authorization'))
         if error:
@@ -4091,82 +4262,78 @@ def get_admin_stats():
         
         conn = get_db_connection()
         cursor = conn.cursor()
+        result = ledger.audit(cursor)
+        cursor.close()
+        conn.close()
         
-        # Get total users count
-        cursor.execute("SELECT COUNT(*) as count FROM users")
-        total_users = cursor.fetchone()['count']
-        
-        # Get active users count (logged in within last 30 days)
-        cursor.execute("""
-            SELECT COUNT(*) as count FROM users 
-            WHERE last_login >= NOW() - INTERVAL '30 days'
-        """)
-        active_users = cursor.fetchone()['count']
-        
-        # Get total active services (both offers and needs)
-        cursor.execute("""
-            SELECT COUNT(*) as count FROM services 
-            WHERE status = 'open'
-        """)
-        active_services = cursor.fetchone()['count']
+        return jsonify(result), 200
         
-        # Calculate hours exchanged from completed service progress
-        cursor.execute("""
-            SELECT COALESCE(SUM(hours), 0) as total_hours 
-            FROM service_progress 
-            WHERE status = 'completed'
-        """)
-        hours_exchanged = cursor.fetchone()['total_hours']
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+@app.route("/api/admin/ledger/rebuild", methods=['POST'])
+def rebuild_time_balances():
+    """Recompute every cached users.time_balance from the ledger"""
+    try:
+        admin_id, error, status = get_admin_from_token(request.headers.get('Authorization'))
+        if error:
+            return jsonify(error), status
         
-        # Get pending reports
-        cursor.execute("""
-            SELECT COUNT(*) as count FROM reports 
-            WHERE status = 'open'
-        """)
-        pending_reports = cursor.fetchone()['count']
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        corrected = ledger.rebuild_balances(cursor)
         
-        # Get banned users count
-        cursor.execute("""
-            SELECT COUNT(*) as count FROM users 
-            WHERE user_status = 'banned'
-        """)
-        banned_users = cursor.fetchone()['count']
+        log_admin_action(
+            cursor,
+            admin_id,
+            'rebuild_balances',
+            'user',
+            None,
+            {'corrected': corrected},
+            request.remote_addr
+        )
         
-        # Get users with warnings
-        cursor.execute("""
-            SELECT COUNT(*) as count FROM users 
-            WHERE user_status = 'warning'
-        """)
-        warned_users = cursor.fetchone()['count']
+        conn.commit()
+        cursor.close()
+        conn.close()
         
-        # Get total forum threads
-        cursor.execute("SELECT COUNT(*) as count FROM forum_threads")
-        total_threads = cursor.fetchone()['count']
+        return jsonify({"message": "Balances rebuilt from the ledger", "corrected": corrected}), 200
         
-        # Get total forum comments
-        cursor.execute("SELECT COUNT(*) as count FROM forum_comments")
-        total_comments = cursor.fetchone()['count']
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+@app.route("/api/admin/stats", methods=['GET'])
+def get_admin_stats():
+    """Get aggregate statistics for admin dashboard (precomputed, see stats.py)"""
+    try:
+        admin_id, error, status = get_admin_from_token(request.headers.get('Authorization'))
+        if error:
+            return jsonify(error), status
         
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        counters = stats.counters(cursor)
         cursor.close()
         conn.close()
         
         return jsonify({
             "users": {
-                "total": total_users,
-                "active": active_users,
-                "banned": banned_users,
-                "warned": warned_users
+                "total": int(counters['users_total']),
+                "active": int(counters['users_active_30d']),
+                "banned": int(counters['users_banned']),
+                "warned": int(counters['users_warned'])
             },
             "services": {
-                "active_services": active_services,
-                "hours_exchanged": float(hours_exchanged)
+                "active_services": int(counters['services_open']),
+                "completed": int(counters['services_completed']),
+                "hours_exchanged": float(counters['hours_exchanged'])
             },
             "reports": {
-                "pending": pending_reports
+                "pending": int(counters['reports_open'])
             },
             "forum": {
-                "threads": total_threads,
-                "comments": total_comments
+                "threads": int(counters['forum_threads']),
+                "comments": int(counters['forum_comments'])
             }
         }), 200
         
@@ -4175,6 +4342,128 @@ def get_admin_stats():
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
 
+@app.route("/api/admin/stats/history", methods=['GET'])
+def get_admin_stats_history():
+    """Daily series for the dashboard chart: ?days=30&metrics=signups,hours_per_day"""
+    try:
+        admin_id, error, status = get_admin_from_token(request.headers.get('Authorization'))
+        if error:
+            return jsonify(error), status
+        
+        try:
+            days = int(request.args.get('days', 30))
+        except ValueError:
+            return jsonify({"error": "days must be a number"}), 400
+        if not 1 <= days <= STATS_HISTORY_MAX_DAYS:
+            return jsonify({"error": f"days must be between 1 and {STATS_HISTORY_MAX_DAYS}"}), 400
+        
+        metrics = [m for m in request.args.get('metrics', '').split(',') if m] or list(stats.HISTORY_METRICS)
+        unknown = [m for m in metrics if m not in stats.HISTORY_METRICS]
+        if unknown:
+            return jsonify({"error": f"Unknown metric(s): {', '.join(unknown)}"}), 400
+        
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        series = stats.history(cursor, metrics, days)
+        cursor.close()
+        conn.close()
+        
+        return jsonify({"days": days, "series": series}), 200
+        
+    except Exception as e:
+        print(f"ERROR in get_admin_stats_history: {str(e)}")
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+
+@app.route("/api/admin/query-stats", methods=['GET'])
+def get_admin_query_stats():
+    """Per-endpoint SQL statistics of this worker process (see query_stats.py): ?top=10 queries each"""
+    try:
+        admin_id, error, status = get_admin_from_token(request.headers.get('Authorization'))
+        if error:
+            return jsonify(error), status
+        
+        try:
+            top = parse_limit(request.args.get('top'), 10, QUERY_STATS_MAX_TOP)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        return jsonify(query_stats.query_stats(top)), 200
+        
+    except Exception as e:
+        print(f"ERROR in get_admin_query_stats: {str(e)}")
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+
+@app.route("/api/admin/query-stats", methods=['DELETE'])
+def reset_admin_query_stats():
+    """Start the SQL statistics of this worker process over"""
+    try:
+        admin_id, error, status = get_admin_from_token(request.headers.get('Authorization'))
+        if error:
+            return jsonify(error), status
+        
+        query_stats.reset_query_stats()
+        return jsonify({"message": "Query statistics reset"}), 200
+        
+    except Exception as e:
+        print(f"ERROR in reset_admin_query_stats: {str(e)}")
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+
+@app.route("/api/admin/analytics", methods=['GET'])
+def get_admin_analytics():
+    """
+    Activity over time from the analytics rollups (see analytics.py).
+    ?metrics=completions,hours_transferred&granularity=hour|day|week&start=<ISO>&end=<ISO>
+    &breakdown=type|tag&limit=10; the range defaults to the last 30 days.
+    """
+    try:
+        admin_id, error, status = get_admin_from_token(request.headers.get('Authorization'))
+        if error:
+            return jsonify(error), status
+        
+        metrics = [m for m in request.args.get('metrics', '').split(',') if m] or list(analytics.SOURCES)
+        granularity = request.args.get('granularity', 'day')
+        breakdown = request.args.get('breakdown') or None
+        try:
+            start = datetime.fromisoformat(request.args['start']) if request.args.get('start') else None
+            end = datetime.fromisoformat(request.args['end']) if request.args.get('end') else None
+            limit = parse_limit(request.args.get('limit'), 10, 50)
+        except ValueError:
+            return jsonify({"error": "start and end must be ISO dates and limit a number"}), 400
+        
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        if end is None:
+            cursor.execute("SELECT LOCALTIMESTAMP AS now")
+            end = cursor.fetchone()['now']
+        if start is None:
+            start = end - timedelta(days=30)
+        
+        try:
+            result = analytics.series(cursor, metrics, granularity, start, end, breakdown, limit)
+        except analytics.AnalyticsQueryError as e:
+            cursor.close()
+            conn.close()
+            return jsonify({"error": str(e)}), 400
+        
+        cursor.close()
+        conn.close()
+        
+        return jsonify({
+            "granularity": granularity,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            **result
+        }), 200
+        
+    except Exception as e:
+        print(f"ERROR in get_admin_analytics: {str(e)}")
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+
 @app.route("/api/admin/users", methods=['GET'])
 def get_admin_users():
     """Get list of all users with their status"""
@@ -4194,13 +4483,11 @@ def get_admin_users():
         per_page = int(request.args.get('per_page', 20))
         offset = (page - 1) * per_page
         
-        # Build query with service count
+        # Pick the page of users first, then count services for only those rows
         query = """
             SELECT u.id, u.email, u.first_name, u.last_name, u.role, u.user_status, 
-                   u.time_balance, u.is_verified, u.is_active, u.date_joined, u.last_login,
-                   COUNT(s.id) as service_count
+                   u.time_balance, u.is_verified, u.is_active, u.date_joined, u.last_login
             FROM users u
-            LEFT JOIN services s ON u.id = s.user_id
             WHERE 1=1
         """
         params = []
@@ -4218,9 +4505,14 @@ def get_admin_users():
             search_pattern = f"%{search}%"
             params.extend([search_pattern, search_pattern, search_pattern])
         
-        query += " GROUP BY u.id, u.email, u.first_name, u.last_name, u.role, u.user_status, u.time_balance, u.is_verified, u.is_active, u.date_joined, u.last_login"
         query += " ORDER BY u.date_joined DESC LIMIT %s OFFSET %s"
         params.extend([per_page, offset])
+        query = f"""
+            SELECT page.*,
+                   (SELECT COUNT(*) FROM services s WHERE s.user_id = page.id) as service_count
+            FROM ({query}) page
+            ORDER BY page.date_joined DESC
+        """
         
         cursor.execute(query, params)
         users = cursor.fetchall()
@@ -4238,8 +4530,12 @@ def get_admin_users():
             search_pattern = f"%{search}%"
             count_params.extend([search_pattern, search_pattern, search_pattern])
         
-        cursor.execute(count_query, count_params)
-        total = cursor.fetchone()['count']
+        if count_params:
+            cursor.execute(count_query, count_params)
+            total = cursor.fetchone()['count']
+        else:
+            # Unfiltered: the maintained counter instead of counting every user (see stats.py)
+            total = int(stats.counters(cursor)['users_total'])
         
         cursor.close()
         conn.close()
@@ -4278,18 +4574,13 @@ def get_admin_services():
         per_page = int(request.args.get('per_page', 20))
         offset = (page - 1) * per_page
         
-        # Build query with user info and application count
+        # Pick the page of services first, then add application counts and tags to those rows
         query = """
             SELECT s.id, s.title, s.description, s.service_type, s.status, 
                    s.hours_required, s.created_at, s.user_id,
-                   u.first_name, u.last_name, u.email,
-                   COUNT(DISTINCT a.id) as application_count,
-                   STRING_AGG(DISTINCT t.name, ', ' ORDER BY t.name) as tags
+                   u.first_name, u.last_name, u.email
             FROM services s
             JOIN users u ON s.user_id = u.id
-            LEFT JOIN service_applications a ON s.id = a.service_id
-            LEFT JOIN service_tags st ON s.id = st.service_id
-            LEFT JOIN tags t ON st.tag_id = t.id
             WHERE 1=1
         """
         params = []
@@ -4308,12 +4599,19 @@ def get_admin_services():
             params.extend([search_pattern, search_pattern, search_pattern, search_pattern])
         
         query += """ 
-            GROUP BY s.id, s.title, s.description, s.service_type, s.status, 
-                     s.hours_required, s.created_at, s.user_id, u.first_name, u.last_name, u.email
-            ORDER BY s.created_at DESC 
+            ORDER BY s.created_at DESC, s.id DESC
             LIMIT %s OFFSET %s
         """
         params.extend([per_page, offset])
+        query = f"""
+            SELECT page.*,
+                   (SELECT COUNT(*) FROM service_applications a WHERE a.service_id = page.id) as application_count,
+                   (SELECT STRING_AGG(t.name, ', ' ORDER BY t.name)
+                    FROM service_tags st JOIN tags t ON st.tag_id = t.id
+                    WHERE st.service_id = page.id) as tags
+            FROM ({query}) page
+            ORDER BY page.created_at DESC, page.id DESC
+        """
         
         cursor.execute(query, params)
         services = cursor.fetchall()
@@ -4669,13 +4967,10 @@ def update_user_balance_for_testing():
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Update user's balance
-        cursor.execute("""
-            UPDATE users 
-            SET time_balance = %s
-            WHERE id = %s
-        """, (new_balance, user_id))
+        # Update user's balance (recorded as a ledger adjustment)
+        ledger.set_balance(cursor, user_id, new_balance, memo="Balance set for testing")
         
+        events.publish(cursor, (user_id,), 'balance')
         conn.commit()
         
         # Get updated user info
@@ -4708,6 +5003,7 @@ def update_user_balance_for_testing():
 # ==================== FORUM API ENDPOINTS ====================
 
 @app.route("/api/forum/categories", methods=['GET'])
+@response_cache.cached(ttl=300, tags=lambda args, data: ["forum_categories"])
 def get_forum_categories():
     """Get all active forum categories"""
     try:
@@ -4750,45 +5046,38 @@ def get_forum_threads():
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Build query
-        query = """
+        # Pick the page of threads first, then join authors and count comments for those rows
+        page_query = "SELECT * FROM forum_threads WHERE 1=1"
+        params = []
+        
+        if category_id:
+            page_query += " AND category_id = %s"
+            params.append(int(category_id))
+        
+        page_query += " ORDER BY is_pinned DESC, updated_at DESC LIMIT %s OFFSET %s"
+        params.extend([per_page, offset])
+        
+        query = f"""
             SELECT ft.id, ft.title, ft.content, ft.is_pinned, ft.is_locked,
                    ft.view_count, ft.created_at, ft.updated_at,
                    fc.name as category_name, fc.id as category_id,
                    u.id as author_id, u.first_name, u.last_name, u.email,
-                   COUNT(DISTINCT fc2.id) as comment_count
-            FROM forum_threads ft
+                   (SELECT COUNT(*) FROM forum_comments c WHERE c.thread_id = ft.id) as comment_count
+            FROM ({page_query}) ft
             JOIN forum_categories fc ON ft.category_id = fc.id
             JOIN users u ON ft.user_id = u.id
-            LEFT JOIN forum_comments fc2 ON ft.id = fc2.thread_id
-            WHERE 1=1
-        """
-        params = []
-        
-        if category_id:
-            query += " AND ft.category_id = %s"
-            params.append(int(category_id))
-        
-        query += """
-            GROUP BY ft.id, fc.id, u.id
             ORDER BY ft.is_pinned DESC, ft.updated_at DESC
-            LIMIT %s OFFSET %s
         """
-        params.extend([per_page, offset])
         
         cursor.execute(query, params)
         threads = cursor.fetchall()
         
-        # Get total count
-        count_query = "SELECT COUNT(*) as count FROM forum_threads WHERE 1=1"
-        count_params = []
-        
+        # Get total count (all threads: the maintained counter, see stats.py)
         if category_id:
-            count_query += " AND category_id = %s"
-            count_params.append(int(category_id))
-        
-        cursor.execute(count_query, count_params)
-        total = cursor.fetchone()['count']
+            cursor.execute("SELECT COUNT(*) as count FROM forum_threads WHERE category_id = %s", (int(category_id),))
+            total = cursor.fetchone()['count']
+        else:
+            total = int(stats.counters(cursor)['forum_threads'])
         
         cursor.close()
         conn.close()
@@ -4921,6 +5210,9 @@ def get_forum_thread(thread_id):
 
 
 @app.route("/api/forum/threads/<int:thread_id>/comments", methods=['GET'])
+@response_cache.cached(ttl=120, tags=lambda args, data: [f"forum_thread:{args['thread_id']}"] + [
+    f"user:{comment['author_id']}" for comment in data['comments']
+])
 def get_thread_comments(thread_id):
     """Get all comments for a thread"""
     try:
@@ -5042,6 +5334,7 @@ def add_thread_comment(thread_id):
         conn.commit()
         cursor.close()
         conn.close()
+        response_cache.invalidate(f"forum_thread:{thread_id}")
         
         return jsonify({
             "message": "Comment added successfully",
@@ -5157,14 +5450,11 @@ def favicon():
 
 
 if __name__ == "__main__":
-    # Initialize database on startup
-    init_db()
+    # Apply pending schema migrations (only a version check when the schema is current)
+    migrate.startup()
     
-    # Start background survey processor
-    try:
-        from survey_processor import start_background_processor
-        start_background_processor()
-    except Exception as e:
-        print(f"Failed to start background processor: {e}")
+    # Run scheduled jobs (survey expiry, token cleanup) in this process too; under
+    # gunicorn each worker starts one (gunicorn.conf.py). Only one scheduler leads at a time.
+    scheduler.Scheduler().start()
     
     app.run(host="0.0.0.0", port=5000, debug=False)
@@ -0,0 +1,187 @@
+"""
+Token and account checks for authenticated requests
+Verified JWTs are cached (by SHA-256 digest) with their claims until they expire, so a
+token is HMAC-verified once per process instead of on every request. Each request also
+checks the user's current status and role against an in-memory snapshot, so a ban,
+deactivation or role change applies to tokens issued before it.
+
+The snapshot is kept correct by a trigger on users (migrations/0003_auth_notify.sql)
+that NOTIFYs the user id whenever user_status, role or is_active change; every worker
+hears it on its shared LISTEN connection (events.Listener) and drops that user's entry. While the listener is disconnected nothing is
+cached (every check reads the database) and the snapshot is emptied on reconnect,
+since notifications may have been missed. AUTH_STATUS_TTL bounds how long an entry is
+trusted in any case.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+
+import events
+
+CHANNEL = 'hive_auth'
+
+# Verified tokens kept per process
+AUTH_TOKEN_CACHE_SIZE = int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', 10000))
+# Seconds a user's status is trusted without a notification (safety net)
+AUTH_STATUS_TTL = float(os.environ.get('AUTH_STATUS_TTL', 300))
+# Users whose status is kept per process
+AUTH_STATUS_CACHE_SIZE = int(os.environ.get('AUTH_STATUS_CACHE_SIZE', 50000))
+
+
+class TokenCache:
+    """LRU map of token digest -> verified claims, valid until the token's exp"""
+
+    def __init__(self, max_entries=AUTH_TOKEN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, token):
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.time():
+                # Expired tokens are decoded again, which raises ExpiredSignatureError
+                self._entries.pop(key, None)
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def put(self, token, claims):
+        if 'exp' not in claims:
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (claims, claims['exp'])
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), **self._stats}
+
+
+class UserStatusSnapshot:
+    """
+    user id -> {user_status, role, is_active}, invalidated by NOTIFY on CHANNEL.
+    Entries are only stored while the listener is connected.
+    """
+
+    def __init__(self, ttl=AUTH_STATUS_TTL, max_entries=AUTH_STATUS_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.connected = False
+        self._entries = OrderedDict()
+        # Bumped by every invalidation; a load that raced one is not stored
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0, "reconnects": 0}
+
+    def start(self, listener=None):
+        """Follow CHANNEL on `listener` (the worker's, by default)"""
+        (listener or events.get_listener()).add(CHANNEL, self.dispatch, self._connected, self._disconnected)
+        return self
+
+    def _connected(self, reconnected):
+        # Changes made while we were not listening were not announced
+        self.invalidate()
+        self.connected = True
+        if reconnected:
+            self._stats["reconnects"] += 1
+
+    def _disconnected(self):
+        self.connected = False
+
+    def get(self, user_id, load):
+        """The user's current status, from the snapshot or `load(user_id)` (None if no such user)"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and self.connected and time.monotonic() - entry[1] < self.ttl:
+                self._entries.move_to_end(user_id)
+                self._stats["hits"] += 1
+                return entry[0]
+            self._stats["misses"] += 1
+            generation = self._generation
+
+        user = load(user_id)
+
+        with self._lock:
+            if self.connected and generation == self._generation and user is not None:
+                self._entries[user_id] = (user, time.monotonic())
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return user
+
+    def invalidate(self, user_id=None):
+        """Forget one user (or everyone)"""
+        with self._lock:
+            self._generation += 1
+            self._stats["invalidations"] += 1
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def dispatch(self, payload):
+        try:
+            user_id = int(payload)
+        except ValueError:
+            print(f"Ignoring malformed auth notification: {payload[:200]}")
+            return
+        self.invalidate(user_id)
+
+    def stats(self):
+        with self._lock:
+            entries = len(self._entries)
+        return {"listening": self.connected, "entries": entries, **self._stats}
+
+
+_tokens = TokenCache()
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def decode_token(token, secret):
+    """Claims of a valid HS256 token; raises jwt.InvalidTokenError (or ExpiredSignatureError) otherwise"""
+    claims = _tokens.get(token)
+    if claims is None:
+        claims = jwt.decode(token, secret, algorithms=['HS256'])
+        _tokens.put(token, claims)
+    return claims
+
+
+def get_snapshot():
+    """The process-wide status snapshot"""
+    global _snapshot
+    if _snapshot is None:
+        listener = events.get_listener()
+        with _snapshot_lock:
+            if _snapshot is None:
+                _snapshot = UserStatusSnapshot().start(listener)
+    return _snapshot
+
+
+def user_status(user_id, load):
+    """{user_status, role, is_active} of a user, or None if the user no longer exists"""
+    return get_snapshot().get(user_id, load)
+
+
+def auth_stats():
+    """Token cache and status snapshot metrics for /api/health"""
+    return {
+        "tokens": _tokens.stats(),
+        "users": _snapshot.stats() if _snapshot is not None else None
+    }
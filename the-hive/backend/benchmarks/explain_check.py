@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Query plan check for the hot endpoints
+Replays the SQL behind the most frequently called endpoints under EXPLAIN ANALYZE on
+the synthetic dataset and fails (exit status 1) when a plan reads a large table with a
+sequential scan, i.e. when a query has lost the index it relies on (see
+migrations/0002_hot_path_indexes.py).
+
+Usage:
+    python3 benchmarks/explain_check.py --services 200000 --applications 200000
+    python3 benchmarks/explain_check.py --no-seed --threshold 5000 --json results/plans.json
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from synthetic import get_db_connection, seed
+
+PAGE_SIZE = 20
+
+PUBLIC_SERVICES = "(s.status = 'open' OR (s.status = 'in_progress' AND s.service_type = 'offer'))"
+
+# (label, SQL with %(sample)s parameters) - the same statements app.py runs
+CATALOGUE = [
+    ("GET /api/services", f"""
+        WITH page AS (
+            SELECT s.* FROM services s
+            WHERE {PUBLIC_SERVICES}
+            ORDER BY s.created_at DESC, s.id DESC
+            LIMIT %(limit)s
+        )
+        SELECT page.*, u.first_name, tg.tags, sp.id AS progress_id
+        FROM page
+        JOIN users u ON page.user_id = u.id
+        LEFT JOIN LATERAL (
+            SELECT ARRAY_AGG(DISTINCT t.name) AS tags
+            FROM service_tags st JOIN tags t ON st.tag_id = t.id
+            WHERE st.service_id = page.id
+        ) tg ON true
+        LEFT JOIN LATERAL (
+            SELECT id FROM service_progress
+            WHERE service_id = page.id
+            ORDER BY updated_at DESC NULLS LAST, created_at DESC
+            LIMIT 1
+        ) sp ON true
+        ORDER BY page.created_at DESC, page.id DESC
+    """),
+    ("GET /api/services?type=offer", """
+        SELECT s.id FROM services s
+        WHERE s.service_type = 'offer' AND s.status = 'open'
+        ORDER BY s.created_at DESC, s.id DESC
+        LIMIT %(limit)s
+    """),
+    ("GET /api/services?tags=", f"""
+        SELECT s.id FROM services s
+        WHERE {PUBLIC_SERVICES}
+          AND s.id IN (SELECT service_id FROM service_tags WHERE tag_id = %(tag_id)s)
+        ORDER BY s.created_at DESC, s.id DESC
+        LIMIT %(limit)s
+    """),
+    ("GET /api/users/<id> services", """
+        SELECT s.id, ARRAY_AGG(DISTINCT t.name) AS tags
+        FROM services s
+        LEFT JOIN service_tags st ON s.id = st.service_id
+        LEFT JOIN tags t ON st.tag_id = t.id
+        WHERE s.user_id = %(owner_id)s AND s.status = 'open'
+        GROUP BY s.id
+        ORDER BY s.created_at DESC
+    """),
+    ("GET /api/users/<id> reviews (provider)", """
+        SELECT sp.id, s.title, u.first_name
+        FROM service_progress sp
+        JOIN services s ON sp.service_id = s.id
+        JOIN users u ON sp.consumer_id = u.id
+        WHERE sp.provider_id = %(provider_id)s AND sp.status = 'completed'
+          AND sp.consumer_survey_data IS NOT NULL AND sp.consumer_survey_submitted = TRUE
+        ORDER BY sp.completed_at DESC
+        LIMIT 50
+    """),
+    ("GET /api/users/<id> reviews (consumer)", """
+        SELECT sp.id, s.title, u.first_name
+        FROM service_progress sp
+        JOIN services s ON sp.service_id = s.id
+        JOIN users u ON sp.provider_id = u.id
+        WHERE sp.consumer_id = %(consumer_id)s AND sp.status = 'completed'
+          AND sp.provider_survey_data IS NOT NULL AND sp.provider_survey_submitted = TRUE
+        ORDER BY sp.completed_at DESC
+        LIMIT 50
+    """),
+    ("GET /api/applications", """
+        SELECT sa.id, s.title, owner.first_name, sp.id AS progress_id
+        FROM service_applications sa
+        JOIN services s ON sa.service_id = s.id
+        JOIN users owner ON s.user_id = owner.id
+        LEFT JOIN service_progress sp ON sa.id = sp.application_id
+        WHERE sa.applicant_id = %(applicant_id)s
+        ORDER BY sa.applied_at DESC
+    """),
+    ("GET /api/services/<id>/applications", """
+        SELECT sa.id, u.first_name, sp.id AS progress_id
+        FROM service_applications sa
+        JOIN users u ON sa.applicant_id = u.id
+        LEFT JOIN service_progress sp ON sa.id = sp.application_id
+        WHERE sa.service_id = %(service_id)s
+        ORDER BY sa.applied_at DESC
+    """),
+    ("accept application (other pending)", """
+        SELECT id FROM service_applications
+        WHERE service_id = %(service_id)s AND id != %(application_id)s AND status = 'pending'
+    """),
+    ("GET /api/progress?application_id=", """
+        SELECT sp.* FROM service_progress sp WHERE sp.application_id = %(application_id)s
+    """),
+    ("GET /api/messages/<application_id>", """
+        SELECT m.id, sender.first_name
+        FROM messages m
+        JOIN users sender ON m.sender_id = sender.id
+        WHERE m.application_id = %(application_id)s
+        ORDER BY m.id DESC
+        LIMIT %(limit)s
+    """),
+    ("GET /api/messages/<application_id>?since=", """
+        SELECT m.id FROM messages m
+        WHERE m.application_id = %(application_id)s AND m.updated_at > NOW() - INTERVAL '1 hour'
+        ORDER BY m.id ASC
+        LIMIT %(limit)s
+    """),
+    ("GET /api/forum/threads", """
+        SELECT ft.id, fc.name, u.first_name,
+               (SELECT COUNT(*) FROM forum_comments c WHERE c.thread_id = ft.id) AS comment_count
+        FROM (SELECT * FROM forum_threads ORDER BY is_pinned DESC, updated_at DESC LIMIT %(limit)s OFFSET 0) ft
+        JOIN forum_categories fc ON ft.category_id = fc.id
+        JOIN users u ON ft.user_id = u.id
+        ORDER BY ft.is_pinned DESC, ft.updated_at DESC
+    """),
+    ("GET /api/forum/threads?category=", """
+        SELECT ft.id, fc.name, u.first_name,
+               (SELECT COUNT(*) FROM forum_comments c WHERE c.thread_id = ft.id) AS comment_count
+        FROM (SELECT * FROM forum_threads WHERE category_id = %(category_id)s
+              ORDER BY is_pinned DESC, updated_at DESC LIMIT %(limit)s OFFSET 0) ft
+        JOIN forum_categories fc ON ft.category_id = fc.id
+        JOIN users u ON ft.user_id = u.id
+        ORDER BY ft.is_pinned DESC, ft.updated_at DESC
+    """),
+    ("GET /api/forum/threads/<id>/comments", """
+        SELECT fc.id, u.first_name
+        FROM forum_comments fc
+        JOIN users u ON fc.user_id = u.id
+        WHERE fc.thread_id = %(thread_id)s
+        ORDER BY fc.created_at ASC
+        LIMIT %(limit)s OFFSET 0
+    """),
+    ("GET /api/admin/users", """
+        SELECT page.*, (SELECT COUNT(*) FROM services s WHERE s.user_id = page.id) AS service_count
+        FROM (SELECT u.id, u.email, u.date_joined FROM users u
+              ORDER BY u.date_joined DESC LIMIT %(limit)s OFFSET 0) page
+        ORDER BY page.date_joined DESC
+    """),
+    ("GET /api/admin/services?type=&status=", """
+        SELECT page.*,
+               (SELECT COUNT(*) FROM service_applications a WHERE a.service_id = page.id) AS application_count
+        FROM (SELECT s.id, s.created_at, u.email FROM services s JOIN users u ON s.user_id = u.id
+              WHERE s.service_type = 'need' AND s.status = 'open'
+              ORDER BY s.created_at DESC, s.id DESC LIMIT %(limit)s OFFSET 0) page
+        ORDER BY page.created_at DESC, page.id DESC
+    """),
+    ("GET /api/admin/reports?status=", """
+        SELECT r.id, u1.email
+        FROM reports r
+        LEFT JOIN users u1 ON r.reporter_id = u1.id
+        WHERE r.status = 'open'
+        ORDER BY r.created_at DESC
+        LIMIT %(limit)s OFFSET 0
+    """),
+]
+
+SAMPLES_SQL = """
+    SELECT
+        (SELECT sp.provider_id FROM service_progress sp WHERE sp.status = 'completed' ORDER BY sp.id DESC LIMIT 1) AS provider_id,
+        (SELECT sp.consumer_id FROM service_progress sp WHERE sp.status = 'completed' ORDER BY sp.id DESC LIMIT 1) AS consumer_id,
+        (SELECT sa.applicant_id FROM service_applications sa ORDER BY sa.id DESC LIMIT 1) AS applicant_id,
+        (SELECT sa.service_id FROM service_applications sa ORDER BY sa.id DESC LIMIT 1) AS service_id,
+        (SELECT m.application_id FROM messages m ORDER BY m.id DESC LIMIT 1) AS application_id,
+        (SELECT s.user_id FROM services s ORDER BY s.id DESC LIMIT 1) AS owner_id,
+        (SELECT st.tag_id FROM service_tags st ORDER BY st.service_id DESC LIMIT 1) AS tag_id,
+        (SELECT ft.id FROM forum_threads ft ORDER BY ft.id DESC LIMIT 1) AS thread_id,
+        (SELECT ft.category_id FROM forum_threads ft ORDER BY ft.id DESC LIMIT 1) AS category_id
+"""
+
+
+def plan_nodes(node):
+    """The plan node and all nodes below it"""
+    yield node
+    for child in node.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def table_sizes(cursor):
+    cursor.execute("""
+        SELECT c.relname, c.reltuples::bigint AS rows
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relkind = 'r' AND n.nspname = current_schema()
+    """)
+    return {row['relname']: row['rows'] for row in cursor.fetchall()}
+
+
+def check(conn, threshold):
+    cursor = conn.cursor()
+    sizes = table_sizes(cursor)
+    cursor.execute(SAMPLES_SQL)
+    params = dict(cursor.fetchone(), limit=PAGE_SIZE)
+
+    results = []
+    for label, sql in CATALOGUE:
+        cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, params)
+        explained = cursor.fetchone()['QUERY PLAN'][0]
+        seq_scans = sorted({
+            node['Relation Name'] for node in plan_nodes(explained['Plan'])
+            if node['Node Type'] == 'Seq Scan' and sizes.get(node['Relation Name'], 0) > threshold
+        })
+        results.append({
+            "label": label,
+            "execution_ms": round(explained['Execution Time'], 2),
+            "seq_scans": seq_scans
+        })
+        # EXPLAIN ANALYZE executes the statement; leave nothing behind
+        conn.rollback()
+
+    cursor.close()
+    return {"threshold": threshold, "tables": sizes, "queries": results}
+
+
+def print_report(report):
+    print(f"\nPlan check: sequential scans of tables above {report['threshold']} rows\n")
+    print(f"{'query':<44} {'ms':>9}  result")
+    for r in report['queries']:
+        verdict = "ok" if not r['seq_scans'] else "SEQ SCAN " + ", ".join(r['seq_scans'])
+        print(f"{r['label']:<44} {r['execution_ms']:>9.2f}  {verdict}")
+    failed = sum(1 for r in report['queries'] if r['seq_scans'])
+    print(f"\n{failed} of {len(report['queries'])} queries fall back to a sequential scan.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail when a hot query plans a sequential scan of a large table")
+    parser.add_argument('--services', type=int, default=200000, help="seed the synthetic dataset up to this size first")
+    parser.add_argument('--applications', type=int, default=200000, help="benchmark applications (and activity) to seed")
+    parser.add_argument('--threshold', type=int, default=10000, help="tables with more rows than this must not be seq-scanned")
+    parser.add_argument('--no-seed', action='store_true', help="check the database as it is")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    try:
+        if not args.no_seed:
+            seed(conn, services=args.services, applications=args.applications)
+        report = check(conn, args.threshold)
+    finally:
+        conn.close()
+
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.json}")
+
+    sys.exit(1 if any(r['seq_scans'] for r in report['queries']) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Load test for The Hive API
+Runs concurrent virtual users against a running server. Each one logs in as a
+benchmark user from synthetic.py and repeats user journeys (browse, search, apply,
+chat, complete, login) drawn from a weighted traffic profile. Per endpoint it reports
+requests per second, p50/p95/p99 latency and the error rate. Several concurrency
+steps in one run (--users 10,25,50,100) show where latency starts to climb.
+Results are written as JSON; --compare puts two runs side by side.
+
+Seed first (applications, progress and messages make the chat/complete journeys
+meaningful):
+    python3 benchmarks/synthetic.py --services 200000 --applications 100000
+
+Usage:
+    python3 benchmarks/loadtest.py --url http://localhost:5001 --users 10,25,50 --duration 60
+    python3 benchmarks/loadtest.py --profile browse=6,search=3,chat=1 --json results/run.json
+    python3 benchmarks/loadtest.py --profile login=1 --users 4,16,64
+    python3 benchmarks/loadtest.py --compare results/before.json results/after.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import requests
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from synthetic import BENCH_PASSWORD, VOCABULARY
+
+# Default traffic mix (relative weights)
+PROFILE = {'browse': 45, 'search': 20, 'apply': 10, 'chat': 20, 'complete': 5}
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Recorder:
+    """Latencies and outcomes per endpoint, shared by all virtual users"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint, elapsed_ms, status, ok):
+        with self._lock:
+            self.latencies[endpoint].append(elapsed_ms)
+            self.statuses[endpoint][str(status)] += 1
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def summary(self, duration):
+        endpoints = {}
+        for endpoint in sorted(self.latencies):
+            ordered = sorted(self.latencies[endpoint])
+            endpoints[endpoint] = {
+                "requests": len(ordered),
+                "rps": round(len(ordered) / duration, 2),
+                "errors": self.errors[endpoint],
+                "error_rate": round(self.errors[endpoint] / len(ordered), 4),
+                "p50_ms": round(percentile(ordered, 0.50), 2),
+                "p95_ms": round(percentile(ordered, 0.95), 2),
+                "p99_ms": round(percentile(ordered, 0.99), 2),
+                "max_ms": round(ordered[-1], 2),
+                "statuses": dict(self.statuses[endpoint])
+            }
+        requests_total = sum(e['requests'] for e in endpoints.values())
+        errors_total = sum(e['errors'] for e in endpoints.values())
+        everything = sorted(ms for values in self.latencies.values() for ms in values)
+        return {
+            "requests": requests_total,
+            "rps": round(requests_total / duration, 2),
+            "error_rate": round(errors_total / requests_total, 4) if requests_total else 0,
+            "p50_ms": round(percentile(everything, 0.50) or 0, 2),
+            "p95_ms": round(percentile(everything, 0.95) or 0, 2),
+            "p99_ms": round(percentile(everything, 0.99) or 0, 2),
+            "endpoints": endpoints
+        }
+
+
+class Client:
+    """One virtual user's HTTP session; every call is timed and recorded"""
+
+    def __init__(self, base_url, recorder, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.user_id = None
+        self.email = None
+
+    def call(self, endpoint, method, path, expected=(200,), **kwargs):
+        """
+        `endpoint` is the route template the call is reported under. Statuses outside
+        `expected` count as errors. Returns the JSON body, or None.
+        """
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+        except requests.RequestException:
+            self.recorder.record(endpoint, (time.perf_counter() - started) * 1000, 'exception', False)
+            return None
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.recorder.record(endpoint, elapsed_ms, response.status_code, response.status_code in expected)
+        if response.status_code >= 400:
+            return None
+        try:
+            return response.json()
+        except ValueError:
+            return None
+
+    def login(self, email):
+        body = self.call('POST /api/auth/login', 'POST', '/api/auth/login',
+                         json={'email': email, 'password': BENCH_PASSWORD})
+        if not body:
+            return False
+        self.session.headers['Authorization'] = f"Bearer {body['access_token']}"
+        self.user_id = body['user']['id']
+        self.email = email
+        return True
+
+
+# Journeys: a few requests in the order a user would make them
+
+def browse(client, rng):
+    services = client.call('GET /api/services', 'GET', '/api/services', params={'limit': 20}) or []
+    if services:
+        service = rng.choice(services)
+        client.call('GET /api/services/<id>', 'GET', f"/api/services/{service['id']}")
+        if rng.random() < 0.5:
+            client.call('GET /api/users/<id>', 'GET', f"/api/users/{service['provider_id']}")
+    if rng.random() < 0.3:
+        threads = (client.call('GET /api/forum/threads', 'GET', '/api/forum/threads') or {}).get('threads', [])
+        if threads:
+            thread = rng.choice(threads)
+            client.call('GET /api/forum/threads/<id>/comments', 'GET', f"/api/forum/threads/{thread['id']}/comments")
+
+
+def search(client, rng):
+    # Earlier words are more common in the dataset; search them more often too
+    word = VOCABULARY[min(int(rng.expovariate(1 / 20)), len(VOCABULARY) - 1)]
+    client.call('GET /api/services/search', 'GET', '/api/services/search', params={'q': word})
+    client.call('GET /api/tags/search', 'GET', '/api/tags/search', params={'q': word[:3]})
+
+
+def apply(client, rng):
+    services = client.call('GET /api/services', 'GET', '/api/services',
+                           params={'limit': 20, 'type': rng.choice(['offer', 'need'])}) or []
+    candidates = [s for s in services if s['provider_id'] != client.user_id and s['status'] == 'open']
+    if candidates:
+        service = rng.choice(candidates)
+        # 400: already applied, or not enough balance
+        client.call('POST /api/services/<id>/apply', 'POST', f"/api/services/{service['id']}/apply",
+                    expected=(201, 400), json={'message': 'I would like to help with this.'})
+
+
+def chat(client, rng):
+    conversations = (client.call('GET /api/messages', 'GET', '/api/messages') or {}).get('conversations', [])
+    if not conversations:
+        return
+    conversation = rng.choice(conversations)
+    application_id = conversation['application_id']
+    client.call('GET /api/applications/<id>/messages', 'GET', f"/api/applications/{application_id}/messages")
+    if rng.random() < 0.5:
+        # 400: the service was cancelled
+        client.call('POST /api/messages', 'POST', '/api/messages', expected=(201, 400), json={
+            'receiver_id': conversation['other_user_id'],
+            'application_id': application_id,
+            'service_id': conversation.get('service_id'),
+            'message': f"Load test message {rng.randint(1, 10**6)}"
+        })
+
+
+def complete(client, rng):
+    applications = client.call('GET /api/user/applications', 'GET', '/api/user/applications') or []
+    active = [a for a in applications if a.get('progress_status') in ('in_progress', 'awaiting_confirmation')]
+    if not active:
+        return
+    progress = rng.choice(active)
+    progress_id = progress['progress_id']
+    client.call('GET /api/applications/<id>/progress', 'GET', f"/api/applications/{progress['application_id']}/progress")
+    if progress['progress_status'] == 'in_progress':
+        # 400: another virtual user got there first
+        client.call('POST /api/progress/<id>/mark-finished', 'POST', f"/api/progress/{progress_id}/mark-finished",
+                    expected=(200, 400))
+    client.call('POST /api/progress/<id>/submit-survey', 'POST', f"/api/progress/{progress_id}/submit-survey",
+                expected=(200, 400), json={'survey_data': {'rating': rng.randint(3, 5), 'comment': 'Load test'}})
+
+
+def login(client, rng):
+    # Password checks only: --profile login=1 measures login throughput
+    client.call('POST /api/auth/login', 'POST', '/api/auth/login',
+                json={'email': client.email, 'password': BENCH_PASSWORD})
+
+
+JOURNEYS = {'browse': browse, 'search': search, 'apply': apply, 'chat': chat, 'complete': complete, 'login': login}
+
+
+def virtual_user(index, args, profile, recorder, start_at, stop_at):
+    rng = random.Random(args.seed * 100003 + index)
+    time.sleep(max(0.0, start_at - time.monotonic()))
+    client = Client(args.url, recorder, args.timeout)
+    if not client.login(f"bench-user-{rng.randint(1, args.accounts)}@hive.invalid"):
+        return
+    names = list(profile)
+    weights = [profile[name] for name in names]
+    while time.monotonic() < stop_at:
+        JOURNEYS[rng.choices(names, weights)[0]](client, rng)
+        if args.think:
+            time.sleep(rng.uniform(0, 2 * args.think / 1000))
+
+
+def run_step(args, profile, users):
+    """Run `users` virtual users for args.duration seconds (after a ramp-up)"""
+    recorder = Recorder()
+    now = time.monotonic()
+    stop_at = now + args.ramp + args.duration
+    threads = [
+        threading.Thread(target=virtual_user, daemon=True,
+                         args=(i, args, profile, recorder, now + args.ramp * i / users, stop_at))
+        for i in range(users)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {"users": users, "duration": args.duration, **recorder.summary(args.ramp + args.duration)}
+
+
+def parse_profile(text):
+    profile = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in JOURNEYS:
+            raise argparse.ArgumentTypeError(f"unknown journey {name!r}; known: {', '.join(JOURNEYS)}")
+        profile[name] = float(weight or 1)
+    return profile
+
+
+def print_step(step):
+    print(f"\n{step['users']} users, {step['duration']}s: {step['requests']} requests, {step['rps']} req/s, "
+          f"p50 {step['p50_ms']} ms, p95 {step['p95_ms']} ms, p99 {step['p99_ms']} ms, "
+          f"errors {step['error_rate']:.2%}")
+    print(f"{'endpoint':<46} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}")
+    for endpoint, e in step['endpoints'].items():
+        print(f"{endpoint:<46} {e['rps']:>8.2f} {e['p50_ms']:>8.1f} {e['p95_ms']:>8.1f} {e['p99_ms']:>8.1f} "
+              f"{e['error_rate']:>7.2%}")
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    earlier = {step['users']: step for step in before['steps']}
+    print(f"\n{before_path} -> {after_path}")
+    for step in after['steps']:
+        old = earlier.get(step['users'])
+        if old is None:
+            continue
+        print(f"\n{step['users']} users: {old['rps']} -> {step['rps']} req/s, "
+              f"p95 {old['p95_ms']} -> {step['p95_ms']} ms, errors {old['error_rate']:.2%} -> {step['error_rate']:.2%}")
+        print(f"{'endpoint':<46} {'p95 before':>11} {'p95 after':>10} {'change':>8}")
+        for endpoint, e in step['endpoints'].items():
+            if endpoint in old['endpoints']:
+                was = old['endpoints'][endpoint]['p95_ms']
+                change = f"{(e['p95_ms'] - was) / was:+.0%}" if was else '-'
+                print(f"{endpoint:<46} {was:>11.1f} {e['p95_ms']:>10.1f} {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive mixed traffic against The Hive API and report latencies")
+    parser.add_argument('--url', default='http://localhost:5001', help="server base URL")
+    parser.add_argument('--users', default='20', help="concurrent virtual users; a list (10,25,50) runs one step each")
+    parser.add_argument('--duration', type=int, default=60, help="seconds measured per step")
+    parser.add_argument('--ramp', type=int, default=5, help="seconds over which the users of a step start")
+    parser.add_argument('--think', type=int, default=0, help="mean pause between journeys in ms")
+    parser.add_argument('--profile', type=parse_profile, default=PROFILE,
+                        help="journey weights, e.g. browse=6,search=3,chat=1")
+    parser.add_argument('--accounts', type=int, default=2000, help="benchmark users to log in as (bench-user-1..N)")
+    parser.add_argument('--timeout', type=float, default=30.0, help="request timeout in seconds")
+    parser.add_argument('--seed', type=int, default=1, help="random seed, for repeatable traffic")
+    parser.add_argument('--json', help="write the results to this file")
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help="compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "url": args.url,
+        "profile": args.profile,
+        "think_ms": args.think,
+        "steps": []
+    }
+    for users in [int(n) for n in args.users.split(',')]:
+        step = run_step(args, args.profile, users)
+        report['steps'].append(step)
+        print_step(step)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Password check throughput benchmark
+Runs concurrent login-style password checks through passwords.PasswordHasher with
+hashing pools of several sizes (0 = in the calling thread, as before the pool) and
+reports checks per second and p50/p95 latency for each. A probe on the same process
+sleeps 10 ms in a loop and reports how late it wakes up: the stall every other
+request on the worker would see while logins are being checked. With --gevent the
+callers are greenlets, as on a gunicorn gevent worker, where hashing in the request
+blocks the whole worker.
+
+No database or server is needed. For end-to-end login throughput against a running
+server use loadtest.py --profile login=1.
+
+Usage:
+    python3 benchmarks/login_benchmark.py --workers 0,1,2,4 --concurrency 16 --duration 10
+    python3 benchmarks/login_benchmark.py --gevent --rounds 12 --json results/login.json
+"""
+
+import sys
+
+if '--gevent' in sys.argv:
+    from gevent import monkey
+    monkey.patch_all()
+
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import passwords
+from loadtest import percentile
+from synthetic import BENCH_PASSWORD
+
+PROBE_INTERVAL_MS = 10
+
+
+def run_step(args, workers, stored_hash):
+    """args.concurrency callers checking BENCH_PASSWORD for args.duration seconds"""
+    hasher = passwords.PasswordHasher(workers=workers, rounds=args.rounds,
+                                      max_pending=args.concurrency + 1, timeout=60)
+    # Start the pool's processes before timing anything
+    for _ in range(max(workers, 1)):
+        hasher.check(BENCH_PASSWORD, stored_hash)
+
+    latencies = []
+    stalls = []
+    failures = [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + args.duration
+
+    def caller():
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            ok = hasher.check(BENCH_PASSWORD, stored_hash)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed_ms)
+                failures[0] += not ok
+
+    def probe():
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            time.sleep(PROBE_INTERVAL_MS / 1000)
+            stalls.append((time.perf_counter() - started) * 1000 - PROBE_INTERVAL_MS)
+
+    threads = [threading.Thread(target=caller, daemon=True) for _ in range(args.concurrency)]
+    threads.append(threading.Thread(target=probe, daemon=True))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    hasher.shutdown()
+
+    latencies.sort()
+    stalls.sort()
+    return {
+        "workers": workers,
+        "checks": len(latencies),
+        "checks_per_s": round(len(latencies) / args.duration, 2),
+        "failures": failures[0],
+        "p50_ms": round(percentile(latencies, 0.50) or 0, 1),
+        "p95_ms": round(percentile(latencies, 0.95) or 0, 1),
+        "probe_p95_stall_ms": round(percentile(stalls, 0.95) or 0, 1),
+        "probe_max_stall_ms": round(stalls[-1], 1) if stalls else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure password check throughput against hashing pool size")
+    parser.add_argument('--workers', default=f"0,1,2,{os.cpu_count() or 2}",
+                        help="hashing pool sizes to compare (0 = hash in the calling thread)")
+    parser.add_argument('--concurrency', type=int, default=16, help="concurrent logins")
+    parser.add_argument('--duration', type=int, default=10, help="seconds measured per pool size")
+    parser.add_argument('--rounds', type=int, default=passwords.BCRYPT_ROUNDS, help="bcrypt cost factor")
+    parser.add_argument('--gevent', action='store_true', help="run the callers as greenlets (gevent worker)")
+    parser.add_argument('--json', help="write the results to this file")
+    args = parser.parse_args()
+
+    stored_hash = passwords.PasswordHasher(workers=0, rounds=args.rounds).hash(BENCH_PASSWORD)
+    report = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "rounds": args.rounds,
+        "concurrency": args.concurrency,
+        "gevent": args.gevent,
+        "cpus": os.cpu_count(),
+        "steps": []
+    }
+    print(f"bcrypt cost {args.rounds}, {args.concurrency} concurrent logins, "
+          f"{'greenlets' if args.gevent else 'threads'}, {os.cpu_count()} CPUs")
+    print(f"{'pool':>5} {'checks/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'probe p95 stall':>16} {'max stall':>10}")
+    for workers in sorted({int(n) for n in args.workers.split(',')}):
+        step = run_step(args, workers, stored_hash)
+        report['steps'].append(step)
+        print(f"{step['workers']:>5} {step['checks_per_s']:>9.2f} {step['p50_ms']:>8.1f} {step['p95_ms']:>8.1f} "
+              f"{step['probe_p95_stall_ms']:>16.1f} {step['probe_max_stall_ms'] or 0:>10.1f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Service search benchmark
+Compares the ranked full-text query behind GET /api/services/search with the
+ILIKE '%term%' scan it replaces, on the synthetic dataset from synthetic.py.
+
+Usage:
+    python3 benchmarks/search_benchmark.py --services 500000 --runs 30
+    python3 benchmarks/search_benchmark.py --json results/search.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from search import SEARCH_CONFIG, SNIPPET_OPTIONS, TITLE_OPTIONS, build_tsquery
+from synthetic import get_db_connection, seed
+
+# (label, what the user typed): common word, rare word, two words, a half-typed prefix
+QUERIES = [
+    ('common term', 'help'),
+    ('rare term', 'mending'),
+    ('two terms', 'guitar lesson'),
+    ('prefix', 'photo'),
+    ('no match', 'zzzzqx'),
+]
+
+PAGE_SIZE = 20
+
+FTS_SQL = f"""
+    WITH q AS (
+        SELECT to_tsquery('{SEARCH_CONFIG}', %s) AS query
+    ),
+    page AS (
+        SELECT s.id, ts_rank_cd(s.search_vector, q.query) AS rank
+        FROM services s, q
+        WHERE s.search_vector @@ q.query
+          AND (s.status = 'open' OR (s.status = 'in_progress' AND s.service_type = 'offer'))
+        ORDER BY rank DESC, s.id DESC
+        LIMIT %s
+    )
+    SELECT s.id, page.rank,
+           ts_headline('{SEARCH_CONFIG}', s.title, q.query, %s) AS title_highlight,
+           ts_headline('{SEARCH_CONFIG}', s.description, q.query, %s) AS snippet
+    FROM page
+    JOIN services s ON s.id = page.id
+    CROSS JOIN q
+    ORDER BY page.rank DESC, page.id DESC
+"""
+
+ILIKE_SQL = """
+    SELECT s.id, s.title, s.description
+    FROM services s
+    WHERE (s.title ILIKE %s OR s.description ILIKE %s)
+      AND (s.status = 'open' OR (s.status = 'in_progress' AND s.service_type = 'offer'))
+    ORDER BY s.created_at DESC
+    LIMIT %s
+"""
+
+
+def time_query(cursor, sql, params, runs):
+    """Run a query `runs` times (after one warm-up) and return latencies in ms"""
+    cursor.execute(sql, params)
+    cursor.fetchall()
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def summarize(timings):
+    ordered = sorted(timings)
+    return {
+        "p50_ms": round(statistics.median(ordered), 2),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+        "max_ms": round(ordered[-1], 2)
+    }
+
+
+def uses_search_index(cursor, tsquery):
+    cursor.execute("EXPLAIN " + FTS_SQL, (tsquery, PAGE_SIZE, TITLE_OPTIONS, SNIPPET_OPTIONS))
+    plan = "\n".join(row['QUERY PLAN'] for row in cursor.fetchall())
+    return 'idx_services_search_vector' in plan
+
+
+def run(conn, runs):
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) as count FROM services")
+    total_services = cursor.fetchone()['count']
+
+    results = []
+    for label, text in QUERIES:
+        tsquery = build_tsquery(text)
+        pattern = f"%{text}%"
+
+        cursor.execute(f"SELECT COUNT(*) as count FROM services WHERE search_vector @@ to_tsquery('{SEARCH_CONFIG}', %s)",
+                       (tsquery,))
+        matches = cursor.fetchone()['count']
+
+        fts = summarize(time_query(cursor, FTS_SQL, (tsquery, PAGE_SIZE, TITLE_OPTIONS, SNIPPET_OPTIONS), runs))
+        ilike = summarize(time_query(cursor, ILIKE_SQL, (pattern, pattern, PAGE_SIZE), runs))
+
+        results.append({
+            "label": label,
+            "query": text,
+            "tsquery": tsquery,
+            "matches": matches,
+            "uses_gin_index": uses_search_index(cursor, tsquery),
+            "fulltext": fts,
+            "ilike": ilike
+        })
+
+    cursor.close()
+    conn.rollback()
+    return {"services": total_services, "runs": runs, "page_size": PAGE_SIZE, "queries": results}
+
+
+def print_report(report):
+    print(f"\nSearch benchmark: {report['services']} services, {report['runs']} runs per query, "
+          f"page size {report['page_size']}\n")
+    print(f"{'query':<28} {'matches':>9} {'index':>6} {'fts p50':>9} {'fts p95':>9} {'ilike p50':>10} {'ilike p95':>10}")
+    for r in report['queries']:
+        print(f"{r['label'] + ' (' + r['query'] + ')':<28} {r['matches']:>9} "
+              f"{'yes' if r['uses_gin_index'] else 'NO':>6} "
+              f"{r['fulltext']['p50_ms']:>9.2f} {r['fulltext']['p95_ms']:>9.2f} "
+              f"{r['ilike']['p50_ms']:>10.2f} {r['ilike']['p95_ms']:>10.2f}")
+    print("\nTimes in milliseconds.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ranked full-text service search")
+    parser.add_argument('--services', type=int, default=500000, help="seed the synthetic dataset up to this size first")
+    parser.add_argument('--runs', type=int, default=30, help="timed runs per query")
+    parser.add_argument('--no-seed', action='store_true', help="benchmark the database as it is")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    try:
+        if not args.no_seed:
+            seed(conn, services=args.services)
+        report = run(conn, args.runs)
+    finally:
+        conn.close()
+
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
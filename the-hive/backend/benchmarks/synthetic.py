@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Synthetic dataset for The Hive benchmarks
+Bulk-generates users, tags and services with SQL generate_series() so that
+hundreds of thousands of rows can be created in seconds. With --applications it also
+adds activity around them (applications, progress, messages, forum threads and
+comments, reports) for benchmarks of the non-search endpoints.
+Benchmark users are recognisable by their email (bench-user-N@hive.invalid), log in
+with BENCH_PASSWORD (see loadtest.py) and everything they own is removed again by
+cleanup().
+
+Usage:
+    python3 benchmarks/synthetic.py --services 500000
+    python3 benchmarks/synthetic.py --services 200000 --applications 200000
+    python3 benchmarks/synthetic.py --cleanup
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import conversations
+import db_pool
+import passwords
+from search import backfill_search_vectors
+
+BENCH_EMAIL_PATTERN = 'bench-user-%@hive.invalid'
+BENCH_FORUM_CATEGORY = 'Benchmark'
+BENCH_PASSWORD = 'bench-password'
+
+# Word pool for titles, descriptions and tags. Words are drawn with a skewed
+# distribution (earlier words are far more common) so searches cover both
+# very common and rare terms.
+VOCABULARY = [
+    'help', 'lesson', 'home', 'garden', 'cooking', 'english', 'math', 'repair', 'music', 'guitar',
+    'moving', 'cleaning', 'tutoring', 'computer', 'bike', 'painting', 'photography', 'yoga', 'language', 'writing',
+    'piano', 'spanish', 'python', 'resume', 'interview', 'baking', 'sewing', 'knitting', 'plumbing', 'electric',
+    'furniture', 'assembly', 'dog', 'walking', 'babysitting', 'elderly', 'shopping', 'delivery', 'car', 'washing',
+    'translation', 'german', 'french', 'chess', 'drawing', 'design', 'website', 'marketing', 'tax', 'accounting',
+    'fitness', 'running', 'swimming', 'dance', 'singing', 'violin', 'drums', 'recording', 'editing', 'video',
+    'smartphone', 'setup', 'printer', 'network', 'router', 'excel', 'presentation', 'essay', 'proofreading', 'history',
+    'physics', 'chemistry', 'biology', 'homework', 'exam', 'preparation', 'meditation', 'massage', 'haircut', 'makeup',
+    'jewelry', 'pottery', 'woodworking', 'carpentry', 'tiling', 'roofing', 'window', 'curtain', 'lamp', 'shelf',
+    'plants', 'composting', 'beekeeping', 'fishing', 'camping', 'hiking', 'map', 'travel', 'packing', 'storage',
+    'recipe', 'vegan', 'bread', 'pastry', 'coffee', 'tea', 'wine', 'cocktail', 'party', 'wedding',
+    'birthday', 'decoration', 'flowers', 'calligraphy', 'origami', 'crochet', 'embroidery', 'upholstery', 'restoration', 'antique',
+    'astronomy', 'telescope', 'robotics', 'arduino', 'raspberry', 'soldering', 'drone', 'kite', 'sailing', 'kayak',
+    'climbing', 'skating', 'skiing', 'snowboard', 'tennis', 'badminton', 'volleyball', 'football', 'basketball', 'coaching',
+    'mentoring', 'career', 'startup', 'pitch', 'negotiation', 'budget', 'savings', 'insurance', 'paperwork', 'visa',
+    'apartment', 'lease', 'neighbor', 'community', 'volunteer', 'charity', 'recycling', 'upcycling', 'thrift', 'mending',
+]
+
+TAG_WORDS = VOCABULARY[:120]
+
+
+def get_db_connection():
+    """Connection from the shared pool; falls back to the docker-compose port on localhost"""
+    return db_pool.connect(defaults={
+        'host': 'localhost',
+        'port': '5433',
+        'database': 'mydatabase',
+        'user': 'myuser',
+        'password': 'mypassword'
+    })
+
+
+def count_bench_services(cursor):
+    cursor.execute("""
+        SELECT COUNT(*) as count
+        FROM services s
+        JOIN users u ON s.user_id = u.id
+        WHERE u.email LIKE %s
+    """, (BENCH_EMAIL_PATTERN,))
+    return cursor.fetchone()['count']
+
+
+def seed_users(cursor, users):
+    """Benchmark users, all with BENCH_PASSWORD so the load test can log in as them"""
+    # Hashed at the server's cost, so logging in does not trigger a rehash
+    password_hash = passwords.PasswordHasher(workers=0).hash(BENCH_PASSWORD)
+    cursor.execute("""
+        INSERT INTO users (email, password_hash, first_name, last_name, is_verified, time_balance)
+        SELECT 'bench-user-' || g || '@hive.invalid', %s, 'Bench', 'User ' || g, TRUE, 5.0
+        FROM generate_series(1, %s) g
+        ON CONFLICT (email) DO UPDATE SET password_hash = EXCLUDED.password_hash
+    """, (password_hash, users))
+
+
+def seed_tags(cursor):
+    cursor.execute("""
+        INSERT INTO tags (name)
+        SELECT unnest(%s::text[])
+        ON CONFLICT (name) DO NOTHING
+    """, (TAG_WORDS,))
+
+
+def seed_services(cursor, count, start=1):
+    """Insert `count` services (and 1-3 tags each) for the benchmark users in one statement"""
+    cursor.execute("""
+        WITH owners AS (
+            SELECT array_agg(id) AS ids FROM users WHERE email LIKE %(pattern)s
+        ),
+        tag_pool AS (
+            SELECT array_agg(id) AS ids FROM tags WHERE name = ANY(%(tag_words)s::text[])
+        ),
+        new_services AS (
+            INSERT INTO services (
+                user_id, service_type, title, description, hours_required,
+                location_type, status, created_at, updated_at
+            )
+            SELECT
+                owners.ids[1 + (g %% array_length(owners.ids, 1))],
+                CASE WHEN g %% 2 = 0 THEN 'offer' ELSE 'need' END,
+                initcap((
+                    SELECT string_agg(words[1 + floor(power(random(), 2) * array_length(words, 1))::int], ' ')
+                    FROM generate_series(1, 3 + (g %% 4)), (SELECT %(words)s::text[] AS words) w
+                )),
+                (
+                    SELECT string_agg(words[1 + floor(power(random(), 1.5) * array_length(words, 1))::int], ' ')
+                    FROM generate_series(1, 20 + (g %% 40)), (SELECT %(words)s::text[] AS words) w
+                ),
+                1 + (g %% 3),
+                'online',
+                CASE
+                    WHEN g %% 20 < 14 THEN 'open'
+                    WHEN g %% 20 < 16 THEN 'in_progress'
+                    WHEN g %% 20 < 19 THEN 'completed'
+                    ELSE 'cancelled'
+                END,
+                NOW() - random() * INTERVAL '365 days',
+                NOW()
+            FROM generate_series(%(start)s, %(end)s) g, owners
+            RETURNING id
+        )
+        INSERT INTO service_tags (service_id, tag_id)
+        SELECT new_services.id, tag_pool.ids[1 + floor(random() * array_length(tag_pool.ids, 1))::int]
+        FROM new_services, tag_pool, generate_series(1, 1 + new_services.id %% 3)
+        ON CONFLICT DO NOTHING
+    """, {
+        'pattern': BENCH_EMAIL_PATTERN,
+        'tag_words': TAG_WORDS,
+        'words': VOCABULARY,
+        'start': start,
+        'end': start + count - 1
+    })
+
+
+def count_bench_applications(cursor):
+    cursor.execute("""
+        SELECT COUNT(*) as count
+        FROM service_applications sa
+        JOIN users u ON sa.applicant_id = u.id
+        WHERE u.email LIKE %s
+    """, (BENCH_EMAIL_PATTERN,))
+    return cursor.fetchone()['count']
+
+
+def seed_applications(cursor, count):
+    """
+    Apply benchmark users to `count` benchmark services that have no application yet.
+    A third of them are accepted and get a progress row (most of those completed),
+    and every application gets a short message thread.
+    """
+    cursor.execute("""
+        WITH owners AS (
+            SELECT array_agg(id ORDER BY id) AS ids FROM users WHERE email LIKE %(pattern)s
+        ),
+        targets AS (
+            SELECT s.id, s.user_id, s.service_type, s.hours_required, s.created_at,
+                   row_number() OVER (ORDER BY s.id) AS n
+            FROM services s
+            JOIN users u ON s.user_id = u.id
+            WHERE u.email LIKE %(pattern)s
+            AND NOT EXISTS (SELECT 1 FROM service_applications sa WHERE sa.service_id = s.id)
+            ORDER BY s.id
+            LIMIT %(count)s
+        ),
+        new_applications AS (
+            INSERT INTO service_applications (service_id, applicant_id, status, message, applied_at, updated_at)
+            SELECT t.id,
+                   CASE WHEN owners.ids[1 + pick.i] = t.user_id
+                        THEN owners.ids[1 + (pick.i + 1) %% array_length(owners.ids, 1)]
+                        ELSE owners.ids[1 + pick.i] END,
+                   CASE WHEN t.n %% 3 = 0 THEN 'accepted' WHEN t.n %% 3 = 1 THEN 'pending' ELSE 'rejected' END,
+                   'Benchmark application',
+                   t.created_at + random() * INTERVAL '3 days',
+                   NOW()
+            FROM targets t, owners
+            CROSS JOIN LATERAL (SELECT (t.n * 7) %% array_length(owners.ids, 1) AS i) pick
+            RETURNING id, service_id, applicant_id, status, applied_at
+        ),
+        new_progress AS (
+            INSERT INTO service_progress (
+                service_id, application_id, provider_id, consumer_id, hours, status,
+                completed_at, created_at, updated_at
+            )
+            SELECT a.service_id, a.id,
+                   CASE WHEN t.service_type = 'offer' THEN t.user_id ELSE a.applicant_id END,
+                   CASE WHEN t.service_type = 'offer' THEN a.applicant_id ELSE t.user_id END,
+                   t.hours_required,
+                   CASE WHEN a.id %% 5 < 3 THEN 'completed' WHEN a.id %% 5 = 3 THEN 'in_progress' ELSE 'awaiting_confirmation' END,
+                   CASE WHEN a.id %% 5 < 3 THEN a.applied_at + INTERVAL '7 days' END,
+                   a.applied_at + INTERVAL '1 day',
+                   a.applied_at + INTERVAL '7 days'
+            FROM new_applications a
+            JOIN targets t ON t.id = a.service_id
+            WHERE a.status = 'accepted'
+            RETURNING id
+        )
+        INSERT INTO messages (service_id, application_id, sender_id, receiver_id, message, is_read, created_at)
+        SELECT a.service_id, a.id,
+               CASE WHEN k %% 2 = 1 THEN a.applicant_id ELSE t.user_id END,
+               CASE WHEN k %% 2 = 1 THEN t.user_id ELSE a.applicant_id END,
+               'Benchmark message ' || k,
+               k < 3,
+               a.applied_at + k * INTERVAL '1 hour'
+        FROM new_applications a
+        JOIN targets t ON t.id = a.service_id
+        CROSS JOIN generate_series(1, 3) AS k
+    """, {'pattern': BENCH_EMAIL_PATTERN, 'count': count})
+
+
+def seed_community(cursor, threads):
+    """Forum threads (with comments) in a benchmark category, and some open reports"""
+    cursor.execute("""
+        INSERT INTO forum_categories (name, description)
+        VALUES (%s, 'Synthetic benchmark threads')
+        ON CONFLICT (name) DO NOTHING
+    """, (BENCH_FORUM_CATEGORY,))
+    cursor.execute("""
+        WITH owners AS (
+            SELECT array_agg(id) AS ids FROM users WHERE email LIKE %(pattern)s
+        ),
+        new_threads AS (
+            INSERT INTO forum_threads (category_id, user_id, title, content, is_pinned, created_at, updated_at)
+            SELECT (SELECT id FROM forum_categories WHERE name = %(category)s),
+                   owners.ids[1 + (g %% array_length(owners.ids, 1))],
+                   'Benchmark thread ' || g, 'Synthetic thread body', g %% 100 = 0,
+                   NOW() - random() * INTERVAL '365 days', NOW() - random() * INTERVAL '30 days'
+            FROM generate_series(1, %(threads)s) g, owners
+            RETURNING id, user_id, created_at
+        )
+        INSERT INTO forum_comments (thread_id, user_id, content, created_at)
+        SELECT t.id, t.user_id, 'Benchmark comment ' || k, t.created_at + k * INTERVAL '1 hour'
+        FROM new_threads t
+        CROSS JOIN generate_series(1, 5) AS k
+    """, {'pattern': BENCH_EMAIL_PATTERN, 'category': BENCH_FORUM_CATEGORY, 'threads': threads})
+    cursor.execute("""
+        WITH owners AS (
+            SELECT array_agg(id) AS ids FROM users WHERE email LIKE %(pattern)s
+        )
+        INSERT INTO reports (reporter_id, reported_user_id, content_type, reason, status, created_at)
+        SELECT owners.ids[1 + (g %% array_length(owners.ids, 1))],
+               owners.ids[1 + ((g + 1) %% array_length(owners.ids, 1))],
+               'user', 'Benchmark report',
+               CASE WHEN g %% 10 = 0 THEN 'open' ELSE 'resolved' END,
+               NOW() - random() * INTERVAL '365 days'
+        FROM generate_series(1, %(reports)s) g, owners
+    """, {'pattern': BENCH_EMAIL_PATTERN, 'reports': max(threads // 10, 1)})
+
+
+def seed_activity(conn, applications, batch_size=50000):
+    """Top benchmark applications up to `applications` (with the forum activity alongside)"""
+    cursor = conn.cursor()
+    existing = count_bench_applications(cursor)
+    missing = applications - existing
+    if missing <= 0:
+        print(f"Dataset already has {existing} benchmark applications")
+        cursor.close()
+        return 0
+
+    started = time.monotonic()
+    done = 0
+    while done < missing:
+        chunk = min(batch_size, missing - done)
+        seed_applications(cursor, chunk)
+        seed_community(cursor, max(chunk // 10, 1))
+        conn.commit()
+        done += chunk
+        print(f"  inserted {existing + done}/{applications} applications")
+
+    print("  building inbox summaries...")
+    conversations.backfill(cursor)
+    conn.commit()
+
+    conn.autocommit = True
+    for table in ('service_applications', 'service_progress', 'messages', 'conversation_summaries',
+                  'forum_threads', 'forum_comments', 'reports', 'users'):
+        cursor.execute(f"ANALYZE {table}")
+    conn.autocommit = False
+
+    cursor.close()
+    print(f"Seeded {done} applications in {time.monotonic() - started:.1f}s")
+    return done
+
+
+def seed(conn, services=500000, users=2000, batch_size=50000, applications=0):
+    """Top the benchmark dataset up to `services` rows; returns the number of services added"""
+    cursor = conn.cursor()
+    started = time.monotonic()
+    seed_users(cursor, users)
+    seed_tags(cursor)
+    conn.commit()
+
+    existing = count_bench_services(cursor)
+    missing = services - existing
+    if missing <= 0:
+        print(f"Dataset already has {existing} benchmark services")
+        cursor.close()
+        if applications:
+            seed_activity(conn, applications, batch_size)
+        return 0
+
+    done = 0
+    while done < missing:
+        chunk = min(batch_size, missing - done)
+        seed_services(cursor, chunk, start=existing + done + 1)
+        conn.commit()
+        done += chunk
+        print(f"  inserted {existing + done}/{services} services")
+
+    print("  building search vectors...")
+    backfill_search_vectors(cursor)
+    conn.commit()
+
+    # Fresh statistics so the planner sees the new row counts
+    conn.autocommit = True
+    cursor.execute("ANALYZE services")
+    cursor.execute("ANALYZE service_tags")
+    conn.autocommit = False
+
+    cursor.close()
+    print(f"Seeded {done} services in {time.monotonic() - started:.1f}s")
+    if applications:
+        seed_activity(conn, applications, batch_size)
+    return done
+
+
+def cleanup(conn):
+    """Delete the benchmark users; their services, tags links and progress rows cascade"""
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM users WHERE email LIKE %s", (BENCH_EMAIL_PATTERN,))
+    deleted = cursor.rowcount
+    cursor.execute("DELETE FROM forum_categories WHERE name = %s", (BENCH_FORUM_CATEGORY,))
+    conn.commit()
+    cursor.close()
+    print(f"Removed {deleted} benchmark users and their data")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate or remove the synthetic benchmark dataset")
+    parser.add_argument('--services', type=int, default=500000, help="total benchmark services to have")
+    parser.add_argument('--users', type=int, default=2000, help="benchmark users owning the services")
+    parser.add_argument('--applications', type=int, default=0,
+                        help="total benchmark applications (with progress, messages and forum activity)")
+    parser.add_argument('--batch-size', type=int, default=50000)
+    parser.add_argument('--cleanup', action='store_true', help="remove all benchmark data instead")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    try:
+        if args.cleanup:
+            cleanup(conn)
+        else:
+            seed(conn, services=args.services, users=args.users, batch_size=args.batch_size,
+                 applications=args.applications)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Build the local Wikidata taxonomy snapshot used for tag suggestions
+Reads a Wikidata JSON dump (latest-all.json[.gz|.bz2], one entity per line) in two passes:
+  1. collect P279/P366/P3095/P1056 edges between items and pick the skill- and
+     activity-like entities: everything that is a subclass (P279, transitively) of the
+     root classes, plus the entities they are directly related to;
+  2. collect English labels, descriptions and aliases for those entities only.
+The result is written as a compact gzip JSON file loaded by taxonomy.py.
+
+Usage:
+    python3 build_taxonomy.py latest-all.json.bz2
+    python3 build_taxonomy.py dump.json.gz --output data/taxonomy.json.gz --root Q1914636 --root Q205961
+"""
+
+import argparse
+import bz2
+import gzip
+import json
+import os
+import sys
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from taxonomy import FORMAT_VERSION, RELATIONS, TAXONOMY_PATH
+
+# Top-level classes whose subclasses are kept
+DEFAULT_ROOTS = [
+    'Q1914636',   # activity
+    'Q205961',    # skill
+    'Q47728',     # hobby
+    'Q28640',     # profession
+    'Q12737077',  # occupation
+    'Q349',       # sport
+    'Q2207288',   # craft
+    'Q7406919',   # service
+    'Q11862829',  # academic discipline
+    'Q34379',     # musical instrument
+    'Q39546',     # tool
+]
+
+
+def open_dump(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+def iter_entities(path, limit=None):
+    """Yield entity dicts from a dump; accepts the official array format and plain NDJSON"""
+    with open_dump(path) as f:
+        for count, line in enumerate(f):
+            if limit is not None and count >= limit:
+                break
+            line = line.strip().rstrip(',')
+            if not line or line in ('[', ']'):
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"  skipping malformed line {count + 1}")
+
+
+def item_number(entity_id):
+    if entity_id and entity_id[0] == 'Q' and entity_id[1:].isdigit():
+        return int(entity_id[1:])
+    return None
+
+
+def claim_targets(entity, prop):
+    """Numeric ids of the items a (non-deprecated) claim points to"""
+    for claim in entity.get('claims', {}).get(prop, ()):
+        if claim.get('rank') == 'deprecated':
+            continue
+        snak = claim.get('mainsnak', {})
+        if snak.get('snaktype') != 'value':
+            continue
+        value = snak.get('datavalue', {}).get('value')
+        if isinstance(value, dict) and value.get('entity-type') == 'item':
+            number = value.get('numeric-id') or item_number(value.get('id'))
+            if number:
+                yield number
+
+
+def collect_edges(path, limit=None):
+    """Pass 1: all item-to-item edges of the kept relations"""
+    edges = {prop: [] for prop in RELATIONS}
+    seen = 0
+    for entity in iter_entities(path, limit):
+        number = item_number(entity.get('id'))
+        if number is None:
+            continue
+        seen += 1
+        for prop in RELATIONS:
+            for target in claim_targets(entity, prop):
+                edges[prop].append((number, target))
+        if seen % 1_000_000 == 0:
+            print(f"  pass 1: {seen} items")
+    return edges, seen
+
+
+def select_entities(edges, roots):
+    """Subclass closure of the roots plus their direct neighbours over the kept relations"""
+    children = {}
+    for source, target in edges['P279']:
+        children.setdefault(target, []).append(source)
+
+    core = set(roots)
+    queue = deque(roots)
+    while queue:
+        for child in children.get(queue.popleft(), ()):
+            if child not in core:
+                core.add(child)
+                queue.append(child)
+
+    selected = set(core)
+    kept = {prop: [] for prop in RELATIONS}
+    for prop, pairs in edges.items():
+        for source, target in pairs:
+            if source in core or target in core:
+                kept[prop].append((source, target))
+                selected.add(source)
+                selected.add(target)
+    return selected, kept
+
+
+def collect_labels(path, selected, language='en', limit=None):
+    """Pass 2: label, description and aliases for the selected entities"""
+    nodes = {}
+    for entity in iter_entities(path, limit):
+        number = item_number(entity.get('id'))
+        if number not in selected:
+            continue
+        label = entity.get('labels', {}).get(language, {}).get('value')
+        if not label:
+            continue
+        description = entity.get('descriptions', {}).get(language, {}).get('value', '')
+        aliases = [alias['value'] for alias in entity.get('aliases', {}).get(language, ())]
+        nodes[number] = [number, label, description, aliases]
+    return nodes
+
+
+def build(dump_path, output_path, roots=None, language='en', limit=None):
+    started = time.monotonic()
+    roots = [item_number(root) for root in (roots or DEFAULT_ROOTS)]
+
+    print(f"Pass 1: reading edges from {dump_path}")
+    edges, items = collect_edges(dump_path, limit)
+    print(f"  {items} items, {sum(len(pairs) for pairs in edges.values())} edges")
+
+    selected, kept = select_entities(edges, roots)
+    del edges
+    print(f"  selected {len(selected)} skill/activity-like entities")
+
+    print("Pass 2: reading labels")
+    nodes = collect_labels(dump_path, selected, language, limit)
+
+    # Drop edges to entities without a label; they can never be shown as a suggestion
+    kept = {prop: [[s, t] for s, t in pairs if s in nodes and t in nodes] for prop, pairs in kept.items()}
+
+    snapshot = {
+        "version": FORMAT_VERSION,
+        "meta": {
+            "source": os.path.basename(dump_path),
+            "built_at": datetime.now(timezone.utc).isoformat(),
+            "roots": [f"Q{root}" for root in roots],
+            "language": language
+        },
+        "nodes": sorted(nodes.values()),
+        "edges": kept
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = output_path + '.tmp'
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        json.dump(snapshot, f, separators=(',', ':'), ensure_ascii=False)
+    os.replace(tmp_path, output_path)
+
+    edge_count = sum(len(pairs) for pairs in kept.values())
+    print(f"Wrote {len(nodes)} entities and {edge_count} edges to {output_path} "
+          f"({os.path.getsize(output_path) / 1024:.0f} KiB) in {time.monotonic() - started:.1f}s")
+    return snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the local Wikidata taxonomy snapshot")
+    parser.add_argument('dump', help="Wikidata JSON dump (.json, .json.gz or .json.bz2)")
+    parser.add_argument('--output', default=TAXONOMY_PATH, help=f"snapshot file (default {TAXONOMY_PATH})")
+    parser.add_argument('--root', action='append', help="root class Q-ID (repeatable, replaces the defaults)")
+    parser.add_argument('--language', default='en')
+    parser.add_argument('--limit', type=int, help="only read the first N lines of the dump (for testing)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.dump):
+        print(f"Dump file not found: {args.dump}")
+        sys.exit(1)
+
+    build(args.dump, args.output, roots=args.root, language=args.language, limit=args.limit)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+Per-participant conversation summaries for the messages inbox
+conversation_summaries holds one row per (application, participant) with the last message,
+message count and that participant's unread count, so GET /api/messages reads a single
+index range instead of aggregating the messages table for every application.
+Rows are kept current by record_message() and mark_read(); refresh_conversation()
+recomputes them from messages for the rare paths that change messages in other ways.
+"""
+
+# Recompute the summary rows of every application matched by {where} (both participants)
+_REFRESH_SQL = """
+    INSERT INTO conversation_summaries
+        (application_id, user_id, other_user_id, service_id, last_message_id, last_message,
+         last_message_at, message_count, unread_count, sort_at)
+    SELECT
+        sa.id,
+        p.user_id,
+        p.other_user_id,
+        s.id,
+        last.id,
+        last.message,
+        last.created_at,
+        counts.message_count,
+        (SELECT COUNT(*)
+         FROM messages m
+         WHERE m.application_id = sa.id
+         AND m.receiver_id = p.user_id
+         AND m.is_read = FALSE),
+        COALESCE(last.created_at, sa.applied_at, CURRENT_TIMESTAMP)
+    FROM service_applications sa
+    JOIN services s ON sa.service_id = s.id
+    CROSS JOIN LATERAL (
+        VALUES (sa.applicant_id, s.user_id), (s.user_id, sa.applicant_id)
+    ) AS p(user_id, other_user_id)
+    CROSS JOIN LATERAL (
+        SELECT COUNT(*) AS message_count FROM messages m WHERE m.application_id = sa.id
+    ) counts
+    LEFT JOIN LATERAL (
+        SELECT m.id, m.message, m.created_at
+        FROM messages m
+        WHERE m.application_id = sa.id
+        ORDER BY m.id DESC
+        LIMIT 1
+    ) last ON TRUE
+    WHERE ({where})
+    AND (p.user_id <> p.other_user_id OR p.user_id = sa.applicant_id)
+    ON CONFLICT (application_id, user_id) DO UPDATE SET
+        other_user_id = EXCLUDED.other_user_id,
+        service_id = EXCLUDED.service_id,
+        last_message_id = EXCLUDED.last_message_id,
+        last_message = EXCLUDED.last_message,
+        last_message_at = EXCLUDED.last_message_at,
+        message_count = EXCLUDED.message_count,
+        unread_count = EXCLUDED.unread_count,
+        sort_at = EXCLUDED.sort_at
+"""
+
+
+def backfill(cursor):
+    """Build summaries for applications that have none yet; returns the number of rows written"""
+    cursor.execute(_REFRESH_SQL.format(where="""
+        NOT EXISTS (SELECT 1 FROM conversation_summaries cs WHERE cs.application_id = sa.id)
+    """))
+    return cursor.rowcount
+
+
+def refresh_conversation(cursor, application_id):
+    """Recompute both participants' summaries of one application from its messages"""
+    cursor.execute(_REFRESH_SQL.format(where="sa.id = %(application_id)s"),
+                   {"application_id": application_id})
+
+
+def record_message(cursor, application_id, message_id):
+    """
+    Fold a newly inserted message into the summaries of its application.
+    Call in the same transaction as the INSERT INTO messages.
+    """
+    if not application_id:
+        return  # direct (admin) messages are not part of any conversation
+
+    cursor.execute("""
+        UPDATE conversation_summaries cs
+        SET message_count = cs.message_count + 1,
+            unread_count = cs.unread_count
+                + CASE WHEN cs.user_id = m.receiver_id AND NOT COALESCE(m.is_read, FALSE) THEN 1 ELSE 0 END,
+            last_message_id = GREATEST(cs.last_message_id, m.id),
+            last_message = CASE WHEN m.id > COALESCE(cs.last_message_id, 0)
+                                THEN m.message ELSE cs.last_message END,
+            last_message_at = CASE WHEN m.id > COALESCE(cs.last_message_id, 0)
+                                   THEN m.created_at ELSE cs.last_message_at END,
+            sort_at = GREATEST(cs.sort_at, m.created_at)
+        FROM messages m
+        WHERE m.id = %s AND cs.application_id = m.application_id
+    """, (message_id,))
+
+    if cursor.rowcount == 0:
+        # First message of an application created before summaries existed
+        refresh_conversation(cursor, application_id)
+
+
+def mark_read(cursor, application_id, user_id):
+    """
+    Mark the messages `user_id` received in an application as read.
+    Only unread rows are touched (and get a new updated_at, which delivers the read
+    receipt to the sender's next sync); returns how many were marked.
+    """
+    cursor.execute("""
+        UPDATE messages
+        SET is_read = TRUE,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE application_id = %s AND receiver_id = %s AND is_read = FALSE
+    """, (application_id, user_id))
+    marked = cursor.rowcount
+
+    if marked:
+        cursor.execute("""
+            UPDATE conversation_summaries
+            SET unread_count = 0
+            WHERE application_id = %s AND user_id = %s
+        """, (application_id, user_id))
+    return marked
+
+
+def inbox_page(cursor, user_id, limit, after=None):
+    """
+    One page of a user's conversations, newest activity first.
+    `after` is the (sort_at, application_id) of the last row of the previous page.
+    Fetches limit + 1 rows so the caller can tell whether there is a next page.
+    """
+    keyset = ""
+    params = [user_id]
+    if after:
+        keyset = "AND (cs.sort_at, cs.application_id) < (%s, %s)"
+        params.extend(after)
+    params.append(limit + 1)
+
+    cursor.execute(f"""
+        SELECT
+            cs.application_id,
+            s.id as service_id,
+            s.title as service_title,
+            s.service_type,
+            s.hours_required,
+            sa.status as application_status,
+            sa.applied_at as application_date,
+            sp.status as progress_status,
+            sp.hours as transaction_hours,
+            other.id as other_user_id,
+            other.first_name || ' ' || other.last_name as other_user_name,
+            other.profile_photo as other_user_photo,
+            cs.unread_count,
+            cs.last_message,
+            cs.last_message_at as last_message_time,
+            cs.message_count,
+            cs.sort_at
+        FROM conversation_summaries cs
+        JOIN service_applications sa ON cs.application_id = sa.id
+        JOIN services s ON cs.service_id = s.id
+        JOIN users other ON cs.other_user_id = other.id
+        LEFT JOIN service_progress sp ON cs.application_id = sp.application_id
+        WHERE cs.user_id = %s
+        {keyset}
+        ORDER BY cs.sort_at DESC, cs.application_id DESC
+        LIMIT %s
+    """, params)
+    return cursor.fetchall()
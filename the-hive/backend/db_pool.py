@@ -0,0 +1,343 @@
+"""
+Database connection pool for The Hive
+Keeps a bounded set of open psycopg2 connections and hands them out per request,
+so handlers no longer pay for a new TCP/TLS handshake and authentication on every call.
+"""
+import os
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+
+import query_stats
+
+
+class PoolTimeoutError(psycopg2.OperationalError):
+    """Raised when no connection could be borrowed within the configured timeout"""
+
+
+def connection_params(defaults=None, use_database_url=True):
+    """
+    Build psycopg2.connect() keyword arguments from the environment.
+    DATABASE_URL (DigitalOcean/Production) wins over the individual POSTGRES_* variables;
+    `defaults` fills in POSTGRES_* values that are not set (used by the reset scripts).
+    """
+    database_url = os.environ.get('DATABASE_URL') if use_database_url else None
+    if database_url:
+        return {"dsn": database_url, "cursor_factory": query_stats.cursor_factory()}
+
+    defaults = defaults or {}
+    params = {
+        "host": os.environ.get("POSTGRES_HOST", defaults.get("host")),
+        "port": os.environ.get("POSTGRES_PORT", defaults.get("port")),
+        "database": os.environ.get("POSTGRES_DB", defaults.get("database")),
+        "user": os.environ.get("POSTGRES_USER", defaults.get("user")),
+        "password": os.environ.get("POSTGRES_PASSWORD", defaults.get("password")),
+        "sslmode": os.environ.get("POSTGRES_SSLMODE", defaults.get("sslmode")),
+        "cursor_factory": query_stats.cursor_factory()
+    }
+    return {key: value for key, value in params.items() if value is not None}
+
+
+class ConnectionPool:
+    """
+    Thread-safe, blocking connection pool.
+    Borrowers wait (up to `timeout` seconds) when all `maxconn` connections are in use,
+    and every borrowed connection is health-checked before it is handed out.
+    """
+
+    def __init__(self, connect_kwargs, minconn=1, maxconn=10, timeout=30.0, health_check_interval=30.0):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Invalid pool size: need 0 <= minconn <= maxconn and maxconn >= 1")
+
+        self.connect_kwargs = connect_kwargs
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        self._lock = threading.Condition(threading.Lock())
+        self._idle = []          # [(connection, returned_at)]
+        self._in_use = set()     # ids of borrowed connections
+        self._size = 0           # open connections (idle + in use + being opened)
+        self._closed = False
+
+        # Metrics
+        self._waiters = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._health_check_failures = 0
+        self._connections_opened = 0
+
+        for _ in range(minconn):
+            self._size += 1
+            try:
+                conn = self._open()
+            except Exception:
+                self._size -= 1
+                raise
+            self._idle.append((conn, time.monotonic()))
+
+    def _open(self):
+        conn = psycopg2.connect(**self.connect_kwargs)
+        self._connections_opened += 1
+        return conn
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, idle_since):
+        """Cheap checks first; only round-trip to the server if the connection sat idle a while"""
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if time.monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def getconn(self, timeout=None):
+        """Borrow a connection, waiting for one to be returned if the pool is exhausted"""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise psycopg2.InterfaceError("Connection pool is closed")
+
+                while not self._idle and self._size >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(
+                            f"Timed out after {timeout}s waiting for a database connection "
+                            f"({self.maxconn} in use)"
+                        )
+                    self._waiters += 1
+                    try:
+                        self._lock.wait(remaining)
+                    finally:
+                        self._waiters -= 1
+
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                else:
+                    conn, idle_since = None, None
+                    self._size += 1
+
+            # Open or validate outside the lock so slow network calls don't block other borrowers
+            if conn is None:
+                try:
+                    conn = self._open()
+                except Exception:
+                    with self._lock:
+                        self._size -= 1
+                        self._lock.notify()
+                    raise
+            elif not self._is_healthy(conn, idle_since):
+                self._discard(conn)
+                with self._lock:
+                    self._health_check_failures += 1
+                    self._size -= 1
+                    self._lock.notify()
+                continue
+
+            waited = time.monotonic() - started
+            with self._lock:
+                self._in_use.add(id(conn))
+                self._checkouts += 1
+                self._wait_time_total += waited
+                self._wait_time_max = max(self._wait_time_max, waited)
+            return conn
+
+    def putconn(self, conn, close=False):
+        """Return a borrowed connection; any open transaction is rolled back"""
+        if not close and not conn.closed:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+            except Exception:
+                close = True
+
+        with self._lock:
+            self._in_use.discard(id(conn))
+            if close or conn.closed or self._closed:
+                self._size -= 1
+                discard = True
+            else:
+                self._idle.append((conn, time.monotonic()))
+                discard = False
+            self._lock.notify()
+
+        if discard:
+            self._discard(conn)
+
+    def closeall(self):
+        """Close idle connections and refuse new checkouts"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._lock.notify_all()
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        """Snapshot of pool usage for /api/health"""
+        with self._lock:
+            checkouts = self._checkouts
+            return {
+                "size": self._size,
+                "min_size": self.minconn,
+                "max_size": self.maxconn,
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "waiters": self._waiters,
+                "checkouts": checkouts,
+                "timeouts": self._timeouts,
+                "health_check_failures": self._health_check_failures,
+                "connections_opened": self._connections_opened,
+                "wait_time_ms": {
+                    "total": round(self._wait_time_total * 1000, 2),
+                    "avg": round(self._wait_time_total * 1000 / checkouts, 3) if checkouts else 0.0,
+                    "max": round(self._wait_time_max * 1000, 2)
+                }
+            }
+
+
+class PooledConnection:
+    """
+    Proxy around a borrowed psycopg2 connection.
+    close() hands the connection back to the pool instead of closing the socket;
+    when the connection is bound to a Flask request, close() is deferred to request teardown.
+    """
+
+    def __init__(self, pool, conn, request_scoped=False):
+        self._pool = pool
+        self._conn = conn
+        self._request_scoped = request_scoped
+
+    def __getattr__(self, name):
+        conn = self.__dict__.get('_conn')
+        if conn is None:
+            raise psycopg2.InterfaceError("connection already returned to the pool")
+        return getattr(conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._conn.commit()
+        else:
+            self._conn.rollback()
+        self.close()
+
+    @property
+    def raw(self):
+        return self._conn
+
+    def close(self):
+        if self._conn is None:
+            return
+        if self._request_scoped:
+            # Keep the connection for the rest of the request, but drop uncommitted work
+            # exactly like closing a dedicated connection would
+            if self._conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                self._conn.rollback()
+            return
+        conn, self._conn = self._conn, None
+        self._pool.putconn(conn)
+
+    def release(self):
+        """Return the connection to the pool regardless of request binding"""
+        self._request_scoped = False
+        self.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(defaults=None, use_database_url=True):
+    """Return the process-wide pool, creating it from the environment on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    connection_params(defaults, use_database_url),
+                    minconn=int(os.environ.get('DB_POOL_MIN_SIZE', 1)),
+                    maxconn=int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+                    timeout=float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+                    health_check_interval=float(os.environ.get('DB_POOL_HEALTH_CHECK_INTERVAL', 30))
+                )
+    return _pool
+
+
+def close_pool():
+    """Close the process-wide pool (used after fork and at shutdown)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+def pool_stats():
+    """Pool metrics, or None if the pool has not been created yet"""
+    return _pool.stats() if _pool is not None else None
+
+
+def connect(defaults=None, use_database_url=True):
+    """Borrow a connection outside a request (scripts, background jobs); close() returns it"""
+    pool = get_pool(defaults, use_database_url)
+    return PooledConnection(pool, pool.getconn())
+
+
+def get_request_connection():
+    """Borrow one connection per Flask request; it is returned in teardown even if the handler raised"""
+    from flask import g
+
+    conn = g.get('_db_conn')
+    if conn is None:
+        pool = get_pool()
+        conn = PooledConnection(pool, pool.getconn(), request_scoped=True)
+        g._db_conn = conn
+    return conn
+
+
+def release_request_connection():
+    """
+    Return the request's connection to the pool now, for handlers that go on to wait
+    without needing the database; a later get_request_connection() borrows again
+    """
+    from flask import g
+
+    conn = g.pop('_db_conn', None)
+    if conn is not None:
+        conn.release()
+
+
+def init_app(app):
+    """Register request teardown so borrowed connections always go back to the pool"""
+
+    @app.teardown_appcontext
+    def _return_request_connection(exc):
+        release_request_connection()
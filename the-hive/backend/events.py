@@ -0,0 +1,461 @@
+"""
+Real-time events for The Hive (served as Server-Sent Events on /api/events)
+Write paths publish small JSON events with pg_notify() inside their transaction, so an
+event is delivered only if the change commits. Every worker process runs one EventHub
+that fans each event out to the open streams of the users it is addressed to. Events
+carry ids and statuses only; clients fetch the details they need (e.g. a message sync)
+when an event arrives.
+
+Notifications reach a worker through its Listener: one dedicated LISTEN connection per
+process that dispatches by channel, shared with the auth status snapshot (auth.py) and
+the response cache (response_cache.py).
+
+EventSource cannot send an Authorization header, so browsers trade their access token
+for a single-use ticket (POST /api/events/ticket) and open the stream with that; the
+token itself never appears in a URL. A stream ends with an "expired" event when the
+access token it was opened with expires (the client opens a new one with a fresh
+token) and with a "closed" event when the account is banned or deactivated, which is
+checked at every heartbeat.
+"""
+import hashlib
+import json
+import os
+import queue
+import secrets
+import select
+import threading
+import time
+
+import psycopg2
+
+import db_pool
+
+CHANNEL = 'hive_events'
+
+# Comment line sent on idle streams so proxies keep them open and dead clients are noticed
+HEARTBEAT_INTERVAL = float(os.environ.get('EVENTS_HEARTBEAT_INTERVAL', 25))
+# Events buffered per stream; a client that falls further behind gets a "resync" instead
+QUEUE_SIZE = int(os.environ.get('EVENTS_QUEUE_SIZE', 100))
+# Open streams per worker process
+MAX_SUBSCRIBERS = int(os.environ.get('EVENTS_MAX_SUBSCRIBERS', 5000))
+# Seconds in which a stream ticket must be used
+TICKET_TTL = int(os.environ.get('EVENTS_TICKET_TTL', 30))
+# Reconnect delay (seconds, doubled up to the maximum) when the LISTEN connection drops
+RECONNECT_DELAY = 1.0
+RECONNECT_MAX_DELAY = 30.0
+# Seconds between the listener's ticks (and checks for a stop request)
+POLL_TIMEOUT = 5.0
+
+
+class HubFullError(Exception):
+    """Raised when a worker already serves MAX_SUBSCRIBERS streams"""
+
+
+def publish(cursor, user_ids, event_type, **data):
+    """Queue an event for `user_ids`; it is sent when the cursor's transaction commits"""
+    users = sorted({user_id for user_id in user_ids if user_id})
+    if not users:
+        return
+    payload = json.dumps({"users": users, "type": event_type, "data": data},
+                         default=str, separators=(',', ':'))
+    cursor.execute("SELECT pg_notify(%s, %s)", (CHANNEL, payload))
+
+
+def publish_progress(cursor, progress_id, event_type='progress', **data):
+    """Tell both parties of a service progress row about its current status"""
+    cursor.execute("""
+        SELECT id, application_id, service_id, provider_id, consumer_id, status
+        FROM service_progress
+        WHERE id = %s
+    """, (progress_id,))
+    progress = cursor.fetchone()
+    if progress:
+        publish(cursor, (progress['provider_id'], progress['consumer_id']), event_type,
+                progress_id=progress['id'], application_id=progress['application_id'],
+                service_id=progress['service_id'], status=progress['status'], **data)
+
+
+def publish_progress_batch(cursor, progress_ids, event_type='progress', **data):
+    """publish_progress() for many progress rows with a single statement"""
+    if not progress_ids:
+        return
+    cursor.execute("""
+        SELECT pg_notify(%(channel)s, json_build_object(
+            'users', json_build_array(sp.provider_id, sp.consumer_id),
+            'type', %(type)s,
+            'data', json_build_object(
+                'progress_id', sp.id,
+                'application_id', sp.application_id,
+                'service_id', sp.service_id,
+                'status', sp.status
+            )::jsonb || %(extra)s::jsonb
+        )::text)
+        FROM service_progress sp
+        WHERE sp.id = ANY(%(ids)s)
+    """, {"channel": CHANNEL, "type": event_type, "extra": json.dumps(data), "ids": list(progress_ids)})
+
+
+def publish_application(cursor, application_id, event_type, **data):
+    """Tell the applicant and the service owner of an application about a change"""
+    cursor.execute("""
+        SELECT sa.applicant_id, s.user_id as service_owner_id, sa.service_id
+        FROM service_applications sa
+        JOIN services s ON sa.service_id = s.id
+        WHERE sa.id = %s
+    """, (application_id,))
+    application = cursor.fetchone()
+    if application:
+        publish(cursor, (application['applicant_id'], application['service_owner_id']), event_type,
+                application_id=application_id, service_id=application['service_id'], **data)
+
+
+def _ticket_hash(ticket):
+    return hashlib.sha256(ticket.encode('utf-8')).hexdigest()
+
+
+def create_ticket(cursor, user_id, lifetime):
+    """
+    Single-use ticket opening one stream for the user within TICKET_TTL seconds; the
+    stream lasts `lifetime` seconds (what is left of the access token it was issued for)
+    """
+    ticket = secrets.token_urlsafe(32)
+    cursor.execute("""
+        INSERT INTO event_tickets (ticket_hash, user_id, expires_at, access_expires_at)
+        VALUES (%s, %s, NOW() + make_interval(secs => %s), NOW() + make_interval(secs => %s))
+    """, (_ticket_hash(ticket), user_id, TICKET_TTL, lifetime))
+    return ticket
+
+
+def redeem_ticket(cursor, ticket):
+    """Use up a ticket: (user id, seconds the stream may stay open), or None if it is not valid"""
+    cursor.execute("""
+        DELETE FROM event_tickets
+        WHERE ticket_hash = %s AND expires_at > NOW()
+        RETURNING user_id, EXTRACT(EPOCH FROM access_expires_at - NOW()) AS lifetime
+    """, (_ticket_hash(ticket),))
+    row = cursor.fetchone()
+    if row is None or row['lifetime'] <= 0:
+        return None
+    return row['user_id'], float(row['lifetime'])
+
+
+def purge_tickets(cursor):
+    """Delete tickets that were never used"""
+    cursor.execute("DELETE FROM event_tickets WHERE expires_at < NOW()")
+    return cursor.rowcount
+
+
+def format_event(event_type, data):
+    """One SSE frame"""
+    return f"event: {event_type}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class Subscriber:
+    """One open event stream of one user"""
+
+    def __init__(self, user_id, maxsize=QUEUE_SIZE):
+        self.user_id = user_id
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._overflowed = False
+
+    def put(self, event):
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except queue.Full:
+            self._overflowed = True
+            return False
+
+    def get(self, timeout):
+        """Next event, or a resync event if some were dropped; raises queue.Empty on timeout"""
+        if self._overflowed:
+            self._overflowed = False
+            with self._queue.mutex:
+                self._queue.queue.clear()
+            return {"type": "resync", "data": {}}
+        return self._queue.get(timeout=timeout)
+
+
+class Listener:
+    """
+    The worker's LISTEN connection, shared by everything that follows notifications.
+    Consumers add a handler for their channel plus callbacks for when it is being
+    listened on (`on_connect(reconnected)`) and when the connection is lost
+    (`on_disconnect()`); notifications sent in between are gone, so a consumer drops or
+    resyncs whatever it derived from them. `on_tick()` runs every POLL_TIMEOUT seconds
+    while the channel is listened on.
+    """
+
+    def __init__(self, connect_kwargs=None):
+        self.connect_kwargs = connect_kwargs
+        self.connected = False
+        self._handlers = {}
+        # Channels listened on by an earlier connection
+        self._heard = set()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        # Wakes the thread from select() so channels added later are listened on at once
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        os.set_blocking(self._wakeup_write, False)
+        self._stats = {"notifications": 0, "reconnects": 0}
+
+    def add(self, channel, on_notify, on_connect=None, on_disconnect=None, on_tick=None):
+        with self._lock:
+            if channel in self._handlers:
+                raise ValueError(f"Channel {channel} already has a handler")
+            self._handlers[channel] = (on_notify, on_connect, on_disconnect, on_tick)
+        self._wake()
+        return self
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name='listener', daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        self._wake()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+
+    def _wake(self):
+        try:
+            os.write(self._wakeup_write, b'.')
+        except BlockingIOError:
+            pass
+
+    @staticmethod
+    def _call(callback, *args):
+        # One consumer's bug must not take the connection down for the others
+        try:
+            callback(*args)
+        except Exception as e:
+            print(f"Listener callback {callback.__qualname__} failed: {e}")
+
+    def _listen(self, conn, listening):
+        """LISTEN on the channels added since the connection was made"""
+        with self._lock:
+            pending = [(channel, handlers[1]) for channel, handlers in self._handlers.items()
+                       if channel not in listening]
+        for channel, on_connect in pending:
+            cursor = conn.cursor()
+            cursor.execute(f"LISTEN {channel};")
+            cursor.close()
+            listening.add(channel)
+            if on_connect is not None:
+                self._call(on_connect, channel in self._heard)
+            self._heard.add(channel)
+
+    def _tick(self, listening):
+        with self._lock:
+            ticks = [self._handlers[channel][3] for channel in listening]
+        for on_tick in ticks:
+            if on_tick is not None:
+                self._call(on_tick)
+
+    def _dispatch(self, notify):
+        handlers = self._handlers.get(notify.channel)
+        if handlers is not None:
+            self._stats["notifications"] += 1
+            self._call(handlers[0], notify.payload)
+
+    def _run(self):
+        delay = RECONNECT_DELAY
+        first = True
+        while not self._stopping.is_set():
+            conn = None
+            listening = set()
+            try:
+                conn = psycopg2.connect(**(self.connect_kwargs or db_pool.connection_params()))
+                conn.autocommit = True
+                self.connected = True
+                delay = RECONNECT_DELAY
+                if not first:
+                    self._stats["reconnects"] += 1
+                first = False
+
+                next_tick = time.monotonic() + POLL_TIMEOUT
+                while not self._stopping.is_set():
+                    self._listen(conn, listening)
+                    readable = select.select([conn, self._wakeup_read], [], [], POLL_TIMEOUT)[0]
+                    if self._wakeup_read in readable:
+                        os.read(self._wakeup_read, 1024)
+                    if conn in readable:
+                        conn.poll()
+                        while conn.notifies:
+                            self._dispatch(conn.notifies.pop(0))
+                    if time.monotonic() >= next_tick:
+                        next_tick = time.monotonic() + POLL_TIMEOUT
+                        self._tick(listening)
+            except (psycopg2.Error, OSError) as e:
+                print(f"Listener connection lost: {e}")
+            finally:
+                self.connected = False
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except psycopg2.Error:
+                        pass
+                with self._lock:
+                    lost = [self._handlers[channel][2] for channel in listening]
+                for on_disconnect in lost:
+                    if on_disconnect is not None:
+                        self._call(on_disconnect)
+            self._stopping.wait(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    def stats(self):
+        with self._lock:
+            channels = sorted(self._handlers)
+        return {"listening": self.connected, "channels": channels, **self._stats}
+
+
+class EventHub:
+    """Routes notifications on CHANNEL to subscribers"""
+
+    def __init__(self, channel=CHANNEL, max_subscribers=MAX_SUBSCRIBERS):
+        self.channel = channel
+        self.max_subscribers = max_subscribers
+        self.connected = False
+        self._subscribers = {}
+        self._count = 0
+        self._lock = threading.Lock()
+        self._stats = {"delivered": 0, "dropped": 0, "reconnects": 0}
+
+    def start(self, listener=None):
+        """Follow CHANNEL on `listener` (the worker's, by default)"""
+        (listener or get_listener()).add(self.channel, self.dispatch, self._connected, self._disconnected)
+        return self
+
+    def _connected(self, reconnected):
+        self.connected = True
+        if reconnected:
+            # Anything published while we were disconnected is lost; clients refetch
+            self._stats["reconnects"] += 1
+            self._broadcast({"type": "resync", "data": {}})
+
+    def _disconnected(self):
+        self.connected = False
+
+    def subscribe(self, user_id):
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                raise HubFullError("Too many open event streams")
+            subscriber = Subscriber(user_id)
+            self._subscribers.setdefault(user_id, set()).add(subscriber)
+            self._count += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            streams = self._subscribers.get(subscriber.user_id)
+            if streams and subscriber in streams:
+                streams.discard(subscriber)
+                self._count -= 1
+                if not streams:
+                    del self._subscribers[subscriber.user_id]
+
+    def dispatch(self, payload):
+        """Route one raw notification payload"""
+        try:
+            event = json.loads(payload)
+            users = event.pop('users')
+        except (ValueError, KeyError, TypeError):
+            print(f"Ignoring malformed event payload: {payload[:200]}")
+            return
+
+        with self._lock:
+            targets = [subscriber for user_id in users for subscriber in self._subscribers.get(user_id, ())]
+        for subscriber in targets:
+            if subscriber.put(event):
+                self._stats["delivered"] += 1
+            else:
+                self._stats["dropped"] += 1
+
+    def _broadcast(self, event):
+        with self._lock:
+            targets = [subscriber for streams in self._subscribers.values() for subscriber in streams]
+        for subscriber in targets:
+            subscriber.put(event)
+
+    def stream(self, subscriber, heartbeat=HEARTBEAT_INTERVAL, lifetime=None, check=None):
+        """
+        SSE body for one subscriber; unsubscribes when the client goes away.
+        Ends with an "expired" event after `lifetime` seconds, and with a "closed" event
+        carrying the error when `check()` (run every `heartbeat` seconds) returns one.
+        """
+        deadline = time.monotonic() + lifetime if lifetime is not None else None
+        next_check = time.monotonic() + heartbeat
+        try:
+            yield "retry: 5000\n\n"
+            yield format_event('ready', {"connected": self.connected})
+            while True:
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    yield format_event('expired', {})
+                    return
+                if now >= next_check:
+                    next_check = now + heartbeat
+                    error = check() if check is not None else None
+                    if error:
+                        yield format_event('closed', error)
+                        return
+                try:
+                    event = subscriber.get(timeout=min(next_check, deadline or next_check) - now)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_event(event['type'], event.get('data', {}))
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self):
+        with self._lock:
+            subscribers = self._count
+            users = len(self._subscribers)
+        return {
+            "listening": self.connected,
+            "subscribers": subscribers,
+            "users": users,
+            **self._stats
+        }
+
+
+_listener = None
+_hub = None
+_lock = threading.Lock()
+
+
+def get_listener():
+    """The process-wide LISTEN connection, started on first use (i.e. after gunicorn has forked)"""
+    global _listener
+    if _listener is None:
+        with _lock:
+            if _listener is None:
+                _listener = Listener().start()
+    return _listener
+
+
+def get_hub():
+    """The process-wide hub"""
+    global _hub
+    if _hub is None:
+        listener = get_listener()
+        with _lock:
+            if _hub is None:
+                _hub = EventHub().start(listener)
+    return _hub
+
+
+def hub_stats():
+    """Stream and delivery counters, or None if no stream was opened in this process"""
+    return _hub.stats() if _hub is not None else None
+
+
+def listener_stats():
+    """State of the LISTEN connection, or None if nothing has used it in this process"""
+    return _listener.stats() if _listener is not None else None
@@ -0,0 +1,38 @@
+"""
+Gunicorn settings for The Hive
+gevent workers serve each request on a greenlet, so thousands of idle /api/events
+streams cost a little memory each instead of a worker thread. psycopg2 is made
+cooperative (psycogreen) so a slow query only blocks its own greenlet.
+
+Each worker also starts a job scheduler (see scheduler.py): the advisory lock lets one
+of them lead and the others take over if its worker goes away. Deployments that run
+`python3 scheduler.py` as its own process can set SCHEDULER_IN_WORKERS=false.
+"""
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+# Concurrent connections (requests and open event streams) per gevent worker
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 2000))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+scheduler_in_workers = os.environ.get('SCHEDULER_IN_WORKERS', 'true').lower() == 'true'
+
+
+def post_fork(server, worker):
+    if worker_class == 'gevent':
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+
+
+def post_worker_init(worker):
+    # After post_fork and gevent's patching, so the scheduler thread is a greenlet
+    if scheduler_in_workers:
+        import scheduler
+        scheduler.Scheduler().start()
+
+
+def on_starting(server):
+    # Once in the master, before workers fork: a version check, or the pending migrations
+    import migrate
+    migrate.startup()
@@ -0,0 +1,231 @@
+"""
+Double-entry ledger for time credits
+Every movement of hours is one time_transactions row with balanced time_ledger_entries
+(the amounts of a transaction sum to zero). Entries without a user belong to the community
+account, which issues adjustments. users.time_balance is a cached projection:
+opening_balance plus the user's entries, and can be rebuilt from the ledger at any time.
+
+transfer() is the only way hours move between users. It is idempotent on its key
+(e.g. one completion transfer per service progress) and locks both accounts in id
+order, so concurrent transfers between the same users cannot deadlock.
+"""
+from decimal import Decimal
+
+# Hours are stored with two decimals (DECIMAL(10,2)) like users.time_balance
+_CENT = Decimal('0.01')
+
+
+class LedgerError(Exception):
+    """Raised for transfers that can never be valid (bad amount, unknown account)"""
+
+
+def _hours(value):
+    hours = Decimal(str(value)).quantize(_CENT)
+    if hours <= 0:
+        raise LedgerError(f"Transfer amount must be positive, got {value}")
+    return hours
+
+
+def progress_key(progress_id):
+    """Idempotency key of the completion transfer of a service progress"""
+    return f"progress:{progress_id}"
+
+
+def _lock_accounts(cursor, user_ids):
+    """Row-lock the users in id order; returns {id: time_balance}"""
+    cursor.execute("""
+        SELECT id, time_balance
+        FROM users
+        WHERE id = ANY(%s)
+        ORDER BY id
+        FOR UPDATE
+    """, (sorted(set(user_ids)),))
+    return {row['id']: row['time_balance'] for row in cursor.fetchall()}
+
+
+def _post(cursor, kind, hours, entries, idempotency_key=None, progress_id=None, memo=None):
+    """
+    Record a transaction with its entries and apply them to the cached balances.
+    Returns the transaction id, or None if `idempotency_key` was already used.
+    """
+    cursor.execute("""
+        INSERT INTO time_transactions (kind, idempotency_key, progress_id, hours, memo)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (idempotency_key) DO NOTHING
+        RETURNING id
+    """, (kind, idempotency_key, progress_id, hours, memo))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    transaction_id = row['id']
+
+    values = []
+    params = []
+    for user_id, amount in entries:
+        values.append("(%s, %s, %s)")
+        params.extend((transaction_id, user_id, amount))
+    cursor.execute(f"""
+        INSERT INTO time_ledger_entries (transaction_id, user_id, amount)
+        VALUES {', '.join(values)}
+    """, params)
+
+    for user_id, amount in entries:
+        if user_id is not None:
+            cursor.execute("""
+                UPDATE users
+                SET time_balance = time_balance + %s
+                WHERE id = %s
+            """, (amount, user_id))
+    return transaction_id
+
+
+def transfer(cursor, from_user_id, to_user_id, hours, idempotency_key, progress_id=None, memo=None):
+    """
+    Move `hours` from one user to another inside the caller's transaction.
+    Returns the transaction id, or None when a transfer with this key already exists
+    (the caller can treat that as success: the hours moved exactly once).
+    """
+    hours = _hours(hours)
+    if from_user_id == to_user_id:
+        raise LedgerError("Cannot transfer hours to the same account")
+
+    accounts = _lock_accounts(cursor, (from_user_id, to_user_id))
+    if len(accounts) != 2:
+        raise LedgerError("Unknown account in transfer")
+
+    return _post(cursor, 'service', hours, [(from_user_id, -hours), (to_user_id, hours)],
+                 idempotency_key=idempotency_key, progress_id=progress_id, memo=memo)
+
+
+def transfer_for_progress(cursor, progress):
+    """Completion transfer of a service progress row (consumer pays provider); idempotent"""
+    return transfer(cursor, progress['consumer_id'], progress['provider_id'], progress['hours'],
+                    idempotency_key=progress_key(progress['id']), progress_id=progress['id'],
+                    memo="Service completed")
+
+
+def settle_progress_batch(cursor, progress_ids, memo="Service completed"):
+    """
+    Set-based transfer_for_progress() for many progress rows in one statement.
+    Accounts are locked in id order first; progress rows that were already paid are
+    skipped via their idempotency keys. Returns the number of transfers recorded.
+    """
+    if not progress_ids:
+        return 0
+
+    cursor.execute("""
+        SELECT u.id
+        FROM users u
+        WHERE u.id IN (
+            SELECT provider_id FROM service_progress WHERE id = ANY(%(ids)s)
+            UNION
+            SELECT consumer_id FROM service_progress WHERE id = ANY(%(ids)s)
+        )
+        ORDER BY u.id
+        FOR UPDATE
+    """, {"ids": list(progress_ids)})
+
+    cursor.execute("""
+        WITH new_transactions AS (
+            INSERT INTO time_transactions (kind, idempotency_key, progress_id, hours, memo)
+            SELECT 'service', 'progress:' || sp.id, sp.id, sp.hours, %(memo)s
+            FROM service_progress sp
+            WHERE sp.id = ANY(%(ids)s) AND sp.hours > 0
+            ON CONFLICT (idempotency_key) DO NOTHING
+            RETURNING id, progress_id, hours
+        ),
+        entries AS (
+            INSERT INTO time_ledger_entries (transaction_id, user_id, amount)
+            SELECT t.id, side.user_id, side.amount
+            FROM new_transactions t
+            JOIN service_progress sp ON sp.id = t.progress_id
+            CROSS JOIN LATERAL (
+                VALUES (sp.consumer_id, -t.hours), (sp.provider_id, t.hours)
+            ) AS side(user_id, amount)
+            RETURNING user_id, amount
+        ),
+        balances AS (
+            UPDATE users u
+            SET time_balance = u.time_balance + deltas.amount
+            FROM (
+                SELECT user_id, SUM(amount) AS amount FROM entries GROUP BY user_id
+            ) deltas
+            WHERE u.id = deltas.user_id
+            RETURNING u.id
+        )
+        SELECT (SELECT COUNT(*) FROM new_transactions) AS transfers,
+               (SELECT COUNT(*) FROM balances) AS accounts
+    """, {"ids": list(progress_ids), "memo": memo})
+    return cursor.fetchone()['transfers']
+
+
+def set_balance(cursor, user_id, new_balance, memo=None):
+    """Bring a user's balance to `new_balance` with an adjustment from the community account"""
+    accounts = _lock_accounts(cursor, (user_id,))
+    if user_id not in accounts:
+        raise LedgerError("Unknown account")
+
+    delta = Decimal(str(new_balance)).quantize(_CENT) - Decimal(accounts[user_id] or 0)
+    if delta == 0:
+        return None
+    return _post(cursor, 'adjustment', abs(delta), [(user_id, delta), (None, -delta)], memo=memo)
+
+
+def rebuild_balances(cursor, user_ids=None):
+    """Recompute users.time_balance from the ledger; returns the number of balances corrected"""
+    projection = """
+        u.opening_balance + COALESCE((
+            SELECT SUM(e.amount) FROM time_ledger_entries e WHERE e.user_id = u.id
+        ), 0)
+    """
+    cursor.execute(f"""
+        UPDATE users u
+        SET time_balance = {projection}
+        WHERE u.opening_balance IS NOT NULL
+        {"AND u.id = ANY(%(user_ids)s)" if user_ids is not None else ""}
+        AND u.time_balance IS DISTINCT FROM {projection}
+    """, {"user_ids": list(user_ids or ())})
+    return cursor.rowcount
+
+
+def audit(cursor):
+    """Ledger invariants: balanced transactions and balances matching their projection"""
+    cursor.execute("""
+        SELECT COUNT(*) AS unbalanced
+        FROM (
+            SELECT transaction_id
+            FROM time_ledger_entries
+            GROUP BY transaction_id
+            HAVING SUM(amount) <> 0
+        ) t
+    """)
+    unbalanced = cursor.fetchone()['unbalanced']
+
+    cursor.execute("""
+        SELECT COUNT(*) AS drifted
+        FROM users u
+        LEFT JOIN (
+            SELECT user_id, SUM(amount) AS amount
+            FROM time_ledger_entries
+            WHERE user_id IS NOT NULL
+            GROUP BY user_id
+        ) totals ON totals.user_id = u.id
+        WHERE u.opening_balance IS NOT NULL
+        AND u.time_balance IS DISTINCT FROM u.opening_balance + COALESCE(totals.amount, 0)
+    """)
+    drifted = cursor.fetchone()['drifted']
+
+    cursor.execute("""
+        SELECT COUNT(*) AS transactions, COALESCE(SUM(hours), 0) AS hours
+        FROM time_transactions
+        WHERE kind = 'service'
+    """)
+    volume = cursor.fetchone()
+
+    return {
+        "unbalanced_transactions": unbalanced,
+        "drifted_accounts": drifted,
+        "service_transactions": volume['transactions'],
+        "hours_transferred": float(volume['hours']),
+        "ok": unbalanced == 0 and drifted == 0
+    }
@@ -0,0 +1,267 @@
+"""
+Versioned schema migrations for The Hive
+Schema changes live in numbered files under migrations/ (0001_baseline.py,
+0002_hot_path_indexes.py, ...) and are applied once, in order. Each applied file is
+recorded in schema_version with a checksum of its contents, so an edited migration is
+refused instead of silently diverging, and startup only compares versions when the
+schema is current: no DDL, no locks on live tables.
+
+A migration is either a .sql file (run in one transaction) or a .py file with an
+`upgrade(cursor)` function. Python migrations that set `TRANSACTIONAL = False` run on
+an autocommit connection, as CREATE/DROP INDEX CONCURRENTLY requires; they must be
+safe to re-run, because a failure leaves the statements before it applied.
+
+Instances coordinate through an advisory lock: the first one migrates, the others wait
+for it and then find nothing to do.
+
+Usage:
+    python3 migrate.py              # apply pending migrations
+    python3 migrate.py --status     # list migrations and whether they are applied
+    python3 migrate.py --check      # exit 1 if migrations are pending
+    python3 migrate.py --to 3       # apply up to version 3
+"""
+import argparse
+import hashlib
+import importlib.util
+import os
+import re
+import sys
+import time
+
+import psycopg2
+
+import db_pool
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+FILE_PATTERN = re.compile(r'^(\d{4})_(\w+)\.(py|sql)$')
+
+# pg_advisory_lock key held while migrating
+MIGRATE_LOCK_KEY = 573_003
+# DDL gives up instead of queueing behind long transactions (and blocking traffic behind it)
+LOCK_TIMEOUT = os.environ.get('MIGRATE_LOCK_TIMEOUT', '10s')
+# Whether app startup applies pending migrations or only reports them
+MIGRATE_ON_STARTUP = os.environ.get('MIGRATE_ON_STARTUP', 'true').lower() == 'true'
+
+
+class MigrationError(Exception):
+    """Raised when the migrations on disk and the ones applied do not agree"""
+
+
+class Migration:
+    """One numbered migration file"""
+
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+        with open(path, 'rb') as f:
+            self.checksum = hashlib.sha256(f.read()).hexdigest()
+        self._module = None
+
+    def __repr__(self):
+        return f"{self.version:04d}_{self.name}"
+
+    @property
+    def module(self):
+        if self._module is None and self.path.endswith('.py'):
+            spec = importlib.util.spec_from_file_location(f"migration_{self.version:04d}", self.path)
+            self._module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(self._module)
+        return self._module
+
+    @property
+    def transactional(self):
+        return self.module is None or getattr(self.module, 'TRANSACTIONAL', True)
+
+    def apply(self, cursor):
+        if self.module is None:
+            with open(self.path) as f:
+                cursor.execute(f.read())
+        else:
+            self.module.upgrade(cursor)
+
+
+def discover(directory=MIGRATIONS_DIR):
+    """Migration files in version order"""
+    migrations = {}
+    for filename in sorted(os.listdir(directory)):
+        match = FILE_PATTERN.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise MigrationError(f"Two migrations numbered {version:04d}: {migrations[version].path}, {filename}")
+        migrations[version] = Migration(version, match.group(2), os.path.join(directory, filename))
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def create_version_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR(200) NOT NULL,
+            checksum CHAR(64) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            execution_ms INTEGER
+        );
+    """)
+
+
+def applied_versions(cursor):
+    """{version: schema_version row}; empty before the first migration"""
+    cursor.execute("SELECT to_regclass('schema_version') IS NOT NULL AS present")
+    if not cursor.fetchone()['present']:
+        return {}
+    cursor.execute("SELECT version, name, checksum, applied_at, execution_ms FROM schema_version")
+    return {row['version']: row for row in cursor.fetchall()}
+
+
+def pending(migrations, applied):
+    """
+    Migrations still to apply. Raises MigrationError when an applied migration's file
+    has changed since; versions applied by newer code are left alone.
+    """
+    changed = [m for m in migrations if m.version in applied and applied[m.version]['checksum'] != m.checksum]
+    if changed:
+        raise MigrationError(f"Applied migration(s) changed on disk: {', '.join(map(repr, changed))}; "
+                             f"add a new migration instead of editing one")
+    return [m for m in migrations if m.version not in applied]
+
+
+def is_current(cursor, migrations=None):
+    """True when every migration on disk is applied, unchanged (read-only check)"""
+    return not pending(discover() if migrations is None else migrations, applied_versions(cursor))
+
+
+def _connect(connect_kwargs=None):
+    conn = psycopg2.connect(**(connect_kwargs or db_pool.connection_params()))
+    conn.autocommit = True
+    return conn
+
+
+def migrate(connect_kwargs=None, target=None):
+    """
+    Apply the pending migrations (up to `target`) under the migration lock.
+    Returns the versions applied.
+    """
+    conn = _connect(connect_kwargs)
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATE_LOCK_KEY,))
+    done = []
+    try:
+        create_version_table(cursor)
+        # Re-read after taking the lock: another instance may have just migrated
+        for migration in pending(discover(), applied_versions(cursor)):
+            if target is not None and migration.version > target:
+                break
+            print(f"Applying migration {migration!r}...")
+            started = time.monotonic()
+            conn.autocommit = not migration.transactional
+            # Concurrent index builds wait for older transactions without blocking writes
+            cursor.execute("SET lock_timeout = %s", (LOCK_TIMEOUT if migration.transactional else '0',))
+            migration.apply(cursor)
+            cursor.execute("""
+                INSERT INTO schema_version (version, name, checksum, execution_ms)
+                VALUES (%s, %s, %s, %s)
+            """, (migration.version, migration.name, migration.checksum,
+                  round((time.monotonic() - started) * 1000)))
+            if not conn.autocommit:
+                conn.commit()
+                conn.autocommit = True
+            done.append(migration.version)
+        if done:
+            print(f"Applied {len(done)} migration(s); schema at version {done[-1]:04d}")
+        else:
+            print("Database schema is current")
+        return done
+    except Exception:
+        if not conn.autocommit:
+            conn.rollback()
+            conn.autocommit = True
+        raise
+    finally:
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATE_LOCK_KEY,))
+        cursor.close()
+        conn.close()
+
+
+def startup(connect_kwargs=None):
+    """
+    Called when the app starts: nothing but a version check when the schema is current,
+    otherwise migrate (or, with MIGRATE_ON_STARTUP=false, report what is pending).
+    """
+    conn = _connect(connect_kwargs)
+    try:
+        migrations = discover()
+        cursor = conn.cursor()
+        waiting = pending(migrations, applied_versions(cursor))
+        cursor.close()
+    finally:
+        conn.close()
+
+    if not waiting:
+        print("Database schema is current")
+        return []
+    if not MIGRATE_ON_STARTUP:
+        print(f"WARNING: {len(waiting)} pending migration(s) ({', '.join(map(repr, waiting))}); "
+              f"run `python3 migrate.py`")
+        return []
+    return migrate(connect_kwargs)
+
+
+def create_index_concurrently(cursor, name, definition):
+    """
+    CREATE INDEX CONCURRENTLY on an autocommit cursor; an invalid index left behind by
+    an interrupted build is dropped and built again
+    """
+    cursor.execute("""
+        SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s AND NOT i.indisvalid
+    """, (name,))
+    if cursor.fetchone():
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name};")
+    cursor.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition};")
+
+
+def status(cursor):
+    """Every migration on disk or in schema_version: [{version, name, state, applied_at}]"""
+    applied = applied_versions(cursor)
+    rows = []
+    for migration in discover():
+        row = applied.pop(migration.version, None)
+        if row is None:
+            state = 'pending'
+        elif row['checksum'] != migration.checksum:
+            state = 'CHANGED'
+        else:
+            state = 'applied'
+        rows.append({"version": migration.version, "name": migration.name, "state": state,
+                     "applied_at": row['applied_at'] if row else None})
+    for version, row in applied.items():
+        rows.append({"version": version, "name": row['name'], "state": 'unknown (newer code)',
+                     "applied_at": row['applied_at']})
+    return sorted(rows, key=lambda row: row['version'])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply or inspect The Hive's schema migrations")
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument('--status', action='store_true', help="list migrations and whether they are applied")
+    action.add_argument('--check', action='store_true', help="exit with status 1 if migrations are pending")
+    parser.add_argument('--to', dest='target', type=int, help="apply migrations up to this version")
+    args = parser.parse_args()
+
+    if args.status or args.check:
+        conn = _connect()
+        cursor = conn.cursor()
+        try:
+            if args.status:
+                for row in status(cursor):
+                    applied_at = f"{row['applied_at']:%Y-%m-%d %H:%M:%S}" if row['applied_at'] else '-'
+                    print(f"{row['version']:04d}  {row['name']:<30} {row['state']:<10} {applied_at}")
+            elif not is_current(cursor):
+                sys.exit("Migrations are pending; run `python3 migrate.py`")
+        finally:
+            conn.close()
+    else:
+        migrate(target=args.target)
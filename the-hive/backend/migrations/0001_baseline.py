@@ -0,0 +1,920 @@
+"""
+Baseline: the schema when versioned migrations were introduced, i.e. what init_db()
+created by then: the original tables plus everything added to init_db() since
+(service search, the Wikidata cache and tag indexes, conversation summaries, the time
+ledger, the job schedule, dashboard stats and analytics rollups).
+Every statement is idempotent, so this applies cleanly both to an empty database and
+to one that init_db() has already set up.
+
+Everything this migration creates is spelled out here rather than taken from the
+application modules, so the checksum covers it: later schema changes go in new
+migrations.
+"""
+import psycopg2
+
+
+def upgrade(cursor):
+    # Create users table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            email VARCHAR(255) UNIQUE NOT NULL,
+            password_hash VARCHAR(255) NOT NULL,
+            first_name VARCHAR(100),
+            last_name VARCHAR(100),
+            phone_number VARCHAR(20),
+            biography TEXT,
+            profile_photo VARCHAR(255),
+            role VARCHAR(20) DEFAULT 'user',
+            time_balance DECIMAL(10,2) DEFAULT 1.0,
+            is_verified BOOLEAN DEFAULT FALSE,
+            is_active BOOLEAN DEFAULT TRUE,
+            user_status VARCHAR(20) DEFAULT 'active' CHECK (user_status IN ('active', 'banned', 'warning')),
+            date_joined TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_login TIMESTAMP
+        );
+    """)
+
+    # Create email verification tokens table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS email_verifications (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            token VARCHAR(255) UNIQUE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP NOT NULL,
+            is_used BOOLEAN DEFAULT FALSE
+        );
+    """)
+
+    # Create tags table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS tags (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(100) UNIQUE NOT NULL,
+            created_by INTEGER REFERENCES users(id),
+            is_approved BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+    # Create services table (for both offers and needs)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS services (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            service_type VARCHAR(10) NOT NULL CHECK (service_type IN ('offer', 'need')),
+            title VARCHAR(255) NOT NULL,
+            description TEXT NOT NULL,
+            hours_required DECIMAL(10,2) NOT NULL CHECK (hours_required >= 1.0 AND hours_required <= 3.0),
+            location_type VARCHAR(20) NOT NULL CHECK (location_type IN ('online', 'in-person', 'both')),
+            location_address TEXT,
+            latitude DECIMAL(10,8),
+            longitude DECIMAL(11,8),
+            status VARCHAR(20) DEFAULT 'open' CHECK (status IN ('open', 'in_progress', 'completed', 'cancelled', 'expired')),
+            service_date TIMESTAMP,
+            start_time TIME,
+            end_time TIME,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+    # Create service_tags junction table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS service_tags (
+            service_id INTEGER REFERENCES services(id) ON DELETE CASCADE,
+            tag_id INTEGER REFERENCES tags(id) ON DELETE CASCADE,
+            PRIMARY KEY (service_id, tag_id)
+        );
+    """)
+
+    # Create service_availability table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS service_availability (
+            id SERIAL PRIMARY KEY,
+            service_id INTEGER REFERENCES services(id) ON DELETE CASCADE,
+            day_of_week INTEGER NOT NULL CHECK (day_of_week BETWEEN 0 AND 6),
+            start_time TIME NOT NULL,
+            end_time TIME NOT NULL
+        );
+    """)
+
+    # Create password_reset_tokens table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS password_reset_tokens (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            token VARCHAR(255) UNIQUE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP NOT NULL,
+            is_used BOOLEAN DEFAULT FALSE
+        );
+    """)
+
+    # Create service_applications table (for tracking applications to services)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS service_applications (
+            id SERIAL PRIMARY KEY,
+            service_id INTEGER REFERENCES services(id) ON DELETE CASCADE,
+            applicant_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            status VARCHAR(20) DEFAULT 'pending' CHECK (status IN ('pending', 'accepted', 'rejected', 'cancelled', 'withdrawn')),
+            message TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(service_id, applicant_id)
+        );
+    """)
+
+    # Add 'withdrawn' to existing status check constraint if table already exists
+    cursor.execute("""
+        DO $$
+        BEGIN
+            -- Drop the old constraint if it exists
+            ALTER TABLE service_applications DROP CONSTRAINT IF EXISTS service_applications_status_check;
+        
+            -- Add the new constraint with 'withdrawn' included
+            ALTER TABLE service_applications ADD CONSTRAINT service_applications_status_check 
+                CHECK (status IN ('pending', 'accepted', 'rejected', 'cancelled', 'withdrawn'));
+        EXCEPTION
+            WHEN OTHERS THEN
+                -- Ignore errors if constraint doesn't exist
+                NULL;
+        END $$;
+    """)
+
+    # Create service_progress table (for tracking service completion workflow)
+    # Progress flow: selected -> scheduled -> in_progress -> awaiting_confirmation -> completed
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS service_progress (
+            id SERIAL PRIMARY KEY,
+            service_id INTEGER REFERENCES services(id),
+            application_id INTEGER REFERENCES service_applications(id),
+            provider_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            consumer_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            hours DECIMAL(10,2) NOT NULL,
+            status VARCHAR(30) DEFAULT 'selected' CHECK (status IN ('selected', 'scheduled', 'in_progress', 'awaiting_confirmation', 'completed', 'disputed', 'cancelled')),
+            scheduled_date DATE,
+            scheduled_time TIME,
+            agreed_location TEXT,
+            special_instructions TEXT,
+            provider_confirmed BOOLEAN DEFAULT FALSE,
+            consumer_confirmed BOOLEAN DEFAULT FALSE,
+            provider_start_confirmed BOOLEAN DEFAULT FALSE,
+            consumer_start_confirmed BOOLEAN DEFAULT FALSE,
+            provider_start_confirmed_at TIMESTAMP,
+            consumer_start_confirmed_at TIMESTAMP,
+            proposed_date DATE,
+            proposed_time TIME,
+            proposed_location TEXT,
+            proposed_by INTEGER REFERENCES users(id),
+            proposed_at TIMESTAMP,
+            schedule_accepted_by_consumer BOOLEAN DEFAULT FALSE,
+            schedule_accepted_by_provider BOOLEAN DEFAULT FALSE,
+            service_end_date DATE,
+            service_start_date DATE,
+            provider_survey_submitted BOOLEAN DEFAULT FALSE,
+            consumer_survey_submitted BOOLEAN DEFAULT FALSE,
+            provider_survey_submitted_at TIMESTAMP,
+            consumer_survey_submitted_at TIMESTAMP,
+            provider_survey_data JSONB,
+            consumer_survey_data JSONB,
+            survey_deadline TIMESTAMP,
+            selected_at TIMESTAMP,
+            scheduled_at TIMESTAMP,
+            started_at TIMESTAMP,
+            completed_at TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+    # Create messages table (for communication between users)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS messages (
+            id SERIAL PRIMARY KEY,
+            service_id INTEGER REFERENCES services(id) ON DELETE CASCADE,
+            application_id INTEGER REFERENCES service_applications(id) ON DELETE CASCADE,
+            sender_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            receiver_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            message TEXT NOT NULL,
+            is_read BOOLEAN DEFAULT FALSE,
+            message_type VARCHAR(50) DEFAULT 'text',
+            proposal_date DATE,
+            proposal_start_time TIME,
+            proposal_end_time TIME,
+            proposal_status VARCHAR(20) DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+    # Columns added to existing tables over time (safe to run multiple times)
+
+    # Add new columns to services table
+    cursor.execute("""
+        ALTER TABLE services 
+        ADD COLUMN IF NOT EXISTS start_time TIME,
+        ADD COLUMN IF NOT EXISTS end_time TIME;
+    """)
+
+    # Add new columns to service_progress table
+    cursor.execute("""
+        ALTER TABLE service_progress 
+        ADD COLUMN IF NOT EXISTS provider_start_confirmed BOOLEAN DEFAULT FALSE,
+        ADD COLUMN IF NOT EXISTS consumer_start_confirmed BOOLEAN DEFAULT FALSE,
+        ADD COLUMN IF NOT EXISTS provider_start_confirmed_at TIMESTAMP,
+        ADD COLUMN IF NOT EXISTS consumer_start_confirmed_at TIMESTAMP,
+        ADD COLUMN IF NOT EXISTS proposed_date DATE,
+        ADD COLUMN IF NOT EXISTS proposed_time TIME,
+        ADD COLUMN IF NOT EXISTS proposed_location TEXT,
+        ADD COLUMN IF NOT EXISTS proposed_by INTEGER REFERENCES users(id),
+        ADD COLUMN IF NOT EXISTS proposed_at TIMESTAMP,
+        ADD COLUMN IF NOT EXISTS schedule_accepted_by_consumer BOOLEAN DEFAULT FALSE,
+        ADD COLUMN IF NOT EXISTS schedule_accepted_by_provider BOOLEAN DEFAULT FALSE,
+        ADD COLUMN IF NOT EXISTS service_end_date DATE,
+        ADD COLUMN IF NOT EXISTS service_start_date DATE,
+        ADD COLUMN IF NOT EXISTS provider_survey_submitted BOOLEAN DEFAULT FALSE,
+        ADD COLUMN IF NOT EXISTS consumer_survey_submitted BOOLEAN DEFAULT FALSE,
+        ADD COLUMN IF NOT EXISTS provider_survey_submitted_at TIMESTAMP,
+        ADD COLUMN IF NOT EXISTS consumer_survey_submitted_at TIMESTAMP,
+        ADD COLUMN IF NOT EXISTS provider_survey_data JSONB,
+        ADD COLUMN IF NOT EXISTS consumer_survey_data JSONB,
+        ADD COLUMN IF NOT EXISTS survey_deadline TIMESTAMP;
+    """)
+
+    # Add new columns to messages table
+    cursor.execute("""
+        ALTER TABLE messages 
+        ADD COLUMN IF NOT EXISTS message_type VARCHAR(50) DEFAULT 'text',
+        ADD COLUMN IF NOT EXISTS proposal_date DATE,
+        ADD COLUMN IF NOT EXISTS proposal_start_time TIME,
+        ADD COLUMN IF NOT EXISTS proposal_end_time TIME,
+        ADD COLUMN IF NOT EXISTS proposal_location TEXT,
+        ADD COLUMN IF NOT EXISTS proposal_status VARCHAR(20) DEFAULT 'pending';
+    """)
+
+    # Last change of a message (sent, read, proposal answered); drives incremental sync
+    cursor.execute("ALTER TABLE messages ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP;")
+    cursor.execute("UPDATE messages SET updated_at = created_at WHERE updated_at IS NULL;")
+    cursor.execute("ALTER TABLE messages ALTER COLUMN updated_at SET DEFAULT CURRENT_TIMESTAMP;")
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_messages_application_updated 
+        ON messages(application_id, updated_at);
+    """)
+
+    # Create index for survey deadlines on service_progress
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_service_progress_survey_deadline 
+        ON service_progress(survey_deadline) 
+        WHERE survey_deadline IS NOT NULL;
+    """)
+
+    # Create forum_categories table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS forum_categories (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(100) UNIQUE NOT NULL,
+            description TEXT,
+            is_active BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+    # Create forum_threads table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS forum_threads (
+            id SERIAL PRIMARY KEY,
+            category_id INTEGER REFERENCES forum_categories(id) ON DELETE CASCADE,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            title VARCHAR(255) NOT NULL,
+            content TEXT NOT NULL,
+            is_pinned BOOLEAN DEFAULT FALSE,
+            is_locked BOOLEAN DEFAULT FALSE,
+            view_count INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+    # Create forum_comments table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS forum_comments (
+            id SERIAL PRIMARY KEY,
+            thread_id INTEGER REFERENCES forum_threads(id) ON DELETE CASCADE,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            content TEXT NOT NULL,
+            parent_comment_id INTEGER REFERENCES forum_comments(id) ON DELETE CASCADE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+    # Create admin_logs table for audit trail
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS admin_logs (
+            id SERIAL PRIMARY KEY,
+            admin_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
+            action VARCHAR(100) NOT NULL,
+            target_type VARCHAR(50) NOT NULL,
+            target_id INTEGER,
+            details JSONB,
+            ip_address VARCHAR(45),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+    # Create reports table for content flagging
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS reports (
+            id SERIAL PRIMARY KEY,
+            reporter_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            reported_user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            content_type VARCHAR(50) NOT NULL CHECK (content_type IN ('service', 'thread', 'comment', 'user', 'message')),
+            content_id INTEGER,
+            reason VARCHAR(255) NOT NULL,
+            description TEXT,
+            status VARCHAR(20) DEFAULT 'open' CHECK (status IN ('open', 'resolved', 'dismissed')),
+            resolved_by INTEGER REFERENCES users(id) ON DELETE SET NULL,
+            resolved_at TIMESTAMP,
+            resolution_notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+    # Create indexes for better performance
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_forum_threads_user 
+        ON forum_threads(user_id);
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_forum_comments_user 
+        ON forum_comments(user_id);
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_services_created_id 
+        ON services(created_at DESC, id DESC);
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_services_status_created_id 
+        ON services(status, created_at DESC, id DESC);
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_admin_logs_admin 
+        ON admin_logs(admin_id);
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_admin_logs_created 
+        ON admin_logs(created_at);
+    """)
+
+    # Add user_status column to existing users table
+    cursor.execute("""
+        ALTER TABLE users 
+        ADD COLUMN IF NOT EXISTS user_status VARCHAR(20) DEFAULT 'active' 
+        CHECK (user_status IN ('active', 'banned', 'warning'));
+    """)
+
+    # Full-text search document for services (title > description > tags)
+    cursor.execute("""
+        ALTER TABLE services 
+        ADD COLUMN IF NOT EXISTS search_vector TSVECTOR;
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_services_search_vector 
+        ON services USING GIN(search_vector);
+    """)
+
+    # Title > description > tag names, as search.SEARCH_VECTOR_SQL at the time
+    cursor.execute("""
+        UPDATE services s
+        SET search_vector =
+            setweight(to_tsvector('english', coalesce(s.title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(s.description, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce((
+                SELECT string_agg(t.name, ' ')
+                FROM service_tags st
+                JOIN tags t ON st.tag_id = t.id
+                WHERE st.service_id = s.id
+            ), '')), 'C')
+        WHERE s.search_vector IS NULL
+    """)
+    filled = cursor.rowcount
+    if filled:
+        print(f"Built search index for {filled} existing service(s)")
+
+    # Shared cache of Wikidata lookups (tag name -> entity id, entity id -> related labels)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS wikidata_cache (
+            cache_key VARCHAR(300) PRIMARY KEY,
+            value JSONB,
+            fetched_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+    # Trigram index for tag typeahead (substring and typo-tolerant matching).
+    # pg_trgm may not be installable on every host; tag search then falls back to LIKE.
+    cursor.execute("SAVEPOINT trigram_extension")
+    try:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_tags_name_trgm 
+            ON tags USING GIN(LOWER(name) gin_trgm_ops);
+        """)
+        cursor.execute("RELEASE SAVEPOINT trigram_extension")
+    except psycopg2.Error as e:
+        cursor.execute("ROLLBACK TO SAVEPOINT trigram_extension")
+        print(f"pg_trgm not available, tag search will not be typo tolerant: {e}")
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_tags_name_prefix 
+        ON tags(LOWER(name) text_pattern_ops);
+    """)
+
+    # Tag usage counts (the primary key only covers lookups by service_id)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_service_tags_tag 
+        ON service_tags(tag_id);
+    """)
+
+    # Inbox summaries (one row per application and participant)
+    _conversation_summaries(cursor)
+
+    # Time credit ledger (users.time_balance becomes its cached projection)
+    _ledger(cursor)
+
+    # Job schedule (see scheduler.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS scheduled_jobs (
+            name VARCHAR(100) PRIMARY KEY,
+            schedule VARCHAR(100) NOT NULL,
+            enabled BOOLEAN NOT NULL DEFAULT TRUE,
+            next_run_at TIMESTAMP NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_started_at TIMESTAMP,
+            last_finished_at TIMESTAMP,
+            last_status VARCHAR(20),
+            last_error TEXT,
+            last_result JSONB,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+    # Dashboard counters and daily history, maintained by triggers
+    _stats(cursor)
+
+    # Analytics rollups (filled by the scheduler; backfill with analytics.py --backfill)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS analytics_rollups (
+            metric VARCHAR(50) NOT NULL,
+            granularity VARCHAR(10) NOT NULL CHECK (granularity IN ('hour', 'day', 'week')),
+            dimension VARCHAR(150) NOT NULL DEFAULT '',
+            bucket TIMESTAMP NOT NULL,
+            value DECIMAL(14,2) NOT NULL,
+            PRIMARY KEY (metric, granularity, dimension, bucket)
+        );
+    """)
+
+    # Breakdown queries read every dimension of a metric over a range
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_analytics_rollups_range
+        ON analytics_rollups(metric, granularity, bucket);
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS analytics_state (
+            name VARCHAR(50) PRIMARY KEY,
+            watermark TIMESTAMP NOT NULL
+        );
+    """)
+
+
+def _conversation_summaries(cursor):
+    """Summary table, the message indexes it relies on, and summaries for existing applications"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS conversation_summaries (
+            application_id INTEGER REFERENCES service_applications(id) ON DELETE CASCADE,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            other_user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            service_id INTEGER REFERENCES services(id) ON DELETE CASCADE,
+            last_message_id INTEGER,
+            last_message TEXT,
+            last_message_at TIMESTAMP,
+            message_count INTEGER NOT NULL DEFAULT 0,
+            unread_count INTEGER NOT NULL DEFAULT 0,
+            sort_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (application_id, user_id)
+        );
+    """)
+
+    # Inbox order: newest activity first
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_conversation_summaries_inbox
+        ON conversation_summaries(user_id, sort_at DESC, application_id DESC);
+    """)
+
+    # Message history of one application in order (also the keyset for older pages)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_messages_application_id
+        ON messages(application_id, id);
+    """)
+
+    # Unread messages per application and receiver (small: read rows are not indexed)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_messages_unread
+        ON messages(application_id, receiver_id)
+        WHERE is_read = FALSE;
+    """)
+
+    cursor.execute("""
+        INSERT INTO conversation_summaries
+            (application_id, user_id, other_user_id, service_id, last_message_id, last_message,
+             last_message_at, message_count, unread_count, sort_at)
+        SELECT
+            sa.id,
+            p.user_id,
+            p.other_user_id,
+            s.id,
+            last.id,
+            last.message,
+            last.created_at,
+            counts.message_count,
+            (SELECT COUNT(*)
+             FROM messages m
+             WHERE m.application_id = sa.id
+             AND m.receiver_id = p.user_id
+             AND m.is_read = FALSE),
+            COALESCE(last.created_at, sa.applied_at, CURRENT_TIMESTAMP)
+        FROM service_applications sa
+        JOIN services s ON sa.service_id = s.id
+        CROSS JOIN LATERAL (
+            VALUES (sa.applicant_id, s.user_id), (s.user_id, sa.applicant_id)
+        ) AS p(user_id, other_user_id)
+        CROSS JOIN LATERAL (
+            SELECT COUNT(*) AS message_count FROM messages m WHERE m.application_id = sa.id
+        ) counts
+        LEFT JOIN LATERAL (
+            SELECT m.id, m.message, m.created_at
+            FROM messages m
+            WHERE m.application_id = sa.id
+            ORDER BY m.id DESC
+            LIMIT 1
+        ) last ON TRUE
+        WHERE NOT EXISTS (SELECT 1 FROM conversation_summaries cs WHERE cs.application_id = sa.id)
+        AND (p.user_id <> p.other_user_id OR p.user_id = sa.applicant_id)
+        ON CONFLICT (application_id, user_id) DO NOTHING
+    """)
+    if cursor.rowcount:
+        print(f"Built inbox summaries for {cursor.rowcount} conversation participant(s)")
+
+
+def _ledger(cursor):
+    """Ledger tables, the opening balance column and the immutability trigger"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS time_transactions (
+            id BIGSERIAL PRIMARY KEY,
+            kind VARCHAR(20) NOT NULL CHECK (kind IN ('service', 'adjustment')),
+            idempotency_key VARCHAR(100) UNIQUE,
+            progress_id INTEGER,  -- no foreign key: ledger rows outlive deleted services
+            hours DECIMAL(10,2) NOT NULL CHECK (hours > 0),
+            memo TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS time_ledger_entries (
+            id BIGSERIAL PRIMARY KEY,
+            transaction_id BIGINT NOT NULL REFERENCES time_transactions(id),
+            user_id INTEGER REFERENCES users(id),
+            amount DECIMAL(10,2) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_time_ledger_entries_user
+        ON time_ledger_entries(user_id, id);
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_time_ledger_entries_transaction
+        ON time_ledger_entries(transaction_id);
+    """)
+
+    # Entries are facts: correcting one means posting a new transaction
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION forbid_ledger_update() RETURNS trigger AS $$
+        BEGIN
+            RAISE EXCEPTION 'time ledger rows are append-only';
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    cursor.execute("""
+        DROP TRIGGER IF EXISTS time_transactions_append_only ON time_transactions;
+        CREATE TRIGGER time_transactions_append_only
+        BEFORE UPDATE ON time_transactions
+        FOR EACH ROW EXECUTE FUNCTION forbid_ledger_update();
+
+        DROP TRIGGER IF EXISTS time_ledger_entries_append_only ON time_ledger_entries;
+        CREATE TRIGGER time_ledger_entries_append_only
+        BEFORE UPDATE ON time_ledger_entries
+        FOR EACH ROW EXECUTE FUNCTION forbid_ledger_update();
+    """)
+
+    # Balance before the ledger existed; new accounts open with the usual starting hour
+    cursor.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS opening_balance DECIMAL(10,2);")
+    cursor.execute("UPDATE users SET opening_balance = COALESCE(time_balance, 0) WHERE opening_balance IS NULL;")
+    cursor.execute("ALTER TABLE users ALTER COLUMN opening_balance SET DEFAULT 1.0;")
+
+
+def _stats(cursor):
+    """
+    Counter and history tables, the triggers maintaining the metrics of stats.METRICS,
+    and their starting values from the existing rows
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stat_counters (
+            name VARCHAR(50) PRIMARY KEY,
+            value DECIMAL(14,2) NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stat_daily (
+            day DATE NOT NULL,
+            metric VARCHAR(50) NOT NULL,
+            value DECIMAL(14,2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (metric, day)
+        );
+    """)
+
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION stats_bump(metric_name TEXT, metric_day DATE, delta NUMERIC)
+        RETURNS void AS $$
+        BEGIN
+            IF delta = 0 THEN
+                RETURN;
+            END IF;
+            IF metric_day IS NULL THEN
+                INSERT INTO stat_counters (name, value) VALUES (metric_name, delta)
+                ON CONFLICT (name) DO UPDATE
+                SET value = stat_counters.value + EXCLUDED.value, updated_at = NOW();
+            ELSE
+                INSERT INTO stat_daily (day, metric, value) VALUES (metric_day, metric_name, delta)
+                ON CONFLICT (metric, day) DO UPDATE
+                SET value = stat_daily.value + EXCLUDED.value;
+            END IF;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    # Each function takes the old row out of the metrics of its table and puts the new
+    # one in (stats.METRICS); updates that change none of the inputs are skipped
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION stats_users() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' AND OLD.user_status IS NOT DISTINCT FROM NEW.user_status THEN
+                RETURN NULL;
+            END IF;
+            IF TG_OP <> 'INSERT' THEN
+                PERFORM stats_bump('users_total', NULL, -1);
+                IF OLD.user_status = 'banned' THEN
+                    PERFORM stats_bump('users_banned', NULL, -1);
+                ELSIF OLD.user_status = 'warning' THEN
+                    PERFORM stats_bump('users_warned', NULL, -1);
+                END IF;
+                IF OLD.date_joined IS NOT NULL THEN
+                    PERFORM stats_bump('signups', OLD.date_joined::date, -1);
+                END IF;
+            END IF;
+            IF TG_OP <> 'DELETE' THEN
+                PERFORM stats_bump('users_total', NULL, 1);
+                IF NEW.user_status = 'banned' THEN
+                    PERFORM stats_bump('users_banned', NULL, 1);
+                ELSIF NEW.user_status = 'warning' THEN
+                    PERFORM stats_bump('users_warned', NULL, 1);
+                END IF;
+                IF NEW.date_joined IS NOT NULL THEN
+                    PERFORM stats_bump('signups', NEW.date_joined::date, 1);
+                END IF;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    cursor.execute("""
+        DROP TRIGGER IF EXISTS users_stats ON users;
+        CREATE TRIGGER users_stats
+        AFTER INSERT OR DELETE OR UPDATE OF user_status ON users
+        FOR EACH ROW EXECUTE FUNCTION stats_users();
+    """)
+
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION stats_services() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' AND OLD.status IS NOT DISTINCT FROM NEW.status THEN
+                RETURN NULL;
+            END IF;
+            IF TG_OP <> 'INSERT' THEN
+                IF OLD.status = 'open' THEN
+                    PERFORM stats_bump('services_open', NULL, -1);
+                END IF;
+                IF OLD.created_at IS NOT NULL THEN
+                    PERFORM stats_bump('services_created', OLD.created_at::date, -1);
+                END IF;
+            END IF;
+            IF TG_OP <> 'DELETE' THEN
+                IF NEW.status = 'open' THEN
+                    PERFORM stats_bump('services_open', NULL, 1);
+                END IF;
+                IF NEW.created_at IS NOT NULL THEN
+                    PERFORM stats_bump('services_created', NEW.created_at::date, 1);
+                END IF;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    cursor.execute("""
+        DROP TRIGGER IF EXISTS services_stats ON services;
+        CREATE TRIGGER services_stats
+        AFTER INSERT OR DELETE OR UPDATE OF status ON services
+        FOR EACH ROW EXECUTE FUNCTION stats_services();
+    """)
+
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION stats_service_progress() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' AND (OLD.status, OLD.hours, OLD.completed_at)
+                    IS NOT DISTINCT FROM (NEW.status, NEW.hours, NEW.completed_at) THEN
+                RETURN NULL;
+            END IF;
+            IF TG_OP <> 'INSERT' AND OLD.status = 'completed' THEN
+                PERFORM stats_bump('services_completed', NULL, -1);
+                PERFORM stats_bump('hours_exchanged', NULL, -COALESCE(OLD.hours, 0));
+                IF OLD.completed_at IS NOT NULL THEN
+                    PERFORM stats_bump('completions', OLD.completed_at::date, -1);
+                    PERFORM stats_bump('hours_per_day', OLD.completed_at::date, -COALESCE(OLD.hours, 0));
+                END IF;
+            END IF;
+            IF TG_OP <> 'DELETE' AND NEW.status = 'completed' THEN
+                PERFORM stats_bump('services_completed', NULL, 1);
+                PERFORM stats_bump('hours_exchanged', NULL, COALESCE(NEW.hours, 0));
+                IF NEW.completed_at IS NOT NULL THEN
+                    PERFORM stats_bump('completions', NEW.completed_at::date, 1);
+                    PERFORM stats_bump('hours_per_day', NEW.completed_at::date, COALESCE(NEW.hours, 0));
+                END IF;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    cursor.execute("""
+        DROP TRIGGER IF EXISTS service_progress_stats ON service_progress;
+        CREATE TRIGGER service_progress_stats
+        AFTER INSERT OR DELETE OR UPDATE OF status, hours, completed_at ON service_progress
+        FOR EACH ROW EXECUTE FUNCTION stats_service_progress();
+    """)
+
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION stats_reports() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' AND OLD.status IS NOT DISTINCT FROM NEW.status THEN
+                RETURN NULL;
+            END IF;
+            IF TG_OP <> 'INSERT' THEN
+                IF OLD.status = 'open' THEN
+                    PERFORM stats_bump('reports_open', NULL, -1);
+                END IF;
+                IF OLD.created_at IS NOT NULL THEN
+                    PERFORM stats_bump('reports_filed', OLD.created_at::date, -1);
+                END IF;
+            END IF;
+            IF TG_OP <> 'DELETE' THEN
+                IF NEW.status = 'open' THEN
+                    PERFORM stats_bump('reports_open', NULL, 1);
+                END IF;
+                IF NEW.created_at IS NOT NULL THEN
+                    PERFORM stats_bump('reports_filed', NEW.created_at::date, 1);
+                END IF;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    cursor.execute("""
+        DROP TRIGGER IF EXISTS reports_stats ON reports;
+        CREATE TRIGGER reports_stats
+        AFTER INSERT OR DELETE OR UPDATE OF status ON reports
+        FOR EACH ROW EXECUTE FUNCTION stats_reports();
+    """)
+
+    # Threads and comments are only counted, so inserts and deletes are all that matter
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION stats_forum_threads() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                PERFORM stats_bump('forum_threads', NULL, -1);
+                IF OLD.created_at IS NOT NULL THEN
+                    PERFORM stats_bump('threads_created', OLD.created_at::date, -1);
+                END IF;
+            ELSE
+                PERFORM stats_bump('forum_threads', NULL, 1);
+                IF NEW.created_at IS NOT NULL THEN
+                    PERFORM stats_bump('threads_created', NEW.created_at::date, 1);
+                END IF;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    cursor.execute("""
+        DROP TRIGGER IF EXISTS forum_threads_stats ON forum_threads;
+        CREATE TRIGGER forum_threads_stats
+        AFTER INSERT OR DELETE ON forum_threads
+        FOR EACH ROW EXECUTE FUNCTION stats_forum_threads();
+    """)
+
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION stats_forum_comments() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                PERFORM stats_bump('forum_comments', NULL, -1);
+                IF OLD.created_at IS NOT NULL THEN
+                    PERFORM stats_bump('comments_created', OLD.created_at::date, -1);
+                END IF;
+            ELSE
+                PERFORM stats_bump('forum_comments', NULL, 1);
+                IF NEW.created_at IS NOT NULL THEN
+                    PERFORM stats_bump('comments_created', NEW.created_at::date, 1);
+                END IF;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    cursor.execute("""
+        DROP TRIGGER IF EXISTS forum_comments_stats ON forum_comments;
+        CREATE TRIGGER forum_comments_stats
+        AFTER INSERT OR DELETE ON forum_comments
+        FOR EACH ROW EXECUTE FUNCTION stats_forum_comments();
+    """)
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_last_login ON users(last_login);")
+
+    # First run: start the counters from the existing rows (writers wait on the new triggers)
+    cursor.execute("SELECT 1 FROM stat_counters LIMIT 1")
+    if cursor.fetchone() is not None:
+        return
+    cursor.execute("""
+        SELECT stats_bump(c.name, NULL, c.value)
+        FROM (
+            SELECT 'users_total' AS name, COUNT(*) AS value FROM users
+            UNION ALL SELECT 'users_banned', COUNT(*) FILTER (WHERE user_status = 'banned') FROM users
+            UNION ALL SELECT 'users_warned', COUNT(*) FILTER (WHERE user_status = 'warning') FROM users
+            UNION ALL SELECT 'services_open', COUNT(*) FILTER (WHERE status = 'open') FROM services
+            UNION ALL SELECT 'services_completed', COUNT(*) FILTER (WHERE status = 'completed') FROM service_progress
+            UNION ALL SELECT 'hours_exchanged', COALESCE(SUM(hours) FILTER (WHERE status = 'completed'), 0) FROM service_progress
+            UNION ALL SELECT 'reports_open', COUNT(*) FILTER (WHERE status = 'open') FROM reports
+            UNION ALL SELECT 'forum_threads', COUNT(*) FROM forum_threads
+            UNION ALL SELECT 'forum_comments', COUNT(*) FROM forum_comments
+        ) c
+    """)
+    cursor.execute("""
+        SELECT stats_bump(d.metric, d.day, d.value)
+        FROM (
+            SELECT date_joined::date AS day, 'signups' AS metric, COUNT(*) AS value
+            FROM users WHERE date_joined IS NOT NULL GROUP BY 1
+            UNION ALL
+            SELECT created_at::date, 'services_created', COUNT(*)
+            FROM services WHERE created_at IS NOT NULL GROUP BY 1
+            UNION ALL
+            SELECT completed_at::date, 'completions', COUNT(*)
+            FROM service_progress WHERE status = 'completed' AND completed_at IS NOT NULL GROUP BY 1
+            UNION ALL
+            SELECT completed_at::date, 'hours_per_day', SUM(COALESCE(hours, 0))
+            FROM service_progress WHERE status = 'completed' AND completed_at IS NOT NULL GROUP BY 1
+            UNION ALL
+            SELECT created_at::date, 'reports_filed', COUNT(*)
+            FROM reports WHERE created_at IS NOT NULL GROUP BY 1
+            UNION ALL
+            SELECT created_at::date, 'threads_created', COUNT(*)
+            FROM forum_threads WHERE created_at IS NOT NULL GROUP BY 1
+            UNION ALL
+            SELECT created_at::date, 'comments_created', COUNT(*)
+            FROM forum_comments WHERE created_at IS NOT NULL GROUP BY 1
+        ) d
+    """)
+    cursor.execute("""
+        INSERT INTO stat_counters (name, value)
+        SELECT 'users_active_30d', COUNT(*) FROM users WHERE last_login >= NOW() - INTERVAL '30 days'
+    """)
@@ -0,0 +1,87 @@
+"""
+Indexes for the hot query paths, built without blocking writes to the tables
+Each index names the queries it serves; benchmarks/explain_check.py replays those
+queries under EXPLAIN ANALYZE on the synthetic dataset and fails when one of them falls
+back to a sequential scan of a large table.
+
+Already covered elsewhere, so not repeated here:
+- messages by application (ordered by id) and the unread partial index: baseline migration
+- messages changed since a sync cursor: idx_messages_application_updated (baseline migration)
+- service_tags by tag: idx_service_tags_tag (baseline migration); by service: its primary key
+- service_applications by service: the UNIQUE (service_id, applicant_id) index
+"""
+import migrate
+
+TRANSACTIONAL = False
+
+# (name, table and columns [+ predicate], queries served)
+INDEXES = [
+    ("idx_services_public_created",
+     "services(created_at DESC, id DESC) WHERE status = 'open' OR (status = 'in_progress' AND service_type = 'offer')",
+     "GET /api/services default listing (open services and in-progress offers), keyset pages"),
+    ("idx_services_type_status_created",
+     "services(service_type, status, created_at DESC, id DESC)",
+     "GET /api/services?type=, GET /api/admin/services?type=&status="),
+    ("idx_services_user_status",
+     "services(user_id, status, created_at DESC)",
+     "public profile services and offer/need counts, my services"),
+    ("idx_service_applications_applicant",
+     "service_applications(applicant_id, applied_at DESC)",
+     "GET /api/applications (the user's applications, newest first)"),
+    ("idx_service_applications_service_pending",
+     "service_applications(service_id) WHERE status = 'pending'",
+     "accept_application rejecting the service's other pending applications"),
+    ("idx_service_applications_applied",
+     "service_applications(applied_at)",
+     "analytics rollups (applications per hour)"),
+    ("idx_service_progress_application",
+     "service_progress(application_id)",
+     "progress by application, applications and messages joined to their progress"),
+    ("idx_service_progress_service_updated",
+     "service_progress(service_id, updated_at DESC NULLS LAST, created_at DESC)",
+     "latest progress of each listed service (GET /api/services LATERAL join)"),
+    ("idx_service_progress_provider_status",
+     "service_progress(provider_id, status, completed_at DESC)",
+     "reviews of a provider, completed-as-provider counts, the provider's active services"),
+    ("idx_service_progress_consumer_status",
+     "service_progress(consumer_id, status, completed_at DESC)",
+     "reviews of a consumer, completed-as-consumer counts, the consumer's active services"),
+    ("idx_service_progress_completed",
+     "service_progress(completed_at) WHERE status = 'completed'",
+     "analytics rollups (completions and hours transferred) and stats reconciliation"),
+    ("idx_forum_threads_listing",
+     "forum_threads(category_id, is_pinned DESC, updated_at DESC)",
+     "GET /api/forum/threads?category_id= (pinned first, then most recently active)"),
+    ("idx_forum_threads_recent",
+     "forum_threads(is_pinned DESC, updated_at DESC)",
+     "GET /api/forum/threads without a category"),
+    ("idx_forum_threads_created",
+     "forum_threads(created_at)",
+     "analytics rollups (threads per hour)"),
+    ("idx_forum_comments_thread_created",
+     "forum_comments(thread_id, created_at)",
+     "GET /api/forum/threads/<id>/comments in order"),
+    ("idx_forum_comments_created",
+     "forum_comments(created_at)",
+     "analytics rollups (comments per hour)"),
+    ("idx_reports_status_created",
+     "reports(status, created_at DESC)",
+     "GET /api/admin/reports?status= (newest first)"),
+    ("idx_users_date_joined",
+     "users(date_joined DESC)",
+     "GET /api/admin/users (newest first), signups history"),
+]
+
+# Earlier indexes that are a prefix of one above
+SUPERSEDED = [
+    "idx_forum_threads_category",   # idx_forum_threads_listing
+    "idx_forum_comments_thread",    # idx_forum_comments_thread_created
+    "idx_reports_status",           # idx_reports_status_created
+]
+
+
+def upgrade(cursor):
+    for name, definition, _ in INDEXES:
+        migrate.create_index_concurrently(cursor, name, definition)
+    for name in SUPERSEDED:
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name};")
@@ -0,0 +1,13 @@
+-- Announce changes to a user's status, role or active flag (and deletions) on the
+-- hive_auth channel; every worker drops its cached copy of that user (see auth.py)
+CREATE OR REPLACE FUNCTION auth_notify_user() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('hive_auth', OLD.id::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS users_auth_notify ON users;
+CREATE TRIGGER users_auth_notify
+AFTER UPDATE OF user_status, role, is_active OR DELETE ON users
+FOR EACH ROW EXECUTE FUNCTION auth_notify_user();
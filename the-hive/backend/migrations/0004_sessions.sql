@@ -0,0 +1,41 @@
+-- Refresh-token sessions (see sessions.py): one row per signed-in device. Only the
+-- SHA-256 of the current refresh token and of the one it replaced are stored.
+CREATE TABLE IF NOT EXISTS sessions (
+    id BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    token_hash CHAR(64) NOT NULL,
+    previous_hash CHAR(64),
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    rotated_at TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL,
+    revoked_at TIMESTAMP,
+    user_agent VARCHAR(255),
+    ip_address VARCHAR(45)
+);
+
+-- Refresh and sign-out look sessions up by token
+CREATE UNIQUE INDEX IF NOT EXISTS idx_sessions_token_hash ON sessions(token_hash);
+-- Reuse detection: the token a session was rotated away from
+CREATE INDEX IF NOT EXISTS idx_sessions_previous_hash ON sessions(previous_hash) WHERE previous_hash IS NOT NULL;
+-- Revoking all of a user's live sessions (ban, deactivation, password reset)
+CREATE INDEX IF NOT EXISTS idx_sessions_user_live ON sessions(user_id) WHERE revoked_at IS NULL;
+-- Cleanup job
+CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions(expires_at);
+CREATE INDEX IF NOT EXISTS idx_sessions_revoked_at ON sessions(revoked_at) WHERE revoked_at IS NOT NULL;
+
+-- Banning or deactivating a user ends their sessions, whichever code path does it
+CREATE OR REPLACE FUNCTION revoke_user_sessions() RETURNS trigger AS $$
+BEGIN
+    UPDATE sessions SET revoked_at = NOW()
+    WHERE user_id = NEW.id AND revoked_at IS NULL;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS users_revoke_sessions ON users;
+CREATE TRIGGER users_revoke_sessions
+AFTER UPDATE OF user_status, is_active ON users
+FOR EACH ROW
+WHEN ((NEW.user_status = 'banned' AND OLD.user_status IS DISTINCT FROM 'banned')
+      OR (NEW.is_active IS FALSE AND OLD.is_active IS DISTINCT FROM FALSE))
+EXECUTE FUNCTION revoke_user_sessions();
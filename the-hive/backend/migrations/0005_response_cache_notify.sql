@@ -0,0 +1,77 @@
+-- Announce the response-cache tags of changed rows on the hive_cache channel; every
+-- worker drops the cached responses carrying them (see response_cache.py).
+-- Row triggers pass (tag prefix, column) pairs: ('service', 'id', 'user', 'user_id')
+-- sends "service:<id>,user:<user_id>". Statement triggers pass the one tag to send.
+-- Postgres folds identical notifications within a transaction into one.
+CREATE OR REPLACE FUNCTION response_cache_notify() RETURNS trigger AS $$
+DECLARE
+    row_data jsonb;
+    tags text[] := '{}';
+    i integer := 0;
+BEGIN
+    IF TG_LEVEL = 'STATEMENT' THEN
+        PERFORM pg_notify('hive_cache', TG_ARGV[0]);
+        RETURN NULL;
+    END IF;
+
+    row_data := to_jsonb(CASE WHEN TG_OP = 'DELETE' THEN OLD ELSE NEW END);
+    WHILE i < TG_NARGS LOOP
+        tags := tags || (TG_ARGV[i] || ':' || (row_data ->> TG_ARGV[i + 1]));
+        i := i + 2;
+    END LOOP;
+    PERFORM pg_notify('hive_cache', array_to_string(tags, ','));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- GET /api/tags
+DROP TRIGGER IF EXISTS tags_response_cache ON tags;
+CREATE TRIGGER tags_response_cache
+AFTER INSERT OR UPDATE OR DELETE ON tags
+FOR EACH STATEMENT EXECUTE FUNCTION response_cache_notify('tags');
+
+-- GET /api/services/<id> and the owner's GET /api/users/<id>
+DROP TRIGGER IF EXISTS services_response_cache ON services;
+CREATE TRIGGER services_response_cache
+AFTER INSERT OR UPDATE OR DELETE ON services
+FOR EACH ROW EXECUTE FUNCTION response_cache_notify('service', 'id', 'user', 'user_id');
+
+DROP TRIGGER IF EXISTS service_tags_response_cache ON service_tags;
+CREATE TRIGGER service_tags_response_cache
+AFTER INSERT OR UPDATE OR DELETE ON service_tags
+FOR EACH ROW EXECUTE FUNCTION response_cache_notify('service', 'service_id');
+
+DROP TRIGGER IF EXISTS service_availability_response_cache ON service_availability;
+CREATE TRIGGER service_availability_response_cache
+AFTER INSERT OR UPDATE OR DELETE ON service_availability
+FOR EACH ROW EXECUTE FUNCTION response_cache_notify('service', 'service_id');
+
+-- GET /api/users/<id> (and the provider block of their services); not last_login etc.
+DROP TRIGGER IF EXISTS users_response_cache ON users;
+CREATE TRIGGER users_response_cache
+AFTER UPDATE OF first_name, last_name, email, phone_number, biography, profile_photo,
+                is_verified, is_active, time_balance OR DELETE ON users
+FOR EACH ROW EXECUTE FUNCTION response_cache_notify('user', 'id');
+
+-- Completion counts and GET /api/users/<id>/reviews of both parties
+DROP TRIGGER IF EXISTS service_progress_response_cache ON service_progress;
+CREATE TRIGGER service_progress_response_cache
+AFTER INSERT OR UPDATE OR DELETE ON service_progress
+FOR EACH ROW EXECUTE FUNCTION response_cache_notify('user', 'provider_id', 'user', 'consumer_id');
+
+-- GET /api/forum/categories (names and thread counts)
+DROP TRIGGER IF EXISTS forum_categories_response_cache ON forum_categories;
+CREATE TRIGGER forum_categories_response_cache
+AFTER INSERT OR UPDATE OR DELETE ON forum_categories
+FOR EACH STATEMENT EXECUTE FUNCTION response_cache_notify('forum_categories');
+
+DROP TRIGGER IF EXISTS forum_threads_response_cache ON forum_threads;
+CREATE TRIGGER forum_threads_response_cache
+AFTER INSERT OR DELETE OR UPDATE OF category_id ON forum_threads
+FOR EACH STATEMENT EXECUTE FUNCTION response_cache_notify('forum_categories');
+
+-- GET /api/forum/threads/<id>/comments
+DROP TRIGGER IF EXISTS forum_comments_response_cache ON forum_comments;
+CREATE TRIGGER forum_comments_response_cache
+AFTER INSERT OR UPDATE OR DELETE ON forum_comments
+FOR EACH ROW EXECUTE FUNCTION response_cache_notify('forum_thread', 'thread_id');
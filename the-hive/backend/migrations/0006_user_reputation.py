@@ -0,0 +1,125 @@
+"""
+Per-user reputation aggregates (see reputation.py), backfilled from the services
+completed so far
+"""
+
+
+def upgrade(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_reputation (
+            user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+            completed_as_provider INTEGER NOT NULL DEFAULT 0,
+            completed_as_consumer INTEGER NOT NULL DEFAULT 0,
+            reviews_as_provider INTEGER NOT NULL DEFAULT 0,
+            reviews_as_consumer INTEGER NOT NULL DEFAULT 0,
+            provider_tags JSONB NOT NULL DEFAULT '{}',  -- tag -> reviews giving it (from consumers)
+            consumer_tags JSONB NOT NULL DEFAULT '{}',  -- tag -> reviews giving it (from providers)
+            time_less INTEGER NOT NULL DEFAULT 0,
+            time_as_estimated INTEGER NOT NULL DEFAULT 0,
+            time_more INTEGER NOT NULL DEFAULT 0,
+            last_review_at TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS reputation_progress (
+            progress_id INTEGER PRIMARY KEY REFERENCES service_progress(id) ON DELETE CASCADE,
+            counted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION reputation_add_counts(a jsonb, b jsonb) RETURNS jsonb AS $$
+            SELECT COALESCE(jsonb_object_agg(key, total), '{}')
+            FROM (
+                SELECT key, SUM(value::integer) AS total
+                FROM (
+                    SELECT * FROM jsonb_each_text(a)
+                    UNION ALL
+                    SELECT * FROM jsonb_each_text(b)
+                ) counts
+                GROUP BY key
+            ) totals
+        $$ LANGUAGE sql IMMUTABLE;
+    """)
+
+    # Count every completed service, as reputation.rebuild() did at the time
+    cursor.execute("""
+        WITH counted AS (
+            INSERT INTO reputation_progress (progress_id)
+            SELECT id FROM service_progress
+            WHERE status = 'completed'
+            ON CONFLICT (progress_id) DO NOTHING
+            RETURNING progress_id
+        ),
+        sides AS (
+            -- The consumer's survey reviews the provider, the provider's the consumer
+            SELECT sp.provider_id AS user_id, 'provider' AS role, sp.id AS progress_id,
+                   sp.consumer_survey_submitted IS TRUE AND sp.consumer_survey_data IS NOT NULL AS reviewed,
+                   sp.consumer_survey_data -> 'tags' AS tags,
+                   NULL AS time_comparison,
+                   COALESCE(sp.consumer_survey_submitted_at, sp.completed_at) AS reviewed_at
+            FROM counted c JOIN service_progress sp ON sp.id = c.progress_id
+            UNION ALL
+            SELECT sp.consumer_id, 'consumer', sp.id,
+                   sp.provider_survey_submitted IS TRUE AND sp.provider_survey_data IS NOT NULL,
+                   sp.provider_survey_data -> 'consumer_tags',
+                   sp.provider_survey_data ->> 'time_comparison',
+                   COALESCE(sp.provider_survey_submitted_at, sp.completed_at)
+            FROM counted c JOIN service_progress sp ON sp.id = c.progress_id
+        ),
+        tag_counts AS (
+            SELECT user_id, role, jsonb_object_agg(tag, reviews) AS tags
+            FROM (
+                SELECT s.user_id, s.role, t.tag, COUNT(DISTINCT s.progress_id) AS reviews
+                FROM sides s
+                CROSS JOIN LATERAL jsonb_array_elements_text(
+                    CASE WHEN jsonb_typeof(s.tags) = 'array' THEN s.tags ELSE '[]' END
+                ) AS t(tag)
+                WHERE s.reviewed
+                GROUP BY 1, 2, 3
+            ) per_tag
+            GROUP BY 1, 2
+        ),
+        totals AS (
+            SELECT user_id,
+                   COUNT(*) FILTER (WHERE role = 'provider') AS completed_as_provider,
+                   COUNT(*) FILTER (WHERE role = 'consumer') AS completed_as_consumer,
+                   COUNT(*) FILTER (WHERE role = 'provider' AND reviewed) AS reviews_as_provider,
+                   COUNT(*) FILTER (WHERE role = 'consumer' AND reviewed) AS reviews_as_consumer,
+                   COUNT(*) FILTER (WHERE reviewed AND time_comparison = 'less-time') AS time_less,
+                   COUNT(*) FILTER (WHERE reviewed AND time_comparison = 'as-estimated') AS time_as_estimated,
+                   COUNT(*) FILTER (WHERE reviewed AND time_comparison = 'more-time') AS time_more,
+                   MAX(reviewed_at) FILTER (WHERE reviewed) AS last_review_at
+            FROM sides
+            WHERE user_id IS NOT NULL
+            GROUP BY user_id
+        )
+        INSERT INTO user_reputation (
+            user_id, completed_as_provider, completed_as_consumer,
+            reviews_as_provider, reviews_as_consumer, provider_tags, consumer_tags,
+            time_less, time_as_estimated, time_more, last_review_at
+        )
+        SELECT t.user_id, t.completed_as_provider, t.completed_as_consumer,
+               t.reviews_as_provider, t.reviews_as_consumer,
+               COALESCE(pt.tags, '{}'), COALESCE(ct.tags, '{}'),
+               t.time_less, t.time_as_estimated, t.time_more, t.last_review_at
+        FROM totals t
+        LEFT JOIN tag_counts pt ON pt.user_id = t.user_id AND pt.role = 'provider'
+        LEFT JOIN tag_counts ct ON ct.user_id = t.user_id AND ct.role = 'consumer'
+        ORDER BY t.user_id
+        ON CONFLICT (user_id) DO UPDATE SET
+            completed_as_provider = user_reputation.completed_as_provider + EXCLUDED.completed_as_provider,
+            completed_as_consumer = user_reputation.completed_as_consumer + EXCLUDED.completed_as_consumer,
+            reviews_as_provider = user_reputation.reviews_as_provider + EXCLUDED.reviews_as_provider,
+            reviews_as_consumer = user_reputation.reviews_as_consumer + EXCLUDED.reviews_as_consumer,
+            provider_tags = reputation_add_counts(user_reputation.provider_tags, EXCLUDED.provider_tags),
+            consumer_tags = reputation_add_counts(user_reputation.consumer_tags, EXCLUDED.consumer_tags),
+            time_less = user_reputation.time_less + EXCLUDED.time_less,
+            time_as_estimated = user_reputation.time_as_estimated + EXCLUDED.time_as_estimated,
+            time_more = user_reputation.time_more + EXCLUDED.time_more,
+            last_review_at = GREATEST(user_reputation.last_review_at, EXCLUDED.last_review_at),
+            updated_at = NOW()
+    """)
+    print(f"Backfilled the reputation of {cursor.rowcount} user(s)")
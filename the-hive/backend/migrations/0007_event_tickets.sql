@@ -0,0 +1,13 @@
+-- Single-use tickets that open an event stream (see events.py). EventSource cannot send
+-- an Authorization header, and an access token in the URL would end up in access logs.
+-- Only the SHA-256 of a ticket is stored; the stream closes when the access token the
+-- ticket was issued for expires.
+CREATE TABLE IF NOT EXISTS event_tickets (
+    ticket_hash CHAR(64) PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    expires_at TIMESTAMP NOT NULL,
+    access_expires_at TIMESTAMP NOT NULL
+);
+
+-- Cleanup job
+CREATE INDEX IF NOT EXISTS idx_event_tickets_expires_at ON event_tickets(expires_at);
@@ -0,0 +1,60 @@
+"""
+Keyset (cursor) pagination helpers shared by list endpoints.
+Cursors are opaque, URL-safe tokens wrapping the sort key of the last row on a page,
+so the next page is fetched with an indexed "WHERE (sort_key) < (cursor)" instead of OFFSET.
+"""
+import base64
+import json
+from datetime import datetime
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a client sends a cursor that was not produced by encode_cursor()"""
+
+
+def encode_cursor(*values):
+    """Pack sort-key values (datetimes, ints, strings) into an opaque token"""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, *types):
+    """
+    Unpack a token produced by encode_cursor().
+    `types` gives the expected type of each value (datetime, int or str).
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError("Invalid cursor") from e
+
+    if not isinstance(payload, list) or len(payload) != len(types):
+        raise InvalidCursorError("Invalid cursor")
+
+    values = []
+    try:
+        for value, expected in zip(payload, types):
+            if expected is datetime:
+                values.append(datetime.fromisoformat(value))
+            elif expected is int:
+                if isinstance(value, bool) or not isinstance(value, int):
+                    raise TypeError(value)
+                values.append(value)
+            else:
+                values.append(expected(value))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError("Invalid cursor") from e
+    return tuple(values)
+
+
+def parse_limit(value, default, maximum):
+    """Parse a ?limit= value, falling back to `default` and clamping to 1..maximum"""
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer")
+    return max(1, min(limit, maximum))
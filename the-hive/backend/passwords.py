@@ -0,0 +1,257 @@
+"""
+Password hashing for The Hive
+bcrypt is deliberately slow (about a quarter of a second per hash at cost 12), so the
+hashing runs in a small process pool rather than in the request's worker, where a
+burst of logins would hold the CPU and stall every other request (and, on a gevent
+worker, every other greenlet). The gunicorn workers share PASSWORD_HASH_WORKERS
+processes out among themselves. Each pool is bounded: when PASSWORD_HASH_MAX_PENDING
+hashes are already queued or running, further ones fail fast with PasswordServiceBusy,
+as they do when the pool keeps breaking.
+
+The cost factor is BCRYPT_ROUNDS. Stored hashes of another cost are still accepted,
+and login rehashes them at the current cost (needs_rehash()), so raising or lowering
+the cost needs no migration. login_slot() caps concurrent logins per client IP and
+per account, so password checks cannot be used to exhaust the pool.
+"""
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+import bcrypt
+
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+# Hashing processes on the host, shared out among the gunicorn workers; 0 hashes in the request thread
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+# As in gunicorn.conf.py
+GUNICORN_WORKERS = int(os.environ.get('GUNICORN_WORKERS', 2))
+# Hashes queued or running per worker before new ones are refused
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 32))
+# Longest wait (seconds) for one hash, queueing included
+PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+LOGIN_MAX_CONCURRENT_PER_IP = int(os.environ.get('LOGIN_MAX_CONCURRENT_PER_IP', 8))
+LOGIN_MAX_CONCURRENT_PER_ACCOUNT = int(os.environ.get('LOGIN_MAX_CONCURRENT_PER_ACCOUNT', 2))
+
+# bcrypt only reads the first 72 bytes; bcrypt >= 5 raises instead of ignoring the rest
+MAX_PASSWORD_BYTES = 72
+
+_COST = re.compile(r"^\$2[abxy]?\$(\d{2})\$")
+
+
+class PasswordServiceBusy(Exception):
+    """The hashing pool is saturated (or too slow); the client should retry shortly"""
+
+
+class LoginThrottled(Exception):
+    """Too many logins in flight for this client or account"""
+
+
+def _encode(password):
+    return password.encode('utf-8')[:MAX_PASSWORD_BYTES]
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(_encode(password), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(password, hashed):
+    try:
+        return bcrypt.checkpw(_encode(password), hashed.encode('utf-8'))
+    except ValueError:
+        # Not a bcrypt hash (e.g. a placeholder for accounts without a password)
+        return False
+
+
+def pool_size(total, workers):
+    """Hashing processes of one worker: its share of `total`, at least one unless `total` is 0"""
+    if total <= 0:
+        return 0
+    return max(1, total // max(workers, 1))
+
+
+def hash_cost(hashed):
+    """The cost factor of a bcrypt hash, or None if it is not one"""
+    match = _COST.match(hashed or '')
+    return int(match.group(1)) if match else None
+
+
+class PasswordHasher:
+    """
+    bcrypt through a per-process pool of hashing processes.
+    The pool is created on first use, i.e. in the gunicorn worker after the fork, and
+    its processes are spawned (not forked) so they start without the worker's
+    threads, sockets or gevent hub.
+    """
+
+    def __init__(self, workers=None, rounds=None, max_pending=None, timeout=None):
+        # Defaults are read at construction time so tests and scripts can override module settings
+        self.workers = pool_size(PASSWORD_HASH_WORKERS, GUNICORN_WORKERS) if workers is None else workers
+        self.rounds = rounds or BCRYPT_ROUNDS
+        self.max_pending = max_pending or PASSWORD_HASH_MAX_PENDING
+        self.timeout = timeout or PASSWORD_HASH_TIMEOUT
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats = {"hashes": 0, "checks": 0, "rejected_busy": 0, "timeouts": 0, "pool_restarts": 0,
+                       "busy_ms": 0.0}
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None and self.workers > 0:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def _run(self, stat, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._stats["rejected_busy"] += 1
+                raise PasswordServiceBusy("Too many password checks in progress, please retry shortly")
+            self._pending += 1
+
+        started = time.monotonic()
+        try:
+            # A hashing process that dies breaks the whole pool: replace it and retry once
+            for attempt in (1, 2):
+                executor = self._get_executor()
+                if executor is None:
+                    return fn(*args)
+                try:
+                    future = executor.submit(fn, *args)
+                    return future.result(timeout=self.timeout)
+                except FutureTimeoutError:
+                    future.cancel()
+                    with self._lock:
+                        self._stats["timeouts"] += 1
+                    raise PasswordServiceBusy("Password check timed out, please retry shortly")
+                except BrokenProcessPool:
+                    print(f"Password hashing pool broke (attempt {attempt}); restarting it")
+                    with self._lock:
+                        self._stats["pool_restarts"] += 1
+                        if self._executor is executor:
+                            self._executor = None
+                    executor.shutdown(wait=False)
+            raise PasswordServiceBusy("Password service is unavailable, please retry shortly")
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._stats[stat] += 1
+                self._stats["busy_ms"] += (time.monotonic() - started) * 1000
+
+    def hash(self, password):
+        """bcrypt hash of the password at the current cost"""
+        return self._run("hashes", _hash, password, self.rounds)
+
+    def check(self, password, hashed):
+        """Whether the password matches the stored hash (of any cost)"""
+        return self._run("checks", _check, password, hashed)
+
+    def needs_rehash(self, hashed):
+        return hash_cost(hashed) != self.rounds
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def stats(self):
+        with self._lock:
+            done = self._stats["hashes"] + self._stats["checks"]
+            return {
+                "workers": self.workers,
+                "rounds": self.rounds,
+                "pending": self._pending,
+                **{name: value for name, value in self._stats.items() if name != "busy_ms"},
+                "avg_ms": round(self._stats["busy_ms"] / done, 1) if done else None
+            }
+
+
+class ConcurrencyLimiter:
+    """In-flight count per key, capped at `limit`"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._counts = {}
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def acquire(self, key):
+        with self._lock:
+            count = self._counts.get(key, 0)
+            if count >= self.limit:
+                self.rejected += 1
+                return False
+            self._counts[key] = count + 1
+            return True
+
+    def release(self, key):
+        with self._lock:
+            count = self._counts.get(key, 0) - 1
+            if count > 0:
+                self._counts[key] = count
+            else:
+                self._counts.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {"limit": self.limit, "keys": len(self._counts), "rejected": self.rejected}
+
+
+_hasher = None
+_hasher_lock = threading.Lock()
+_per_ip = ConcurrencyLimiter(LOGIN_MAX_CONCURRENT_PER_IP)
+_per_account = ConcurrencyLimiter(LOGIN_MAX_CONCURRENT_PER_ACCOUNT)
+
+
+def get_hasher():
+    """The process-wide hasher; its pool starts on first use"""
+    global _hasher
+    if _hasher is None:
+        with _hasher_lock:
+            if _hasher is None:
+                _hasher = PasswordHasher()
+    return _hasher
+
+
+def hash_password(password):
+    """Raises PasswordServiceBusy when the pool is saturated"""
+    return get_hasher().hash(password)
+
+
+def check_password(password, hashed):
+    """Raises PasswordServiceBusy when the pool is saturated"""
+    return get_hasher().check(password, hashed)
+
+
+def needs_rehash(hashed):
+    return get_hasher().needs_rehash(hashed)
+
+
+@contextmanager
+def login_slot(client_ip, account):
+    """Hold one of the login slots of this client and account; raises LoginThrottled if none is free"""
+    account = account.lower()
+    if not _per_ip.acquire(client_ip):
+        raise LoginThrottled("Too many login attempts in progress from this address")
+    if not _per_account.acquire(account):
+        _per_ip.release(client_ip)
+        raise LoginThrottled("Too many login attempts in progress for this account")
+    try:
+        yield
+    finally:
+        _per_account.release(account)
+        _per_ip.release(client_ip)
+
+
+def password_stats():
+    """Hashing pool and login limiter metrics for /api/health"""
+    return {
+        "hashing": _hasher.stats() if _hasher is not None else None,
+        "login_per_ip": _per_ip.stats(),
+        "login_per_account": _per_account.stats()
+    }
@@ -0,0 +1,254 @@
+"""
+SQL instrumentation for The Hive
+Every connection from db_pool uses InstrumentedCursor, a RealDictCursor that times
+each statement and records it under its fingerprint (the SQL with literals and
+parameters replaced by ?) for the endpoint that issued it. Per request this gives:
+- a Server-Timing header (db time and query count), visible in the browser dev tools
+- an N+1 warning when one fingerprint runs QUERY_N_PLUS_ONE_THRESHOLD times or more
+- a JSON line in the slow-query log for statements over SLOW_QUERY_MS
+Totals per endpoint and fingerprint are kept in memory (per worker process) for
+GET /api/admin/query-stats. Queries outside a request count under "background".
+"""
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from flask import g, has_request_context, request
+from psycopg2.extras import RealDictCursor
+
+QUERY_STATS_ENABLED = os.environ.get('QUERY_STATS_ENABLED', 'true').lower() == 'true'
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 200))
+# Append slow-query records to this file instead of stdout
+SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG')
+QUERY_N_PLUS_ONE_THRESHOLD = int(os.environ.get('QUERY_N_PLUS_ONE_THRESHOLD', 10))
+# Distinct fingerprints kept per endpoint; further ones are counted under "(other)"
+MAX_FINGERPRINTS = 200
+
+BACKGROUND = 'background'
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    """Statement shape: literals and parameters as ?, value lists as (?...), whitespace collapsed"""
+    sql = _STRING.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _LIST.sub('(?...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+class EndpointStats:
+    """Running totals for one endpoint"""
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.db_ms = 0.0
+        self.max_queries = 0
+        self.n_plus_one = 0
+        self.fingerprints = {}    # fingerprint -> [calls, total_ms, max_ms, rows]
+
+    def add_query(self, sql, calls, total_ms, max_ms, rows):
+        self.queries += calls
+        self.db_ms += total_ms
+        entry = self.fingerprints.get(sql)
+        if entry is None:
+            if len(self.fingerprints) >= MAX_FINGERPRINTS:
+                sql = '(other)'
+            entry = self.fingerprints.setdefault(sql, [0, 0.0, 0.0, 0])
+        entry[0] += calls
+        entry[1] += total_ms
+        entry[2] = max(entry[2], max_ms)
+        entry[3] += rows
+
+    def snapshot(self, top):
+        queries = sorted(self.fingerprints.items(), key=lambda item: item[1][1], reverse=True)[:top]
+        return {
+            "requests": self.requests,
+            "queries": self.queries,
+            "queries_per_request": round(self.queries / self.requests, 2) if self.requests else None,
+            "max_queries": self.max_queries,
+            "db_ms": round(self.db_ms, 2),
+            "db_ms_per_request": round(self.db_ms / self.requests, 2) if self.requests else None,
+            "n_plus_one": self.n_plus_one,
+            "top_queries": [{
+                "fingerprint": sql,
+                "calls": calls,
+                "total_ms": round(total_ms, 2),
+                "avg_ms": round(total_ms / calls, 3),
+                "max_ms": round(max_ms, 2),
+                "rows": rows
+            } for sql, (calls, total_ms, max_ms, rows) in queries]
+        }
+
+
+class QueryStats:
+    """Per-endpoint totals shared by all requests of this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.since = datetime.now(timezone.utc)
+            self.endpoints = {}
+
+    def _endpoint(self, name):
+        stats = self.endpoints.get(name)
+        if stats is None:
+            stats = self.endpoints[name] = EndpointStats()
+        return stats
+
+    def add_background_query(self, sql, elapsed_ms, rows):
+        with self._lock:
+            self._endpoint(BACKGROUND).add_query(sql, 1, elapsed_ms, elapsed_ms, max(rows, 0))
+
+    def add_request(self, endpoint, trace):
+        """Fold one finished request's RequestTrace into the totals"""
+        with self._lock:
+            stats = self._endpoint(endpoint)
+            stats.requests += 1
+            stats.max_queries = max(stats.max_queries, trace.queries)
+            stats.n_plus_one += bool(trace.repeated())
+            for sql, entry in trace.fingerprints.items():
+                stats.add_query(sql, *entry)
+
+    def snapshot(self, top=10):
+        with self._lock:
+            endpoints = [{"endpoint": name, **stats.snapshot(top)} for name, stats in self.endpoints.items()]
+            since = self.since
+        endpoints.sort(key=lambda e: e['db_ms'], reverse=True)
+        return {"since": since.isoformat(), "pid": os.getpid(), "endpoints": endpoints}
+
+
+class RequestTrace:
+    """The statements of one request, by fingerprint"""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_ms = 0.0
+        self.fingerprints = {}    # fingerprint -> [calls, total_ms, max_ms, rows]
+
+    def add(self, sql, elapsed_ms, rows):
+        self.queries += 1
+        self.db_ms += elapsed_ms
+        entry = self.fingerprints.setdefault(sql, [0, 0.0, 0.0, 0])
+        entry[0] += 1
+        entry[1] += elapsed_ms
+        entry[2] = max(entry[2], elapsed_ms)
+        entry[3] += max(rows, 0)
+
+    def repeated(self):
+        """Fingerprints run often enough in this request to look like an N+1 loop: {fingerprint: calls}"""
+        return {sql: entry[0] for sql, entry in self.fingerprints.items()
+                if entry[0] >= QUERY_N_PLUS_ONE_THRESHOLD}
+
+
+_stats = QueryStats()
+
+
+def query_stats(top=10):
+    """Per-endpoint query totals of this process since start (or the last reset)"""
+    return _stats.snapshot(top)
+
+
+def reset_query_stats():
+    _stats.reset()
+
+
+def log_event(event, **fields):
+    """One structured (JSON) log line: stdout, or SLOW_QUERY_LOG when set"""
+    line = json.dumps({"event": event, "at": datetime.now(timezone.utc).isoformat(), **fields}, default=str)
+    if SLOW_QUERY_LOG:
+        with open(SLOW_QUERY_LOG, 'a') as f:
+            f.write(line + "\n")
+    else:
+        print(line, flush=True)
+
+
+def _current_trace():
+    if not has_request_context():
+        return None
+    return g.get('_query_trace')
+
+
+def _record(statement, elapsed_ms, rows):
+    sql = fingerprint(statement)
+    trace = _current_trace()
+    if trace is not None:
+        trace.add(sql, elapsed_ms, rows)
+    else:
+        _stats.add_background_query(sql, elapsed_ms, rows)
+    if elapsed_ms >= SLOW_QUERY_MS:
+        log_event("slow_query", endpoint=trace.endpoint if trace else BACKGROUND,
+                  duration_ms=round(elapsed_ms, 2), rows=rows, fingerprint=sql)
+
+
+def _statement_text(cursor, query):
+    if isinstance(query, bytes):
+        return query.decode('utf-8', 'replace')
+    if not isinstance(query, str):
+        # psycopg2.sql.Composed
+        return query.as_string(cursor.connection)
+    return query
+
+
+class InstrumentedCursor(RealDictCursor):
+    """RealDictCursor that records every statement it runs (see module docstring)"""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            _record(_statement_text(self, query), (time.perf_counter() - started) * 1000, self.rowcount)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            _record(_statement_text(self, query), (time.perf_counter() - started) * 1000, self.rowcount)
+
+
+def cursor_factory():
+    """Cursor class for new connections: instrumented unless QUERY_STATS_ENABLED=false"""
+    return InstrumentedCursor if QUERY_STATS_ENABLED else RealDictCursor
+
+
+def init_app(app):
+    """Trace the statements of every request and report them when it ends"""
+    if not QUERY_STATS_ENABLED:
+        return
+
+    @app.before_request
+    def _start_trace():
+        g._query_trace = RequestTrace(f"{request.method} {request.url_rule.rule}" if request.url_rule else None)
+
+    @app.after_request
+    def _finish_trace(response):
+        trace = g.pop('_query_trace', None)
+        if trace is None:
+            return response
+        total_ms = (time.perf_counter() - trace.started) * 1000
+        response.headers.add('Server-Timing', f'db;dur={trace.db_ms:.2f};desc="{trace.queries} queries"')
+        response.headers.add('Server-Timing', f'app;dur={total_ms:.2f}')
+        if trace.endpoint is None:
+            return response
+        for sql, calls in trace.repeated().items():
+            log_event("n_plus_one", endpoint=trace.endpoint, calls=calls, fingerprint=sql)
+        _stats.add_request(trace.endpoint, trace)
+        return response
@@ -0,0 +1,200 @@
+"""
+Per-user reputation aggregated from completion surveys
+user_reputation holds, for every user, the completions per role, how often each
+survey tag was given to them, the providers' time comparisons of their requests and
+when they were last reviewed, so profiles and service listings read one row instead of
+unpacking survey JSON.
+
+apply() adds completed service progress rows to the aggregates in the transaction that
+completes them (submit_completion_survey() and the expired-survey processor). It is
+idempotent: reputation_progress records which rows were counted. rebuild() recomputes
+everything from service_progress (the migration that adds the tables does the same):
+
+    python3 reputation.py --rebuild
+
+Incremental changes invalidate cached profiles through the service_progress update
+they come with; after a rebuild cached profiles catch up within their TTL.
+"""
+import argparse
+
+# Score of a provider's time comparison; the average is reported in [-1, 1]
+TIME_SCORES = {'less-time': -1, 'as-estimated': 0, 'more-time': 1}
+TIME_COLUMNS = {'less-time': 'time_less', 'as-estimated': 'time_as_estimated', 'more-time': 'time_more'}
+# Tags shown with each service in listings
+LISTING_TAGS = 3
+
+
+def _accumulate(cursor, progress_filter="", params=None):
+    """
+    Count the completed progress rows matching `progress_filter` that were not counted
+    yet and add them to their users' aggregates. Returns the number of users updated.
+    """
+    cursor.execute(f"""
+        WITH counted AS (
+            INSERT INTO reputation_progress (progress_id)
+            SELECT id FROM service_progress
+            WHERE status = 'completed' {progress_filter}
+            ON CONFLICT (progress_id) DO NOTHING
+            RETURNING progress_id
+        ),
+        sides AS (
+            -- The consumer's survey reviews the provider, the provider's the consumer
+            SELECT sp.provider_id AS user_id, 'provider' AS role, sp.id AS progress_id,
+                   sp.consumer_survey_submitted IS TRUE AND sp.consumer_survey_data IS NOT NULL AS reviewed,
+                   sp.consumer_survey_data -> 'tags' AS tags,
+                   NULL AS time_comparison,
+                   COALESCE(sp.consumer_survey_submitted_at, sp.completed_at) AS reviewed_at
+            FROM counted c JOIN service_progress sp ON sp.id = c.progress_id
+            UNION ALL
+            SELECT sp.consumer_id, 'consumer', sp.id,
+                   sp.provider_survey_submitted IS TRUE AND sp.provider_survey_data IS NOT NULL,
+                   sp.provider_survey_data -> 'consumer_tags',
+                   sp.provider_survey_data ->> 'time_comparison',
+                   COALESCE(sp.provider_survey_submitted_at, sp.completed_at)
+            FROM counted c JOIN service_progress sp ON sp.id = c.progress_id
+        ),
+        tag_counts AS (
+            SELECT user_id, role, jsonb_object_agg(tag, reviews) AS tags
+            FROM (
+                SELECT s.user_id, s.role, t.tag, COUNT(DISTINCT s.progress_id) AS reviews
+                FROM sides s
+                CROSS JOIN LATERAL jsonb_array_elements_text(
+                    CASE WHEN jsonb_typeof(s.tags) = 'array' THEN s.tags ELSE '[]' END
+                ) AS t(tag)
+                WHERE s.reviewed
+                GROUP BY 1, 2, 3
+            ) per_tag
+            GROUP BY 1, 2
+        ),
+        totals AS (
+            SELECT user_id,
+                   COUNT(*) FILTER (WHERE role = 'provider') AS completed_as_provider,
+                   COUNT(*) FILTER (WHERE role = 'consumer') AS completed_as_consumer,
+                   COUNT(*) FILTER (WHERE role = 'provider' AND reviewed) AS reviews_as_provider,
+                   COUNT(*) FILTER (WHERE role = 'consumer' AND reviewed) AS reviews_as_consumer,
+                   COUNT(*) FILTER (WHERE reviewed AND time_comparison = 'less-time') AS time_less,
+                   COUNT(*) FILTER (WHERE reviewed AND time_comparison = 'as-estimated') AS time_as_estimated,
+                   COUNT(*) FILTER (WHERE reviewed AND time_comparison = 'more-time') AS time_more,
+                   MAX(reviewed_at) FILTER (WHERE reviewed) AS last_review_at
+            FROM sides
+            WHERE user_id IS NOT NULL
+            GROUP BY user_id
+        )
+        INSERT INTO user_reputation (
+            user_id, completed_as_provider, completed_as_consumer,
+            reviews_as_provider, reviews_as_consumer, provider_tags, consumer_tags,
+            time_less, time_as_estimated, time_more, last_review_at
+        )
+        SELECT t.user_id, t.completed_as_provider, t.completed_as_consumer,
+               t.reviews_as_provider, t.reviews_as_consumer,
+               COALESCE(pt.tags, '{{}}'), COALESCE(ct.tags, '{{}}'),
+               t.time_less, t.time_as_estimated, t.time_more, t.last_review_at
+        FROM totals t
+        LEFT JOIN tag_counts pt ON pt.user_id = t.user_id AND pt.role = 'provider'
+        LEFT JOIN tag_counts ct ON ct.user_id = t.user_id AND ct.role = 'consumer'
+        ORDER BY t.user_id
+        ON CONFLICT (user_id) DO UPDATE SET
+            completed_as_provider = user_reputation.completed_as_provider + EXCLUDED.completed_as_provider,
+            completed_as_consumer = user_reputation.completed_as_consumer + EXCLUDED.completed_as_consumer,
+            reviews_as_provider = user_reputation.reviews_as_provider + EXCLUDED.reviews_as_provider,
+            reviews_as_consumer = user_reputation.reviews_as_consumer + EXCLUDED.reviews_as_consumer,
+            provider_tags = reputation_add_counts(user_reputation.provider_tags, EXCLUDED.provider_tags),
+            consumer_tags = reputation_add_counts(user_reputation.consumer_tags, EXCLUDED.consumer_tags),
+            time_less = user_reputation.time_less + EXCLUDED.time_less,
+            time_as_estimated = user_reputation.time_as_estimated + EXCLUDED.time_as_estimated,
+            time_more = user_reputation.time_more + EXCLUDED.time_more,
+            last_review_at = GREATEST(user_reputation.last_review_at, EXCLUDED.last_review_at),
+            updated_at = NOW()
+    """, params or {})
+    return cursor.rowcount
+
+
+def apply(cursor, progress_ids):
+    """Add newly completed progress rows to their users' reputation; rows already counted are skipped"""
+    if not progress_ids:
+        return 0
+    return _accumulate(cursor, "AND id = ANY(%(ids)s)", {"ids": list(progress_ids)})
+
+
+def rebuild(cursor):
+    """
+    Recompute every user's reputation from service_progress.
+    Completions committed meanwhile wait for the (short) duration, so nothing is lost
+    or counted twice. Returns the number of users with a reputation.
+    """
+    cursor.execute("LOCK TABLE user_reputation, reputation_progress IN EXCLUSIVE MODE;")
+    cursor.execute("DELETE FROM reputation_progress;")
+    cursor.execute("DELETE FROM user_reputation;")
+    return _accumulate(cursor)
+
+
+def _sorted_tags(tags):
+    return dict(sorted((tags or {}).items(), key=lambda item: (-item[1], item[0])))
+
+
+def to_dict(row):
+    """API shape of a user_reputation row (or of a user without one, when `row` is None)"""
+    row = row or {}
+    times = {value: row.get(column, 0) for value, column in TIME_COLUMNS.items()}
+    compared = sum(times.values())
+    last_review_at = row.get('last_review_at')
+    if last_review_at is not None and not isinstance(last_review_at, str):
+        last_review_at = last_review_at.isoformat()
+    return {
+        "as_provider": {
+            "completed": row.get('completed_as_provider', 0),
+            "reviews": row.get('reviews_as_provider', 0),
+            "tags": _sorted_tags(row.get('provider_tags'))
+        },
+        "as_consumer": {
+            "completed": row.get('completed_as_consumer', 0),
+            "reviews": row.get('reviews_as_consumer', 0),
+            "tags": _sorted_tags(row.get('consumer_tags')),
+            "time_comparison": {
+                "less_time": times['less-time'],
+                "as_estimated": times['as-estimated'],
+                "more_time": times['more-time'],
+                "average": round(sum(TIME_SCORES[value] * n for value, n in times.items()) / compared, 2)
+                if compared else None
+            }
+        },
+        "last_review_at": last_review_at
+    }
+
+
+def listing_summary(row, service_type):
+    """
+    Compact reputation of a service's owner for listings, in the role they take in it:
+    provider for offers, consumer for needs. `row` is to_jsonb(user_reputation) or None.
+    """
+    role = to_dict(row)["as_provider" if service_type == 'offer' else "as_consumer"]
+    return {
+        "completed": role["completed"],
+        "reviews": role["reviews"],
+        "top_tags": list(role["tags"])[:LISTING_TAGS]
+    }
+
+
+def get(cursor, user_id):
+    """A user's reputation (zeros if they have none yet)"""
+    cursor.execute("SELECT * FROM user_reputation WHERE user_id = %s", (user_id,))
+    return to_dict(cursor.fetchone())
+
+
+if __name__ == "__main__":
+    import db_pool
+
+    parser = argparse.ArgumentParser(description="Maintain the per-user reputation aggregates")
+    parser.add_argument('--rebuild', action='store_true', required=True,
+                        help="recompute every user's reputation from service_progress (backfill)")
+    args = parser.parse_args()
+
+    conn = db_pool.connect()
+    try:
+        cursor = conn.cursor()
+        users = rebuild(cursor)
+        conn.commit()
+        cursor.close()
+        print(f"Rebuilt the reputation of {users} user(s)")
+    finally:
+        conn.close()
@@ -5,50 +5,35 @@ Drops all tables and recreates them with the latest schema.
 USE WITH CAUTION - This will delete ALL data!
 """
 
-import os
 import sys
-import psycopg2
-from psycopg2.extras import RealDictCursor
+
+import db_pool
 
 def get_db_connection():
-    """Get database connection using environment variables."""
-    # Check for DigitalOcean DATABASE_URL first
-    database_url = os.getenv('DATABASE_URL')
-    if database_url:
-        return psycopg2.connect(database_url, cursor_factory=RealDictCursor)
-    
-    # Fallback to docker-compose style environment variables
-    return psycopg2.connect(
-        host=os.getenv('POSTGRES_HOST', 'localhost'),
-        database=os.getenv('POSTGRES_DB', 'hive_db'),
-        user=os.getenv('POSTGRES_USER', 'hive_user'),
-        password=os.getenv('POSTGRES_PASSWORD', 'hive_password'),
-        cursor_factory=RealDictCursor
-    )
+    """Get database connection from the shared pool (same settings as the app)."""
+    # DATABASE_URL (DigitalOcean) is picked up by db_pool first;
+    # these defaults only apply to docker-compose style variables that are unset
+    return db_pool.connect(defaults={
+        'host': 'localhost',
+        'database': 'hive_db',
+        'user': 'hive_user',
+        'password': 'hive_password'
+    })
 
 def drop_all_tables(cursor):
-    """Drop all tables in the correct order (respecting foreign keys)."""
+    """
+    Drop the public schema with everything in it: tables, the migrations' functions and
+    triggers, and schema_version, so the migrations start again from an empty database.
+    """
     print("\n🗑️  Dropping all tables...")
     
-    tables = [
-        'messages',
-        'service_progress',
-        'service_applications',
-        'service_availability',
-        'service_tags',
-        'services',
-        'password_reset_tokens',
-        'email_verifications',
-        'tags',
-        'users'
-    ]
+    cursor.execute("SELECT tablename FROM pg_tables WHERE schemaname = 'public' ORDER BY tablename;")
+    tables = [row['tablename'] for row in cursor.fetchall()]
     
+    cursor.execute("DROP SCHEMA public CASCADE;")
+    cursor.execute("CREATE SCHEMA public;")
     for table in tables:
-        try:
-            cursor.execute(f"DROP TABLE IF EXISTS {table} CASCADE;")
-            print(f"   ✅ Dropped table: {table}")
-        except Exception as e:
-            print(f"   ⚠️  Error dropping {table}: {e}")
+        print(f"   ✅ Dropped table: {table}")
     
     print("\n✅ All tables dropped successfully!")
 
@@ -86,7 +71,7 @@ def main():
         print("="*60)
         print("\n📝 Next steps:")
         print("   1. Restart your application")
-        print("   2. The app.py init_db() function will recreate all tables")
+        print("   2. The schema migrations (python3 migrate.py, also run on startup) will recreate all tables")
         print("   3. Database will be fresh with no data")
         print("\n💡 For DigitalOcean:")
         print("   - Go to Apps → Your App → Actions → Force Rebuild and Deploy")
@@ -5,55 +5,42 @@ Drops all tables and recreates them with the latest schema.
 USE WITH CAUTION - This will delete ALL data!
 """
 
-import os
 import sys
-import psycopg2
-from psycopg2.extras import RealDictCursor
+
+import db_pool
 
 def get_db_connection():
-    """Get database connection using environment variables."""
+    """Get database connection from the shared pool using environment variables."""
     # Fallback to docker-compose style environment variables
     # Note: Use 'db' when running inside Docker, 'localhost' when running from host machine
-    host = os.getenv('POSTGRES_HOST', 'localhost')  # Default to localhost for local execution
-    database = os.getenv('POSTGRES_DB', 'mydatabase')
-    user = os.getenv('POSTGRES_USER', 'myuser')
-    password = os.getenv('POSTGRES_PASSWORD', 'mypassword')
-    port = os.getenv('POSTGRES_PORT', '5433')
+    defaults = {
+        'host': 'localhost',  # Default to localhost for local execution
+        'database': 'mydatabase',
+        'user': 'myuser',
+        'password': 'mypassword',
+        'port': '5433'
+    }
     
-    print(f"Connecting to: {user}@{host}:{port}/{database}")
+    params = db_pool.connection_params(defaults, use_database_url=False)
+    print(f"Connecting to: {params['user']}@{params['host']}:{params['port']}/{params['database']}")
     
-    return psycopg2.connect(
-        host=host,
-        port=port,
-        database=database,
-        user=user,
-        password=password,
-        cursor_factory=RealDictCursor
-    )
+    return db_pool.connect(defaults, use_database_url=False)
+
 
 def drop_all_tables(cursor):
-    """Drop all tables in the correct order (respecting foreign keys)."""
+    """
+    Drop the public schema with everything in it: tables, the migrations' functions and
+    triggers, and schema_version, so the migrations start again from an empty database.
+    """
     print("\n🗑️  Dropping all tables...")
     
-    tables = [
-        'messages',
-        'service_progress',
-        'service_applications',
-        'service_availability',
-        'service_tags',
-        'services',
-        'password_reset_tokens',
-        'email_verifications',
-        'tags',
-        'users'
-    ]
+    cursor.execute("SELECT tablename FROM pg_tables WHERE schemaname = 'public' ORDER BY tablename;")
+    tables = [row['tablename'] for row in cursor.fetchall()]
     
+    cursor.execute("DROP SCHEMA public CASCADE;")
+    cursor.execute("CREATE SCHEMA public;")
     for table in tables:
-        try:
-            cursor.execute(f"DROP TABLE IF EXISTS {table} CASCADE;")
-            print(f"   ✅ Dropped table: {table}")
-        except Exception as e:
-            print(f"   ⚠️  Error dropping {table}: {e}")
+        print(f"   ✅ Dropped table: {table}")
     
     print("\n✅ All tables dropped successfully!")
 
@@ -91,7 +78,7 @@ def main():
         print("="*60)
         print("\n📝 Next steps:")
         print("   1. Restart your application")
-        print("   2. The app.py init_db() function will recreate all tables")
+        print("   2. The schema migrations (python3 migrate.py, also run on startup) will recreate all tables")
         print("   3. Database will be fresh with no data")
         print("\n💡 For DigitalOcean:")
         print("   - Go to Apps → Your App → Actions → Force Rebuild and Deploy")
@@ -0,0 +1,405 @@
+"""
+Response cache for public read endpoints
+@cached(ttl, tags) on a GET view stores its 200 JSON responses keyed by path and
+normalized query string, and sends a strong ETag with every response. A cached
+response is served (or answered with 304 when If-None-Match matches) without running
+the view, so without touching Postgres.
+
+Every entry carries tags naming what it shows ("service:12", "user:5", "tags", ...).
+Triggers on the underlying tables (migrations/0005_response_cache_notify.sql) NOTIFY
+the tags of every changed row on CHANNEL, and each worker hears them on its shared
+LISTEN connection (events.Listener) and drops the matching entries; write handlers
+also call invalidate() after committing, so their own worker never serves the old
+copy. As in auth.py, nothing is cached while the listener is disconnected, the cache
+is emptied on reconnect, and a response computed while an invalidation came in is not
+stored.
+
+The backend is an in-process LRU (default) or, with RESPONSE_CACHE_BACKEND=redis and
+the redis package installed, a Redis server shared by the workers. A shared backend is
+kept by one worker at a time, the holder of a short lease in Redis: it applies the
+notified invalidations, and empties the backend when it takes the lease over (nobody
+may have been applying them before). The other workers only apply those of their own
+write handlers.
+"""
+import functools
+import hashlib
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+from flask import make_response, request
+
+import events
+
+CHANNEL = 'hive_cache'
+
+RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+# "memory" (per worker process) or "redis"
+RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'memory')
+RESPONSE_CACHE_REDIS_URL = os.environ.get('RESPONSE_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+# Responses kept per process by the memory backend
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 5000))
+# Seconds the invalidator lease on a shared backend lasts unless renewed (at every listener tick)
+LEASE_TTL = 3 * events.POLL_TIMEOUT
+
+HIT = 'HIT'
+MISS = 'MISS'
+BYPASS = 'BYPASS'
+
+
+def cache_key(path, args):
+    """Path plus the query arguments sorted by name and value"""
+    pairs = sorted((name, value) for name in args for value in args.getlist(name))
+    return f"{path}?{urlencode(pairs)}" if pairs else path
+
+
+class MemoryBackend:
+    """LRU of key -> (etag, body, expires_at, tags), with a tag -> keys index"""
+
+    shared = False
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            for tag in entry[3]:
+                keys = self._tags.get(tag)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._tags[tag]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] <= time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def set(self, key, etag, body, ttl, tags):
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (etag, body, time.monotonic() + ttl, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, tags):
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def size(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class RedisBackend:
+    """
+    Entries as Redis hashes (etag, body) with a TTL, plus one set of keys per tag.
+    Redis errors are logged and treated as a miss.
+    """
+
+    shared = True
+    PREFIX = 'hive:response:'
+    # Tag sets outlive the longest entry TTL
+    TAG_TTL = 24 * 3600
+    # Outside PREFIX, so clear() leaves it alone
+    LEASE_KEY = 'hive:response-invalidator'
+
+    def __init__(self, url=RESPONSE_CACHE_REDIS_URL):
+        import redis
+        self._errors = redis.RedisError
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._renew = self.client.register_script("""
+            if redis.call('get', KEYS[1]) == ARGV[1] then
+                return redis.call('expire', KEYS[1], ARGV[2])
+            end
+            return 0
+        """)
+        self._release = self.client.register_script("""
+            if redis.call('get', KEYS[1]) == ARGV[1] then
+                return redis.call('del', KEYS[1])
+            end
+            return 0
+        """)
+
+    def _tag_key(self, tag):
+        return f"{self.PREFIX}tag:{tag}"
+
+    def get(self, key):
+        try:
+            etag, body = self.client.hmget(self.PREFIX + key, 'etag', 'body')
+        except self._errors as e:
+            print(f"Response cache read failed for {key}: {e}")
+            return None
+        if etag is None or body is None:
+            return None
+        return etag.decode('ascii'), body
+
+    def set(self, key, etag, body, ttl, tags):
+        try:
+            pipe = self.client.pipeline()
+            pipe.hset(self.PREFIX + key, mapping={'etag': etag, 'body': body})
+            pipe.expire(self.PREFIX + key, int(ttl))
+            for tag in tags:
+                pipe.sadd(self._tag_key(tag), key)
+                pipe.expire(self._tag_key(tag), self.TAG_TTL)
+            pipe.execute()
+        except self._errors as e:
+            print(f"Response cache write failed for {key}: {e}")
+
+    def invalidate(self, tags):
+        try:
+            for tag in tags:
+                keys = self.client.smembers(self._tag_key(tag))
+                self.client.delete(self._tag_key(tag), *(self.PREFIX + k.decode('utf-8') for k in keys))
+        except self._errors as e:
+            print(f"Response cache invalidation failed for {', '.join(tags)}: {e}")
+
+    def clear(self):
+        try:
+            for key in self.client.scan_iter(match=self.PREFIX + '*', count=1000):
+                self.client.delete(key)
+        except self._errors as e:
+            print(f"Response cache clear failed: {e}")
+
+    def size(self):
+        return None
+
+    def lease(self, owner, ttl):
+        """Take or renew the invalidator lease; True while `owner` holds it"""
+        try:
+            if self.client.set(self.LEASE_KEY, owner, nx=True, ex=int(ttl)):
+                return True
+            return bool(self._renew(keys=[self.LEASE_KEY], args=[owner, int(ttl)]))
+        except self._errors as e:
+            print(f"Response cache lease failed: {e}")
+            return False
+
+    def release(self, owner):
+        try:
+            self._release(keys=[self.LEASE_KEY], args=[owner])
+        except self._errors as e:
+            print(f"Response cache lease release failed: {e}")
+
+
+def make_backend():
+    if RESPONSE_CACHE_BACKEND == 'redis':
+        try:
+            return RedisBackend()
+        except ImportError:
+            print("Warning: RESPONSE_CACHE_BACKEND=redis but the redis package is not installed; "
+                  "using the in-process cache")
+    return MemoryBackend()
+
+
+class RouteStats:
+    """Outcomes of one cached view"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.bypassed = 0
+
+    def snapshot(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "bypassed": self.bypassed,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None
+        }
+
+
+class ResponseCache:
+    """The backend plus the notification handler that keeps it consistent (see module docstring)"""
+
+    def __init__(self, backend=None):
+        self.backend = backend or make_backend()
+        self.connected = False
+        # With a shared backend: whether this worker holds the invalidator lease
+        self.invalidator = False
+        self._owner = f"{socket.gethostname()}:{os.getpid()}"
+        # Bumped by every invalidation; a response that raced one is not stored
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._routes = {}
+        self._stats = {"invalidations": 0, "reconnects": 0}
+
+    def start(self, listener=None):
+        """Follow CHANNEL on `listener` (the worker's, by default)"""
+        (listener or events.get_listener()).add(CHANNEL, self.dispatch, self._connected, self._disconnected,
+                                                self._tick)
+        return self
+
+    def _connected(self, reconnected):
+        # Changes made while we were not listening were not announced
+        if self.backend.shared:
+            self._claim()
+        else:
+            self.invalidate(None)
+        self.connected = True
+        if reconnected:
+            self._stats["reconnects"] += 1
+
+    def _disconnected(self):
+        self.connected = False
+        if self.invalidator:
+            self.invalidator = False
+            self.backend.release(self._owner)
+
+    def _tick(self):
+        if self.backend.shared:
+            self._claim()
+
+    def _claim(self):
+        """Take or keep the invalidator lease of the shared backend, emptying it on takeover"""
+        held = self.backend.lease(self._owner, LEASE_TTL)
+        if held and not self.invalidator:
+            self.invalidate(None)
+        self.invalidator = held
+
+    def _count(self, route, outcome):
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = self._routes[route] = RouteStats()
+            setattr(stats, outcome, getattr(stats, outcome) + 1)
+
+    def respond(self, route, view, view_args, ttl, tags):
+        """The view's response, from the cache when possible, with an ETag and conditional handling"""
+        key = cache_key(request.path, request.args)
+        entry = self.backend.get(key) if self.connected else None
+        if entry is not None:
+            etag, body = entry
+            response = make_response(body, 200, {'Content-Type': 'application/json'})
+            outcome = HIT
+        else:
+            with self._lock:
+                generation = self._generation
+            response = make_response(view(**view_args))
+            if response.status_code != 200 or not response.is_json:
+                self._count(route, 'bypassed')
+                return response
+            body = response.get_data()
+            etag = hashlib.sha256(body).hexdigest()[:32]
+            outcome = self._store(key, generation, etag, body, ttl, tags(view_args, response.get_json()))
+
+        self._count(route, {HIT: 'hits', MISS: 'misses', BYPASS: 'bypassed'}[outcome])
+        response.set_etag(etag)
+        # Browsers keep the copy but revalidate it (If-None-Match) on every use
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Cache'] = outcome
+        response.make_conditional(request)
+        if response.status_code == 304:
+            self._count(route, 'not_modified')
+        return response
+
+    def _store(self, key, generation, etag, body, ttl, tags):
+        with self._lock:
+            if not self.connected or generation != self._generation:
+                return BYPASS
+        self.backend.set(key, etag, body, ttl, tags)
+        return MISS
+
+    def invalidate(self, tags):
+        with self._lock:
+            self._generation += 1
+            self._stats["invalidations"] += 1
+        if tags is None:
+            self.backend.clear()
+        else:
+            self.backend.invalidate(tags)
+
+    def dispatch(self, payload):
+        tags = [tag for tag in payload.split(',') if tag]
+        if not tags:
+            return
+        if self.backend.shared and not self.invalidator:
+            # The lease holder drops them from the shared backend; a response of ours
+            # that raced them must still not be stored
+            with self._lock:
+                self._generation += 1
+            return
+        self.invalidate(tags)
+
+    def stats(self):
+        with self._lock:
+            routes = {name: stats.snapshot() for name, stats in self._routes.items()}
+            hits = sum(r["hits"] for r in routes.values())
+            lookups = hits + sum(r["misses"] for r in routes.values())
+            return {
+                "backend": type(self.backend).__name__,
+                "listening": self.connected,
+                "invalidator": self.invalidator if self.backend.shared else None,
+                "entries": self.backend.size(),
+                "hit_ratio": round(hits / lookups, 3) if lookups else None,
+                **self._stats,
+                "routes": routes
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """The process-wide cache; None if disabled"""
+    global _cache
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        listener = events.get_listener()
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache().start(listener)
+    return _cache
+
+
+def cached(ttl, tags):
+    """
+    Cache a public GET view's 200 JSON responses for `ttl` seconds.
+    `tags(view_args, data)` lists the tags of a response, given the view arguments and its JSON.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(**view_args):
+            cache = get_cache()
+            if cache is None:
+                return view(**view_args)
+            return cache.respond(view.__name__, view, view_args, ttl, tags)
+        return wrapper
+    return decorator
+
+
+def invalidate(*tags):
+    """Drop this worker's entries for the tags now (other workers hear it from the triggers)"""
+    if _cache is not None:
+        _cache.invalidate(tags)
+
+
+def cache_stats():
+    """Hit ratios per route and backend state for /api/health"""
+    return _cache.stats() if _cache is not None else None
@@ -0,0 +1,548 @@
+"""
+Postgres-backed job scheduler for The Hive
+Jobs are registered in code with a cron schedule and live as rows in scheduled_jobs
+(next run, last result, failed attempts), so the schedule survives deploys and restarts.
+Any number of scheduler processes can run: they elect a leader with a session-level
+advisory lock and only the leader runs jobs; the others take over if it goes away.
+Failed runs are retried with backoff.
+
+Work that is due at a per-row time (e.g. each service's survey_deadline) does not wait
+for a cron slot: the leader keeps those deadlines in an in-memory DeadlineIndex (a
+min-heap), loaded from the database when it takes over and fed by the add_deadline()
+notifications that write paths send when they create or move one. The leader sleeps
+until the earliest job or deadline, so each deadline fires within a second or so of
+passing; the cron job for the same work only reconciles what was missed.
+
+    python3 scheduler.py              # run the scheduler (leader or standby)
+    python3 scheduler.py --once       # run the jobs that are due now and exit
+    python3 scheduler.py --run NAME   # run one job now
+    python3 scheduler.py --list       # show the schedule
+"""
+import heapq
+import json
+import os
+import select
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+import psycopg2
+from psycopg2.extras import Json
+
+import db_pool
+
+CHANNEL = 'hive_jobs'
+# pg_advisory_lock key held by the leader for as long as its connection lives
+LEADER_LOCK_KEY = 573_001
+
+# Longest sleep between looking at the schedule (an add_deadline() notification ends it earlier)
+POLL_INTERVAL = float(os.environ.get('SCHEDULER_POLL_INTERVAL', 60))
+# Retry delay after a failed run: doubled per consecutive failure up to the maximum
+RETRY_BASE = float(os.environ.get('SCHEDULER_RETRY_BASE', 30))
+RETRY_MAX = float(os.environ.get('SCHEDULER_RETRY_MAX', 3600))
+
+
+class CronSchedule:
+    """
+    Five-field cron expression: minute hour day-of-month month day-of-week.
+    Fields accept *, numbers, ranges (1-5), lists (1,15) and steps (*/10, 0-30/5).
+    As in cron, a restricted day-of-month and day-of-week match if either matches.
+    """
+
+    _FIELDS = (('minute', 0, 59), ('hour', 0, 23), ('day', 1, 31), ('month', 1, 12), ('weekday', 0, 6))
+
+    def __init__(self, expression):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        for part, (name, low, high) in zip(parts, self._FIELDS):
+            setattr(self, name, self._parse(part, low, high, name))
+        # Sunday may be written as 7
+        self.weekday = {day % 7 for day in self.weekday}
+        self._any_day = parts[2] == '*'
+        self._any_weekday = parts[4] == '*'
+
+    @staticmethod
+    def _parse(field, low, high, name):
+        values = set()
+        for item in field.split(','):
+            span, _, step = item.partition('/')
+            step = int(step) if step else 1
+            if span == '*':
+                start, end = low, high
+            elif '-' in span:
+                start, end = (int(value) for value in span.split('-', 1))
+            else:
+                start = end = int(span)
+                if step != 1:
+                    end = high
+            top = 7 if name == 'weekday' else high
+            if step < 1 or start < low or end > top or start > end:
+                raise ValueError(f"Invalid cron {name} field: {field!r}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, moment):
+        day = moment.day in self.day
+        weekday = (moment.weekday() + 1) % 7 in self.weekday
+        if self._any_day or self._any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, after):
+        """First matching minute strictly after `after`"""
+        moment = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=366 * 5)
+        while moment < limit:
+            if moment.month not in self.month:
+                year, month = divmod(moment.month, 12)
+                moment = moment.replace(year=moment.year + year, month=month + 1, day=1, hour=0, minute=0)
+            elif not self._day_matches(moment):
+                moment = (moment + timedelta(days=1)).replace(hour=0, minute=0)
+            elif moment.hour not in self.hour:
+                moment = (moment + timedelta(hours=1)).replace(minute=0)
+            elif moment.minute not in self.minute:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"Cron expression never matches: {self.expression!r}")
+
+
+class Job:
+    """A registered job: `func()` does the work, run at the slots of its cron `schedule`"""
+
+    def __init__(self, name, func, schedule):
+        self.name = name
+        self.func = func
+        self.schedule = CronSchedule(schedule)
+
+
+class DeadlineIndex:
+    """
+    Min-heap of (deadline, source, key). Adding a key again moves its deadline; the old
+    heap entry is left in place and skipped when it surfaces.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._current = {}  # (source, key) -> deadline
+
+    def __len__(self):
+        return len(self._current)
+
+    def add(self, source, key, at):
+        self._current[(source, key)] = at
+        heapq.heappush(self._heap, (at, source, key))
+
+    def clear(self):
+        self._heap.clear()
+        self._current.clear()
+
+    def _drop_stale(self):
+        while self._heap and self._current.get(self._heap[0][1:]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def next_at(self):
+        """Earliest pending deadline, or None"""
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        """Remove the deadlines before `now`; returns {source: [keys]}"""
+        due = {}
+        self._drop_stale()
+        while self._heap and self._heap[0][0] < now:
+            at, source, key = heapq.heappop(self._heap)
+            del self._current[(source, key)]
+            due.setdefault(source, []).append(key)
+            self._drop_stale()
+        return due
+
+
+class DeadlineSource:
+    """Per-row deadlines: `load(cursor)` yields (key, deadline) pairs, `fire(keys)` handles passed ones"""
+
+    def __init__(self, name, fire, load):
+        self.name = name
+        self.fire = fire
+        self.load = load
+
+
+JOBS = {}
+DEADLINES = {}
+
+
+def register(name, schedule):
+    """Decorator adding a job to the registry"""
+    def decorator(func):
+        JOBS[name] = Job(name, func, schedule)
+        return func
+    return decorator
+
+
+def register_deadlines(name, load):
+    """Decorator adding a deadline source; the decorated function fires passed deadlines"""
+    def decorator(func):
+        DEADLINES[name] = DeadlineSource(name, func, load)
+        return func
+    return decorator
+
+
+def retry_delay(attempts):
+    """Seconds to wait after `attempts` consecutive failures"""
+    return min(RETRY_BASE * 2 ** max(attempts - 1, 0), RETRY_MAX)
+
+
+def add_deadline(cursor, source, key, at):
+    """Tell the leader about a new or moved deadline (sent when the caller's transaction commits)"""
+    payload = json.dumps({"deadline": source, "key": key, "at": at.isoformat()})
+    cursor.execute("SELECT pg_notify(%s, %s)", (CHANNEL, payload))
+
+
+class Scheduler:
+    """Runs due jobs while holding the leader lock; stands by otherwise"""
+
+    def __init__(self, jobs=None, deadlines=None, connect_kwargs=None, poll_interval=POLL_INTERVAL):
+        self.jobs = JOBS if jobs is None else jobs
+        self.deadlines = DEADLINES if deadlines is None else deadlines
+        self.index = DeadlineIndex()
+        self.connect_kwargs = connect_kwargs
+        self.poll_interval = poll_interval
+        self.is_leader = False
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def _connect(self):
+        conn = psycopg2.connect(**(self.connect_kwargs or db_pool.connection_params()))
+        conn.autocommit = True
+        return conn
+
+    def _acquire_leadership(self, cursor):
+        cursor.execute("SELECT pg_try_advisory_lock(%s) AS locked", (LEADER_LOCK_KEY,))
+        self.is_leader = cursor.fetchone()['locked']
+        return self.is_leader
+
+    @staticmethod
+    def _now(cursor):
+        cursor.execute("SELECT LOCALTIMESTAMP AS now")
+        return cursor.fetchone()['now']
+
+    def sync(self, cursor):
+        """Add registered jobs to the table and pick up changed schedules"""
+        now = self._now(cursor)
+        for job in self.jobs.values():
+            cursor.execute("""
+                INSERT INTO scheduled_jobs (name, schedule, next_run_at)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (name) DO UPDATE
+                SET schedule = EXCLUDED.schedule,
+                    next_run_at = LEAST(scheduled_jobs.next_run_at, EXCLUDED.next_run_at),
+                    updated_at = NOW()
+            """, (job.name, job.schedule.expression, job.schedule.next_after(now)))
+
+    def run_job(self, cursor, job):
+        """Run one job and record the outcome and its next run"""
+        cursor.execute("""
+            UPDATE scheduled_jobs
+            SET last_started_at = LOCALTIMESTAMP, updated_at = NOW()
+            WHERE name = %s
+            RETURNING attempts
+        """, (job.name,))
+        row = cursor.fetchone()
+        attempts = row['attempts'] if row else 0
+
+        started = time.monotonic()
+        try:
+            result = job.func()
+        except Exception as e:
+            traceback.print_exc()
+            attempts += 1
+            delay = retry_delay(attempts)
+            print(f"Job {job.name} failed (attempt {attempts}), retrying in {delay:g}s: {e}")
+            cursor.execute("""
+                UPDATE scheduled_jobs
+                SET last_finished_at = LOCALTIMESTAMP,
+                    last_status = 'failed',
+                    last_error = %s,
+                    attempts = %s,
+                    next_run_at = LOCALTIMESTAMP + %s * INTERVAL '1 second',
+                    updated_at = NOW()
+                WHERE name = %s
+            """, (str(e), attempts, delay, job.name))
+            return False
+
+        elapsed_ms = round((time.monotonic() - started) * 1000, 1)
+        print(f"Job {job.name} finished in {elapsed_ms} ms: {result}")
+        cursor.execute("""
+            UPDATE scheduled_jobs
+            SET last_finished_at = LOCALTIMESTAMP,
+                last_status = 'ok',
+                last_error = NULL,
+                last_result = %s,
+                attempts = 0,
+                next_run_at = %s,
+                updated_at = NOW()
+            WHERE name = %s
+        """, (Json(result, dumps=lambda value: json.dumps(value, default=str)),
+              job.schedule.next_after(self._now(cursor)), job.name))
+        return True
+
+    def run_due(self, cursor):
+        """Run every enabled job whose next_run_at has passed; returns how many ran"""
+        cursor.execute("""
+            SELECT name
+            FROM scheduled_jobs
+            WHERE enabled AND next_run_at <= LOCALTIMESTAMP
+            ORDER BY next_run_at
+        """)
+        due = [row['name'] for row in cursor.fetchall() if row['name'] in self.jobs]
+        for name in due:
+            if self._stopping.is_set():
+                break
+            self.run_job(cursor, self.jobs[name])
+        return len(due)
+
+    def load_deadlines(self, cursor):
+        """Rebuild the deadline index from the database"""
+        self.index.clear()
+        for source in self.deadlines.values():
+            for key, at in source.load(cursor):
+                self.index.add(source.name, key, at)
+        print(f"Loaded {len(self.index)} pending deadline(s)")
+
+    def handle_notify(self, payload):
+        """Add the deadline from an add_deadline() payload to the index"""
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return
+        if isinstance(message, dict) and message.get('deadline') in self.deadlines:
+            self.index.add(message['deadline'], message['key'], datetime.fromisoformat(message['at']))
+
+    def fire_deadlines(self, cursor):
+        """Fire every passed deadline; failed ones are retried after a backoff"""
+        now = self._now(cursor)
+        for name, keys in self.index.pop_due(now).items():
+            started = time.monotonic()
+            try:
+                result = self.deadlines[name].fire(keys)
+            except Exception as e:
+                traceback.print_exc()
+                retry_at = now + timedelta(seconds=retry_delay(1))
+                print(f"Deadlines {name} failed for {len(keys)} key(s), retrying at {retry_at}: {e}")
+                for key in keys:
+                    self.index.add(name, key, retry_at)
+                continue
+            elapsed_ms = round((time.monotonic() - started) * 1000, 1)
+            print(f"Deadlines {name} fired for {len(keys)} key(s) in {elapsed_ms} ms: {result}")
+
+    def seconds_until_next(self, cursor):
+        cursor.execute("""
+            SELECT LOCALTIMESTAMP AS now, MIN(next_run_at) AS next_run_at
+            FROM scheduled_jobs
+            WHERE enabled
+        """)
+        row = cursor.fetchone()
+        pending = [at for at in (row['next_run_at'], self.index.next_at()) if at is not None]
+        if not pending:
+            return self.poll_interval
+        seconds = (min(pending) - row['now']).total_seconds()
+        return min(max(seconds, 0.0), self.poll_interval)
+
+    def _lead(self, conn):
+        cursor = conn.cursor()
+        cursor.execute(f"LISTEN {CHANNEL};")
+        self.sync(cursor)
+        self.load_deadlines(cursor)
+        print("Scheduler is the leader")
+        while not self._stopping.is_set():
+            self.run_due(cursor)
+            self.fire_deadlines(cursor)
+            timeout = self.seconds_until_next(cursor)
+            if timeout > 0 and select.select([conn], [], [], timeout) != ([], [], []):
+                conn.poll()
+                while conn.notifies:
+                    self.handle_notify(conn.notifies.pop(0).payload)
+
+    def run_forever(self):
+        delay = self.poll_interval
+        while not self._stopping.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                if self._acquire_leadership(conn.cursor()):
+                    self._lead(conn)
+            except (psycopg2.Error, OSError) as e:
+                print(f"Scheduler connection lost: {e}")
+            finally:
+                self.is_leader = False
+                if conn is not None:
+                    try:
+                        conn.close()  # releases the leader lock
+                    except psycopg2.Error:
+                        pass
+            self._stopping.wait(delay)
+
+    def run_once(self, names=None):
+        """Run the due jobs (or the named ones) once if no other scheduler is leading"""
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            if not self._acquire_leadership(cursor):
+                print("Another scheduler is running; nothing to do")
+                return 0
+            self.sync(cursor)
+            if names is None:
+                return self.run_due(cursor)
+            for name in names:
+                self.run_job(cursor, self.jobs[name])
+            return len(names)
+        finally:
+            self.is_leader = False
+            conn.close()
+
+    def start(self):
+        """Run the scheduler in a daemon thread (used by `python3 app.py` and the gunicorn workers)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self.run_forever, name='scheduler', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+
+
+def list_jobs(cursor):
+    cursor.execute("""
+        SELECT name, schedule, enabled, next_run_at, last_status, last_finished_at, attempts, last_error
+        FROM scheduled_jobs
+        ORDER BY name
+    """)
+    return cursor.fetchall()
+
+
+# ==================== JOBS ====================
+
+def _pending_survey_deadlines(cursor):
+    cursor.execute("""
+        SELECT id, survey_deadline
+        FROM service_progress
+        WHERE status = 'awaiting_confirmation'
+        AND survey_deadline IS NOT NULL
+    """)
+    return [(row['id'], row['survey_deadline']) for row in cursor.fetchall()]
+
+
+@register_deadlines('survey_deadline', load=_pending_survey_deadlines)
+def complete_expired_progress(progress_ids):
+    """Auto-complete the given services as soon as their survey deadline passes"""
+    from survey_processor import process_expired_surveys
+    return process_expired_surveys(progress_ids=progress_ids, raise_errors=True)
+
+
+@register('expire_surveys', '15 */6 * * *')
+def expire_surveys():
+    """Reconciliation: auto-complete any expired service the deadline index missed"""
+    from survey_processor import process_expired_surveys
+    return process_expired_surveys(raise_errors=True)
+
+
+@register('refresh_stats', '*/10 * * * *')
+def refresh_stats():
+    """Recount the time-window dashboard counters (e.g. users active in the last 30 days)"""
+    import stats
+    from app import get_db_connection
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    stats.refresh_windowed(cursor)
+    conn.commit()
+    cursor.close()
+    conn.close()
+    return {"refreshed": len(stats.WINDOWED)}
+
+
+@register('reconcile_stats', '45 2 * * *')
+def reconcile_stats():
+    """Recompute the dashboard counters and history from the base tables"""
+    import stats
+    from app import get_db_connection
+    conn = get_db_connection()
+    try:
+        return {"drifted": stats.reconcile(conn)}
+    finally:
+        conn.close()
+
+
+@register('refresh_analytics', '*/5 * * * *')
+def refresh_analytics():
+    """Roll recent activity up into the analytics tables (a full backfill on first run)"""
+    import analytics
+    conn = db_pool.connect()
+    try:
+        return analytics.refresh_recent(conn)
+    finally:
+        conn.close()
+
+
+@register('cleanup_tokens', '30 3 * * *')
+def cleanup_tokens():
+    """Delete used and long-expired email verification and password reset tokens"""
+    from app import get_db_connection
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    deleted = {}
+    for table in ('email_verifications', 'password_reset_tokens'):
+        cursor.execute(f"""
+            DELETE FROM {table}
+            WHERE is_used OR expires_at < NOW() - INTERVAL '7 days'
+        """)
+        deleted[table] = cursor.rowcount
+    conn.commit()
+    cursor.close()
+    conn.close()
+    return deleted
+
+
+@register('cleanup_sessions', '40 * * * *')
+def cleanup_sessions():
+    """Delete refresh-token sessions that expired or were revoked over a day ago, and unused stream tickets"""
+    import events
+    import sessions
+    conn = db_pool.connect()
+    cursor = conn.cursor()
+    try:
+        tickets = events.purge_tickets(cursor)
+        conn.commit()
+        return {"deleted": sessions.purge(cursor), "tickets": tickets}
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    scheduler = Scheduler()
+    if '--list' in args:
+        conn = scheduler._connect()
+        for job in list_jobs(conn.cursor()):
+            print(f"{job['name']:<20} {job['schedule']:<15} next {job['next_run_at']:%Y-%m-%d %H:%M:%S} "
+                  f"last {job['last_status'] or '-'} attempts {job['attempts']}"
+                  f"{'' if job['enabled'] else ' (disabled)'}")
+        conn.close()
+    elif '--once' in args:
+        scheduler.run_once()
+    elif '--run' in args:
+        names = args[args.index('--run') + 1:]
+        unknown = [name for name in names if name not in JOBS]
+        if not names or unknown:
+            sys.exit(f"Unknown job(s): {', '.join(unknown) or '(none given)'}; known: {', '.join(sorted(JOBS))}")
+        scheduler.run_once(names)
+    else:
+        try:
+            scheduler.run_forever()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,79 @@
+"""
+Full-text search over services
+services.search_vector holds a weighted tsvector (title 'A', description 'B', tag names 'C')
+backed by a GIN index. It is refreshed by refresh_service_search_vector() whenever a service
+or its tags change, so searching never has to re-parse the text of every row.
+"""
+import html
+import re
+
+SEARCH_CONFIG = 'english'
+
+# Weighted document for one service row aliased as "s"
+SEARCH_VECTOR_SQL = f"""
+    setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(s.title, '')), 'A') ||
+    setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(s.description, '')), 'B') ||
+    setweight(to_tsvector('{SEARCH_CONFIG}', coalesce((
+        SELECT string_agg(t.name, ' ')
+        FROM service_tags st
+        JOIN tags t ON st.tag_id = t.id
+        WHERE st.service_id = s.id
+    ), '')), 'C')
+"""
+
+# ts_headline() wraps matches in control characters that cannot survive html.escape(),
+# so the snippet can be escaped first and the markers swapped for <mark> afterwards
+_HIGHLIGHT_START = '\x02'
+_HIGHLIGHT_STOP = '\x03'
+SNIPPET_OPTIONS = (
+    f"StartSel={_HIGHLIGHT_START}, StopSel={_HIGHLIGHT_STOP}, "
+    "MaxWords=35, MinWords=15, ShortWord=3, MaxFragments=2, FragmentDelimiter=\" ... \""
+)
+TITLE_OPTIONS = f"StartSel={_HIGHLIGHT_START}, StopSel={_HIGHLIGHT_STOP}, HighlightAll=true"
+
+MAX_QUERY_TERMS = 8
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def refresh_service_search_vector(cursor, service_id):
+    """Recompute the search document of one service (call after changing its text or tags)"""
+    cursor.execute(f"""
+        UPDATE services s
+        SET search_vector = {SEARCH_VECTOR_SQL}
+        WHERE s.id = %s
+    """, (service_id,))
+
+
+def backfill_search_vectors(cursor, only_missing=True):
+    """Fill search_vector for existing rows; returns the number of services updated"""
+    cursor.execute(f"""
+        UPDATE services s
+        SET search_vector = {SEARCH_VECTOR_SQL}
+        {"WHERE s.search_vector IS NULL" if only_missing else ""}
+    """)
+    return cursor.rowcount
+
+
+def build_tsquery(text, prefix=True):
+    """
+    Turn free text into a to_tsquery() expression.
+    All words must match; the last one is prefix-matched (as-you-type) when `prefix` is set.
+    Returns None when the text contains no searchable words.
+    """
+    terms = _TERM_RE.findall((text or '').lower())[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    parts = [f"'{term}'" for term in terms]
+    if prefix:
+        parts[-1] += ':*'
+    return ' & '.join(parts)
+
+
+def render_highlight(text):
+    """HTML-escape a ts_headline() result and turn its match markers into <mark> tags"""
+    if text is None:
+        return None
+    return (html.escape(text)
+            .replace(_HIGHLIGHT_START, '<mark>')
+            .replace(_HIGHLIGHT_STOP, '</mark>'))
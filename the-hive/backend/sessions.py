@@ -0,0 +1,113 @@
+"""
+Refresh-token sessions
+Login issues a short-lived access token (a JWT, ACCESS_TOKEN_TTL) and a refresh
+token. POST /api/auth/refresh trades the refresh token for a new access token without
+a password check, so an expiring access token no longer sends the user back to the
+login form (and through bcrypt).
+
+A session is one row per signed-in device. Its refresh token rotates on every use and
+only the SHA-256 of the current and the previous token are stored. Presenting the
+previous token again means it was copied: the session is revoked, unless the reuse
+comes within REFRESH_REUSE_GRACE seconds of the rotation (two tabs refreshing at
+once), which gets a 409 so the client picks up the newer token instead.
+Banning or deactivating a user revokes their sessions (a trigger on users, see
+migrations/0004_sessions.sql); resetting the password does too.
+"""
+import hashlib
+import os
+import secrets
+
+# Lifetime (seconds) of access tokens
+ACCESS_TOKEN_TTL = int(os.environ.get('ACCESS_TOKEN_TTL', 900))
+# Seconds a session may go unused before its refresh token expires; every refresh extends it
+SESSION_TTL = int(os.environ.get('SESSION_TTL', 30 * 86400))
+# Seconds after a rotation in which the replaced token is answered with 409 rather than revoking
+REFRESH_REUSE_GRACE = int(os.environ.get('REFRESH_REUSE_GRACE', 30))
+# Rows deleted per statement by the cleanup job
+PURGE_BATCH = 5000
+
+
+def token_hash(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def create(cursor, user_id, user_agent=None, ip_address=None):
+    """Start a session for the user; returns its first refresh token"""
+    token = secrets.token_urlsafe(32)
+    cursor.execute("""
+        INSERT INTO sessions (user_id, token_hash, expires_at, user_agent, ip_address)
+        VALUES (%s, %s, NOW() + make_interval(secs => %s), %s, %s)
+    """, (user_id, token_hash(token), SESSION_TTL, (user_agent or '')[:255] or None, ip_address))
+    return token
+
+
+def rotate(cursor, token):
+    """
+    Replace a live refresh token with a new one.
+    Returns (new_token, session, error, status); session has id and user_id.
+    """
+    digest = token_hash(token)
+    new_token = secrets.token_urlsafe(32)
+    cursor.execute("""
+        UPDATE sessions
+        SET token_hash = %s,
+            previous_hash = token_hash,
+            rotated_at = NOW(),
+            expires_at = NOW() + make_interval(secs => %s)
+        WHERE token_hash = %s AND revoked_at IS NULL AND expires_at > NOW()
+        RETURNING id, user_id
+    """, (token_hash(new_token), SESSION_TTL, digest))
+    session = cursor.fetchone()
+    if session:
+        return new_token, session, None, None
+
+    cursor.execute("""
+        SELECT id, user_id, rotated_at > NOW() - make_interval(secs => %s) AS recent
+        FROM sessions
+        WHERE previous_hash = %s AND revoked_at IS NULL
+    """, (REFRESH_REUSE_GRACE, digest))
+    replaced = cursor.fetchone()
+    if replaced and replaced['recent']:
+        return None, None, "Refresh token has already been used; use the newer one", 409
+    if replaced:
+        cursor.execute("UPDATE sessions SET revoked_at = NOW() WHERE id = %s", (replaced['id'],))
+        print(f"Refresh token reuse for user {replaced['user_id']}; session {replaced['id']} revoked")
+        return None, None, "Session revoked, please sign in again", 401
+    return None, None, "Invalid or expired refresh token", 401
+
+
+def revoke(cursor, token):
+    """End the session of a refresh token; returns whether there was one"""
+    cursor.execute("""
+        UPDATE sessions SET revoked_at = NOW()
+        WHERE token_hash = %s AND revoked_at IS NULL
+    """, (token_hash(token),))
+    return cursor.rowcount > 0
+
+
+def revoke_user(cursor, user_id):
+    """End all of a user's sessions; returns how many were live"""
+    cursor.execute("""
+        UPDATE sessions SET revoked_at = NOW()
+        WHERE user_id = %s AND revoked_at IS NULL
+    """, (user_id,))
+    return cursor.rowcount
+
+
+def purge(cursor):
+    """Delete sessions that expired or were revoked more than a day ago, in batches"""
+    deleted = 0
+    while True:
+        cursor.execute("""
+            DELETE FROM sessions
+            WHERE id IN (
+                SELECT id FROM sessions
+                WHERE expires_at < NOW() - INTERVAL '1 day'
+                   OR revoked_at < NOW() - INTERVAL '1 day'
+                LIMIT %s
+            )
+        """, (PURGE_BATCH,))
+        deleted += cursor.rowcount
+        cursor.connection.commit()
+        if cursor.rowcount < PURGE_BATCH:
+            return deleted
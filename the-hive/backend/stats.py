@@ -0,0 +1,152 @@
+"""
+Precomputed statistics for the admin dashboard
+Counters (total users, open services, hours exchanged, ...) and per-day history
+(signups, hours exchanged per day, ...) are kept in stat_counters / stat_daily by
+triggers on the base tables, so they change in the same transaction as the rows they
+count and the dashboard reads them without scanning anything.
+
+Every metric is defined in METRICS as a condition and a value over a row, from which
+the reconciliation recomputes the true figures. The triggers applying the same
+definitions live in the baseline migration; a new or changed metric needs a new
+migration replacing its table's trigger function. Windowed figures (users active in
+the last 30 days) cannot be maintained by triggers and are refreshed by the scheduler
+instead.
+"""
+
+# name: (table, condition, value, day) over a row written as {row}; `day` is None
+# for counters, else the date the row is counted on in the daily history
+METRICS = {
+    'users_total': ('users', "TRUE", "1", None),
+    'users_banned': ('users', "{row}.user_status = 'banned'", "1", None),
+    'users_warned': ('users', "{row}.user_status = 'warning'", "1", None),
+    'services_open': ('services', "{row}.status = 'open'", "1", None),
+    'services_completed': ('service_progress', "{row}.status = 'completed'", "1", None),
+    'hours_exchanged': ('service_progress', "{row}.status = 'completed'", "{row}.hours", None),
+    'reports_open': ('reports', "{row}.status = 'open'", "1", None),
+    'forum_threads': ('forum_threads', "TRUE", "1", None),
+    'forum_comments': ('forum_comments', "TRUE", "1", None),
+
+    'signups': ('users', "TRUE", "1", "{row}.date_joined"),
+    'services_created': ('services', "TRUE", "1", "{row}.created_at"),
+    'completions': ('service_progress', "{row}.status = 'completed'", "1", "{row}.completed_at"),
+    'hours_per_day': ('service_progress', "{row}.status = 'completed'", "{row}.hours", "{row}.completed_at"),
+    'reports_filed': ('reports', "TRUE", "1", "{row}.created_at"),
+    'threads_created': ('forum_threads', "TRUE", "1", "{row}.created_at"),
+    'comments_created': ('forum_comments', "TRUE", "1", "{row}.created_at"),
+}
+
+# Counters that are refreshed by refresh_windowed() rather than by triggers
+WINDOWED = {
+    'users_active_30d': "SELECT COUNT(*) AS value FROM users WHERE last_login >= NOW() - INTERVAL '30 days'",
+}
+
+HISTORY_METRICS = tuple(name for name, (_, _, _, day) in METRICS.items() if day is not None)
+
+
+def _row(expression, row):
+    return expression.format(row=row)
+
+
+def _drift(cursor):
+    """
+    How far each counter and history row is from the base tables, as
+    ([(name, None, delta)], [(name, day, delta)]) for the values that differ. Run in one
+    snapshot, where the triggers have kept both sides in step unless something drifted.
+    """
+    counters = []
+    days = []
+    for name, (table, condition, value, day) in METRICS.items():
+        if day is None:
+            cursor.execute(f"""
+                SELECT COALESCE(SUM(CASE WHEN {_row(condition, 't')} THEN {_row(value, 't')} END), 0)
+                       - COALESCE((SELECT value FROM stat_counters WHERE name = %s), 0) AS delta
+                FROM {table} t
+            """, (name,))
+            delta = cursor.fetchone()['delta']
+            if delta:
+                counters.append((name, None, delta))
+            continue
+        cursor.execute(f"""
+            SELECT COALESCE(actual.day, kept.day) AS day,
+                   COALESCE(actual.value, 0) - COALESCE(kept.value, 0) AS delta
+            FROM (
+                SELECT ({_row(day, 't')})::date AS day, SUM(COALESCE({_row(value, 't')}, 0)) AS value
+                FROM {table} t
+                WHERE {_row(condition, 't')} AND {_row(day, 't')} IS NOT NULL
+                GROUP BY 1
+            ) actual
+            FULL JOIN (
+                SELECT day, value FROM stat_daily WHERE metric = %s
+            ) kept ON kept.day = actual.day
+            WHERE COALESCE(actual.value, 0) <> COALESCE(kept.value, 0)
+        """, (name,))
+        days.extend((name, row['day'], row['delta']) for row in cursor.fetchall())
+    return counters, days
+
+
+def _correct(cursor, corrections):
+    """Add each (name, day, delta) through stats_bump(), like the triggers do"""
+    if corrections:
+        names, days, deltas = zip(*corrections)
+        cursor.execute("""
+            SELECT stats_bump(c.name, c.day, c.delta)
+            FROM unnest(%s::text[], %s::date[], %s::numeric[]) AS c(name, day, delta)
+        """, (list(names), list(days), list(deltas)))
+
+
+def reconcile(conn):
+    """
+    Correct every counter and the history from the base tables (scheduler job).
+    The drift is measured in one read-only REPEATABLE READ snapshot, so the full scans
+    take no locks that writers wait for; it is then added to the stored values, which
+    stays right whatever the triggers added since. Returns the number of counters that
+    had drifted.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY;")
+    counters, days = _drift(cursor)
+    conn.commit()
+
+    for name, _, delta in counters:
+        print(f"Stat counter {name} corrected by {delta}")
+    _correct(cursor, counters + days)
+    cursor.execute("DELETE FROM stat_daily WHERE metric <> ALL(%s)", (list(HISTORY_METRICS),))
+    refresh_windowed(cursor)
+    conn.commit()
+    cursor.close()
+    return len(counters)
+
+
+def refresh_windowed(cursor):
+    """Recount the time-window counters"""
+    for name, query in WINDOWED.items():
+        cursor.execute(query)
+        value = cursor.fetchone()['value']
+        cursor.execute("""
+            INSERT INTO stat_counters (name, value) VALUES (%s, %s)
+            ON CONFLICT (name) DO UPDATE
+            SET value = EXCLUDED.value, updated_at = NOW()
+        """, (name, value))
+
+
+def counters(cursor):
+    """All counters in one read: {name: value}; missing counters read as 0"""
+    cursor.execute("SELECT name, value FROM stat_counters")
+    values = {name: 0 for name in list(METRICS) + list(WINDOWED) if name not in HISTORY_METRICS}
+    values.update({row['name']: row['value'] for row in cursor.fetchall()})
+    return values
+
+
+def history(cursor, metrics, days):
+    """Daily series for the last `days` days (including today), zero-filled: {metric: [{day, value}]}"""
+    cursor.execute("""
+        SELECT d.day::date AS day, m.metric, COALESCE(s.value, 0) AS value
+        FROM generate_series(CURRENT_DATE - (%s - 1), CURRENT_DATE, INTERVAL '1 day') AS d(day)
+        CROSS JOIN unnest(%s::text[]) AS m(metric)
+        LEFT JOIN stat_daily s ON s.metric = m.metric AND s.day = d.day::date
+        ORDER BY m.metric, d.day
+    """, (days, list(metrics)))
+    series = {metric: [] for metric in metrics}
+    for row in cursor.fetchall():
+        series[row['metric']].append({"day": row['day'].isoformat(), "value": float(row['value'])})
+    return series
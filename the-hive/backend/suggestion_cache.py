@@ -0,0 +1,311 @@
+"""
+Two-tier cache for Wikidata tag suggestions
+Tier 1 is an in-process LRU with TTL, tier 2 a Postgres table shared by all workers.
+Tag names resolve to entity ids ("entity:<normalized name>") and entity ids to related
+labels ("related:<entity id>"), so different spellings of one concept share the SPARQL result.
+
+Entries older than the TTL are still served immediately while a background thread refreshes
+them (stale-while-revalidate), and concurrent misses for the same key trigger a single fetch.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+
+CACHE_TTL = float(os.environ.get('SUGGESTION_CACHE_TTL', 7 * 24 * 3600))
+CACHE_STALE_TTL = float(os.environ.get('SUGGESTION_CACHE_STALE_TTL', 30 * 24 * 3600))
+CACHE_NEGATIVE_TTL = float(os.environ.get('SUGGESTION_CACHE_NEGATIVE_TTL', 24 * 3600))
+CACHE_MAX_ENTRIES = int(os.environ.get('SUGGESTION_CACHE_MAX_ENTRIES', 1000))
+
+# Values reported in the "cache" field of lookups
+HIT = 'hit'
+STALE = 'stale'
+MISS = 'miss'
+
+
+def normalize_tag(name):
+    """Cache key form of a tag name: case-folded with whitespace collapsed"""
+    return ' '.join((name or '').casefold().split())
+
+
+class MemoryStore:
+    """Second-tier store kept in a dict (tests, or when no database is available)"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._data.get(key)
+
+    def set(self, key, value, fetched_at):
+        with self._lock:
+            self._data[key] = (value, fetched_at)
+
+
+class PostgresStore:
+    """
+    Second-tier store in the wikidata_cache table.
+    Uses its own short-lived connections so it never touches the caller's transaction;
+    database errors are logged and treated as a miss.
+    """
+
+    def __init__(self, connect):
+        self._connect = connect
+
+    def get(self, key):
+        try:
+            conn = self._connect()
+            try:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT value, EXTRACT(EPOCH FROM fetched_at) AS fetched_at
+                    FROM wikidata_cache
+                    WHERE cache_key = %s
+                """, (key,))
+                row = cursor.fetchone()
+                cursor.close()
+                conn.rollback()
+            finally:
+                conn.close()
+        except psycopg2.Error as e:
+            print(f"Suggestion cache read failed for {key}: {e}")
+            return None
+        if not row:
+            return None
+        return row['value'], float(row['fetched_at'])
+
+    def set(self, key, value, fetched_at):
+        try:
+            conn = self._connect()
+            try:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    INSERT INTO wikidata_cache (cache_key, value, fetched_at)
+                    VALUES (%s, %s, TO_TIMESTAMP(%s))
+                    ON CONFLICT (cache_key) DO UPDATE
+                    SET value = EXCLUDED.value, fetched_at = EXCLUDED.fetched_at
+                    WHERE wikidata_cache.fetched_at < EXCLUDED.fetched_at
+                """, (key, json.dumps(value), fetched_at))
+                conn.commit()
+                cursor.close()
+            finally:
+                conn.close()
+        except psycopg2.Error as e:
+            print(f"Suggestion cache write failed for {key}: {e}")
+
+
+class _Flight:
+    """One in-progress fetch that concurrent callers for the same key wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SWRCache:
+    """
+    LRU + TTL cache in front of a shared store, with stale-while-revalidate and
+    single-flight loading. `loader(key_suffix)` fetches a fresh value and raises on failure;
+    failures are never cached. `None` results are cached for `negative_ttl` only.
+    """
+
+    def __init__(self, namespace, loader, store=None, ttl=CACHE_TTL, stale_ttl=CACHE_STALE_TTL,
+                 negative_ttl=CACHE_NEGATIVE_TTL, max_entries=CACHE_MAX_ENTRIES,
+                 executor=None, clock=time.time):
+        self.namespace = namespace
+        self.loader = loader
+        self.store = store
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.clock = clock
+
+        self._executor = executor or ThreadPoolExecutor(max_workers=2, thread_name_prefix=f"{namespace}-refresh")
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (value, fetched_at)
+        self._flights = {}              # key -> _Flight
+
+        self._stats = {
+            "memory_hits": 0,
+            "store_hits": 0,
+            "misses": 0,
+            "stale_served": 0,
+            "coalesced": 0,
+            "loads": 0,
+            "load_errors": 0,
+            "refreshes": 0,
+            "load_time_ms": 0.0
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _age_limit(self, value):
+        return self.negative_ttl if value is None else self.ttl
+
+    def _remember(self, key, value, fetched_at):
+        with self._lock:
+            self._entries[key] = (value, fetched_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _lookup(self, key):
+        """Memory first, then the shared store (promoting its entry into memory)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return entry
+        if self.store is not None:
+            entry = self.store.get(f"{self.namespace}:{key}")
+            if entry is not None:
+                self._count("store_hits")
+                self._remember(key, *entry)
+                return entry
+        return None
+
+    def _load(self, key):
+        """Fetch `key` once no matter how many threads ask; returns the fresh value or raises"""
+        with self._lock:
+            flight = self._flights.get(key)
+            owner = flight is None
+            if owner:
+                flight = self._flights[key] = _Flight()
+            else:
+                self._stats["coalesced"] += 1
+
+        if not owner:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        started = time.monotonic()
+        try:
+            value = self.loader(key)
+            fetched_at = self.clock()
+            self._remember(key, value, fetched_at)
+            if self.store is not None:
+                self.store.set(f"{self.namespace}:{key}", value, fetched_at)
+            flight.value = value
+            return value
+        except Exception as e:
+            flight.error = e
+            self._count("load_errors")
+            raise
+        finally:
+            self._count("loads")
+            self._count("load_time_ms", (time.monotonic() - started) * 1000)
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def _refresh_in_background(self, key):
+        with self._lock:
+            if key in self._flights:
+                return
+        self._count("refreshes")
+
+        def refresh():
+            try:
+                self._load(key)
+            except Exception as e:
+                print(f"Background refresh of {self.namespace}:{key} failed: {e}")
+
+        self._executor.submit(refresh)
+
+    def get(self, key):
+        """Return (value, status) where status is 'hit', 'stale' or 'miss'"""
+        entry = self._lookup(key)
+        if entry is not None:
+            value, fetched_at = entry
+            age = self.clock() - fetched_at
+            if age < self._age_limit(value):
+                return value, HIT
+            if age < self._age_limit(value) + self.stale_ttl:
+                self._count("stale_served")
+                self._refresh_in_background(key)
+                return value, STALE
+
+        self._count("misses")
+        try:
+            return self._load(key), MISS
+        except Exception:
+            if entry is not None:
+                # Too old to serve normally, but better than nothing while Wikidata is down
+                self._count("stale_served")
+                return entry[0], STALE
+            raise
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["in_flight"] = len(self._flights)
+        stats["load_time_ms"] = round(stats["load_time_ms"], 2)
+        lookups = stats["memory_hits"] + stats["store_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["memory_hits"] + stats["store_hits"]) / lookups, 3) if lookups else None
+        return stats
+
+
+class SuggestionCache:
+    """Tag name -> entity id -> related labels, each step cached separately"""
+
+    def __init__(self, find_entity_id, fetch_related_tags, store=None, **options):
+        self.entities = SWRCache('entity', find_entity_id, store, **options)
+        self.related = SWRCache('related', fetch_related_tags, store, **options)
+
+    def lookup(self, tag_name):
+        """
+        Returns {"entity_id", "suggestions", "cache"} for a tag name.
+        "cache" is the worst status of the two steps ('miss' beats 'stale' beats 'hit').
+        Raises if a step had to be fetched and the fetch failed.
+        """
+        entity_id, entity_status = self.entities.get(normalize_tag(tag_name))
+        if not entity_id:
+            return {"entity_id": None, "suggestions": [], "cache": entity_status}
+
+        suggestions, related_status = self.related.get(entity_id)
+        statuses = {entity_status, related_status}
+        status = MISS if MISS in statuses else STALE if STALE in statuses else HIT
+        return {"entity_id": entity_id, "suggestions": suggestions or [], "cache": status}
+
+    def stats(self):
+        return {"entities": self.entities.stats(), "related": self.related.stats()}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide suggestion cache backed by Wikidata and the wikidata_cache table"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                import db_pool
+                import wikibase_search
+
+                _cache = SuggestionCache(
+                    wikibase_search.find_entity_id,
+                    wikibase_search.fetch_related_tags,
+                    store=PostgresStore(db_pool.connect)
+                )
+    return _cache
+
+
+def cache_stats():
+    """Cache metrics, or None if no suggestion has been requested yet"""
+    return _cache.stats() if _cache is not None else None
@@ -1,85 +1,101 @@
 """
-Background task processor for expired surveys
-This module handles auto-completion of services when 24-hour survey deadline expires
+Batch processor for expired surveys
+This module handles auto-completion of services when 24-hour survey deadline expires.
+Expired rows are completed in bounded batches with set-based SQL; each batch claims its
+rows with FOR UPDATE SKIP LOCKED and commits on its own, so several processes can run
+the processor at the same time without blocking each other or paying a service twice.
+Each service is completed by scheduler.py when its deadline passes; the "expire_surveys"
+job sweeps up anything missed.
 """
+import os
 import time
-import threading
 from app import get_db_connection
+import events
+import ledger
+import reputation
 
+# Progress rows completed (and paid) per transaction
+SURVEY_BATCH_SIZE = int(os.environ.get('SURVEY_BATCH_SIZE', 500))
 
-def process_expired_surveys():
+
+def process_expired_batch(cursor, batch_size=SURVEY_BATCH_SIZE, progress_ids=None):
+    """
+    Complete up to `batch_size` expired progress rows (optionally only among
+    `progress_ids`) in the cursor's transaction. Rows locked by another processor are
+    skipped. Returns the completed progress ids.
+    """
+    cursor.execute(f"""
+        WITH batch AS (
+            SELECT id
+            FROM service_progress
+            WHERE status = 'awaiting_confirmation'
+            AND survey_deadline < NOW()
+            {"AND id = ANY(%(ids)s)" if progress_ids is not None else ""}
+            ORDER BY survey_deadline, id
+            LIMIT %(limit)s
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE service_progress sp
+        SET status = 'completed',
+            completed_at = NOW(),
+            updated_at = NOW()
+        FROM batch
+        WHERE sp.id = batch.id
+        RETURNING sp.id
+    """, {"limit": batch_size, "ids": list(progress_ids or ())})
+    progress_ids = [row['id'] for row in cursor.fetchall()]
+    if not progress_ids:
+        return progress_ids
+
+    # Transfer hours from consumer to provider (once per progress, see ledger.py)
+    ledger.settle_progress_batch(cursor, progress_ids)
+    reputation.apply(cursor, progress_ids)
+
+    events.publish_progress_batch(cursor, progress_ids, 'survey', completed=True, expired=True)
+    events.publish_progress_batch(cursor, progress_ids, 'balance')
+    return progress_ids
+
+
+def process_expired_surveys(batch_size=SURVEY_BATCH_SIZE, raise_errors=False, progress_ids=None):
     """
     Process surveys that have exceeded the 24-hour deadline.
-    Auto-complete services where deadline has passed.
-    This should be called periodically (e.g., every hour via cron job).
+    Auto-complete services where deadline has passed (all of them, or those among
+    `progress_ids`), one committed batch at a time.
+    Returns {"processed", "batches", "elapsed_ms"}; errors are logged, or re-raised
+    with `raise_errors` (so the scheduler retries the run).
     """
+    started = time.monotonic()
+    processed = 0
+    batches = 0
+    conn = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        
-        # Find all services awaiting confirmation with expired deadlines
-        cursor.execute("""
-            SELECT id, provider_id, consumer_id, hours,
-                   provider_survey_submitted, consumer_survey_submitted
-            FROM service_progress
-            WHERE status = 'awaiting_confirmation'
-            AND survey_deadline < NOW()
-            AND survey_deadline IS NOT NULL
-        """)
-        
-        expired_services = cursor.fetchall()
-        
-        for service in expired_services:
-            print(f"Auto-completing service {service['id']} (deadline expired)")
-            
-            # Update progress status to completed
-            cursor.execute("""
-                UPDATE service_progress 
-                SET status = 'completed', 
-                    completed_at = NOW(), 
-                    updated_at = NOW()
-                WHERE id = %s
-            """, (service['id'],))
-            
-            # Transfer hours: add to provider, deduct from consumer
-            cursor.execute("""
-                UPDATE users 
-                SET time_balance = time_balance + %s 
-                WHERE id = %s
-            """, (service['hours'], service['provider_id']))
-            
-            cursor.execute("""
-                UPDATE users 
-                SET time_balance = time_balance - %s 
-                WHERE id = %s
-            """, (service['hours'], service['consumer_id']))
-        
-        conn.commit()
+
+        while True:
+            completed = process_expired_batch(cursor, batch_size, progress_ids)
+            conn.commit()
+            if completed:
+                batches += 1
+                processed += len(completed)
+            if len(completed) < batch_size:
+                break
+
         cursor.close()
-        conn.close()
-        
-        print(f"Processed {len(expired_services)} expired surveys")
-        return len(expired_services)
-        
+
     except Exception as e:
         print(f"ERROR in process_expired_surveys: {str(e)}")
         import traceback
         traceback.print_exc()
-        return 0
-
-
-def background_survey_processor():
-    """Background thread that processes expired surveys every hour"""
-    while True:
-        try:
-            time.sleep(3600)  # Wait 1 hour
-            process_expired_surveys()
-        except Exception as e:
-            print(f"Error in background survey processor: {e}")
+        if conn is not None:
+            conn.rollback()
+        if raise_errors:
+            raise
+    finally:
+        if conn is not None:
+            conn.close()
 
+    elapsed_ms = round((time.monotonic() - started) * 1000, 1)
+    print(f"Processed {processed} expired surveys in {batches} batches ({elapsed_ms} ms)")
+    return {"processed": processed, "batches": batches, "elapsed_ms": elapsed_ms}
 
-def start_background_processor():
-    """Start the background survey processor thread"""
-    survey_thread = threading.Thread(target=background_survey_processor, daemon=True)
-    survey_thread.start()
-    print("Started background survey processor (runs every hour)")
@@ -0,0 +1,104 @@
+"""
+Typeahead search for tags
+Matches are ranked exact > prefix > substring > fuzzy (typo tolerant), and within each
+tier the most used tags (by service_tags count) come first. Lookups are served by a
+pg_trgm GIN index on LOWER(tags.name); without the extension the fuzzy tier is skipped.
+"""
+import os
+
+# Minimum pg_trgm word similarity for a fuzzy (typo) match, 0..1
+FUZZY_THRESHOLD = float(os.environ.get('TAG_SEARCH_FUZZY_THRESHOLD', 0.5))
+
+# Queries shorter than this only match on prefix; one or two letters match almost every tag
+MIN_SUBSTRING_LENGTH = 3
+
+MATCH_TYPES = {0: 'exact', 1: 'prefix', 2: 'substring', 3: 'fuzzy'}
+
+_trigram_available = None
+
+
+def _escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def trigram_available(cursor):
+    """Whether pg_trgm is installed (checked once per process)"""
+    global _trigram_available
+    if _trigram_available is None:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        _trigram_available = cursor.fetchone() is not None
+    return _trigram_available
+
+
+def search_tags(cursor, query, limit=10):
+    """
+    Ranked typeahead matches for `query`.
+    Returns rows with id, name, usage_count and match ('exact', 'prefix', 'substring' or 'fuzzy').
+    """
+    query = ' '.join(query.lower().split())
+    if not query:
+        return popular_tags(cursor, limit)
+
+    escaped = _escape_like(query)
+    params = {
+        'query': query,
+        'prefix': f"{escaped}%",
+        'contains': f"%{escaped}%" if len(query) >= MIN_SUBSTRING_LENGTH else f"{escaped}%",
+        'limit': limit
+    }
+
+    match_condition = "LOWER(t.name) LIKE %(contains)s"
+    score = "0"
+    if trigram_available(cursor):
+        if len(query) >= MIN_SUBSTRING_LENGTH:
+            cursor.execute("SET LOCAL pg_trgm.word_similarity_threshold = %s", (FUZZY_THRESHOLD,))
+            match_condition += " OR %(query)s <%% LOWER(t.name)"
+        score = "word_similarity(%(query)s, LOWER(t.name))"
+
+    cursor.execute(f"""
+        WITH candidates AS (
+            SELECT t.id, t.name,
+                   CASE
+                       WHEN LOWER(t.name) = %(query)s THEN 0
+                       WHEN LOWER(t.name) LIKE %(prefix)s THEN 1
+                       WHEN LOWER(t.name) LIKE %(contains)s THEN 2
+                       ELSE 3
+                   END AS match_rank,
+                   {score} AS score
+            FROM tags t
+            WHERE t.is_approved = TRUE
+            AND ({match_condition})
+        )
+        SELECT c.id, c.name, c.match_rank, c.score, usage.usage_count
+        FROM candidates c
+        CROSS JOIN LATERAL (
+            SELECT COUNT(*) AS usage_count
+            FROM service_tags st
+            WHERE st.tag_id = c.id
+        ) usage
+        ORDER BY c.match_rank, usage.usage_count DESC, c.score DESC, c.name
+        LIMIT %(limit)s
+    """, params)
+
+    return [_format(row) for row in cursor.fetchall()]
+
+
+def popular_tags(cursor, limit=10):
+    """Most used approved tags, for an empty typeahead box"""
+    cursor.execute("""
+        SELECT t.id, t.name, COUNT(st.service_id) AS usage_count
+        FROM tags t
+        LEFT JOIN service_tags st ON st.tag_id = t.id
+        WHERE t.is_approved = TRUE
+        GROUP BY t.id, t.name
+        ORDER BY usage_count DESC, t.name
+        LIMIT %s
+    """, (limit,))
+    return [_format(row) for row in cursor.fetchall()]
+
+
+def _format(row):
+    tag = {"id": row['id'], "name": row['name'], "usage_count": row['usage_count']}
+    if 'match_rank' in row:
+        tag["match"] = MATCH_TYPES[row['match_rank']]
+    return tag
@@ -0,0 +1,208 @@
+"""
+Local Wikidata taxonomy snapshot for tag suggestions
+Loads the compact store written by build_taxonomy.py into memory and answers the same
+questions as the live Wikidata lookups (entity for a tag name, related concepts for an
+entity) in microseconds. Entity choice and label filtering reuse the rules in
+wikibase_search, so local and live answers agree. Anything the snapshot does not know
+returns None and callers fall back to live Wikidata.
+"""
+import bisect
+import gzip
+import json
+import os
+import threading
+import time
+
+TAXONOMY_PATH = os.environ.get(
+    'TAXONOMY_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'taxonomy.json.gz')
+)
+
+FORMAT_VERSION = 1
+
+# Relations kept in the snapshot (same as the SPARQL in wikibase_search.build_related_query)
+RELATIONS = ('P279', 'P366', 'P3095', 'P1056')
+
+SEARCH_LIMIT = 5    # wbsearchentities limit used by the live lookup
+RELATED_LIMIT = 20  # SPARQL LIMIT used by the live lookup
+
+
+def _normalize(text):
+    return ' '.join((text or '').casefold().split())
+
+
+def _qid(number):
+    return f"Q{number}"
+
+
+class TaxonomyGraph:
+    """In-memory label index and typed adjacency lists over integer entity ids"""
+
+    def __init__(self, nodes, edges, meta=None):
+        self.meta = meta or {}
+        self.labels = {}
+        self.descriptions = {}
+        self._by_label = {}
+        self._by_alias = {}
+
+        for number, label, description, aliases in nodes:
+            self.labels[number] = label
+            if description:
+                self.descriptions[number] = description
+            self._by_label.setdefault(_normalize(label), []).append(number)
+            for alias in aliases or ():
+                self._by_alias.setdefault(_normalize(alias), []).append(number)
+
+        self._sorted_labels = sorted(self._by_label)
+
+        self.parents = {}    # P279 out: what this is a type of
+        self.children = {}   # P279 in: specializations
+        self.tools = {}      # P366 in: things used for this
+        self.roles = {}      # P3095 out: who practises this
+        self.products = {}   # P1056 out: what this produces
+        targets = {
+            'P279': (self.parents, self.children),
+            'P366': (None, self.tools),
+            'P3095': (self.roles, None),
+            'P1056': (self.products, None),
+        }
+        for prop, pairs in edges.items():
+            outgoing, incoming = targets[prop]
+            for source, target in pairs:
+                if outgoing is not None:
+                    outgoing.setdefault(source, []).append(target)
+                if incoming is not None:
+                    incoming.setdefault(target, []).append(source)
+
+    @classmethod
+    def load(cls, path):
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported taxonomy format version: {data.get('version')}")
+        return cls(data['nodes'], data['edges'], meta=data.get('meta'))
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __contains__(self, entity_id):
+        return self._number(entity_id) in self.labels
+
+    @staticmethod
+    def _number(entity_id):
+        if isinstance(entity_id, str) and entity_id[:1] == 'Q' and entity_id[1:].isdigit():
+            return int(entity_id[1:])
+        return None
+
+    def _degree(self, number):
+        return sum(len(index.get(number, ())) for index in
+                   (self.parents, self.children, self.tools, self.roles, self.products))
+
+    def candidates(self, search_term, limit=SEARCH_LIMIT):
+        """
+        wbsearchentities-style matches: exact labels, then aliases, then label prefixes,
+        better connected entities first within each group
+        """
+        term = _normalize(search_term)
+        if not term:
+            return []
+
+        found = []
+        seen = set()
+
+        def add(numbers):
+            for number in sorted(numbers, key=self._degree, reverse=True):
+                if number not in seen and len(found) < limit:
+                    seen.add(number)
+                    found.append(number)
+
+        add(self._by_label.get(term, ()))
+        add(self._by_alias.get(term, ()))
+
+        start = bisect.bisect_left(self._sorted_labels, term)
+        prefixed = []
+        for label in self._sorted_labels[start:]:
+            if not label.startswith(term) or len(prefixed) >= limit * 4:
+                break
+            prefixed.extend(self._by_label[label])
+        add(prefixed)
+
+        return [{
+            "id": _qid(number),
+            "label": self.labels[number],
+            "description": self.descriptions.get(number, '')
+        } for number in found]
+
+    def search_entity(self, search_term):
+        """Q-ID for a tag name using the live filter rules, or None if the snapshot has no match"""
+        from wikibase_search import pick_entity
+
+        matches = self.candidates(search_term)
+        if not matches:
+            return None
+        return pick_entity(search_term, matches)
+
+    def related_tags(self, entity_id):
+        """Related labels in the same group order as the SPARQL query, or None for unknown entities"""
+        from wikibase_search import filter_related_labels
+
+        number = self._number(entity_id)
+        if number not in self.labels:
+            return None
+
+        labels = []
+        seen = set()
+        for index in (self.parents, self.children, self.tools, self.roles, self.products):
+            for other in index.get(number, ()):
+                label = self.labels.get(other)
+                if label and label not in seen and len(labels) < RELATED_LIMIT:
+                    seen.add(label)
+                    labels.append(label)
+        return filter_related_labels(labels)
+
+    def lookup(self, tag_name):
+        """{"entity_id", "suggestions"} answered locally, or None to fall back to live Wikidata"""
+        entity_id = self.search_entity(tag_name)
+        if entity_id is None:
+            return None
+        return {"entity_id": entity_id, "suggestions": self.related_tags(entity_id) or []}
+
+    def stats(self):
+        return {
+            "entities": len(self.labels),
+            "edges": sum(len(targets) for targets in self.parents.values())
+                     + sum(len(sources) for sources in self.tools.values())
+                     + sum(len(targets) for targets in self.roles.values())
+                     + sum(len(targets) for targets in self.products.values()),
+            "built_at": self.meta.get('built_at'),
+            "source": self.meta.get('source')
+        }
+
+
+_graph = None
+_graph_loaded = False
+_graph_lock = threading.Lock()
+
+
+def get_graph():
+    """The snapshot at TAXONOMY_PATH, loaded once per process; None if there is no snapshot"""
+    global _graph, _graph_loaded
+    if not _graph_loaded:
+        with _graph_lock:
+            if not _graph_loaded:
+                if os.path.exists(TAXONOMY_PATH):
+                    try:
+                        started = time.monotonic()
+                        _graph = TaxonomyGraph.load(TAXONOMY_PATH)
+                        print(f"Loaded taxonomy snapshot with {len(_graph)} entities "
+                              f"in {time.monotonic() - started:.2f}s")
+                    except (OSError, ValueError, KeyError) as e:
+                        print(f"Could not load taxonomy snapshot {TAXONOMY_PATH}: {e}")
+                _graph_loaded = True
+    return _graph
+
+
+def graph_stats():
+    """Snapshot size and build info, or None if no snapshot is loaded"""
+    return _graph.stats() if _graph is not None else None
@@ -0,0 +1,60 @@
+"""
+Shared fixtures for the tests that need a PostgreSQL database (POSTGRES_* / DATABASE_URL
+as for the app); those tests are skipped when none is reachable.
+"""
+
+import os
+import sys
+
+import psycopg2
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import db_pool
+
+
+@pytest.fixture
+def db_cursor():
+    """Cursor on its own connection to a migrated database; uncommitted work is rolled back afterwards"""
+    try:
+        conn = psycopg2.connect(**db_pool.connection_params())
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"PostgreSQL not available: {e}")
+
+    import app
+    app.init_db()
+
+    cursor = conn.cursor()
+    yield cursor
+
+    conn.rollback()
+    cursor.close()
+    conn.close()
+
+
+@pytest.fixture
+def make_user(db_cursor):
+    """
+    Factory committing a test user with the given email (other columns as keyword
+    arguments) and returning its id; the users are deleted afterwards
+    """
+    created = []
+
+    def make(email, **columns):
+        columns = {"password_hash": 'x', "first_name": 'Test', "last_name": 'User', **columns, "email": email}
+        db_cursor.execute(f"""
+            INSERT INTO users ({', '.join(columns)})
+            VALUES ({', '.join(['%s'] * len(columns))})
+            RETURNING id
+        """, list(columns.values()))
+        user_id = db_cursor.fetchone()['id']
+        db_cursor.connection.commit()
+        created.append(user_id)
+        return user_id
+
+    yield make
+
+    db_cursor.connection.rollback()
+    db_cursor.execute("DELETE FROM users WHERE id = ANY(%s)", (created,))
+    db_cursor.connection.commit()
@@ -0,0 +1,84 @@
+"""
+Local stand-in for the Wikidata APIs used by the Wikidata tests
+Serves wbsearchentities and SPARQL responses from fixed data, counts requests per
+endpoint and can be slowed down or made to fail.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+ENTITIES = {"guitar": "Q6607", "gardening": "Q124246"}
+RELATED = {
+    "Q6607": ["String instrument", "Electric guitar", "Bass guitar", "Guitarist"],
+    "Q124246": ["Horticulture", "Gardener", "Rake"],
+}
+
+
+class FakeWikidata:
+    """Minimal wbsearchentities + SPARQL endpoint"""
+
+    def __init__(self):
+        self.requests = {"search": 0, "sparql": 0}
+        self.delay = 0.0
+        self.fail = False
+        self.fail_times = 0  # fail only the next N requests
+        self.lock = threading.Lock()
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = parse_qs(url.query)
+                kind = "search" if url.path.endswith("api.php") else "sparql"
+                with fake.lock:
+                    fake.requests[kind] += 1
+                    failing = fake.fail or fake.fail_times > 0
+                    if fake.fail_times > 0:
+                        fake.fail_times -= 1
+                time.sleep(fake.delay)
+
+                if failing:
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+
+                if kind == "search":
+                    term = params["search"][0].lower()
+                    matches = []
+                    if term in ENTITIES:
+                        matches.append({"id": ENTITIES[term], "label": term, "description": "activity"})
+                    body = {"search": matches}
+                else:
+                    query = params["query"][0]
+                    entity_id = next((qid for qid in RELATED if f"wd:{qid} " in query), None)
+                    labels = RELATED.get(entity_id, [])
+                    body = {"results": {"bindings": [{"itemLabel": {"value": label}} for label in labels]}}
+
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
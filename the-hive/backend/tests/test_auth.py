@@ -0,0 +1,111 @@
+"""
+Tests for the verified-token cache and the user status snapshot
+Runs offline; no database is needed (the snapshot's listener is never started).
+"""
+
+import os
+import sys
+import time
+
+import jwt
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import auth
+from auth import TokenCache, UserStatusSnapshot
+
+SECRET = 'test-secret'
+
+
+def make_token(user_id, expires_in=3600):
+    return jwt.encode({'user_id': user_id, 'exp': int(time.time()) + expires_in}, SECRET, algorithm='HS256')
+
+
+class TestTokenCache:
+    """Tokens are verified once and served from the cache until they expire"""
+
+    def test_verified_once(self, monkeypatch):
+        monkeypatch.setattr(auth, '_tokens', TokenCache())
+        token = make_token(7)
+        assert auth.decode_token(token, SECRET)['user_id'] == 7
+
+        monkeypatch.setattr(auth.jwt, 'decode', lambda *args, **kwargs: pytest.fail("decoded again"))
+        assert auth.decode_token(token, SECRET)['user_id'] == 7
+        assert auth._tokens.stats()['hits'] == 1
+
+    def test_invalid_and_expired_tokens_not_cached(self, monkeypatch):
+        monkeypatch.setattr(auth, '_tokens', TokenCache())
+        with pytest.raises(jwt.InvalidTokenError):
+            auth.decode_token(make_token(7)[:-2] + 'xx', SECRET)
+        with pytest.raises(jwt.ExpiredSignatureError):
+            auth.decode_token(make_token(7, expires_in=-10), SECRET)
+        assert auth._tokens.stats()['entries'] == 0
+
+    def test_cached_token_expires(self):
+        cache = TokenCache()
+        token = make_token(7)
+        cache.put(token, {'user_id': 7, 'exp': time.time() - 1})
+        assert cache.get(token) is None
+
+    def test_least_recently_used_evicted(self):
+        cache = TokenCache(max_entries=2)
+        tokens = [make_token(n) for n in range(3)]
+        for n, token in enumerate(tokens[:2]):
+            cache.put(token, {'user_id': n, 'exp': time.time() + 60})
+        cache.get(tokens[0])
+        cache.put(tokens[2], {'user_id': 2, 'exp': time.time() + 60})
+        assert cache.get(tokens[1]) is None
+        assert cache.get(tokens[0])['user_id'] == 0
+
+
+class TestUserStatusSnapshot:
+    """Statuses are cached only while notifications can invalidate them"""
+
+    def loader(self, rows):
+        calls = []
+
+        def load(user_id):
+            calls.append(user_id)
+            return rows.get(user_id)
+        return load, calls
+
+    def test_cached_while_listening(self):
+        snapshot = UserStatusSnapshot()
+        snapshot.connected = True
+        load, calls = self.loader({1: {'user_status': 'active', 'role': 'user', 'is_active': True}})
+
+        assert snapshot.get(1, load)['user_status'] == 'active'
+        assert snapshot.get(1, load)['user_status'] == 'active'
+        assert calls == [1]
+
+    def test_notification_evicts_user(self):
+        snapshot = UserStatusSnapshot()
+        snapshot.connected = True
+        rows = {1: {'user_status': 'active', 'role': 'user', 'is_active': True}}
+        load, calls = self.loader(rows)
+        snapshot.get(1, load)
+
+        rows[1] = {'user_status': 'banned', 'role': 'user', 'is_active': True}
+        snapshot.dispatch('1')
+        assert snapshot.get(1, load)['user_status'] == 'banned'
+        assert calls == [1, 1]
+
+    def test_not_cached_without_listener(self):
+        snapshot = UserStatusSnapshot()
+        load, calls = self.loader({1: {'user_status': 'active', 'role': 'user', 'is_active': True}})
+        snapshot.get(1, load)
+        snapshot.get(1, load)
+        assert calls == [1, 1]
+
+    def test_load_racing_an_invalidation_is_not_stored(self):
+        snapshot = UserStatusSnapshot()
+        snapshot.connected = True
+
+        def stale_load(user_id):
+            # The row changes (and is announced) while this read is in flight
+            snapshot.dispatch(str(user_id))
+            return {'user_status': 'active', 'role': 'user', 'is_active': True}
+
+        snapshot.get(1, stale_load)
+        assert snapshot.stats()['entries'] == 0
@@ -0,0 +1,122 @@
+"""
+Tests for the real-time event hub: routing, slow-client overflow and SSE framing
+Runs offline; notifications are fed to the hub directly instead of through LISTEN.
+TestListener checks the shared LISTEN connection against the test database.
+"""
+
+import json
+import os
+import queue
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from events import EventHub, HubFullError, Listener, Subscriber
+
+
+def notification(users, event_type, **data):
+    return json.dumps({"users": users, "type": event_type, "data": data})
+
+
+class TestEventHub:
+    """Fan-out of notifications to the streams of the addressed users"""
+
+    def test_events_reach_only_addressed_users(self):
+        hub = EventHub()
+        alice, alice_tab, bob = hub.subscribe(1), hub.subscribe(1), hub.subscribe(2)
+
+        hub.dispatch(notification([1], 'message', application_id=7, message_id=40))
+
+        assert alice.get(timeout=0.1) == {"type": "message", "data": {"application_id": 7, "message_id": 40}}
+        assert alice_tab.get(timeout=0.1)["type"] == "message"
+        with pytest.raises(queue.Empty):
+            bob.get(timeout=0.05)
+        assert hub.stats()["delivered"] == 2
+
+    def test_malformed_payload_is_ignored(self):
+        hub = EventHub()
+        subscriber = hub.subscribe(1)
+        hub.dispatch("not json")
+        hub.dispatch(json.dumps({"type": "message"}))
+        with pytest.raises(queue.Empty):
+            subscriber.get(timeout=0.05)
+
+    def test_overflow_turns_into_resync(self):
+        subscriber = Subscriber(1, maxsize=2)
+        for number in range(3):
+            subscriber.put({"type": "message", "data": {"message_id": number}})
+
+        assert subscriber.get(timeout=0.1) == {"type": "resync", "data": {}}
+        with pytest.raises(queue.Empty):
+            subscriber.get(timeout=0.05)
+
+    def test_subscriber_limit(self):
+        hub = EventHub(max_subscribers=1)
+        first = hub.subscribe(1)
+        with pytest.raises(HubFullError):
+            hub.subscribe(2)
+        hub.unsubscribe(first)
+        hub.subscribe(2)
+
+    def test_stream_frames_and_cleanup(self):
+        hub = EventHub()
+        subscriber = hub.subscribe(5)
+        stream = hub.stream(subscriber, heartbeat=0.05)
+
+        assert next(stream) == "retry: 5000\n\n"
+        assert next(stream).startswith("event: ready\n")
+        assert next(stream) == ": keepalive\n\n"
+
+        hub.dispatch(notification([5], 'balance'))
+        assert next(stream) == "event: balance\ndata: {}\n\n"
+
+        stream.close()
+        assert hub.stats()["subscribers"] == 0
+
+    def test_stream_ends_when_access_token_expires(self):
+        hub = EventHub()
+        subscriber = hub.subscribe(5)
+        stream = hub.stream(subscriber, heartbeat=5, lifetime=0.05)
+
+        frames = list(stream)
+        assert frames[-1] == "event: expired\ndata: {}\n\n"
+        assert hub.stats()["subscribers"] == 0
+
+    def test_stream_closes_when_account_check_fails(self):
+        hub = EventHub()
+        subscriber = hub.subscribe(5)
+        errors = [None, {"error": "Your account is banned"}]
+        stream = hub.stream(subscriber, heartbeat=0.02, check=lambda: errors.pop(0))
+
+        frames = list(stream)
+        assert frames[-1] == 'event: closed\ndata: {"error": "Your account is banned"}\n\n'
+        assert not errors and hub.stats()["subscribers"] == 0
+
+
+class TestListener:
+    """One connection per worker, dispatching notifications by channel"""
+
+    def test_channels_share_one_connection(self, db_cursor):
+        received = {"hive_test_a": queue.Queue(), "hive_test_b": queue.Queue()}
+        connected = threading.Event()
+        listener = Listener().start()
+        try:
+            listener.add("hive_test_a", received["hive_test_a"].put)
+            assert received["hive_test_a"].empty()
+            # Added while connected: listened on right away
+            listener.add("hive_test_b", received["hive_test_b"].put, on_connect=lambda reconnected: connected.set())
+            assert connected.wait(5)
+
+            db_cursor.execute("SELECT pg_notify('hive_test_a', 'one'), pg_notify('hive_test_b', 'two')")
+            db_cursor.connection.commit()
+            assert received["hive_test_a"].get(timeout=5) == 'one'
+            assert received["hive_test_b"].get(timeout=5) == 'two'
+
+            with pytest.raises(ValueError):
+                listener.add("hive_test_a", print)
+            assert listener.stats()["notifications"] == 2
+        finally:
+            listener.stop()
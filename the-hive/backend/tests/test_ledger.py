@@ -0,0 +1,95 @@
+"""
+Concurrency stress test for the time credit ledger
+Fires hundreds of simultaneous transfers (some repeating an idempotency key) between a
+small set of accounts, then checks that no hours were created or lost, that every key
+moved hours exactly once and that the cached balances match the ledger.
+Needs a PostgreSQL database (POSTGRES_* / DATABASE_URL as for the app); skipped otherwise.
+"""
+
+import os
+import random
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import psycopg2
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import db_pool
+import ledger
+
+ACCOUNTS = 20
+OPENING = Decimal('100.00')
+TRANSFERS = 400
+DISTINCT_KEYS = 300
+
+
+def connect():
+    return psycopg2.connect(**db_pool.connection_params())
+
+
+@pytest.fixture
+def accounts(db_cursor, make_user):
+    user_ids = [
+        make_user(f"ledger-stress-{n}@hive.invalid", first_name='Ledger', last_name=f"Stress {n}",
+                  time_balance=OPENING, opening_balance=OPENING)
+        for n in range(1, ACCOUNTS + 1)
+    ]
+
+    yield user_ids
+
+    # Before make_user deletes the accounts the entries refer to
+    db_cursor.connection.rollback()
+    db_cursor.execute("""
+        DELETE FROM time_ledger_entries
+        WHERE transaction_id IN (SELECT id FROM time_transactions WHERE idempotency_key LIKE 'stress:%%')
+    """)
+    db_cursor.execute("DELETE FROM time_transactions WHERE idempotency_key LIKE 'stress:%%'")
+    db_cursor.connection.commit()
+
+
+def run_transfer(user_ids, number, rng):
+    payer, payee = rng.sample(user_ids, 2)
+    hours = Decimal(rng.choice(['0.50', '1.00', '1.50', '2.00', '3.25']))
+    conn = connect()
+    try:
+        cursor = conn.cursor()
+        transaction_id = ledger.transfer(cursor, payer, payee, hours,
+                                         idempotency_key=f"stress:{number % DISTINCT_KEYS}")
+        conn.commit()
+        return transaction_id
+    finally:
+        conn.close()
+
+
+class TestLedgerConcurrency:
+    """Simultaneous transfers keep hours conserved and apply each key once"""
+
+    def test_concurrent_transfers_conserve_hours(self, accounts):
+        rng = random.Random(573)
+        jobs = [(number, random.Random(rng.random())) for number in range(TRANSFERS)]
+
+        with ThreadPoolExecutor(max_workers=64) as pool:
+            results = list(pool.map(lambda job: run_transfer(accounts, *job), jobs))
+
+        applied = [result for result in results if result is not None]
+        assert len(applied) == DISTINCT_KEYS
+
+        conn = connect()
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT SUM(time_balance) AS total FROM users WHERE id = ANY(%s)", (accounts,))
+        assert cursor.fetchone()['total'] == OPENING * ACCOUNTS
+
+        cursor.execute("SELECT COUNT(*) AS count FROM time_transactions WHERE idempotency_key LIKE 'stress:%%'")
+        assert cursor.fetchone()['count'] == DISTINCT_KEYS
+
+        audit = ledger.audit(cursor)
+        assert audit['unbalanced_transactions'] == 0
+        assert ledger.rebuild_balances(cursor, accounts) == 0
+
+        conn.rollback()
+        cursor.close()
+        conn.close()
@@ -0,0 +1,68 @@
+"""
+Tests for migration discovery, ordering and checksum verification
+Runs offline; no database is needed.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import migrate
+from migrate import MigrationError
+
+
+def write(directory, filename, content):
+    path = directory / filename
+    path.write_text(content)
+    return path
+
+
+class TestDiscover:
+    """Numbered files in version order; anything else is ignored"""
+
+    def test_version_order_and_kinds(self, tmp_path):
+        write(tmp_path, '0010_later.sql', "SELECT 1;")
+        write(tmp_path, '0002_indexes.py', "TRANSACTIONAL = False\n\ndef upgrade(cursor):\n    pass\n")
+        write(tmp_path, '0001_baseline.py', "def upgrade(cursor):\n    pass\n")
+        write(tmp_path, 'README.md', "not a migration")
+        write(tmp_path, '12_short.sql', "SELECT 1;")
+
+        migrations = migrate.discover(str(tmp_path))
+        assert [(m.version, m.name) for m in migrations] == [(1, 'baseline'), (2, 'indexes'), (10, 'later')]
+        assert [m.transactional for m in migrations] == [True, False, True]
+
+    def test_duplicate_versions_rejected(self, tmp_path):
+        write(tmp_path, '0003_one.sql', "SELECT 1;")
+        write(tmp_path, '0003_two.py', "def upgrade(cursor):\n    pass\n")
+        with pytest.raises(MigrationError):
+            migrate.discover(str(tmp_path))
+
+    def test_shipped_migrations_load(self):
+        migrations = migrate.discover()
+        assert [m.version for m in migrations] == list(range(1, len(migrations) + 1))
+        assert all(callable(m.module.upgrade) for m in migrations if m.path.endswith('.py'))
+
+
+class TestPending:
+    """Applied versions are skipped; an edited applied migration is refused"""
+
+    def test_pending_after_applied(self, tmp_path):
+        write(tmp_path, '0001_a.sql', "SELECT 1;")
+        write(tmp_path, '0002_b.sql', "SELECT 2;")
+        first, second = migrate.discover(str(tmp_path))
+
+        assert migrate.pending([first, second], {}) == [first, second]
+        assert migrate.pending([first, second], {1: {'checksum': first.checksum}}) == [second]
+        # Versions applied by newer code are not an error
+        assert migrate.pending([first], {1: {'checksum': first.checksum}, 3: {'checksum': 'x'}}) == []
+
+    def test_changed_migration_refused(self, tmp_path):
+        path = write(tmp_path, '0001_a.sql', "SELECT 1;")
+        applied = {1: {'checksum': migrate.discover(str(tmp_path))[0].checksum}}
+        path.write_text("SELECT 1; SELECT 2;")
+
+        with pytest.raises(MigrationError):
+            migrate.pending(migrate.discover(str(tmp_path)), applied)
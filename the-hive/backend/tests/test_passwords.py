@@ -0,0 +1,119 @@
+"""
+Tests for the password hashing service and the login concurrency limits
+Runs offline; no database is needed.
+"""
+
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import passwords
+from passwords import ConcurrencyLimiter, PasswordHasher, PasswordServiceBusy, LoginThrottled
+
+
+def die_once(marker):
+    """Kills its hashing process the first time (breaking the pool), then succeeds"""
+    if not os.path.exists(marker):
+        open(marker, 'w').close()
+        os._exit(1)
+    return True
+
+
+def die(marker):
+    os._exit(1)
+
+
+class TestPasswordHasher:
+    """Hashes at the configured cost, accepts older costs and flags them for rehash"""
+
+    def test_hash_and_check(self):
+        hasher = PasswordHasher(workers=0, rounds=4)
+        hashed = hasher.hash('Secret123')
+        assert passwords.hash_cost(hashed) == 4
+        assert hasher.check('Secret123', hashed)
+        assert not hasher.check('Secret124', hashed)
+        assert not hasher.check('Secret123', 'not-a-hash')
+
+    def test_cost_change_needs_rehash(self):
+        old = PasswordHasher(workers=0, rounds=4).hash('Secret123')
+        hasher = PasswordHasher(workers=0, rounds=5)
+        assert hasher.check('Secret123', old)
+        assert hasher.needs_rehash(old)
+        assert not hasher.needs_rehash(hasher.hash('Secret123'))
+
+    def test_long_passwords_use_first_72_bytes(self):
+        hasher = PasswordHasher(workers=0, rounds=4)
+        hashed = hasher.hash('A1' + 'x' * 100)
+        assert hasher.check('A1' + 'x' * 70 + 'different tail', hashed)
+
+    def test_pool(self):
+        hasher = PasswordHasher(workers=1, rounds=4)
+        try:
+            assert hasher.check('Secret123', hasher.hash('Secret123'))
+        finally:
+            hasher.shutdown()
+
+    def test_broken_pool_retried_once(self, tmp_path):
+        hasher = PasswordHasher(workers=1, rounds=4)
+        try:
+            assert hasher._run("checks", die_once, str(tmp_path / 'died'))
+            assert hasher.stats()["pool_restarts"] == 1
+            with pytest.raises(PasswordServiceBusy):
+                hasher._run("checks", die, str(tmp_path / 'died'))
+            assert hasher.stats()["pool_restarts"] == 3
+        finally:
+            hasher.shutdown()
+
+    def test_pool_shared_out_among_workers(self):
+        assert passwords.pool_size(8, 4) == 2
+        assert passwords.pool_size(2, 4) == 1
+        assert passwords.pool_size(0, 4) == 0
+
+    def test_saturated_pool_refuses(self):
+        hasher = PasswordHasher(workers=0, rounds=4, max_pending=1)
+        entered, release = threading.Event(), threading.Event()
+
+        def slow_check(*args):
+            entered.set()
+            release.wait(5)
+            return True
+
+        worker = threading.Thread(target=hasher._run, args=("checks", slow_check))
+        worker.start()
+        entered.wait(5)
+        try:
+            with pytest.raises(PasswordServiceBusy):
+                hasher.check('Secret123', 'x')
+        finally:
+            release.set()
+            worker.join()
+        assert hasher.stats()["rejected_busy"] == 1
+        assert hasher.stats()["pending"] == 0
+
+
+class TestLoginSlots:
+    """Concurrent logins are capped per client address and per account"""
+
+    def test_limiter(self):
+        limiter = ConcurrencyLimiter(2)
+        assert limiter.acquire('a') and limiter.acquire('a')
+        assert not limiter.acquire('a')
+        assert limiter.acquire('b')
+        limiter.release('a')
+        assert limiter.acquire('a')
+
+    def test_login_slot_per_account(self, monkeypatch):
+        monkeypatch.setattr(passwords, '_per_ip', ConcurrencyLimiter(10))
+        monkeypatch.setattr(passwords, '_per_account', ConcurrencyLimiter(1))
+        with passwords.login_slot('10.0.0.1', 'Ada@example.com'):
+            with pytest.raises(LoginThrottled):
+                with passwords.login_slot('10.0.0.2', 'ada@example.com'):
+                    pass
+            # The address slot taken by the refused attempt was given back
+            assert passwords._per_ip.stats()["keys"] == 1
+        with passwords.login_slot('10.0.0.2', 'ada@example.com'):
+            pass
@@ -0,0 +1,81 @@
+"""
+Concurrency test for completing a service through the confirmation survey
+Both parties (and repeated clicks) confirm at the same time; the service must complete
+exactly once, with one transfer.
+Needs a PostgreSQL database (POSTGRES_* / DATABASE_URL as for the app); skipped otherwise.
+"""
+
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import ledger
+
+
+@pytest.fixture
+def progress(db_cursor, make_user):
+    provider = make_user('progress-provider@hive.invalid', first_name='Progress', last_name='Provider')
+    consumer = make_user('progress-consumer@hive.invalid', first_name='Progress', last_name='Consumer')
+    db_cursor.execute("""
+        INSERT INTO services (user_id, service_type, title, description, hours_required, location_type, status)
+        VALUES (%s, 'offer', 'Progress test', 'Progress test', 1, 'online', 'in_progress')
+        RETURNING id
+    """, (provider,))
+    service_id = db_cursor.fetchone()['id']
+    db_cursor.execute("""
+        INSERT INTO service_applications (service_id, applicant_id, status) VALUES (%s, %s, 'accepted')
+        RETURNING id
+    """, (service_id, consumer))
+    application_id = db_cursor.fetchone()['id']
+    db_cursor.execute("""
+        INSERT INTO service_progress (service_id, application_id, provider_id, consumer_id, hours, status)
+        VALUES (%s, %s, %s, %s, 1, 'awaiting_confirmation')
+        RETURNING id
+    """, (service_id, application_id, provider, consumer))
+    progress_id = db_cursor.fetchone()['id']
+    db_cursor.connection.commit()
+
+    yield db_cursor, progress_id, provider, consumer
+
+    # Before make_user deletes the accounts the entries refer to
+    db_cursor.connection.rollback()
+    db_cursor.execute("""
+        DELETE FROM time_ledger_entries
+        WHERE transaction_id IN (SELECT id FROM time_transactions WHERE progress_id = %s)
+    """, (progress_id,))
+    db_cursor.execute("DELETE FROM time_transactions WHERE progress_id = %s", (progress_id,))
+    db_cursor.execute("DELETE FROM service_progress WHERE id = %s", (progress_id,))
+    db_cursor.execute("DELETE FROM services WHERE id = %s", (service_id,))
+    db_cursor.connection.commit()
+
+
+class TestSubmitSurvey:
+    """POST /api/progress/<id>/submit-survey"""
+
+    def test_concurrent_confirmations_complete_once(self, progress):
+        cursor, progress_id, provider, consumer = progress
+        import app
+
+        def submit(user_id):
+            token = app.create_access_token({"id": user_id, "email": 'progress@hive.invalid', "role": 'user'})
+            response = app.app.test_client().post(f"/api/progress/{progress_id}/submit-survey",
+                                                  headers={'Authorization': f"Bearer {token}"},
+                                                  json={"survey_data": {"rating": 5}})
+            return response.status_code, (response.get_json() or {}).get('completed')
+
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            results = list(pool.map(submit, [provider, consumer] * 3))
+
+        assert results.count((200, True)) == 1
+        assert results.count((200, False)) == 1
+        assert all(status in (400, 409) for status, _ in results if status != 200)
+
+        cursor.execute("SELECT status FROM service_progress WHERE id = %s", (progress_id,))
+        assert cursor.fetchone()['status'] == 'completed'
+        cursor.execute("SELECT COUNT(*) AS count FROM time_transactions WHERE idempotency_key = %s",
+                       (ledger.progress_key(progress_id),))
+        assert cursor.fetchone()['count'] == 1
@@ -0,0 +1,67 @@
+"""
+Tests for SQL fingerprints, N+1 detection and the per-request Server-Timing header
+Runs offline; no database is needed.
+"""
+
+import os
+import sys
+
+from flask import Flask, jsonify
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import query_stats
+from query_stats import fingerprint
+
+
+class TestFingerprint:
+    """Statements differing only in values share a fingerprint"""
+
+    def test_literals_and_parameters(self):
+        assert fingerprint("SELECT * FROM users  WHERE id = %s\n AND status = 'active'") == \
+            "SELECT * FROM users WHERE id = ? AND status = ?"
+        assert fingerprint("SELECT * FROM t WHERE a = %(a)s LIMIT 20") == "SELECT * FROM t WHERE a = ? LIMIT ?"
+
+    def test_value_lists_collapse(self):
+        assert fingerprint("SELECT 1 FROM tags WHERE id IN (1, 2, 3)") == \
+            fingerprint("SELECT 1 FROM tags WHERE id IN (%s,%s)") == "SELECT ? FROM tags WHERE id IN (?...)"
+
+    def test_identifiers_with_digits_kept(self):
+        assert fingerprint("SELECT u1.email FROM users u1") == "SELECT u1.email FROM users u1"
+
+
+class TestRequestTracing:
+    """Each request gets Server-Timing and its statements are folded into the endpoint totals"""
+
+    def make_app(self, queries):
+        app = Flask(__name__)
+        query_stats.init_app(app)
+
+        @app.route("/items/<int:item_id>")
+        def item(item_id):
+            for n in range(queries):
+                query_stats._record(f"SELECT * FROM tags WHERE id = {n}", 1.5, 1)
+            return jsonify({})
+
+        return app
+
+    def test_server_timing_and_totals(self, monkeypatch):
+        monkeypatch.setattr(query_stats, '_stats', query_stats.QueryStats())
+        response = self.make_app(queries=3).test_client().get("/items/7")
+
+        timing = response.headers.getlist('Server-Timing')
+        assert timing[0] == 'db;dur=4.50;desc="3 queries"'
+        assert timing[1].startswith('app;dur=')
+
+        endpoint, = query_stats.query_stats()['endpoints']
+        assert endpoint['endpoint'] == "GET /items/<int:item_id>"
+        assert (endpoint['requests'], endpoint['queries'], endpoint['n_plus_one']) == (1, 3, 0)
+        assert endpoint['top_queries'][0]['fingerprint'] == "SELECT * FROM tags WHERE id = ?"
+
+    def test_repeated_statement_flagged(self, monkeypatch, capsys):
+        monkeypatch.setattr(query_stats, '_stats', query_stats.QueryStats())
+        monkeypatch.setattr(query_stats, 'QUERY_N_PLUS_ONE_THRESHOLD', 5)
+        self.make_app(queries=6).test_client().get("/items/1")
+
+        assert query_stats.query_stats()['endpoints'][0]['n_plus_one'] == 1
+        assert '"event": "n_plus_one"' in capsys.readouterr().out
@@ -0,0 +1,88 @@
+"""
+Tests for the per-user reputation aggregates
+The formatting tests run offline; the rest need a PostgreSQL database
+(POSTGRES_* / DATABASE_URL as for the app) and are skipped otherwise.
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import reputation
+
+
+class TestFormat:
+    def test_empty(self):
+        data = reputation.to_dict(None)
+        assert data['as_provider'] == {"completed": 0, "reviews": 0, "tags": {}}
+        assert data['as_consumer']['time_comparison']['average'] is None
+        assert data['last_review_at'] is None
+
+    def test_tags_and_time_average(self):
+        row = {
+            'completed_as_provider': 3, 'reviews_as_provider': 2,
+            'provider_tags': {'punctual': 1, 'friendly': 2, 'helpful': 2},
+            'time_less': 1, 'time_as_estimated': 0, 'time_more': 3,
+            'last_review_at': '2026-01-02T03:04:05'
+        }
+        data = reputation.to_dict(row)
+        assert list(data['as_provider']['tags']) == ['friendly', 'helpful', 'punctual']
+        assert data['as_consumer']['time_comparison']['average'] == 0.5
+        assert reputation.listing_summary(row, 'offer') == {
+            "completed": 3, "reviews": 2, "top_tags": ['friendly', 'helpful', 'punctual']
+        }
+        assert reputation.listing_summary(row, 'need')['completed'] == 0
+
+
+@pytest.fixture
+def users(db_cursor, make_user):
+    return db_cursor, [make_user(f"reputation-{name}@hive.invalid", first_name='Reputation', last_name='Test')
+                       for name in ('provider', 'consumer')]
+
+
+def complete(cursor, provider_id, consumer_id, provider_tags, consumer_tags, time_comparison):
+    cursor.execute("""
+        INSERT INTO service_progress (
+            provider_id, consumer_id, hours, status, completed_at,
+            consumer_survey_submitted, consumer_survey_data,
+            provider_survey_submitted, provider_survey_data
+        )
+        VALUES (%s, %s, 1, 'completed', NOW(), TRUE, %s, TRUE, %s)
+        RETURNING id
+    """, (provider_id, consumer_id, json.dumps({"tags": provider_tags}),
+          json.dumps({"consumer_tags": consumer_tags, "time_comparison": time_comparison})))
+    return cursor.fetchone()['id']
+
+
+class TestAggregates:
+    """Completions are counted once, and a rebuild gives the same figures"""
+
+    def test_apply_is_idempotent(self, users):
+        cursor, (provider_id, consumer_id) = users
+        first = complete(cursor, provider_id, consumer_id, ['friendly', 'friendly'], ['clear'], 'more-time')
+        second = complete(cursor, provider_id, consumer_id, ['friendly', 'punctual'], [], 'as-estimated')
+        reputation.apply(cursor, [first])
+        reputation.apply(cursor, [first, second])
+        reputation.apply(cursor, [second])
+
+        provider = reputation.get(cursor, provider_id)
+        assert provider['as_provider']['completed'] == 2
+        assert provider['as_provider']['tags'] == {'friendly': 2, 'punctual': 1}
+
+        consumer = reputation.get(cursor, consumer_id)
+        assert consumer['as_consumer']['tags'] == {'clear': 1}
+        assert consumer['as_consumer']['time_comparison']['average'] == 0.5
+        assert consumer['last_review_at'] is not None
+
+    def test_rebuild_matches(self, users):
+        cursor, (provider_id, consumer_id) = users
+        progress_id = complete(cursor, provider_id, consumer_id, ['helpful'], ['clear'], 'less-time')
+        reputation.apply(cursor, [progress_id])
+        before = [reputation.get(cursor, user_id) for user_id in (provider_id, consumer_id)]
+
+        reputation.rebuild(cursor)
+        assert [reputation.get(cursor, user_id) for user_id in (provider_id, consumer_id)] == before
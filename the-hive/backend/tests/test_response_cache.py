@@ -0,0 +1,173 @@
+"""
+Tests for the response cache: keys, ETags, conditional GETs, tag invalidation and the
+invalidator lease of a shared backend
+Runs offline; no database is needed (the cache's listener is never started).
+"""
+
+import os
+import sys
+
+import pytest
+from flask import Flask, jsonify
+from werkzeug.datastructures import MultiDict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import response_cache
+from response_cache import MemoryBackend, ResponseCache
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ResponseCache(backend=MemoryBackend())
+    cache.connected = True
+    monkeypatch.setattr(response_cache, '_cache', cache)
+    monkeypatch.setattr(response_cache, 'RESPONSE_CACHE_ENABLED', True)
+    return cache
+
+
+@pytest.fixture
+def client(cache):
+    app = Flask(__name__)
+    app.calls = 0
+    app.version = 1
+
+    @app.route("/items/<int:item_id>")
+    @response_cache.cached(ttl=60, tags=lambda args, data: [f"item:{args['item_id']}", f"owner:{data['owner']}"])
+    def get_item(item_id):
+        app.calls += 1
+        if item_id == 404:
+            return jsonify({"error": "Not found"}), 404
+        return jsonify({"id": item_id, "owner": 7, "version": app.version}), 200
+
+    return app.test_client()
+
+
+class TestCacheKey:
+    def test_arguments_sorted(self):
+        a = response_cache.cache_key('/api/x', MultiDict([('b', '2'), ('a', '1'), ('a', '0')]))
+        b = response_cache.cache_key('/api/x', MultiDict([('a', '0'), ('b', '2'), ('a', '1')]))
+        assert a == b == '/api/x?a=0&a=1&b=2'
+        assert response_cache.cache_key('/api/x', MultiDict()) == '/api/x'
+
+
+class TestCachedView:
+    """The view runs once; later requests are served, or answered 304, from the cache"""
+
+    def test_hit_after_miss(self, client):
+        first = client.get('/items/1')
+        second = client.get('/items/1')
+        assert (first.headers['X-Cache'], second.headers['X-Cache']) == ('MISS', 'HIT')
+        assert first.get_json() == second.get_json()
+        assert first.headers['ETag'] == second.headers['ETag']
+        assert client.application.calls == 1
+
+    def test_if_none_match(self, client):
+        etag = client.get('/items/1').headers['ETag']
+        response = client.get('/items/1', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.data == b''
+        assert client.application.calls == 1
+        assert client.get('/items/1', headers={'If-None-Match': '"other"'}).status_code == 200
+
+    def test_tag_invalidation(self, client, cache):
+        etag = client.get('/items/1').headers['ETag']
+        client.application.version = 2
+        # Any tag of the entry drops it, e.g. one taken from the response body
+        cache.dispatch('owner:7')
+        response = client.get('/items/1', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.get_json()['version'] == 2
+        assert client.application.calls == 2
+
+    def test_errors_not_cached(self, client):
+        client.get('/items/404')
+        assert client.get('/items/404').headers.get('X-Cache') is None
+        assert client.application.calls == 2
+
+    def test_not_stored_without_listener(self, client, cache):
+        cache.connected = False
+        client.get('/items/1')
+        assert client.get('/items/1').headers['X-Cache'] == 'BYPASS'
+        assert client.application.calls == 2
+
+    def test_hit_ratio(self, client, cache):
+        for _ in range(4):
+            client.get('/items/1')
+        route = cache.stats()['routes']['get_item']
+        assert (route['hits'], route['misses'], route['hit_ratio']) == (3, 1, 0.75)
+
+
+class TestMemoryBackend:
+    def test_lru_eviction_cleans_tag_index(self):
+        backend = MemoryBackend(max_entries=2)
+        for key in ('a', 'b', 'c'):
+            backend.set(key, 'etag', b'{}', 60, [f"tag:{key}", "shared"])
+        assert backend.get('a') is None
+        backend.invalidate(["shared"])
+        assert backend.size() == 0
+        assert backend._tags == {}
+
+    def test_expiry(self):
+        backend = MemoryBackend()
+        backend.set('a', 'etag', b'{}', -1, [])
+        assert backend.get('a') is None
+
+
+class SharedBackend(MemoryBackend):
+    """MemoryBackend standing in for Redis: one store and one lease for several workers"""
+
+    shared = True
+
+    def __init__(self):
+        super().__init__()
+        self.holder = None
+        self.clears = 0
+
+    def clear(self):
+        self.clears += 1
+        super().clear()
+
+    def lease(self, owner, ttl):
+        if self.holder is None:
+            self.holder = owner
+        return self.holder == owner
+
+    def release(self, owner):
+        if self.holder == owner:
+            self.holder = None
+
+
+class TestSharedBackend:
+    """One worker (the lease holder) applies notified invalidations to a shared backend"""
+
+    @staticmethod
+    def worker(backend, name):
+        cache = ResponseCache(backend=backend)
+        cache._owner = name
+        return cache
+
+    def test_one_invalidator(self):
+        backend = SharedBackend()
+        first, second = self.worker(backend, 'first'), self.worker(backend, 'second')
+        first._connected(False)
+        backend.set('/items/1', 'etag', b'{}', 60, ['item:1'])
+        second._connected(False)
+        assert (first.invalidator, second.invalidator, backend.clears) == (True, False, 1)
+
+        second.dispatch('item:1')
+        assert backend.get('/items/1') is not None
+        first.dispatch('item:1')
+        assert backend.get('/items/1') is None
+
+    def test_takeover_empties_backend(self):
+        backend = SharedBackend()
+        first, second = self.worker(backend, 'first'), self.worker(backend, 'second')
+        first._connected(False)
+        second._connected(False)
+        backend.set('/items/1', 'etag', b'{}', 60, ['item:1'])
+
+        first._disconnected()
+        second._tick()
+        assert second.invalidator and backend.clears == 2
+        assert backend.get('/items/1') is None
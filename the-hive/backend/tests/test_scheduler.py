@@ -0,0 +1,87 @@
+"""
+Tests for the job scheduler's cron schedules, deadline index and retry backoff
+Runs offline; no database is needed.
+"""
+
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import scheduler
+from scheduler import CronSchedule, DeadlineIndex, Scheduler
+
+
+class TestCronSchedule:
+    """Next matching minute of five-field cron expressions"""
+
+    def test_hourly(self):
+        schedule = CronSchedule('0 * * * *')
+        assert schedule.next_after(datetime(2025, 3, 1, 10, 0)) == datetime(2025, 3, 1, 11, 0)
+        assert schedule.next_after(datetime(2025, 3, 1, 23, 59, 30)) == datetime(2025, 3, 2, 0, 0)
+
+    def test_steps_ranges_and_lists(self):
+        schedule = CronSchedule('*/15 9-17 * * 1-5')
+        # Saturday evening -> Monday 09:00
+        assert schedule.next_after(datetime(2025, 3, 1, 18, 0)) == datetime(2025, 3, 3, 9, 0)
+        assert schedule.next_after(datetime(2025, 3, 3, 9, 7)) == datetime(2025, 3, 3, 9, 15)
+        assert CronSchedule('5,35 * * * *').next_after(datetime(2025, 3, 1, 10, 5)) == datetime(2025, 3, 1, 10, 35)
+
+    def test_month_and_year_rollover(self):
+        assert CronSchedule('30 3 1 1 *').next_after(datetime(2025, 3, 1)) == datetime(2026, 1, 1, 3, 30)
+        # Day-of-month and day-of-week both restricted: either matches (the 13th or a Friday)
+        assert CronSchedule('0 0 13 * 5').next_after(datetime(2025, 3, 1)) == datetime(2025, 3, 7, 0, 0)
+
+    @pytest.mark.parametrize('expression', ['* * * *', '60 * * * *', '* 5-2 * * *', '*/0 * * * *'])
+    def test_invalid_expressions(self, expression):
+        with pytest.raises(ValueError):
+            CronSchedule(expression)
+
+
+class TestJob:
+    """Failures back off"""
+
+    def test_retry_delay_doubles_up_to_max(self, monkeypatch):
+        monkeypatch.setattr(scheduler, 'RETRY_BASE', 30)
+        monkeypatch.setattr(scheduler, 'RETRY_MAX', 200)
+        assert [scheduler.retry_delay(n) for n in range(1, 6)] == [30, 60, 120, 200, 200]
+
+
+class TestDeadlineIndex:
+    """Per-row deadlines fire in order, once, at their latest time"""
+
+    def test_pop_due_in_deadline_order(self):
+        index = DeadlineIndex()
+        index.add('survey', 3, datetime(2025, 3, 1, 12, 0))
+        index.add('survey', 1, datetime(2025, 3, 1, 10, 0))
+        index.add('survey', 2, datetime(2025, 3, 1, 11, 0))
+
+        assert index.next_at() == datetime(2025, 3, 1, 10, 0)
+        assert index.pop_due(datetime(2025, 3, 1, 11, 30)) == {'survey': [1, 2]}
+        assert index.pop_due(datetime(2025, 3, 1, 11, 30)) == {}
+        assert len(index) == 1
+
+    def test_moved_deadline_replaces_old_one(self):
+        index = DeadlineIndex()
+        index.add('survey', 1, datetime(2025, 3, 1, 10, 0))
+        index.add('survey', 1, datetime(2025, 3, 1, 14, 0))
+
+        assert index.next_at() == datetime(2025, 3, 1, 14, 0)
+        assert index.pop_due(datetime(2025, 3, 1, 12, 0)) == {}
+        assert index.pop_due(datetime(2025, 3, 1, 15, 0)) == {'survey': [1]}
+        assert index.next_at() is None
+
+    def test_notifications_feed_the_index(self):
+        fired = []
+        deadlines = {'survey': scheduler.DeadlineSource('survey', fired.append, load=lambda cursor: [])}
+        leader = Scheduler(jobs={}, deadlines=deadlines)
+
+        leader.handle_notify('{"deadline": "survey", "key": 7, "at": "2025-03-01T10:00:00.123456"}')
+        leader.handle_notify('expire_surveys')
+        leader.handle_notify('{"deadline": "unknown", "key": 8, "at": "2025-03-01T10:00:00"}')
+
+        assert len(leader.index) == 1
+        assert leader.index.next_at() == datetime(2025, 3, 1, 10, 0, 0, 123456)
@@ -0,0 +1,147 @@
+"""
+Tests for refresh-token sessions (rotation, reuse detection and revocation), login and
+event stream tickets
+Needs a PostgreSQL database (POSTGRES_* / DATABASE_URL as for the app); skipped otherwise.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import passwords
+import sessions
+
+
+@pytest.fixture
+def user(db_cursor, make_user):
+    return db_cursor, make_user('session-test@hive.invalid', first_name='Session', last_name='Test')
+
+
+class TestRotation:
+    """Each refresh token works once; a replayed one is refused"""
+
+    def test_rotate(self, user):
+        cursor, user_id = user
+        token = sessions.create(cursor, user_id)
+        cursor.connection.commit()
+
+        new_token, session, error, status = sessions.rotate(cursor, token)
+        assert error is None and session['user_id'] == user_id
+        cursor.connection.commit()
+
+        # Straight after the rotation (e.g. a second tab): 409, the session survives
+        assert sessions.rotate(cursor, token)[2:] == ("Refresh token has already been used; use the newer one", 409)
+        assert sessions.rotate(cursor, new_token)[2] is None
+
+    def test_reuse_after_grace_revokes(self, user, monkeypatch):
+        cursor, user_id = user
+        monkeypatch.setattr(sessions, 'REFRESH_REUSE_GRACE', 0)
+        token = sessions.create(cursor, user_id)
+        cursor.connection.commit()
+        new_token = sessions.rotate(cursor, token)[0]
+        cursor.connection.commit()
+
+        assert sessions.rotate(cursor, token)[3] == 401
+        cursor.connection.commit()
+        assert sessions.rotate(cursor, new_token)[3] == 401
+
+    def test_unknown_token(self, user):
+        cursor, user_id = user
+        assert sessions.rotate(cursor, 'not-a-token')[2:] == ("Invalid or expired refresh token", 401)
+
+
+class TestRevocation:
+    """Sign-out, bans and cleanup"""
+
+    def test_sign_out(self, user):
+        cursor, user_id = user
+        token = sessions.create(cursor, user_id)
+        assert sessions.revoke(cursor, token)
+        assert sessions.rotate(cursor, token)[3] == 401
+
+    def test_ban_revokes_all_sessions(self, user):
+        cursor, user_id = user
+        tokens = [sessions.create(cursor, user_id) for _ in range(3)]
+        cursor.execute("UPDATE users SET user_status = 'banned' WHERE id = %s", (user_id,))
+        assert all(sessions.rotate(cursor, token)[3] == 401 for token in tokens)
+
+    def test_purge(self, user):
+        cursor, user_id = user
+        sessions.create(cursor, user_id)
+        cursor.execute("""
+            UPDATE sessions SET expires_at = NOW() - INTERVAL '2 days'
+            WHERE user_id = %s
+        """, (user_id,))
+        cursor.connection.commit()
+        assert sessions.purge(cursor) >= 1
+        cursor.execute("SELECT COUNT(*) AS count FROM sessions WHERE user_id = %s", (user_id,))
+        assert cursor.fetchone()['count'] == 0
+
+
+class TestLogin:
+    """POST /api/auth/login"""
+
+    def test_connection_released_during_password_check(self, user, monkeypatch):
+        cursor, user_id = user
+        cursor.execute("UPDATE users SET password_hash = %s, is_verified = TRUE WHERE id = %s",
+                       (passwords.hash_password('Session-test1'), user_id))
+        cursor.connection.commit()
+
+        import app
+        from flask import g
+
+        held = []
+        check_password = passwords.check_password
+
+        def checking(password, hashed):
+            held.append('_db_conn' in g)
+            return check_password(password, hashed)
+
+        monkeypatch.setattr(passwords, 'check_password', checking)
+        response = app.app.test_client().post(
+            '/api/auth/login',
+            json={"email": 'session-test@hive.invalid', "password": 'Session-test1'},
+            environ_base={'REMOTE_ADDR': '203.0.113.7'}
+        )
+        assert response.status_code == 200
+        assert held == [False]
+
+        cursor.execute("SELECT ip_address, last_login FROM sessions JOIN users u ON u.id = user_id WHERE user_id = %s",
+                       (user_id,))
+        row = cursor.fetchone()
+        assert str(row['ip_address']) == '203.0.113.7' and row['last_login'] is not None
+
+
+class TestEventTickets:
+    """GET /api/events is opened with a single-use ticket, never with the token in the URL"""
+
+    def test_ticket_opens_one_stream(self, user):
+        cursor, user_id = user
+        import app
+
+        client = app.app.test_client()
+        token = app.create_access_token({"id": user_id, "email": 'session-test@hive.invalid', "role": 'user'})
+        response = client.post('/api/events/ticket', headers={'Authorization': f"Bearer {token}"})
+        assert response.status_code == 200
+        ticket = response.get_json()['ticket']
+
+        stream = client.get(f"/api/events?ticket={ticket}")
+        assert stream.status_code == 200 and stream.mimetype == 'text/event-stream'
+        stream.close()
+
+        assert client.get(f"/api/events?ticket={ticket}").status_code == 401
+        assert client.get(f"/api/events?token={token}").status_code == 401
+
+    def test_banned_user_gets_no_stream(self, user):
+        cursor, user_id = user
+        import app
+        import events
+
+        ticket = events.create_ticket(cursor, user_id, 60)
+        cursor.execute("UPDATE users SET user_status = 'banned' WHERE id = %s", (user_id,))
+        cursor.connection.commit()
+
+        assert app.app.test_client().get(f"/api/events?ticket={ticket}").status_code == 403
@@ -0,0 +1,114 @@
+"""
+Tests that the stats triggers in the baseline migration keep the metrics of
+stats.METRICS: statically against the trigger source (offline) and by changing rows in
+the test database and measuring the drift (skipped when no database is reachable).
+"""
+
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import stats
+
+BASELINE = os.path.join(os.path.dirname(__file__), '..', 'migrations', '0001_baseline.py')
+
+
+def trigger_functions():
+    """{table: body of its stats_<table>() trigger function} from the baseline migration"""
+    with open(BASELINE) as f:
+        source = f.read()
+    return dict(re.findall(r"FUNCTION stats_(\w+)\(\) RETURNS trigger AS \$\$(.*?)\$\$", source, re.S))
+
+
+class TestBaselineSource:
+    """Every metric is bumped by its table's trigger, on the metric's condition and day"""
+
+    def test_tables_and_metrics(self):
+        functions = trigger_functions()
+        assert set(functions) == {table for table, _, _, _ in stats.METRICS.values()}
+        for table, body in functions.items():
+            bumped = set(re.findall(r"stats_bump\('(\w+)'", body))
+            assert bumped == {name for name, metric in stats.METRICS.items() if metric[0] == table}, table
+
+    def test_conditions_values_and_days(self):
+        functions = trigger_functions()
+        for name, (table, condition, value, day) in stats.METRICS.items():
+            body = functions[table]
+            for row, sign in (('OLD', '-'), ('NEW', '')):
+                if condition != "TRUE":
+                    assert condition.format(row=row) in body, (name, row)
+                day_sql = f"{day.format(row=row)}::date" if day else "NULL"
+                value_sql = "1" if value == "1" else f"COALESCE({value.format(row=row)}, 0)"
+                assert f"stats_bump('{name}', {day_sql}, {sign}{value_sql})" in body, (name, row)
+
+
+class TestTriggers:
+    """Row changes leave the counters and history as the base tables say"""
+
+    @staticmethod
+    def drift(cursor):
+        counters, days = stats._drift(cursor)
+        return {(name, day): delta for name, day, delta in counters + days}
+
+    def test_row_changes_keep_metrics(self, db_cursor):
+        before = self.drift(db_cursor)
+        cursor = db_cursor
+
+        cursor.execute("""
+            INSERT INTO users (email, password_hash, first_name, last_name)
+            VALUES ('stats-provider@hive.invalid', 'x', 'Stats', 'Provider'),
+                   ('stats-consumer@hive.invalid', 'x', 'Stats', 'Consumer')
+            RETURNING id
+        """)
+        provider, consumer = (row['id'] for row in cursor.fetchall())
+        cursor.execute("UPDATE users SET user_status = 'warning' WHERE id = %s", (consumer,))
+        cursor.execute("UPDATE users SET user_status = 'banned' WHERE id = %s", (consumer,))
+
+        cursor.execute("""
+            INSERT INTO services (user_id, service_type, title, description, hours_required, location_type)
+            VALUES (%s, 'offer', 'Stats test', 'Stats test', 2, 'online')
+            RETURNING id
+        """, (provider,))
+        service = cursor.fetchone()['id']
+        cursor.execute("""
+            INSERT INTO service_applications (service_id, applicant_id) VALUES (%s, %s) RETURNING id
+        """, (service, consumer))
+        application = cursor.fetchone()['id']
+        cursor.execute("""
+            INSERT INTO service_progress (service_id, application_id, provider_id, consumer_id, hours)
+            VALUES (%s, %s, %s, %s, 2)
+            RETURNING id
+        """, (service, application, provider, consumer))
+        progress = cursor.fetchone()['id']
+        cursor.execute("""
+            UPDATE service_progress SET status = 'completed', completed_at = NOW() - INTERVAL '2 days'
+            WHERE id = %s
+        """, (progress,))
+        cursor.execute("UPDATE service_progress SET hours = 3, completed_at = NOW() WHERE id = %s", (progress,))
+        cursor.execute("UPDATE services SET status = 'completed' WHERE id = %s", (service,))
+
+        cursor.execute("""
+            INSERT INTO reports (reporter_id, reported_user_id, content_type, reason)
+            VALUES (%s, %s, 'user', 'Stats test')
+            RETURNING id
+        """, (provider, consumer))
+        cursor.execute("UPDATE reports SET status = 'resolved' WHERE id = %s", (cursor.fetchone()['id'],))
+
+        cursor.execute("""
+            INSERT INTO forum_threads (user_id, title, content) VALUES (%s, 'Stats test', 'Stats test')
+            RETURNING id
+        """, (provider,))
+        thread = cursor.fetchone()['id']
+        cursor.execute("""
+            INSERT INTO forum_comments (thread_id, user_id, content) VALUES (%s, %s, 'One'), (%s, %s, 'Two')
+        """, (thread, consumer, thread, consumer))
+        cursor.execute("DELETE FROM forum_comments WHERE thread_id = %s AND content = 'One'", (thread,))
+
+        assert self.drift(cursor) == before
+
+        # Deleting the users cascades to everything above
+        cursor.execute("DELETE FROM service_progress WHERE id = %s", (progress,))
+        cursor.execute("DELETE FROM users WHERE id IN (%s, %s)", (provider, consumer))
+        assert self.drift(cursor) == before
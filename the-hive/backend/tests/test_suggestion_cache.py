@@ -0,0 +1,171 @@
+"""
+Tests for the Wikidata suggestion cache
+Runs fully offline: wikibase_search is pointed at a local fake Wikidata server that
+counts requests and can be slowed down or made to fail.
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import wikibase_search
+from fake_wikidata import FakeWikidata, RELATED
+from suggestion_cache import SuggestionCache, MemoryStore, HIT, STALE, MISS
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def wikidata(monkeypatch):
+    fake = FakeWikidata().start()
+    client = wikibase_search.WikidataClient(
+        search_url=f"{fake.base_url}/w/api.php",
+        sparql_url=f"{fake.base_url}/sparql",
+        retries=0
+    )
+    monkeypatch.setattr(wikibase_search, "_client", client)
+    yield fake
+    fake.stop()
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def make_cache(store, clock, **options):
+    options.setdefault("ttl", 3600)
+    options.setdefault("stale_ttl", 86400)
+    options.setdefault("negative_ttl", 60)
+    return SuggestionCache(
+        wikibase_search.find_entity_id,
+        wikibase_search.fetch_related_tags,
+        store=store,
+        clock=clock,
+        **options
+    )
+
+
+class TestSuggestionCache:
+    """Hit/miss behaviour, latency and coalescing of the suggestion cache"""
+
+    def test_miss_then_memory_hit(self, wikidata, clock):
+        wikidata.delay = 0.1
+        cache = make_cache(MemoryStore(), clock)
+
+        started = time.perf_counter()
+        first = cache.lookup("Guitar")
+        miss_latency = time.perf_counter() - started
+
+        started = time.perf_counter()
+        second = cache.lookup("  guitar ")
+        hit_latency = time.perf_counter() - started
+
+        assert first["cache"] == MISS
+        assert second["cache"] == HIT
+        assert first["entity_id"] == second["entity_id"] == "Q6607"
+        assert second["suggestions"] == RELATED["Q6607"]
+        assert wikidata.requests == {"search": 1, "sparql": 1}
+        assert miss_latency >= 0.2
+        assert hit_latency < 0.01
+
+    def test_shared_store_serves_other_workers(self, wikidata, clock):
+        store = MemoryStore()
+        make_cache(store, clock).lookup("gardening")
+
+        # A second process has an empty memory tier but shares the table
+        other_worker = make_cache(store, clock)
+        result = other_worker.lookup("Gardening")
+
+        assert result["cache"] == HIT
+        assert result["suggestions"] == RELATED["Q124246"]
+        assert wikidata.requests == {"search": 1, "sparql": 1}
+        assert other_worker.entities.stats()["store_hits"] == 1
+
+    def test_stale_entry_is_served_and_refreshed_in_background(self, wikidata, clock):
+        cache = make_cache(MemoryStore(), clock)
+        cache.lookup("guitar")
+
+        clock.now += 3600 + 1
+        wikidata.delay = 0.2
+        started = time.perf_counter()
+        result = cache.lookup("guitar")
+        latency = time.perf_counter() - started
+
+        assert result["cache"] == STALE
+        assert result["suggestions"] == RELATED["Q6607"]
+        assert latency < 0.05
+
+        # Both steps are refreshed once in the background
+        deadline = time.time() + 5
+        while time.time() < deadline and (
+            wikidata.requests != {"search": 2, "sparql": 2}
+            or cache.entities.stats()["in_flight"] or cache.related.stats()["in_flight"]
+        ):
+            time.sleep(0.02)
+        assert wikidata.requests == {"search": 2, "sparql": 2}
+        assert cache.lookup("guitar")["cache"] == HIT
+
+    def test_concurrent_misses_are_coalesced(self, wikidata, clock):
+        wikidata.delay = 0.2
+        cache = make_cache(MemoryStore(), clock)
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.lookup("guitar"))) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(results) == 10
+        assert all(r["entity_id"] == "Q6607" for r in results)
+        assert wikidata.requests == {"search": 1, "sparql": 1}
+        assert cache.entities.stats()["coalesced"] == 9
+
+    def test_failures_are_not_cached(self, wikidata, clock):
+        cache = make_cache(MemoryStore(), clock)
+
+        wikidata.fail = True
+        with pytest.raises(Exception):
+            cache.lookup("guitar")
+
+        wikidata.fail = False
+        result = cache.lookup("guitar")
+        assert result["cache"] == MISS
+        assert result["entity_id"] == "Q6607"
+        assert wikidata.requests["search"] == 2
+
+    def test_unknown_tags_are_cached_briefly(self, wikidata, clock):
+        cache = make_cache(MemoryStore(), clock, negative_ttl=60)
+
+        assert cache.lookup("zzqx")["entity_id"] is None
+        assert cache.lookup("zzqx")["cache"] == HIT
+        assert wikidata.requests["search"] == 1
+
+        # Past the negative TTL the empty result is only served stale
+        clock.now += 61
+        assert cache.lookup("zzqx")["cache"] == STALE
+
+    def test_stale_value_survives_outage(self, wikidata, clock):
+        cache = make_cache(MemoryStore(), clock, stale_ttl=60)
+        cache.lookup("guitar")
+
+        # Older than TTL + stale window: must refetch, but Wikidata is down
+        clock.now += 3600 + 61
+        wikidata.fail = True
+        result = cache.lookup("guitar")
+
+        assert result["cache"] == STALE
+        assert result["suggestions"] == RELATED["Q6607"]
@@ -0,0 +1,129 @@
+"""
+Tests for the offline Wikidata taxonomy snapshot
+Builds a snapshot from a tiny generated dump and checks local lookups, the shared
+filter rules and the fall back to (fake) live Wikidata.
+"""
+
+import gzip
+import json
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import taxonomy
+import wikibase_search
+from build_taxonomy import build
+from fake_wikidata import FakeWikidata
+
+ACTIVITY = 1914636
+
+
+def item(number, label, description='', aliases=(), **claims):
+    """Minimal dump entity; claims are given as P279=[targets] etc."""
+    entity = {
+        "id": f"Q{number}",
+        "type": "item",
+        "labels": {"en": {"language": "en", "value": label}},
+        "descriptions": {"en": {"language": "en", "value": description}} if description else {},
+        "aliases": {"en": [{"language": "en", "value": alias} for alias in aliases]},
+        "claims": {}
+    }
+    for prop, targets in claims.items():
+        entity["claims"][prop] = [{
+            "mainsnak": {
+                "snaktype": "value",
+                "property": prop,
+                "datavalue": {"type": "wikibase-entityid",
+                              "value": {"entity-type": "item", "numeric-id": target, "id": f"Q{target}"}}
+            },
+            "rank": "normal"
+        } for target in targets]
+    return entity
+
+
+DUMP = [
+    item(ACTIVITY, "activity"),
+    item(2, "horticulture", "science and art of growing plants", P279=[ACTIVITY]),
+    item(1, "gardening", "laying out and caring for a garden", aliases=["garden work"], P279=[2],
+         P3095=[4], P1056=[5]),
+    item(6, "Gardening", "2019 video game", P279=[ACTIVITY]),
+    item(7, "vegetable gardening", "growing vegetables", P279=[1]),
+    item(3, "rake", "garden tool", P366=[1]),
+    item(4, "gardener", "person who gardens"),
+    item(5, "vegetable", "edible part of a plant"),
+    item(8, "Q8", "unlabelled child", P279=[1]),
+    item(100, "Paris", "capital of France"),
+    {"id": "P31", "type": "property", "labels": {"en": {"value": "instance of"}}},
+]
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    dump_path = tmp_path / "dump.json.gz"
+    with gzip.open(dump_path, "wt", encoding="utf-8") as f:
+        f.write("[\n")
+        f.write(",\n".join(json.dumps(entity) for entity in DUMP))
+        f.write("\n]\n")
+    output = tmp_path / "taxonomy.json.gz"
+    build(str(dump_path), str(output), roots=[f"Q{ACTIVITY}"])
+    return str(output)
+
+
+@pytest.fixture
+def graph(snapshot_path):
+    return taxonomy.TaxonomyGraph.load(snapshot_path)
+
+
+class TestTaxonomySnapshot:
+    """Building and querying the local taxonomy"""
+
+    def test_only_related_entities_are_kept(self, graph):
+        assert "Q1" in graph
+        assert "Q3" in graph    # tool used for gardening
+        assert "Q100" not in graph
+        assert graph.stats()["entities"] == 9
+
+    def test_search_applies_live_filter_rules(self, graph):
+        # "Gardening" the video game is an exact label match too, but is filtered out
+        assert graph.search_entity("Gardening") == "Q1"
+        assert graph.search_entity("garden work") == "Q1"
+        assert graph.search_entity("horti") == "Q2"
+        assert graph.search_entity("paris") is None
+
+    def test_related_tags_follow_sparql_groups(self, graph):
+        # parents, children, tools, roles, products; "Q8" is dropped like a missing label
+        assert graph.related_tags("Q1") == ["horticulture", "vegetable gardening", "rake", "gardener", "vegetable"]
+        assert graph.related_tags("Q100") is None
+
+    def test_lookups_take_microseconds(self, graph):
+        started = time.perf_counter()
+        for _ in range(1000):
+            graph.lookup("gardening")
+        assert (time.perf_counter() - started) / 1000 < 0.001
+
+    def test_legacy_functions_use_snapshot_then_live_fallback(self, graph, monkeypatch):
+        fake = FakeWikidata().start()
+        try:
+            monkeypatch.setattr(taxonomy, "_graph", graph)
+            monkeypatch.setattr(taxonomy, "_graph_loaded", True)
+            monkeypatch.setattr(wikibase_search, "_client", wikibase_search.WikidataClient(
+                search_url=f"{fake.base_url}/w/api.php",
+                sparql_url=f"{fake.base_url}/sparql",
+                retries=0
+            ))
+
+            assert wikibase_search.get_entity_id("gardening") == "Q1"
+            assert "rake" in wikibase_search.get_related_tags("Q1")
+            assert fake.requests == {"search": 0, "sparql": 0}
+
+            # Not in the snapshot: answered by live Wikidata
+            assert wikibase_search.get_entity_id("guitar") == "Q6607"
+            assert wikibase_search.get_related_tags("Q6607")
+            assert fake.requests == {"search": 1, "sparql": 1}
+        finally:
+            fake.stop()
@@ -0,0 +1,153 @@
+"""
+Tests for the Wikidata client: timeouts, retries, bounded concurrency and circuit breaker
+Runs fully offline against the local fake Wikidata server.
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import taxonomy
+import wikibase_search
+from fake_wikidata import FakeWikidata, RELATED
+from wikibase_search import WikidataClient, CircuitBreaker, WikidataError, CircuitOpenError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def wikidata():
+    fake = FakeWikidata().start()
+    yield fake
+    fake.stop()
+
+
+def make_client(fake, **options):
+    options.setdefault("backoff_base", 0.01)
+    options.setdefault("backoff_max", 0.02)
+    return WikidataClient(
+        search_url=f"{fake.base_url}/w/api.php",
+        sparql_url=f"{fake.base_url}/sparql",
+        **options
+    )
+
+
+class TestWikidataClient:
+    """Client behaviour against a healthy, slow or failing Wikidata"""
+
+    def test_search_and_related(self, wikidata):
+        client = make_client(wikidata)
+
+        assert client.search_entity("Guitar") == "Q6607"
+        assert client.search_entity("zzqx") is None
+        assert client.related_tags("Q6607") == RELATED["Q6607"]
+
+        stats = client.stats()
+        assert stats["latency"]["search"]["count"] == 2
+        assert stats["latency"]["sparql"]["count"] == 1
+        assert stats["circuit"] == "closed"
+
+    def test_rejects_malformed_entity_ids(self, wikidata):
+        client = make_client(wikidata)
+        with pytest.raises(ValueError):
+            client.related_tags("Q1 } UNION { ?s ?p ?o")
+        assert wikidata.requests["sparql"] == 0
+
+    def test_transient_failures_are_retried(self, wikidata):
+        client = make_client(wikidata, retries=2)
+        wikidata.fail_times = 2
+
+        assert client.search_entity("guitar") == "Q6607"
+        assert wikidata.requests["search"] == 3
+        assert client.stats()["retries"] == 2
+
+    def test_read_timeout(self, wikidata):
+        client = make_client(wikidata, retries=0, search_timeout=0.1)
+        wikidata.delay = 0.5
+
+        started = time.monotonic()
+        with pytest.raises(WikidataError):
+            client.search_entity("guitar")
+        assert time.monotonic() - started < 0.4
+
+    def test_circuit_opens_and_short_circuits(self, wikidata):
+        clock = FakeClock()
+        client = make_client(wikidata, retries=0, breaker=CircuitBreaker(threshold=3, reset_timeout=30, clock=clock))
+        wikidata.fail = True
+
+        for _ in range(3):
+            with pytest.raises(WikidataError):
+                client.search_entity("guitar")
+        assert client.stats()["circuit"] == "open"
+
+        # While open, nothing reaches Wikidata
+        with pytest.raises(CircuitOpenError):
+            client.search_entity("guitar")
+        assert wikidata.requests["search"] == 3
+        assert client.stats()["short_circuited"] == 1
+
+        # After the reset timeout one trial request closes the circuit again
+        wikidata.fail = False
+        clock.now += 31
+        assert client.stats()["circuit"] == "half_open"
+        assert client.search_entity("guitar") == "Q6607"
+        assert client.stats()["circuit"] == "closed"
+
+    def test_failed_trial_reopens_circuit(self, wikidata):
+        clock = FakeClock()
+        client = make_client(wikidata, retries=0, breaker=CircuitBreaker(threshold=1, reset_timeout=10, clock=clock))
+        wikidata.fail = True
+
+        with pytest.raises(WikidataError):
+            client.search_entity("guitar")
+        clock.now += 11
+        with pytest.raises(WikidataError):
+            client.search_entity("guitar")
+
+        assert client.stats()["circuit"] == "open"
+        assert client.stats()["circuit_opened"] == 2
+
+    def test_concurrency_is_bounded(self, wikidata):
+        client = make_client(wikidata, retries=0, max_concurrency=2, connect_timeout=0.1)
+        wikidata.delay = 0.3
+
+        outcomes = []
+
+        def call():
+            try:
+                outcomes.append(client.search_entity("guitar"))
+            except WikidataError:
+                outcomes.append("busy")
+
+        threads = [threading.Thread(target=call) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert outcomes.count("Q6607") == 2
+        assert outcomes.count("busy") == 3
+        assert wikidata.requests["search"] == 2
+        assert client.stats()["rejected_busy"] == 3
+
+    def test_legacy_wrappers_return_empty_results(self, wikidata, monkeypatch):
+        client = make_client(wikidata, retries=0)
+        monkeypatch.setattr(wikibase_search, "_client", client)
+        monkeypatch.setattr(taxonomy, "_graph", None)
+        monkeypatch.setattr(taxonomy, "_graph_loaded", True)
+        wikidata.fail = True
+
+        assert wikibase_search.get_entity_id("guitar") is None
+        assert wikibase_search.get_related_tags("Q6607") == []
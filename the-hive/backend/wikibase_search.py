@@ -1,82 +1,355 @@
-import requests
+import os
+import random
+import re
 import sys
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
 
 # 1. Configuration
-SEARCH_API_URL = "https://www.wikidata.org/w/api.php"
-SPARQL_API_URL = "https://query.wikidata.org/sparql"
+SEARCH_API_URL = os.environ.get('WIKIDATA_SEARCH_URL', "https://www.wikidata.org/w/api.php")
+SPARQL_API_URL = os.environ.get('WIKIDATA_SPARQL_URL', "https://query.wikidata.org/sparql")
 USER_AGENT = "TheHiveServiceApp/1.0 (community-timebank)" # Wikidata requires a User-Agent
 
-def get_entity_id(search_term):
+CONNECT_TIMEOUT = float(os.environ.get('WIKIDATA_CONNECT_TIMEOUT', 3.05))
+REQUEST_TIMEOUT = float(os.environ.get('WIKIDATA_TIMEOUT', 5))  # read timeout for entity search
+SPARQL_TIMEOUT = float(os.environ.get('WIKIDATA_SPARQL_TIMEOUT', 10))  # read timeout for SPARQL
+MAX_CONCURRENCY = int(os.environ.get('WIKIDATA_MAX_CONCURRENCY', 4))  # in-flight requests per process
+RETRIES = int(os.environ.get('WIKIDATA_RETRIES', 2))
+BREAKER_THRESHOLD = int(os.environ.get('WIKIDATA_BREAKER_THRESHOLD', 5))  # consecutive failures
+BREAKER_RESET = float(os.environ.get('WIKIDATA_BREAKER_RESET', 30))  # seconds before a trial request
+
+ENTITY_ID_RE = re.compile(r"^Q\d+$")
+
+# Entity descriptions that mark a search hit as something other than a skill/activity
+SKIP_KEYWORDS = ['database', 'website', 'software', 'company', 'organization',
+                 'web service', 'online', 'application', 'platform', 'record label',
+                 'brand', 'corporation', 'enterprise', 'firm', 'business']
+SKIP_DESCRIPTIONS = SKIP_KEYWORDS + ['video game', 'film', 'movie', 'album', 'song',
+                                     'television', 'TV series', 'band', 'musical']
+
+
+class WikidataError(Exception):
+    """Wikidata could not answer (network error, timeout, bad status or overload)"""
+
+
+class CircuitOpenError(WikidataError):
+    """Raised without contacting Wikidata while the circuit breaker is open"""
+
+
+class LatencyHistogram:
+    """Cumulative latency histogram with fixed millisecond buckets"""
+
+    BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+
+    def observe(self, ms):
+        index = next((i for i, bound in enumerate(self.BUCKETS_MS) if ms <= bound), len(self.BUCKETS_MS))
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._sum += ms
+            self._max = max(self._max, ms)
+
+    def _percentile(self, counts, total, fraction):
+        """Upper bound of the bucket holding the given fraction of observations"""
+        target = total * fraction
+        seen = 0
+        for i, count in enumerate(counts):
+            seen += count
+            if seen >= target:
+                return self.BUCKETS_MS[i] if i < len(self.BUCKETS_MS) else None
+        return None
+
+    def snapshot(self):
+        with self._lock:
+            counts, total, total_ms, max_ms = list(self._counts), self._count, self._sum, self._max
+        buckets = {f"le_{bound}": count for bound, count in zip(self.BUCKETS_MS, counts)}
+        buckets["inf"] = counts[-1]
+        return {
+            "count": total,
+            "avg_ms": round(total_ms / total, 2) if total else None,
+            "max_ms": round(max_ms, 2),
+            "p50_ms": self._percentile(counts, total, 0.5) if total else None,
+            "p95_ms": self._percentile(counts, total, 0.95) if total else None,
+            "buckets": buckets
+        }
+
+
+class CircuitBreaker:
     """
-    Step 1: Search for the term and return the Q-ID of the best match.
-    Filters out databases, websites, and other non-conceptual entities.
+    Opens after `threshold` consecutive failures and rejects calls for `reset_timeout` seconds,
+    then lets a single trial call through (half-open) to decide whether to close again.
     """
-    params = {
-        "action": "wbsearchentities",
-        "search": search_term,
-        "language": "en",
-        "format": "json",
-        "type": "item",  # Strictly filter for items (not properties, lexemes, etc.)
-        "limit": 5  # Get multiple results to choose from
-    }
-    
-    headers = {"User-Agent": USER_AGENT}
 
-    try:
-        response = requests.get(SEARCH_API_URL, params=params, headers=headers)
-        response.raise_for_status()
-        data = response.json()
-
-        if data.get("search"):
-            # Filter to avoid databases, websites, software, companies, etc.
-            skip_keywords = ['database', 'website', 'software', 'company', 'organization', 
-                           'web service', 'online', 'application', 'platform', 'record label',
-                           'brand', 'corporation', 'enterprise', 'firm', 'business']
-            
-            for match in data["search"]:
-                description = match.get('description', '').lower()
-                label = match.get('label', '').lower()
-                search_lower = search_term.lower()
-                
-                # Skip if description contains unwanted keywords (including video games)
-                skip_descriptions = skip_keywords + ['video game', 'film', 'movie', 'album', 'song', 
-                                                     'television', 'TV series', 'band', 'musical']
-                if any(keyword in description for keyword in skip_descriptions):
-                    continue
-                
-                # Prefer exact matches
-                if label == search_lower:
-                    print(f"Found Entity: {match['label']} ({match['id']}) - {match.get('description', '')}")
-                    return match["id"]
-                
-                # For single-word searches, skip multi-word labels (avoid "Cooking Vinyl" for "cooking")
-                label_words = label.split()
-                search_words = search_lower.split()
-                if len(search_words) == 1 and len(label_words) > 1:
-                    # Skip this multi-word result
-                    continue
-                
-                # Otherwise accept if search term is in label
-                if search_lower in label:
-                    print(f"Found Entity: {match['label']} ({match['id']}) - {match.get('description', '')}")
-                    return match["id"]
-            
-            # If all results were filtered out, return the first one anyway
-            best_match = data["search"][0]
-            print(f"Found Entity (fallback): {best_match['label']} ({best_match['id']}) - {best_match.get('description', '')}")
-            return best_match["id"]
-        else:
-            print(f"No entity found for '{search_term}'")
-            return None
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_timeout=BREAKER_RESET, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self.times_opened = 0
 
-    except requests.exceptions.RequestException as e:
-        print(f"Error connecting to Search API: {e}")
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if self.clock() - self._opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        """Whether a call may go out now"""
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.threshold:
+                if self._opened_at is None or self._trial_in_flight:
+                    self.times_opened += 1
+                self._opened_at = self.clock()
+            self._trial_in_flight = False
+
+
+class WikidataClient:
+    """
+    Thread-safe Wikidata client shared by all requests of a worker process.
+    Reuses keep-alive connections, applies (connect, read) timeouts, caps concurrent
+    requests, retries transient failures with jittered exponential backoff and
+    short-circuits through a circuit breaker while Wikidata keeps failing.
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, search_url=None, sparql_url=None, user_agent=USER_AGENT,
+                 connect_timeout=None, search_timeout=None, sparql_timeout=None,
+                 max_concurrency=None, retries=None, backoff_base=0.25, backoff_max=2.0,
+                 breaker=None):
+        # Defaults are read at construction time so tests and scripts can override module settings
+        self.search_url = search_url or SEARCH_API_URL
+        self.sparql_url = sparql_url or SPARQL_API_URL
+        self.connect_timeout = CONNECT_TIMEOUT if connect_timeout is None else connect_timeout
+        self.timeouts = {
+            'search': REQUEST_TIMEOUT if search_timeout is None else search_timeout,
+            'sparql': SPARQL_TIMEOUT if sparql_timeout is None else sparql_timeout
+        }
+        self.max_concurrency = max_concurrency or MAX_CONCURRENCY
+        self.retries = RETRIES if retries is None else retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+
+        self.session = requests.Session()
+        self.session.headers.update({"User-Agent": user_agent})
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.max_concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+        self.histograms = {'search': LatencyHistogram(), 'sparql': LatencyHistogram()}
+        self._counters = {"requests": 0, "retries": 0, "errors": 0, "short_circuited": 0, "rejected_busy": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _backoff(self, attempt, response=None):
+        """Full-jitter exponential backoff; honours a short Retry-After header"""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit() and int(retry_after) <= self.backoff_max:
+                return float(retry_after)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _get_json(self, stage, url, params):
+        # Wait no longer than a connect timeout for a free slot; a queue of blocked workers helps nobody
+        if not self._slots.acquire(timeout=self.connect_timeout):
+            self._count("rejected_busy")
+            raise WikidataError("Too many concurrent Wikidata requests")
+
+        try:
+            if not self.breaker.allow():
+                self._count("short_circuited")
+                raise CircuitOpenError("Wikidata circuit breaker is open")
+
+            last_error = None
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    self._count("retries")
+                self._count("requests")
+                started = time.monotonic()
+                response = None
+                try:
+                    response = self.session.get(url, params=params,
+                                                timeout=(self.connect_timeout, self.timeouts[stage]))
+                    if response.status_code in self.RETRY_STATUSES:
+                        raise WikidataError(f"Wikidata {stage} returned HTTP {response.status_code}")
+                    response.raise_for_status()
+                    data = response.json()
+                    self.breaker.record_success()
+                    return data
+                except requests.HTTPError as e:
+                    # Other 4xx: our request is wrong, retrying will not help
+                    self._count("errors")
+                    self.breaker.record_success()
+                    raise WikidataError(f"Wikidata {stage} request rejected: {e}") from e
+                except (requests.RequestException, ValueError, WikidataError) as e:
+                    self._count("errors")
+                    last_error = e
+                finally:
+                    self.histograms[stage].observe((time.monotonic() - started) * 1000)
+
+                if attempt < self.retries:
+                    time.sleep(self._backoff(attempt, response))
+
+            self.breaker.record_failure()
+            raise WikidataError(f"Wikidata {stage} failed after {self.retries + 1} attempt(s): {last_error}")
+        finally:
+            self._slots.release()
+
+    def search_entity(self, search_term):
+        """
+        Search for the term and return the Q-ID of the best match (None if nothing matched).
+        Raises WikidataError if Wikidata could not be queried.
+        """
+        params = {
+            "action": "wbsearchentities",
+            "search": search_term,
+            "language": "en",
+            "format": "json",
+            "type": "item",  # Strictly filter for items (not properties, lexemes, etc.)
+            "limit": 5  # Get multiple results to choose from
+        }
+        data = self._get_json('search', self.search_url, params)
+        return pick_entity(search_term, data.get("search") or [])
+
+    def related_tags(self, entity_id):
+        """
+        Related service concepts for a Q-ID via SPARQL (see build_related_query()).
+        Raises WikidataError if Wikidata could not be queried.
+        """
+        if not ENTITY_ID_RE.match(entity_id or ''):
+            raise ValueError(f"Invalid Wikidata entity id: {entity_id!r}")
+        params = {
+            "query": build_related_query(entity_id),
+            "format": "json"
+        }
+        data = self._get_json('sparql', self.sparql_url, params)
+        try:
+            labels = [result["itemLabel"]["value"] for result in data["results"]["bindings"]]
+        except (KeyError, TypeError) as e:
+            raise WikidataError(f"Unexpected SPARQL response: {e}") from e
+        return filter_related_labels(labels)
+
+    def stats(self):
+        """Counters, breaker state and per-stage latency histograms for /api/health"""
+        with self._lock:
+            counters = dict(self._counters)
+        counters["circuit"] = self.breaker.state
+        counters["circuit_opened"] = self.breaker.times_opened
+        counters["latency"] = {stage: hist.snapshot() for stage, hist in self.histograms.items()}
+        return counters
+
+
+def pick_entity(search_term, matches):
+    """
+    Choose the Q-ID of the best wbsearchentities match.
+    Filters out databases, websites, and other non-conceptual entities.
+    """
+    if not matches:
+        print(f"No entity found for '{search_term}'")
         return None
 
-def get_related_tags(entity_id):
+    search_lower = search_term.lower()
+    for match in matches:
+        description = match.get('description', '').lower()
+        label = match.get('label', '').lower()
+
+        # Skip if description contains unwanted keywords (including video games)
+        if any(keyword in description for keyword in SKIP_DESCRIPTIONS):
+            continue
+
+        # Prefer exact matches
+        if label == search_lower:
+            print(f"Found Entity: {match['label']} ({match['id']}) - {match.get('description', '')}")
+            return match["id"]
+
+        # For single-word searches, skip multi-word labels (avoid "Cooking Vinyl" for "cooking")
+        label_words = label.split()
+        search_words = search_lower.split()
+        if len(search_words) == 1 and len(label_words) > 1:
+            # Skip this multi-word result
+            continue
+
+        # Otherwise accept if search term is in label
+        if search_lower in label:
+            print(f"Found Entity: {match['label']} ({match['id']}) - {match.get('description', '')}")
+            return match["id"]
+
+    # If all results were filtered out, return the first one anyway
+    best_match = matches[0]
+    print(f"Found Entity (fallback): {best_match['label']} ({best_match['id']}) - {best_match.get('description', '')}")
+    return best_match["id"]
+
+
+def filter_related_labels(labels):
+    """Drop labels that are ids, numbers or codes rather than usable tag names"""
+    results = []
+    for label in labels:
+        # Filter out unwanted results:
+        # 1. Q-IDs (items without proper labels)
+        if label.startswith('Q') and label[1:].isdigit():
+            continue
+
+        # 2. Lexeme IDs (L followed by numbers)
+        if label.startswith('L') and '-' in label:
+            continue
+
+        # 3. Pure numbers
+        if label.isdigit():
+            continue
+
+        # 4. Very short labels (likely codes or abbreviations)
+        if len(label) <= 2:
+            continue
+
+        results.append(label)
+    return results
+
+
+def build_related_query(entity_id):
     """
-    Step 2: Use the Q-ID to find related service concepts via SPARQL (Hybrid approach).
-    
+    SPARQL for related service concepts (Hybrid approach).
+
     This query finds:
     1. Categories/Parents (P279 ↑): e.g., "Cooking" → "Food preparation", "Skill"
     2. Specializations/Children (P279 ↓): e.g., "Cooking" → "Baking", "Roasting"
@@ -84,106 +357,135 @@ def get_related_tags(entity_id):
     4. Practitioners/Roles (P3095): e.g., "Cooking" → "Chef", "Cook"
     5. Products (P1056): e.g., "Sewing" → "Clothing"
     """
-    
-    sparql_query = f"""
+    return f"""
     SELECT DISTINCT ?itemLabel WHERE {{
-      
+
       # Group 1: Broader Categories (What is this service a type of?)
       {{
         wd:{entity_id} wdt:P279 ?item.
       }}
-      
+
       UNION
-      
+
       # Group 2: Specializations (Specific types of this service)
       {{
         ?item wdt:P279 wd:{entity_id}.
       }}
-      
+
       UNION
-      
+
       # Group 3: Tools & Equipment (Things used in this service)
       {{
         ?item wdt:P366 wd:{entity_id}.
       }}
-      
+
       UNION
-      
+
       # Group 4: Roles (Who performs this?)
       {{
         wd:{entity_id} wdt:P3095 ?item.
       }}
-      
+
       UNION
-      
+
       # Group 5: Products (What does this produce?)
       {{
         wd:{entity_id} wdt:P1056 ?item.
       }}
-      
+
       SERVICE wikibase:label {{ bd:serviceParam wikibase:language "en". }}
     }}
     LIMIT 20
     """
 
-    params = {
-        "query": sparql_query,
-        "format": "json"
-    }
-    
-    headers = {"User-Agent": USER_AGENT}
 
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Process-wide client configured from the environment"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = WikidataClient()
+    return _client
+
+
+def client_stats():
+    """Client metrics, or None if Wikidata has not been queried yet"""
+    return _client.stats() if _client is not None else None
+
+
+def _local_graph():
+    # Imported lazily: taxonomy reuses pick_entity()/filter_related_labels() from this module
+    import taxonomy
+    return taxonomy.get_graph()
+
+
+def find_entity_id(search_term):
+    """Live Q-ID of the best match, None if nothing matched; raises WikidataError on failure"""
+    return get_client().search_entity(search_term)
+
+
+def fetch_related_tags(entity_id):
+    """Live related tag labels for a Q-ID; raises WikidataError on failure"""
+    return get_client().related_tags(entity_id)
+
+
+def get_entity_id(search_term):
+    """
+    Step 1: Search for the term and return the Q-ID of the best match.
+    Answers from the local taxonomy snapshot when it has a match, otherwise asks Wikidata.
+    Returns None if nothing matched or Wikidata could not be reached.
+    """
+    graph = _local_graph()
+    if graph is not None:
+        entity_id = graph.search_entity(search_term)
+        if entity_id is not None:
+            return entity_id
+    try:
+        return find_entity_id(search_term)
+    except WikidataError as e:
+        print(f"Error connecting to Search API: {e}")
+        return None
+
+
+def get_related_tags(entity_id):
+    """
+    Step 2: Use the Q-ID to find related service concepts via SPARQL.
+    Answers from the local taxonomy snapshot for entities it contains, otherwise asks Wikidata.
+    Returns [] if Wikidata could not be reached (or the circuit breaker is open).
+    """
+    graph = _local_graph()
+    if graph is not None:
+        related = graph.related_tags(entity_id)
+        if related is not None:
+            return related
     try:
-        response = requests.get(SPARQL_API_URL, params=params, headers=headers)
-        response.raise_for_status()
-        data = response.json()
-
-        results = []
-        for result in data["results"]["bindings"]:
-            label = result["itemLabel"]["value"]
-            
-            # Filter out unwanted results:
-            # 1. Q-IDs (items without proper labels)
-            if label.startswith('Q') and label[1:].isdigit():
-                continue
-            
-            # 2. Lexeme IDs (L followed by numbers)
-            if label.startswith('L') and '-' in label:
-                continue
-            
-            # 3. Pure numbers
-            if label.isdigit():
-                continue
-            
-            # 4. Very short labels (likely codes or abbreviations)
-            if len(label) <= 2:
-                continue
-            
-            results.append(label)
-        
-        return results
-
-    except requests.exceptions.RequestException as e:
+        return fetch_related_tags(entity_id)
+    except (WikidataError, ValueError) as e:
         print(f"Error connecting to SPARQL API: {e}")
         return []
 
 # --- Main Execution ---
 if __name__ == "__main__":
     # Change this to test different tags (e.g., "Music", "Computer Science", "Football")
-    user_input = "Music" 
+    user_input = sys.argv[1] if len(sys.argv) > 1 else "Music"
 
     print(f"--- Processing Tag: '{user_input}' ---")
-    
+
     # 1. Get the ID
     q_id = get_entity_id(user_input)
-    
+
     if q_id:
         # 2. Get Suggestions
         suggestions = get_related_tags(q_id)
-        
+
         if suggestions:
             print("\n--- Suggested Semantic Tags ---")
             for tag in suggestions:
                 print(f"- {tag}")
         else:
-            print("No related suggestions found.")
\ No newline at end of file
+            print("No related suggestions found.")
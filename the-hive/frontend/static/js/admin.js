@@ -51,6 +51,53 @@ async function loadAdminStats() {
     }
 }
 
+// Series shown in the dashboard's activity chart
+const ACTIVITY_SERIES = [
+    { metric: 'signups', label: 'Users joined' },
+    { metric: 'services_created', label: 'Services created' },
+    { metric: 'hours_per_day', label: 'Hours exchanged' }
+];
+
+// Load daily history for the activity chart
+async function loadActivityChart(days = 30) {
+    const container = document.getElementById('activity-chart');
+    if (!container) return;
+
+    try {
+        const token = localStorage.getItem('access_token');
+        const metrics = ACTIVITY_SERIES.map(series => series.metric).join(',');
+        const response = await fetch(`/api/admin/stats/history?days=${days}&metrics=${metrics}`, {
+            headers: {
+                'Authorization': `Bearer ${token}`
+            }
+        });
+
+        if (!response.ok) throw new Error('Failed to load activity');
+
+        const data = await response.json();
+
+        container.innerHTML = ACTIVITY_SERIES.map(({ metric, label }) => {
+            const points = data.series[metric] || [];
+            const max = Math.max(1, ...points.map(point => point.value));
+            const total = points.reduce((sum, point) => sum + point.value, 0);
+            const bars = points.map(point => `
+                <div class="activity-bar" style="height: ${(point.value / max) * 100}%"
+                     title="${point.day}: ${point.value}"></div>
+            `).join('');
+            return `
+                <div class="activity-series">
+                    <h3>${label} <span>(${Math.round(total * 100) / 100} total)</span></h3>
+                    <div class="activity-bars">${bars}</div>
+                </div>
+            `;
+        }).join('');
+
+    } catch (error) {
+        console.error('Error loading activity chart:', error);
+        container.innerHTML = '<div class="chart-placeholder">Could not load activity</div>';
+    }
+}
+
 // Load users list
 async function loadUsers(page = 1, status = '', search = '') {
     try {
@@ -643,6 +690,12 @@ document.addEventListener('DOMContentLoaded', function() {
         loadAdminStats();
         loadRecentReports();
         loadRecentUsers();
+        loadActivityChart();
+        
+        const range = document.getElementById('activity-range');
+        if (range) {
+            range.addEventListener('change', () => loadActivityChart(range.value));
+        }
     } else if (path.includes('admin-users')) {
         loadUsers();
     } else if (path.includes('admin-services')) {
@@ -149,8 +149,21 @@ const BalanceManager = {
         // Setup visibility listener (always enabled)
         this.setupVisibilityListener();
         
-        // Setup polling if requested
-        if (enablePolling) {
+        if (window.HiveEvents) {
+            // Balance changes are pushed; poll only while the event stream is down
+            HiveEvents.on('balance', () => this.update());
+            HiveEvents.on('resync', () => this.update());
+            if (enablePolling) {
+                HiveEvents.onStatus(connected => {
+                    if (connected) {
+                        this.stopPolling();
+                    } else {
+                        this.startPolling(intervalSeconds);
+                    }
+                });
+            }
+        } else if (enablePolling) {
+            // Setup polling if requested
             this.startPolling(intervalSeconds);
         }
         
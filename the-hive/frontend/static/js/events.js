@@ -0,0 +1,152 @@
+/**
+ * Real-time events pushed by the server over /api/events (Server-Sent Events)
+ * One stream per tab. Pages register handlers with HiveEvents.on(type, handler);
+ * events carry ids and statuses, handlers refetch what they display.
+ * Event types: message, application, progress, survey, balance and resync
+ * (sent after a reconnect or overflow, when events may have been missed).
+ */
+
+const HiveEvents = {
+    // Wait (ms) before opening a new stream after an error
+    RETRY_DELAY: 5000,
+
+    source: null,
+    opening: null,
+    retryTimer: null,
+    connected: false,
+    hasConnected: false,
+    handlers: {},
+    statusHandlers: [],
+    types: ['message', 'application', 'progress', 'survey', 'balance', 'resync'],
+
+    /**
+     * Open the event stream (no-op without a token or EventSource support)
+     */
+    connect() {
+        if (this.source || this.opening || !window.EventSource) return;
+
+        const token = localStorage.getItem('access_token');
+        if (!token) return;
+
+        // EventSource cannot send an Authorization header, and the access token must not
+        // end up in a URL: trade it for a single-use ticket first
+        this.opening = fetch('/api/events/ticket', {
+            method: 'POST',
+            headers: { 'Authorization': `Bearer ${token}` }
+        })
+            .then(response => {
+                if (response.ok) {
+                    return response.json().then(data => this.open(data.ticket));
+                }
+                // 401/403: signed out or no longer allowed in; callers keep polling
+                if (response.status >= 500) this.retryLater();
+            })
+            .catch(() => this.retryLater())
+            .finally(() => {
+                this.opening = null;
+            });
+    },
+
+    open(ticket) {
+        this.source = new EventSource(`/api/events?ticket=${encodeURIComponent(ticket)}`);
+
+        this.source.addEventListener('ready', () => {
+            if (this.hasConnected) {
+                // Reconnected: anything sent while we were away is lost
+                this.dispatch('resync', {});
+            }
+            this.hasConnected = true;
+            this.setConnected(true);
+        });
+
+        // The access token the stream was opened with expired: reopen it with a fresh one
+        this.source.addEventListener('expired', () => this.reopen());
+
+        // The account was banned or deactivated
+        this.source.addEventListener('closed', () => {
+            this.close();
+            this.setConnected(false);
+        });
+
+        this.source.onerror = () => {
+            // The ticket was used up, so the browser's own reconnect would be refused
+            this.setConnected(false);
+            this.close();
+            this.retryLater();
+        };
+
+        this.types.forEach(type => {
+            this.source.addEventListener(type, event => {
+                let data = {};
+                try {
+                    data = JSON.parse(event.data || '{}');
+                } catch (error) {
+                    console.error('Malformed event data:', error);
+                }
+                this.dispatch(type, data);
+            });
+        });
+    },
+
+    close() {
+        if (this.source) {
+            this.source.close();
+            this.source = null;
+        }
+    },
+
+    /**
+     * Open a new stream, refreshing the access token first if it has expired
+     */
+    reopen() {
+        this.close();
+        const fresh = !window.Session || Session.accessTokenExpiry() > Date.now()
+            ? Promise.resolve(true) : Session.refresh();
+        fresh.then(ok => {
+            if (ok) this.connect();
+        });
+    },
+
+    retryLater() {
+        clearTimeout(this.retryTimer);
+        this.retryTimer = setTimeout(() => this.reopen(), this.RETRY_DELAY);
+    },
+
+    dispatch(type, data) {
+        (this.handlers[type] || []).forEach(handler => {
+            try {
+                handler(data);
+            } catch (error) {
+                console.error(`Error handling ${type} event:`, error);
+            }
+        });
+    },
+
+    /**
+     * Register a handler for an event type and make sure the stream is open
+     * @param {string} type - Event type
+     * @param {Function} handler - Called with the event data
+     */
+    on(type, handler) {
+        (this.handlers[type] = this.handlers[type] || []).push(handler);
+        this.connect();
+    },
+
+    /**
+     * Register a handler for stream status changes; called immediately with the current status
+     * @param {Function} handler - Called with true when connected, false when not
+     */
+    onStatus(handler) {
+        this.statusHandlers.push(handler);
+        handler(this.connected);
+    },
+
+    setConnected(value) {
+        if (this.connected === value) return;
+        this.connected = value;
+        this.statusHandlers.forEach(handler => handler(value));
+    }
+};
+
+// Make it globally available
+window.HiveEvents = HiveEvents;
@@ -0,0 +1,73 @@
+/**
+ * Incremental message sync for an application's conversation
+ * The first call loads the latest page of messages; later calls pass the
+ * X-Sync-Cursor of the previous response as ?since= and only receive messages
+ * that were sent or changed (read, proposal answered) in the meantime.
+ */
+class MessageSync {
+    /**
+     * @param {number} applicationId - Application whose messages are synced
+     */
+    constructor(applicationId) {
+        this.url = `/api/applications/${applicationId}/messages`;
+        this.byId = new Map();
+        this.syncCursor = null;
+        this.hasOlder = false;
+    }
+
+    async request(params) {
+        const token = localStorage.getItem('access_token');
+        const query = new URLSearchParams(params).toString();
+        const response = await fetch(query ? `${this.url}?${query}` : this.url, {
+            headers: { 'Authorization': `Bearer ${token}` }
+        });
+        if (!response.ok) {
+            throw new Error(`Request failed with status ${response.status}`);
+        }
+        return { response, messages: await response.json() };
+    }
+
+    merge(messages) {
+        messages.forEach(msg => this.byId.set(msg.id, msg));
+    }
+
+    /**
+     * Fetch new and changed messages
+     * @returns {Promise<Array>} All known messages, oldest first
+     */
+    async sync() {
+        const params = this.syncCursor ? { since: this.syncCursor } : {};
+        const { response, messages } = await this.request(params);
+
+        if (!this.syncCursor || response.headers.get('X-Sync-Reset') === 'true') {
+            this.byId.clear();
+            this.hasOlder = response.headers.get('X-Has-More') === 'true';
+        }
+        this.merge(messages);
+        this.syncCursor = response.headers.get('X-Sync-Cursor');
+        return this.messages();
+    }
+
+    /**
+     * Fetch the page of history before the oldest loaded message
+     * @returns {Promise<Array>} All known messages, oldest first
+     */
+    async loadOlder() {
+        const oldest = this.messages()[0];
+        if (!oldest || !this.hasOlder) {
+            return this.messages();
+        }
+        const { response, messages } = await this.request({ before: oldest.id });
+        this.merge(messages);
+        this.hasOlder = response.headers.get('X-Has-More') === 'true';
+        return this.messages();
+    }
+
+    get(messageId) {
+        return this.byId.get(messageId);
+    }
+
+    messages() {
+        return Array.from(this.byId.values()).sort((a, b) => a.id - b.id);
+    }
+}
@@ -31,6 +31,13 @@ const NavBar = {
     checkTokenValidity() {
         const token = localStorage.getItem('access_token');
         if (token && this.isTokenExpired()) {
+            if (Session.hasRefreshToken()) {
+                // API calls wait for the new access token (see session.js)
+                Session.refresh().then(ok => {
+                    if (!ok) this.signOut();
+                });
+                return true;
+            }
             console.log('Token has expired, logging out user...');
             this.signOut();
             return false;
@@ -184,8 +191,7 @@ const NavBar = {
      * Handle sign out
      */
     signOut() {
-        localStorage.removeItem('access_token');
-        localStorage.removeItem('user');
+        Session.signOut();
         window.location.href = '/';
     },
 
@@ -222,13 +228,12 @@ window.NavBar = NavBar;
     const originalFetch = window.fetch;
     window.fetch = function(...args) {
         return originalFetch.apply(this, args).then(response => {
-            // If we get a 401 Unauthorized, automatically logout
+            // If we still get a 401 after session.js tried a refresh, automatically logout
             if (response.status === 401) {
                 const token = localStorage.getItem('access_token');
                 if (token) {
                     console.log('Received 401 Unauthorized - token expired or invalid');
-                    localStorage.removeItem('access_token');
-                    localStorage.removeItem('user');
+                    Session.clear();
                     // Show alert and redirect to signin
                     alert('Your session has expired. Please sign in again.');
                     window.location.href = '/signin';
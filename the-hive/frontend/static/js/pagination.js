@@ -0,0 +1,42 @@
+/**
+ * Cursor pagination helper
+ * List endpoints such as /api/services return one page as a JSON array and
+ * advertise the next page in the X-Next-Cursor response header.
+ */
+
+/**
+ * Fetch every page of a cursor-paginated list endpoint
+ * @param {string} url - Endpoint URL, may already contain query parameters
+ * @param {Object} options - fetch() options (headers etc.)
+ * @param {number} maxPages - Safety cap on the number of pages requested
+ * @returns {Promise<Array>} All items across pages
+ */
+async function fetchAllPages(url, options = {}, maxPages = 100) {
+    const items = [];
+    let cursor = null;
+
+    for (let page = 0; page < maxPages; page++) {
+        let pageUrl = url;
+        if (cursor) {
+            pageUrl += (url.includes('?') ? '&' : '?') + 'cursor=' + encodeURIComponent(cursor);
+        }
+
+        const response = await fetch(pageUrl, options);
+        if (!response.ok) {
+            throw new Error(`Request failed with status ${response.status}`);
+        }
+
+        const data = await response.json();
+        if (!Array.isArray(data)) {
+            throw new Error('Unexpected response format');
+        }
+        items.push(...data);
+
+        cursor = response.headers.get('X-Next-Cursor');
+        if (!cursor) {
+            break;
+        }
+    }
+
+    return items;
+}
@@ -375,23 +375,28 @@ function renderServiceDetails() {
     `;
 }
 
+// Only new and changed messages are fetched after the first load
+const messageSync = new MessageSync(APPLICATION_ID);
+
 async function loadMessages() {
     try {
-        const token = localStorage.getItem('access_token');
-        const response = await fetch(`/api/applications/${APPLICATION_ID}/messages`, {
-            headers: { 'Authorization': `Bearer ${token}` }
-        });
-
-        if (response.ok) {
-            const messages = await response.json();
-            renderMessages(messages);
-            renderProposalNotification(messages);
-        }
+        const messages = await messageSync.sync();
+        renderMessages(messages);
+        renderProposalNotification(messages);
     } catch (error) {
         console.error('Error loading messages:', error);
     }
 }
 
+async function loadOlderMessages() {
+    try {
+        const messages = await messageSync.loadOlder();
+        renderMessages(messages, false);
+    } catch (error) {
+        console.error('Error loading older messages:', error);
+    }
+}
+
 // Check if there's a pending proposal
 let hasPendingProposal = false;
 
@@ -469,11 +474,15 @@ function renderProposalNotification(messages) {
 }
 
 
-function renderMessages(messages) {
+function renderMessages(messages, scrollToBottom = true) {
     const thread = document.getElementById('messageThread');
     const currentUserId = JSON.parse(atob(localStorage.getItem('access_token').split('.')[1])).user_id;
 
-    thread.innerHTML = messages.map(msg => {
+    const olderButton = messageSync.hasOlder
+        ? '<button type="button" style="display: block; margin: 0 auto 1rem;" onclick="loadOlderMessages()">Load earlier messages</button>'
+        : '';
+
+    thread.innerHTML = olderButton + messages.map(msg => {
         const isCurrentUser = msg.sender_id === currentUserId;
         const messageClass = isCurrentUser ? 'message current-user' : 'message other-user';
 
@@ -542,7 +551,9 @@ function renderMessages(messages) {
     }).join('');
 
     // Scroll to bottom
-    thread.scrollTop = thread.scrollHeight;
+    if (scrollToBottom) {
+        thread.scrollTop = thread.scrollHeight;
+    }
 }
 
 async function respondToSchedule(messageId, accept) {
@@ -1091,6 +1102,21 @@ document.addEventListener('DOMContentLoaded', async () => {
     await loadProgressData();
 });
 
+// Live updates pushed by the server (see events.js)
+if (window.HiveEvents) {
+    const isThisApplication = data => String(data.application_id) === String(APPLICATION_ID);
+    HiveEvents.on('message', data => {
+        if (isThisApplication(data)) loadMessages();
+    });
+    HiveEvents.on('progress', data => {
+        if (isThisApplication(data)) loadProgressData();
+    });
+    HiveEvents.on('survey', data => {
+        if (isThisApplication(data)) loadProgressData();
+    });
+    HiveEvents.on('resync', () => loadProgressData());
+}
+
 // Enter key to send message
 document.addEventListener('DOMContentLoaded', () => {
     document.getElementById('messageInput')?.addEventListener('keypress', (e) => {
@@ -0,0 +1,153 @@
+/**
+ * Session Module
+ * Keeps the short-lived access token fresh using the refresh token from login,
+ * so users are not sent back to /signin when an access token expires.
+ * Load this before navbar.js (and before any page script that calls the API).
+ */
+
+const Session = {
+    // Refresh this long (ms) before the access token expires
+    REFRESH_MARGIN: 60000,
+
+    refreshing: null,
+    timer: null,
+
+    apiBase() {
+        return window.location.hostname === 'localhost' ? 'http://localhost:5001/api' : '/api';
+    },
+
+    /**
+     * Expiry time (ms since epoch) of an access token (default: the stored one), or 0 if there is none
+     */
+    accessTokenExpiry(token = localStorage.getItem('access_token')) {
+        if (!token) return 0;
+        try {
+            return JSON.parse(atob(token.split('.')[1])).exp * 1000;
+        } catch (e) {
+            return 0;
+        }
+    },
+
+    hasRefreshToken() {
+        return !!localStorage.getItem('refresh_token');
+    },
+
+    /**
+     * Store the tokens from a login or refresh response
+     */
+    store(data) {
+        localStorage.setItem('access_token', data.access_token);
+        if (data.refresh_token) {
+            localStorage.setItem('refresh_token', data.refresh_token);
+        }
+        this.schedule();
+    },
+
+    clear() {
+        localStorage.removeItem('access_token');
+        localStorage.removeItem('refresh_token');
+        localStorage.removeItem('user');
+    },
+
+    /**
+     * Get a new access token. Concurrent callers share one request.
+     * @returns {Promise<boolean>} true if a valid access token is now stored
+     */
+    refresh() {
+        if (!this.refreshing) {
+            this.refreshing = this.doRefresh().finally(() => {
+                this.refreshing = null;
+            });
+        }
+        return this.refreshing;
+    },
+
+    async doRefresh() {
+        const refreshToken = localStorage.getItem('refresh_token');
+        if (!refreshToken) return false;
+
+        try {
+            const response = await Session.originalFetch.call(window, `${this.apiBase()}/auth/refresh`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ refresh_token: refreshToken })
+            });
+            if (response.ok) {
+                this.store(await response.json());
+                return true;
+            }
+            // 409: another tab refreshed with the same token first and stored the newer one
+            if (response.status === 409 && localStorage.getItem('refresh_token') !== refreshToken) {
+                this.schedule();
+                return true;
+            }
+            if (response.status === 401 || response.status === 403) {
+                localStorage.removeItem('refresh_token');
+            }
+            return false;
+        } catch (e) {
+            console.error('Error refreshing session:', e);
+            return false;
+        }
+    },
+
+    /**
+     * Refresh shortly before the access token expires
+     */
+    schedule() {
+        clearTimeout(this.timer);
+        if (!this.hasRefreshToken()) return;
+        const delay = Math.max(0, this.accessTokenExpiry() - Date.now() - this.REFRESH_MARGIN);
+        this.timer = setTimeout(() => this.refresh(), delay);
+    },
+
+    /**
+     * End the session on the server and forget the tokens
+     */
+    signOut() {
+        const refreshToken = localStorage.getItem('refresh_token');
+        if (refreshToken) {
+            Session.originalFetch.call(window, `${this.apiBase()}/auth/logout`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ refresh_token: refreshToken }),
+                keepalive: true
+            }).catch(() => {});
+        }
+        this.clear();
+    }
+};
+
+window.Session = Session;
+
+// Retry API calls that fail with 401 once, after refreshing the access token
+(function() {
+    const originalFetch = window.fetch;
+    Session.originalFetch = originalFetch;
+
+    window.fetch = async function(resource, init = {}) {
+        const response = await originalFetch.call(this, resource, init);
+        if (response.status !== 401 || !Session.hasRefreshToken()) {
+            return response;
+        }
+        const headers = new Headers(init.headers || {});
+        if (!(headers.get('Authorization') || '').startsWith('Bearer ')) {
+            return response;
+        }
+        if (!(await Session.refresh())) {
+            return response;
+        }
+        headers.set('Authorization', `Bearer ${localStorage.getItem('access_token')}`);
+        return originalFetch.call(this, resource, { ...init, headers });
+    };
+})();
+
+Session.schedule();
+
+// Timers are delayed while the tab sleeps; catch up when it becomes visible again
+document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'visible' && Session.hasRefreshToken()
+        && Session.accessTokenExpiry() - Date.now() < Session.REFRESH_MARGIN) {
+        Session.refresh();
+    }
+});